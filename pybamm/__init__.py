@@ -97,7 +97,11 @@ from .expression_tree.array import Array
 from .expression_tree.matrix import Matrix
 from .expression_tree.unary_operators import *
 from .expression_tree.functions import *
-from .expression_tree.interpolant import Interpolant
+from .expression_tree.interpolant import (
+    Interpolant,
+    GridInterpolatingFunction,
+    get_interpolating_function,
+)
 from .expression_tree.input_parameter import InputParameter
 from .expression_tree.parameter import Parameter, FunctionParameter
 from .expression_tree.broadcasts import Broadcast, PrimaryBroadcast, FullBroadcast
@@ -133,12 +137,21 @@ from .expression_tree.operations.simplify import (
 )
 from .expression_tree.operations.evaluate import (
     find_symbols,
+    fuse_elementwise,
     id_to_python_variable,
     to_python,
     EvaluatorPython,
 )
+from .expression_tree.operations.evaluate_flat import EvaluatorFlat, EvaluatorFlatOutput
+from .expression_tree.operations.evaluate_numba import EvaluatorNumba, have_numba
 from .expression_tree.operations.jacobian import Jacobian
-from .expression_tree.operations.convert_to_casadi import CasadiConverter
+from .expression_tree.operations.jacobian_vector_product import JacobianVectorProduct
+from .expression_tree.operations.convert_to_casadi import (
+    CasadiConverter,
+    choose_casadi_graph,
+)
+from .expression_tree.operations.intern import Interner
+from .expression_tree.operations.fold_constants import ConstantFolding
 
 #
 # Model classes
@@ -232,15 +245,26 @@ from .spatial_methods.scikit_finite_element import ScikitFiniteElement
 # Solver classes
 #
 from .solvers.solution import Solution
-from .solvers.base_solver import BaseSolver
+from .solvers.checkpoint import Checkpoint
+from .solvers.casadi_compile import compile_casadi_function
+from .solvers.base_solver import BaseSolver, get_bandwidth
 from .solvers.ode_solver import OdeSolver
 from .solvers.dae_solver import DaeSolver
 from .solvers.algebraic_solver import AlgebraicSolver
 from .solvers.casadi_solver import CasadiSolver
 from .solvers.scikits_dae_solver import ScikitsDaeSolver
-from .solvers.scikits_ode_solver import ScikitsOdeSolver, have_scikits_odes
+from .solvers.scikits_ode_solver import (
+    ScikitsOdeSolver,
+    have_scikits_odes,
+    choose_linsolver,
+)
 from .solvers.scipy_solver import ScipySolver
 from .solvers.idaklu_solver import IDAKLUSolver, have_idaklu
+from .solvers.autotune import (
+    autotune_solver,
+    default_solver_candidates,
+    solution_error,
+)
 
 #
 # other
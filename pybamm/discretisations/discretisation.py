@@ -205,6 +205,38 @@ class Discretisation(object):
             processed_events[event] = self.process_symbol(equation)
         model_disc.events = processed_events
 
+        # Fold the chains of constant matrices in the equations and events
+        pybamm.logger.info("Fold constant matrices for {}".format(model.name))
+        folding = pybamm.ConstantFolding()
+        for dictionary in [model_disc.rhs, model_disc.algebraic, model_disc.events]:
+            for key, symbol in dictionary.items():
+                dictionary[key] = folding.fold(symbol)
+        model_disc.concatenated_rhs = folding.fold(model_disc.concatenated_rhs)
+        model_disc.concatenated_algebraic = folding.fold(
+            model_disc.concatenated_algebraic
+        )
+        pybamm.logger.debug(
+            "Removed {} matrix products from {}".format(
+                folding.operations_removed, model.name
+            )
+        )
+
+        # Share the subexpressions that appear several times in the discretised model
+        pybamm.logger.info("Share common subexpressions for {}".format(model.name))
+        interner = pybamm.Interner()
+        for dictionary in [
+            model_disc.rhs,
+            model_disc.algebraic,
+            model_disc.events,
+            model_disc.variables,
+        ]:
+            for key, symbol in dictionary.items():
+                dictionary[key] = interner.intern(symbol)
+        model_disc.concatenated_rhs = interner.intern(model_disc.concatenated_rhs)
+        model_disc.concatenated_algebraic = interner.intern(
+            model_disc.concatenated_algebraic
+        )
+
         # Create mass matrix
         pybamm.logger.info("Create mass matrix for {}".format(model.name))
         model_disc.mass_matrix, model_disc.mass_matrix_inv = self.create_mass_matrix(
@@ -635,10 +667,11 @@ class Discretisation(object):
 
         Note: At present, calculation of the Jacobian is deferred until after
         simplification, since it is much faster to compute the Jacobian of the
-        simplified model. However, in some use cases (e.g. running the same
-        model multiple times but with different parameters) it may be more
-        efficient to compute the Jacobian once, before simplification, so that
-        parameters in the Jacobian can be updated (see PR #670).
+        simplified model. To run the same model multiple times with different
+        parameters, make those parameters :class:`pybamm.InputParameter` (e.g. with
+        :meth:`pybamm.Simulation.set_input_parameters`): they are kept in the
+        Jacobian, and the solvers reuse the Jacobian (and the rest of their set-up)
+        when only the values of the inputs change (see PR #670).
 
         Parameters
         ----------
@@ -82,6 +82,27 @@ class Array(pybamm.Symbol):
             (self.__class__, self.name, self.entries_string) + tuple(self.domain)
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        entries = self._entries
+        if issparse(entries):
+            # use a canonical (csr, sorted indices, no duplicates) form
+            entries = entries.tocsr(copy=True)
+            entries.sum_duplicates()
+            entries.sort_indices()
+            parts = [
+                entries.data.tobytes(),
+                entries.indices.astype(np.int64).tobytes(),
+                entries.indptr.astype(np.int64).tobytes(),
+            ]
+        else:
+            parts = [np.ascontiguousarray(entries).tobytes()]
+        return (
+            super()._content_hash_parts()
+            + [type(entries).__name__, str(entries.dtype), repr(entries.shape)]
+            + parts
+        )
+
     def _jac(self, variable):
         """ See :meth:`pybamm.Symbol._jac()`. """
         # Return zeros of correct size
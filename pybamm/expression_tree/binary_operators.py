@@ -94,8 +94,16 @@ class BinaryOperator(pybamm.Symbol):
             domain=domain,
             auxiliary_domains=auxiliary_domains,
         )
-        self.left = self.children[0]
-        self.right = self.children[1]
+
+    @property
+    def left(self):
+        "The left child of the operator"
+        return self.cached_children[0]
+
+    @property
+    def right(self):
+        "The right child of the operator"
+        return self.cached_children[1]
 
     def format(self, left, right):
         "Format children left and right into compatible form"
@@ -701,7 +709,11 @@ class Outer(BinaryOperator):
 
     def _binary_evaluate(self, left, right):
         """ See :meth:`pybamm.BinaryOperator._binary_evaluate()`. """
-
+        if np.ndim(left) == 2 and left.shape[1] > 1:
+            # left has been evaluated at several times at once (one column for each
+            # time), so take the outer product column by column
+            right = np.reshape(right, (1, -1, 1))
+            return (left[:, np.newaxis, :] * right).reshape(-1, left.shape[1])
         return np.outer(left, right).reshape(-1, 1)
 
 
@@ -57,6 +57,13 @@ class Broadcast(pybamm.SpatialOperator):
                 auxiliary_domains = {}
         super().__init__(name, child, domain, auxiliary_domains)
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [
+            self.broadcast_type,
+            repr(self.broadcast_domain),
+        ]
+
     def check_and_set_domain_and_broadcast_type(
         self, child, broadcast_domain, broadcast_type
     ):
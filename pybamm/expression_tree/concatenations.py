@@ -4,7 +4,7 @@
 import copy
 import numpy as np
 import pybamm
-from scipy.sparse import vstack
+from scipy.sparse import csr_matrix, vstack
 from collections import defaultdict
 
 
@@ -133,6 +133,19 @@ class NumpyConcatenation(Concatenation):
             concat_fun=np.concatenate
         )
 
+    def _concatenation_evaluate(self, children_eval):
+        """ See :meth:`Concatenation._concatenation_evaluate()`. """
+        n_columns = {child.shape[1] for child in children_eval if np.ndim(child) == 2}
+        if len(n_columns) > 1:
+            # some children have been evaluated at several times at once (one column
+            # for each time), so repeat the columns of the others
+            n_columns = max(n_columns)
+            children_eval = [
+                np.broadcast_to(child, (child.shape[0], n_columns))
+                for child in children_eval
+            ]
+        return super()._concatenation_evaluate(children_eval)
+
     def _concatenation_jac(self, children_jacs):
         """ See :meth:`pybamm.Concatenation.concatenation_jac()`. """
         children = self.cached_children
@@ -148,7 +161,9 @@ class NumpyConcatenation(Concatenation):
         for child in children:
             # extract any children from numpy concatenation
             if isinstance(child, NumpyConcatenation):
-                new_children.extend(child.orphans)
+                # no need for new copies of the children, as they are copied when
+                # they are attached to the new concatenation
+                new_children.extend(child.children)
             else:
                 new_children.append(child)
         new_symbol = NumpyConcatenation(*new_children)
@@ -163,6 +178,11 @@ class DomainConcatenation(Concatenation):
     It is assumed that each child has a domain, and the final concatenated vector will
     respect the sizes and ordering of domains established in mesh keys
 
+    The ordering is computed once, when the concatenation is created, as a
+    permutation of the entries of the stacked children (see :attr:`permutation`), so
+    that the concatenation is evaluated with a single gather, however many domains
+    and points in the secondary dimensions there are.
+
     **Extends**: :class:`pybamm.Concatenation`
 
     Parameters
@@ -218,17 +238,45 @@ class DomainConcatenation(Concatenation):
             self._children_slices = [
                 self.create_slices(child) for child in self.cached_children
             ]
+            self._permutation = self.create_permutation()
         else:
             self._mesh = copy.copy(copy_this._mesh)
             self._slices = copy.copy(copy_this._slices)
             self._size = copy.copy(copy_this._size)
             self._children_slices = copy.copy(copy_this._children_slices)
             self.secondary_dimensions_npts = copy_this.secondary_dimensions_npts
+            # the permutation is never changed, so it can be shared with the copy
+            self._permutation = copy_this._permutation
 
     @property
     def mesh(self):
         return self._mesh
 
+    @property
+    def permutation(self):
+        """
+        Integer array such that the concatenation is the vertical stack of its
+        children's values, indexed by the array
+        """
+        return self._permutation
+
+    @property
+    def permutation_matrix(self):
+        """
+        Sparse permutation matrix P such that the concatenation is P times the
+        vertical stack of its children's values
+        """
+        size = self._size
+        return csr_matrix(
+            (np.ones(size), (np.arange(size), self._permutation)), shape=(size, size)
+        )
+
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [
+            repr([dict(slices) for slices in self._children_slices])
+        ]
+
     def create_slices(self, node):
         slices = defaultdict(list)
         start = 0
@@ -246,18 +294,38 @@ class DomainConcatenation(Concatenation):
                 start = end
         return slices
 
+    def create_permutation(self):
+        """
+        Find the position in the vertical stack of the children of each entry of the
+        concatenation, from the slices of the children and of the concatenation
+        """
+        permutation = np.empty(self._size, dtype=int)
+        offset = 0
+        for slices in self._children_slices:
+            child_size = 0
+            for child_dom, child_slices in slices.items():
+                for _slice, child_slice in zip(self._slices[child_dom], child_slices):
+                    permutation[_slice] = np.arange(
+                        offset + child_slice.start, offset + child_slice.stop
+                    )
+                    child_size = max(child_size, child_slice.stop)
+            offset += child_size
+        return permutation
+
     def _concatenation_evaluate(self, children_eval):
         """ See :meth:`Concatenation._concatenation_evaluate()`. """
-        # preallocate vector
-        vector = np.empty((self._size, 1))
-
-        # loop through domains of children writing subvectors to final vector
-        for child_vector, slices in zip(children_eval, self._children_slices):
-            for child_dom, child_slice in slices.items():
-                for i, _slice in enumerate(child_slice):
-                    vector[self._slices[child_dom][i]] = child_vector[_slice]
-
-        return vector
+        # give all the children the same number of columns (e.g. when evaluating at
+        # several times at once, constant children only have one column)
+        n_columns = max(
+            child.shape[1] if np.ndim(child) == 2 else 1 for child in children_eval
+        )
+        children_eval = [
+            np.broadcast_to(
+                np.reshape(child, (child.shape[0], -1)), (child.shape[0], n_columns)
+            )
+            for child in children_eval
+        ]
+        return np.concatenate(children_eval)[self._permutation]
 
     def _concatenation_jac(self, children_jacs):
         """ See :meth:`pybamm.Concatenation.concatenation_jac()`. """
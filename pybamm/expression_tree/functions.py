@@ -2,9 +2,24 @@
 # Function classes and methods
 #
 import autograd
+import casadi
+import functools
+import hashlib
 import numbers
 import numpy as np
 import pybamm
+import types
+import weakref
+from scipy.sparse import csr_matrix, issparse
+
+# Derivatives of the functions that have been differentiated, keyed by the function
+# and then by the indices of the arguments that they are taken with respect to.
+# Functions that cannot be weakly referenced (e.g. numpy ufuncs) are module-level
+# objects, which are kept in a normal dictionary. The derivatives refer to their
+# functions, so they are only weakly referenced: a function and its derivatives are
+# freed once neither of them is used anymore.
+_function_derivatives = weakref.WeakKeyDictionary()
+_builtin_function_derivatives = {}
 
 
 class Function(pybamm.Symbol):
@@ -58,6 +73,31 @@ class Function(pybamm.Symbol):
             name, children=children, domain=domain, auxiliary_domains=auxiliary_domains
         )
 
+    def _content_hash_parts(self):
+        """
+        See :meth:`pybamm.Symbol._content_hash_parts()`. The function is identified
+        by what it computes (see :func:`callable_content`), so that e.g. two lambdas
+        with different bodies have different hashes.
+
+        Raises
+        ------
+        TypeError
+            If the function cannot be identified in this way
+        """
+        return super()._content_hash_parts() + [
+            self._function_content(),
+            str(self.derivative),
+        ]
+
+    def _function_content(self):
+        "Serialisation of the function, for :attr:`pybamm.Symbol.content_hash`"
+        try:
+            return callable_content(self.function)
+        except TypeError as e:
+            raise TypeError(
+                "Cannot compute the content hash of '{}': {}".format(self.name, e)
+            )
+
     def get_children_domains(self, children_list):
         """Obtains the unique domain of the children. If the
         children have different domains then raise an error"""
@@ -110,26 +150,31 @@ class Function(pybamm.Symbol):
         # Store differentiated function, needed in case we want to convert to CasADi
         if self.derivative == "autograd":
             return Function(
-                autograd.elementwise_grad(self.function, idx),
+                function_derivative(self.function, idx),
                 *children,
                 differentiated_function=self.function
             )
         elif self.derivative == "derivative":
             if len(children) > 1:
-                raise ValueError(
-                    """
-                    differentiation using '.derivative()' not implemented for functions
-                    with more than one child
-                    """
-                )
+                # functions of several variables (e.g. interpolants of data on a
+                # grid) can give their partial derivatives
+                if not hasattr(self.function, "partial_derivative"):
+                    raise ValueError(
+                        """
+                        differentiation using '.derivative()' not implemented for
+                        functions with more than one child
+                        """
+                    )
+                function_diff = self.function.partial_derivative(idx)
             else:
-                # keep using "derivative" as derivative
-                return pybamm.Function(
-                    self.function.derivative(),
-                    *children,
-                    derivative="derivative",
-                    differentiated_function=self.function
-                )
+                function_diff = self.function.derivative()
+            # keep using "derivative" as derivative
+            return pybamm.Function(
+                function_diff,
+                *children,
+                derivative="derivative",
+                differentiated_function=self.function
+            )
 
     def _function_jac(self, children_jacs):
         """ Calculate the jacobian of a function. """
@@ -221,6 +266,267 @@ class Function(pybamm.Symbol):
         return self._function_new_copy(simplified_children)
 
 
+def callable_content(value):
+    """
+    Returns a serialisation of a callable (or of the data it holds) that identifies
+    what it computes, and is the same in every process, for
+    :attr:`pybamm.Symbol.content_hash`.
+
+    Python functions (including lambdas) are identified by their code, default
+    arguments and the contents of their closures, builtin functions and numpy
+    ufuncs by their name, and other callables (e.g. scipy interpolants) by their
+    class and attributes. Objects can define a `_content_hash_data` method that
+    returns the data that identifies them instead.
+
+    Parameters
+    ----------
+    value : object
+        The callable (or data) to serialise
+
+    Returns
+    -------
+    str
+        The serialisation
+
+    Raises
+    ------
+    TypeError
+        If the callable (or part of its data) cannot be serialised in this way
+    """
+    return _callable_content(value, set())
+
+
+def _callable_content(value, in_progress):
+    "Serialise `value`, with the ids of the objects being serialised in in_progress"
+    if value is None or isinstance(value, (bool, numbers.Number, str, bytes)):
+        return "{}:{!r}".format(type(value).__name__, value)
+    if isinstance(value, (np.ndarray, np.generic)) or issparse(value):
+        if issparse(value):
+            value = csr_matrix(value)
+            arrays = [value.data, value.indices, value.indptr]
+        else:
+            arrays = [np.asarray(value)]
+        hasher = hashlib.blake2b(digest_size=16)
+        for array in arrays:
+            hasher.update(repr((array.dtype.str, array.shape)).encode())
+            hasher.update(np.ascontiguousarray(array).tobytes())
+        return "{}:{}".format(type(value).__name__, hasher.hexdigest())
+    if isinstance(value, (types.BuiltinFunctionType, np.ufunc, type, types.ModuleType)):
+        # objects that are defined once, by name
+        return "{}:{}.{}".format(
+            type(value).__name__,
+            getattr(value, "__module__", None) or "",
+            getattr(value, "__qualname__", value.__name__),
+        )
+
+    if id(value) in in_progress:
+        # e.g. recursive functions, whose closure holds the function itself
+        return "recursion"
+    in_progress.add(id(value))
+    try:
+        if isinstance(value, (list, tuple)):
+            parts = [_callable_content(item, in_progress) for item in value]
+        elif isinstance(value, (set, frozenset)):
+            # sorted, as the order of the items depends on the hash seed
+            parts = sorted(_callable_content(item, in_progress) for item in value)
+        elif isinstance(value, dict):
+            parts = [
+                _callable_content(item, in_progress)
+                for item in sorted(value.items(), key=lambda item: repr(item[0]))
+            ]
+        elif isinstance(value, types.CodeType):
+            parts = [
+                value.co_code.hex(),
+                _callable_content(value.co_consts, in_progress),
+                repr(value.co_names),
+            ]
+        elif isinstance(value, types.FunctionType):
+            closure = [cell.cell_contents for cell in value.__closure__ or []]
+            parts = [
+                "{}.{}".format(value.__module__, value.__qualname__),
+                _callable_content(value.__code__, in_progress),
+                _callable_content(value.__defaults__, in_progress),
+                _callable_content(value.__kwdefaults__, in_progress),
+                _callable_content(closure, in_progress),
+            ]
+        elif isinstance(value, types.MethodType):
+            parts = [
+                _callable_content(value.__func__, in_progress),
+                _callable_content(value.__self__, in_progress),
+            ]
+        elif isinstance(value, functools.partial):
+            parts = [
+                _callable_content(value.func, in_progress),
+                _callable_content(value.args, in_progress),
+                _callable_content(value.keywords, in_progress),
+            ]
+        elif hasattr(value, "_content_hash_data"):
+            parts = [_callable_content(value._content_hash_data(), in_progress)]
+        elif hasattr(value, "__dict__"):
+            parts = [_callable_content(vars(value), in_progress)]
+        else:
+            raise TypeError(
+                "cannot identify objects of type '{}'".format(type(value).__name__)
+            )
+    finally:
+        in_progress.discard(id(value))
+    cls = type(value)
+    return "{}.{}({})".format(cls.__module__, cls.__qualname__, ",".join(parts))
+
+
+def function_derivative(function, idx):
+    """
+    Returns the elementwise derivative of a function with respect to its `idx`-th
+    argument, as a :class:`FunctionDerivative`. Derivatives are cached by function
+    and argument index while they are in use, so that a function (e.g. from a
+    parameter file) that is differentiated many times is only traced once for each
+    of its derivatives.
+    Derivatives of derivatives are derivatives of the original function with respect
+    to several arguments.
+
+    Parameters
+    ----------
+    function : method or :class:`FunctionDerivative`
+        The function to differentiate
+    idx : int
+        The index of the argument to differentiate with respect to
+
+    Returns
+    -------
+    :class:`FunctionDerivative`
+        The derivative
+    """
+    if isinstance(function, FunctionDerivative):
+        function, argnums = function.function, function.argnums + (idx,)
+    else:
+        argnums = (idx,)
+    try:
+        derivatives = _function_derivatives.setdefault(
+            function, weakref.WeakValueDictionary()
+        )
+    except TypeError:
+        derivatives = _builtin_function_derivatives.setdefault(
+            function, weakref.WeakValueDictionary()
+        )
+    derivative = derivatives.get(argnums)
+    if derivative is None:
+        derivative = FunctionDerivative(function, argnums)
+        derivatives[argnums] = derivative
+    return derivative
+
+
+class FunctionDerivative(object):
+    """
+    Elementwise (partial) derivative of a function, as given by
+    :func:`function_derivative`.
+
+    The first time the derivative is evaluated, the function is traced into a CasADi
+    graph (by calling it on scalar SX symbols) and differentiated by CasADi, which
+    then evaluates the derivative at all the points at once, much faster than
+    `autograd` (which traces the function again at each evaluation). The same graph
+    is used when the derivative is converted to CasADi. Functions that CasADi cannot
+    trace (e.g. functions that branch on the values of their arguments) are
+    differentiated with `autograd.elementwise_grad` instead.
+
+    Parameters
+    ----------
+    function : method
+        The function that is differentiated
+    argnums : tuple of int
+        The indices of the arguments that the derivative is taken with respect to, in
+        order
+    """
+
+    def __init__(self, function, argnums):
+        self.function = function
+        self.argnums = argnums
+        # Name the derivative as autograd does, e.g.
+        # "elementwise_grad_of_f_wrt_argnum_0"
+        name = getattr(function, "__name__", str(function.__class__))
+        qualname = getattr(function, "__qualname__", name)
+        for idx in argnums:
+            name = "elementwise_grad_of_{}_wrt_argnum_{}".format(name, idx)
+            qualname = "elementwise_grad_of_{}_wrt_argnum_{}".format(qualname, idx)
+        self.__name__ = name
+        self.__qualname__ = qualname
+        self.__module__ = getattr(function, "__module__", None)
+        # CasADi functions of the derivative, for each number of arguments (None if
+        # the function cannot be traced)
+        self._casadi_functions = {}
+        self._mapped_functions = {}
+        self._autograd_function = None
+
+    def _content_hash_data(self):
+        "The data that identifies the derivative (see :func:`callable_content`)"
+        return self.function, self.argnums
+
+    def casadi_function(self, n_args):
+        """
+        Returns the derivative as a CasADi function of `n_args` scalars, or None if
+        CasADi cannot trace the function
+        """
+        if n_args not in self._casadi_functions:
+            args = [casadi.SX.sym("x_" + str(i)) for i in range(n_args)]
+            try:
+                derivative = casadi.SX(self.function(*args))
+                for idx in self.argnums:
+                    derivative = casadi.gradient(derivative, args[idx])
+                casadi_function = casadi.Function("derivative", args, [derivative])
+            except Exception:
+                # functions that cannot be traced with SX symbols
+                casadi_function = None
+            self._casadi_functions[n_args] = casadi_function
+        return self._casadi_functions[n_args]
+
+    def evaluate_casadi(self, *args):
+        """
+        Evaluate the derivative at CasADi expressions `args` (column vectors of the
+        same length, or scalars), elementwise
+        """
+        casadi_function = self.casadi_function(len(args))
+        if casadi_function is None:
+            raise NotImplementedError(
+                "Cannot convert the derivative of '{}' to CasADi".format(
+                    getattr(self.function, "__name__", self.function)
+                )
+            )
+        # CasADi evaluates functions of scalars at all the columns of row vectors
+        return casadi_function(*[arg.T for arg in args]).T
+
+    def __call__(self, *args):
+        casadi_function = self.casadi_function(len(args))
+        if casadi_function is None:
+            if self._autograd_function is None:
+                autograd_function = self.function
+                for idx in self.argnums:
+                    autograd_function = autograd.elementwise_grad(
+                        autograd_function, idx
+                    )
+                self._autograd_function = autograd_function
+            return self._autograd_function(*args)
+
+        # Evaluate the function at all the points at once, with a map over the points
+        # (cached for each number of points); arguments with a single value are
+        # shared between the points
+        args = [np.asarray(arg, dtype=float) for arg in args]
+        shape = np.broadcast(*args).shape
+        n_points = int(np.prod(shape))
+        mapped_function = self._mapped_functions.get((len(args), n_points))
+        if mapped_function is None:
+            mapped_function = casadi_function.map(n_points)
+            self._mapped_functions[(len(args), n_points)] = mapped_function
+        value = mapped_function(
+            *[
+                float(arg) if arg.size == 1 else np.broadcast_to(arg, shape).ravel()
+                for arg in args
+            ]
+        )
+        if shape == ():
+            # scalar arguments give a float, as with autograd
+            return value.full().item()
+        return value.full().reshape(shape)
+
+
 class SpecificFunction(Function):
     """
     Parent class for the specific functions, which implement their own `diff`
@@ -44,6 +44,8 @@ class Time(IndependentVariable):
     *Extends:* :class:`Symbol`
     """
 
+    _node_dependencies = pybamm.Symbol.DEPENDS_ON_TIME
+
     def __init__(self):
         super().__init__("time")
 
@@ -109,6 +111,10 @@ class SpatialVariable(IndependentVariable):
                 "domain cannot be particle if name is '{}'".format(name)
             )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [str(self.coord_sys)]
+
     def new_copy(self):
         """ See :meth:`pybamm.Symbol.new_copy()`. """
         return SpatialVariable(
@@ -18,6 +18,8 @@ class InputParameter(pybamm.Symbol):
 
     """
 
+    _node_dependencies = pybamm.Symbol.DEPENDS_ON_INPUTS
+
     def __init__(self, name):
         super().__init__(name)
 
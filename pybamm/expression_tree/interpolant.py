@@ -2,27 +2,312 @@
 # Interpolating class
 #
 import pybamm
+import hashlib
+import numpy as np
 from scipy import interpolate
 
+# Maximum number of interpolating functions kept in the cache
+INTERPOLANT_CACHE_SIZE = 128
+
+_interpolating_functions = {}
+
+
+def get_interpolating_function(data, interpolator="cubic spline", extrapolate=True):
+    """
+    Returns the interpolating function for the given data.
+
+    For data in 1D, this is a piecewise polynomial (:class:`scipy.interpolate.PPoly`)
+    in terms of its breakpoints and spline coefficients, which can be evaluated
+    (vectorised, with a binary search for the intervals) by scipy and converted to
+    CasADi (see :class:`pybamm.CasadiConverter`). For data on a grid, this is a
+    :class:`GridInterpolatingFunction`.
+
+    Interpolating functions are cached by the content of the data, so that
+    interpolants of the same data (e.g. the copies of an interpolant made when
+    processing and discretising a model) share a single function, which is only
+    built once. The cache holds the last :data:`INTERPOLANT_CACHE_SIZE` functions.
+
+    Parameters
+    ----------
+    data : :class:`numpy.ndarray` or tuple
+        Numpy array of data to use for interpolation, with two columns (x and y data),
+        or tuple (grids, values) of data on a grid (see :class:`pybamm.Interpolant`)
+    interpolator : str, optional
+        Which interpolator to use ("linear", "constant", "pchip" or "cubic spline" in
+        1D, "linear" or "cubic spline" on a grid). Default is "cubic spline".
+    extrapolate : bool, optional
+        Whether to extrapolate for points that are outside of the parametrisation
+        range, or return NaN. Default is True.
+
+    Returns
+    -------
+    :class:`scipy.interpolate.PPoly` or :class:`GridInterpolatingFunction`
+        The interpolating function
+    """
+    if isinstance(data, tuple):
+        grids = [np.ascontiguousarray(grid, dtype=float) for grid in data[0]]
+        values = np.ascontiguousarray(data[1], dtype=float)
+        arrays = grids + [values]
+    else:
+        data = np.ascontiguousarray(data, dtype=float)
+        arrays = [data]
+    hasher = hashlib.sha1()
+    for array in arrays:
+        hasher.update(repr(array.shape).encode() + array.tobytes())
+    hasher.update(repr((interpolator, bool(extrapolate))).encode())
+    key = hasher.hexdigest()
+    try:
+        return _interpolating_functions[key]
+    except KeyError:
+        pass
+
+    if isinstance(data, tuple):
+        function = GridInterpolatingFunction(
+            grids, values, interpolator, extrapolate, name=key[:8]
+        )
+    else:
+        x, y = data[:, 0], data[:, 1]
+        if interpolator == "linear":
+            slopes = np.diff(y) / np.diff(x)
+            function = interpolate.PPoly(
+                np.vstack([slopes, y[:-1]]), x, extrapolate=extrapolate
+            )
+        elif interpolator == "constant":
+            # each value is held until the next data point; the last value is held on
+            # a one-ulp interval so that it is the value at the last data point
+            breakpoints = np.append(x, np.nextafter(x[-1], np.inf))
+            function = interpolate.PPoly(
+                y[np.newaxis, :], breakpoints, extrapolate=extrapolate
+            )
+        elif interpolator == "pchip":
+            function = interpolate.PchipInterpolator(x, y, extrapolate=extrapolate)
+        elif interpolator == "cubic spline":
+            function = interpolate.CubicSpline(x, y, extrapolate=extrapolate)
+        else:
+            raise ValueError("interpolator '{}' not recognised".format(interpolator))
+
+    if len(_interpolating_functions) >= INTERPOLANT_CACHE_SIZE:
+        # forget the oldest function
+        del _interpolating_functions[next(iter(_interpolating_functions))]
+    _interpolating_functions[key] = function
+    return function
+
+
+class GridInterpolatingFunction(object):
+    """
+    Interpolating function (or one of its partial derivatives) of data on a
+    rectangular grid, in any number of dimensions, evaluated at many points at once.
+
+    The function is a tensor product of 1D interpolants: piecewise linear ones
+    ("linear", which extrapolate linearly), or not-a-knot cubic B-splines ("cubic
+    spline", which are held constant outside of the grid). These are the functions
+    given by `casadi.interpolant` with the "linear" and "bspline" plugins, to which
+    the function is converted by :class:`pybamm.CasadiConverter`, so that both
+    backends (and their derivatives) agree.
+
+    Parameters
+    ----------
+    grids : list of :class:`numpy.ndarray`
+        The (increasing) grid points along each dimension
+    values : :class:`numpy.ndarray`
+        The values at the grid points, of shape `(len(grids[0]), len(grids[1]), ...)`
+    interpolator : str
+        Which interpolator to use ("linear" or "cubic spline")
+    extrapolate : bool
+        Whether to extrapolate for points that are outside of the grid, or return NaN
+    name : str, optional
+        Name of the function (e.g. a hash of the data), which identifies it in the
+        names of the nodes that use its derivatives
+    derivative_orders : tuple of int, optional
+        The order of the partial derivative with respect to each dimension. Default
+        is zero for each dimension (the function itself).
+    coefficients : tuple, optional
+        The B-spline coefficients and knots of a "cubic spline" function, which are
+        shared with its partial derivatives. Default is None, in which case they are
+        found from the values.
+    """
+
+    def __init__(
+        self,
+        grids,
+        values,
+        interpolator,
+        extrapolate,
+        name=None,
+        derivative_orders=None,
+        coefficients=None,
+    ):
+        if interpolator not in ["linear", "cubic spline"]:
+            raise ValueError(
+                "interpolator '{}' not recognised for data on a grid".format(
+                    interpolator
+                )
+            )
+        self.grids = grids
+        self.values = values
+        self.interpolator = interpolator
+        self.extrapolate = extrapolate
+        self.derivative_orders = derivative_orders or (0,) * len(grids)
+        self.name = name
+
+        if interpolator == "cubic spline":
+            if any(len(grid) < 4 for grid in grids):
+                raise ValueError(
+                    "cubic spline interpolants on a grid need at least 4 points in "
+                    "each dimension"
+                )
+            if coefficients is None:
+                # the B-spline coefficients of the tensor product are found by
+                # interpolating along each dimension in turn
+                coefficients = values
+                self._knots = []
+                for axis, grid in enumerate(grids):
+                    spline = interpolate.make_interp_spline(
+                        grid, coefficients, k=3, axis=axis
+                    )
+                    # the coefficients are stored with the interpolation axis first
+                    coefficients = np.moveaxis(spline.c, 0, axis)
+                    self._knots.append(spline.t)
+            else:
+                coefficients, self._knots = coefficients
+            self._coefficients = coefficients
+        else:
+            self._coefficients = values
+
+        # Name, used by pybamm.Function for the nodes that use the function
+        self.__name__ = "interpolating function {} d{}".format(
+            name, self.derivative_orders
+        )
+
+    def _content_hash_data(self):
+        "The data that identifies the function (see :func:`pybamm.callable_content`)"
+        return (
+            self.grids,
+            self.values,
+            self.interpolator,
+            self.extrapolate,
+            self.derivative_orders,
+        )
+
+    @property
+    def ndim(self):
+        "The number of dimensions of the grid"
+        return len(self.grids)
+
+    def partial_derivative(self, idx):
+        """
+        Returns the partial derivative of the function with respect to its `idx`-th
+        argument, which shares the coefficients of the function
+        """
+        orders = list(self.derivative_orders)
+        orders[idx] += 1
+        coefficients = None
+        if self.interpolator == "cubic spline":
+            coefficients = (self._coefficients, self._knots)
+        return GridInterpolatingFunction(
+            self.grids,
+            self.values,
+            self.interpolator,
+            self.extrapolate,
+            name=self.name,
+            derivative_orders=tuple(orders),
+            coefficients=coefficients,
+        )
+
+    def derivative(self):
+        "The derivative of the function, for functions of a single variable"
+        return self.partial_derivative(0)
+
+    def __call__(self, *xs):
+        if len(xs) != self.ndim:
+            raise ValueError(
+                "interpolating function on a {}D grid called with {} arguments".format(
+                    self.ndim, len(xs)
+                )
+            )
+        xs = np.broadcast_arrays(*[np.asarray(x, dtype=float) for x in xs])
+        shape = xs[0].shape
+        xs = [x.ravel() for x in xs]
+
+        # Contract the coefficients with the basis functions along each dimension
+        result = None
+        for x, grid, order, axis in zip(
+            xs, self.grids, self.derivative_orders, range(self.ndim)
+        ):
+            basis = self._basis(x, grid, order, axis)
+            if result is None:
+                result = np.tensordot(basis, self._coefficients, axes=(1, 0))
+            else:
+                basis = basis.reshape(basis.shape + (1,) * (result.ndim - 2))
+                result = np.sum(result * basis, axis=1)
+
+        if not self.extrapolate:
+            outside = np.zeros(result.shape, dtype=bool)
+            for x, grid in zip(xs, self.grids):
+                outside |= (x < grid[0]) | (x > grid[-1])
+            result[outside] = np.nan
+        return result.reshape(shape)
+
+    def _basis(self, x, grid, order, axis):
+        """
+        The values of the basis functions (or their derivatives) of one dimension at
+        the points `x`, as a matrix of shape `(len(x), number of basis functions)`
+        """
+        if self.interpolator == "linear":
+            n = len(grid)
+            interval = np.clip(np.searchsorted(grid, x, side="right") - 1, 0, n - 2)
+            width = grid[interval + 1] - grid[interval]
+            if order == 0:
+                weight = (x - grid[interval]) / width
+                left, right = 1 - weight, weight
+            elif order == 1:
+                left, right = -1 / width, 1 / width
+            else:
+                left = right = np.zeros_like(x)
+            basis = np.zeros((len(x), n))
+            rows = np.arange(len(x))
+            basis[rows, interval] = left
+            basis[rows, interval + 1] = right
+            return basis
+        else:
+            knots = self._knots[axis]
+            n_basis = len(knots) - 4
+            # B-spline interpolants are held constant outside of the grid
+            inside = (x >= grid[0]) & (x <= grid[-1])
+            x = np.clip(x, grid[0], grid[-1])
+            basis = interpolate.BSpline(knots, np.eye(n_basis), 3, extrapolate=False)
+            if order > 0:
+                basis = basis.derivative(order)
+                return np.where(inside[:, np.newaxis], basis(x), 0)
+            return basis(x)
+
 
 class Interpolant(pybamm.Function):
     """
-    Interpolate data in 1D.
+    Interpolate data in 1D, or on a grid in several dimensions.
 
     Parameters
     ----------
-    data : :class:`numpy.ndarray`
-        Numpy array of data to use for interpolation. Must have exactly two columns (x
-        and y data)
-    child : :class:`pybamm.Symbol`
-        Node to use when evaluating the interpolant
+    data : :class:`numpy.ndarray` or tuple
+        Numpy array of data to use for interpolation in 1D, which must have exactly two
+        columns (x and y data). For data on a grid, a tuple (grids, values), where
+        grids is a list of the (increasing) grid points along each dimension and
+        values is an array of shape `(len(grids[0]), len(grids[1]), ...)` of the data
+        at the grid points (e.g. an open-circuit potential at each concentration and
+        temperature).
+    child : :class:`pybamm.Symbol` or list of :class:`pybamm.Symbol`
+        Node to use when evaluating the interpolant, or list of nodes (one for each
+        dimension) for data on a grid
     name : str, optional
         Name of the interpolant. Default is None, in which case the name "interpolating
         function" is given.
     interpolator : str, optional
-        Which interpolator to use ("pchip" or "cubic spline"). Note that whichever
-        interpolator is used must be differentiable (for ``Interpolator._diff``).
-        Default is "cubic spline". Note that "pchip" may give slow results.
+        Which interpolator to use: "linear", "constant" (each value is held until the
+        next data point, e.g. for drive cycles), "pchip" or "cubic spline". Data on a
+        grid can use "linear" or "cubic spline" (see
+        :class:`GridInterpolatingFunction`). Default is "cubic spline". The
+        interpolating function is shared between all the interpolants of the same
+        data (see :func:`get_interpolating_function`).
     extrapolate : bool, optional
         Whether to extrapolate for points that are outside of the parametrisation
         range, or return NaN (following default behaviour from scipy). Default is True.
@@ -33,7 +318,23 @@ class Interpolant(pybamm.Function):
     def __init__(
         self, data, child, name=None, interpolator="cubic spline", extrapolate=True
     ):
-        if data.ndim != 2 or data.shape[1] != 2:
+        children = list(child) if isinstance(child, (list, tuple)) else [child]
+        if isinstance(data, tuple):
+            grids, values = data
+            values = np.asarray(values)
+            if len(grids) != len(children):
+                raise ValueError(
+                    "data on a {}D grid needs {} children, but {} were given".format(
+                        len(grids), len(grids), len(children)
+                    )
+                )
+            if values.shape != tuple(len(grid) for grid in grids):
+                raise ValueError(
+                    "values should have shape {} to match the grids but have shape "
+                    "{}".format(tuple(len(grid) for grid in grids), values.shape)
+                )
+            data = (tuple(np.asarray(grid) for grid in grids), values)
+        elif data.ndim != 2 or data.shape[1] != 2:
             raise ValueError(
                 """
                 data should have exactly two columns (x and y) but has shape {}
@@ -41,37 +342,56 @@ class Interpolant(pybamm.Function):
                     data.shape
                 )
             )
-        elif interpolator == "pchip":
-            interpolating_function = interpolate.PchipInterpolator(
-                data[:, 0], data[:, 1], extrapolate=extrapolate
-            )
-        elif interpolator == "cubic spline":
-            interpolating_function = interpolate.CubicSpline(
-                data[:, 0], data[:, 1], extrapolate=extrapolate
-            )
-        else:
-            raise ValueError("interpolator '{}' not recognised".format(interpolator))
+        interpolating_function = get_interpolating_function(
+            data, interpolator, extrapolate
+        )
         # Set name
         if name is not None and not name.startswith("interpolating function"):
             name = "interpolating function ({})".format(name)
         else:
             name = "interpolating function"
         super().__init__(
-            interpolating_function, child, name=name, derivative="derivative"
+            interpolating_function, *children, name=name, derivative="derivative"
         )
         # Store information as attributes
         self.data = data
-        self.x = data[:, 0]
-        self.y = data[:, 1]
+        if isinstance(data, tuple):
+            self.x, self.y = data
+        else:
+            self.x = data[:, 0]
+            self.y = data[:, 1]
         self.interpolator = interpolator
         self.extrapolate = extrapolate
 
+    def _function_content(self):
+        """ See :meth:`Function._function_content()` """
+        # the interpolating function is identified by the data and options below
+        return "interpolating function"
+
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        if isinstance(self.data, tuple):
+            arrays = list(self.data[0]) + [self.data[1]]
+        else:
+            arrays = [self.data]
+        data_parts = []
+        for array in arrays:
+            data_parts += [
+                np.ascontiguousarray(array, dtype=float).tobytes(),
+                repr(array.shape),
+            ]
+        return (
+            super()._content_hash_parts()
+            + data_parts
+            + [self.interpolator, str(self.extrapolate)]
+        )
+
     def _function_new_copy(self, children):
         """ See :meth:`Function._function_new_copy()` """
         return pybamm.Interpolant(
             self.data,
-            *children,
+            children,
             name=self.name,
             interpolator=self.interpolator,
-            extrapolate=self.extrapolate
+            extrapolate=self.extrapolate,
         )
@@ -6,7 +6,25 @@ import pybamm
 # need numpy imported for code generated in EvaluatorPython
 import numpy as np  # noqa: F401
 import scipy.sparse  # noqa: F401
-from collections import OrderedDict
+import numbers
+import re
+from collections import Counter, OrderedDict
+
+# Operations that act elementwise on dense arrays, which can be fused into a single
+# numpy expression
+_ELEMENTWISE_OPERATORS = (
+    pybamm.Addition,
+    pybamm.Subtraction,
+    pybamm.Multiplication,
+    pybamm.Division,
+    pybamm.Power,
+    pybamm.Heaviside,
+    pybamm.Negate,
+    pybamm.AbsoluteValue,
+)
+
+# Names of the variables in the generated code
+_VARIABLE_NAME = re.compile(r"self\.var_[0-9m]+")
 
 
 def id_to_python_variable(symbol_id, constant=False):
@@ -24,7 +42,7 @@ def id_to_python_variable(symbol_id, constant=False):
     return var_format.format(symbol_id).replace("-", "m")
 
 
-def find_symbols(symbol, constant_symbols, variable_symbols):
+def find_symbols(symbol, constant_symbols, variable_symbols, output_values=None):
     """
     This function converts an expression tree to a dictionary of node id's and strings
     specifying valid python code to calculate that nodes value, given y and t.
@@ -39,6 +57,12 @@ def find_symbols(symbol, constant_symbols, variable_symbols):
     are important for the calculations. A dict is specified rather than a list so that
     identical subtrees (which give identical id's) are not recalculated in the code
 
+    The value of each node is also traced at a dummy point (t = 0, y = 1, and inputs
+    equal to 1) to find whether it is a sparse matrix, so that only the correct branch
+    is generated for operations (such as Multiplication) whose code depends on the
+    types of their children. If the type of a child cannot be traced, code that checks
+    the types at run time is generated instead.
+
     Parameters
     ----------
     symbol : :class:`pybamm.Symbol`
@@ -50,14 +74,27 @@ def find_symbols(symbol, constant_symbols, variable_symbols):
     variable_symbol: collections.OrderedDict
         The output dictionary of variable (with y or t) symbol ids to lines of code
 
+    output_values: dict, optional
+        The output dictionary of symbol ids to their values at the dummy point (None
+        if the value could not be traced)
+
     """
+    if output_values is None:
+        output_values = {}
+
     if symbol.is_constant():
-        constant_symbols[symbol.id] = symbol.evaluate()
+        value = symbol.evaluate()
+        constant_symbols[symbol.id] = value
+        output_values[symbol.id] = value
+        return
+
+    # identical subtrees only need to be processed once
+    if symbol.id in variable_symbols:
         return
 
     # process children recursively
     for child in symbol.children:
-        find_symbols(child, constant_symbols, variable_symbols)
+        find_symbols(child, constant_symbols, variable_symbols, output_values)
 
     # calculate the variable names that will hold the result of calculating the
     # children variables
@@ -65,43 +102,64 @@ def find_symbols(symbol, constant_symbols, variable_symbols):
         id_to_python_variable(child.id, child.is_constant())
         for child in symbol.children
     ]
+    children_values = [output_values.get(child.id) for child in symbol.children]
+    children_sparse = [_is_sparse(value) for value in children_values]
 
     if isinstance(symbol, pybamm.BinaryOperator):
-        # Multiplication and Division need special handling for scipy sparse matrices
-        # TODO: we can pass through a dummy y and t to get the type and then hardcode
-        # the right line, avoiding these checks
+        # Multiplication and Division need special handling for scipy sparse
+        # matrices. Where the types of the children are known, only the correct
+        # line is generated; otherwise the types are checked at run time
         if isinstance(symbol, pybamm.Multiplication):
-            symbol_str = (
-                "scipy.sparse.csr_matrix({0}.multiply({1})) "
-                "if scipy.sparse.issparse({0}) else "
-                "scipy.sparse.csr_matrix({1}.multiply({0})) "
-                "if scipy.sparse.issparse({1}) else "
-                "{0} * {1}".format(children_vars[0], children_vars[1])
-            )
+            if children_sparse[0] is True:
+                symbol_str = "scipy.sparse.csr_matrix({0}.multiply({1}))"
+            elif children_sparse[1] is True:
+                symbol_str = "scipy.sparse.csr_matrix({1}.multiply({0}))"
+            elif children_sparse == [False, False]:
+                symbol_str = "{0} * {1}"
+            else:
+                symbol_str = (
+                    "scipy.sparse.csr_matrix({0}.multiply({1})) "
+                    "if scipy.sparse.issparse({0}) else "
+                    "scipy.sparse.csr_matrix({1}.multiply({0})) "
+                    "if scipy.sparse.issparse({1}) else "
+                    "{0} * {1}"
+                )
         elif isinstance(symbol, pybamm.Division):
-            symbol_str = (
-                "scipy.sparse.csr_matrix({0}.multiply(1/{1})) "
-                "if scipy.sparse.issparse({0}) else "
-                "{0} / {1}".format(children_vars[0], children_vars[1])
-            )
+            if children_sparse[0] is True:
+                symbol_str = "scipy.sparse.csr_matrix({0}.multiply(1/{1}))"
+            elif children_sparse[0] is False:
+                symbol_str = "{0} / {1}"
+            else:
+                symbol_str = (
+                    "scipy.sparse.csr_matrix({0}.multiply(1/{1})) "
+                    "if scipy.sparse.issparse({0}) else "
+                    "{0} / {1}"
+                )
         elif isinstance(symbol, pybamm.Inner):
-            symbol_str = (
-                "{0}.multiply({1}) "
-                "if scipy.sparse.issparse({0}) else "
-                "{1}.multiply({0}) "
-                "if scipy.sparse.issparse({1}) else "
-                "{0} * {1}".format(children_vars[0], children_vars[1])
-            )
+            if children_sparse[0] is True:
+                symbol_str = "{0}.multiply({1})"
+            elif children_sparse[1] is True:
+                symbol_str = "{1}.multiply({0})"
+            elif children_sparse == [False, False]:
+                symbol_str = "{0} * {1}"
+            else:
+                symbol_str = (
+                    "{0}.multiply({1}) "
+                    "if scipy.sparse.issparse({0}) else "
+                    "{1}.multiply({0}) "
+                    "if scipy.sparse.issparse({1}) else "
+                    "{0} * {1}"
+                )
         elif isinstance(symbol, pybamm.Outer):
-            symbol_str = "np.outer({}, {}).reshape(-1, 1)".format(
-                children_vars[0], children_vars[1]
-            )
+            # use the function handle of the outer product, which can also take the
+            # outer product column-by-column when evaluating at several times at once
+            constant_symbols[symbol.id] = symbol._binary_evaluate
+            symbol_str = id_to_python_variable(symbol.id, True) + "({0}, {1})"
         elif isinstance(symbol, pybamm.Kron):
-            symbol_str = "scipy.sparse.csr_matrix(scipy.sparse.kron({}, {}))".format(
-                children_vars[0], children_vars[1]
-            )
+            symbol_str = "scipy.sparse.csr_matrix(scipy.sparse.kron({0}, {1}))"
         else:
-            symbol_str = children_vars[0] + " " + symbol.name + " " + children_vars[1]
+            symbol_str = "{0} " + symbol.name + " {1}"
+        symbol_str = symbol_str.format(children_vars[0], children_vars[1])
 
     elif isinstance(symbol, pybamm.UnaryOperator):
         # Index has a different syntax than other univariate operations
@@ -109,6 +167,8 @@ def find_symbols(symbol, constant_symbols, variable_symbols):
             symbol_str = "{}[{}:{}]".format(
                 children_vars[0], symbol.slice.start, symbol.slice.stop
             )
+        elif isinstance(symbol, pybamm.AbsoluteValue):
+            symbol_str = "np.abs({})".format(children_vars[0])
         else:
             symbol_str = symbol.name + children_vars[0]
 
@@ -142,35 +202,31 @@ def find_symbols(symbol, constant_symbols, variable_symbols):
                 symbol_str = "{}".format(",".join(children_vars))
 
         # DomainConcatenation specifies a particular ordering for the concatenation,
-        # which we must follow
+        # which we follow by indexing the stacked children with its permutation
+        # (unless the children are already in the right order)
         elif isinstance(symbol, pybamm.DomainConcatenation):
-            slice_starts = []
-            all_child_vectors = []
-            for i in range(symbol.secondary_dimensions_npts):
-                child_vectors = []
-                for child_var, slices in zip(children_vars, symbol._children_slices):
-                    for child_dom, child_slice in slices.items():
-                        slice_starts.append(symbol._slices[child_dom][i].start)
-                        child_vectors.append(
-                            "{}[{}:{}]".format(
-                                child_var, child_slice[i].start, child_slice[i].stop
-                            )
-                        )
-                all_child_vectors.extend(
-                    [v for _, v in sorted(zip(slice_starts, child_vectors))]
-                )
-            if len(children_vars) > 1 or symbol.secondary_dimensions_npts > 1:
-                symbol_str = "np.concatenate(({}))".format(",".join(all_child_vectors))
+            if len(children_vars) > 1:
+                symbol_str = "np.concatenate(({}))".format(",".join(children_vars))
             else:
                 symbol_str = "{}".format(",".join(children_vars))
+            permutation = symbol.permutation
+            if np.any(permutation != np.arange(len(permutation))):
+                constant_symbols[symbol.id] = permutation
+                symbol_str = "{}[{}]".format(
+                    symbol_str, id_to_python_variable(symbol.id, True)
+                )
         else:
             raise NotImplementedError
 
-    # Note: we assume that y is being passed as a column vector
+    # Note: we assume that y is being passed as a column vector. Contiguous entries
+    # are read with a slice (a view of y), others with precomputed integer indices
     elif isinstance(symbol, pybamm.StateVector):
-        symbol_str = "y[:{}][{}]".format(
-            len(symbol.evaluation_array), symbol.evaluation_array
-        )
+        index = symbol.evaluation_index
+        if isinstance(index, slice):
+            symbol_str = "y[{}:{}]".format(index.start, index.stop)
+        else:
+            constant_symbols[symbol.id] = index
+            symbol_str = "y[{}]".format(id_to_python_variable(symbol.id, True))
 
     elif isinstance(symbol, pybamm.Time):
         symbol_str = "t"
@@ -184,6 +240,100 @@ def find_symbols(symbol, constant_symbols, variable_symbols):
         )
 
     variable_symbols[symbol.id] = symbol_str
+    output_values[symbol.id] = _trace_value(symbol, children_values)
+
+
+def _trace_value(symbol, children_values):
+    """
+    Evaluate a (non-constant) node at the dummy point t = 0, y = 1, u = 1, given the
+    values of its children at that point. Returns None if the value cannot be found.
+    """
+    if any(value is None for value in children_values):
+        return None
+    try:
+        with np.errstate(all="ignore"):
+            if isinstance(symbol, pybamm.StateVector):
+                n = len(symbol.evaluation_array)
+                return symbol.evaluate(y=np.ones((n, 1)))
+            elif isinstance(symbol, pybamm.Time):
+                return 0.0
+            elif isinstance(symbol, pybamm.InputParameter):
+                return 1.0
+            elif isinstance(symbol, pybamm.BinaryOperator):
+                return symbol._binary_evaluate(*children_values)
+            elif isinstance(symbol, pybamm.UnaryOperator):
+                return symbol._unary_evaluate(*children_values)
+            elif isinstance(symbol, pybamm.Function):
+                return symbol._function_evaluate(children_values)
+            elif isinstance(symbol, pybamm.Concatenation):
+                return symbol._concatenation_evaluate(children_values)
+    except Exception:
+        pass
+    return None
+
+
+def _is_sparse(value):
+    "Whether a traced value is a sparse matrix (None if the value is unknown)"
+    if value is None:
+        return None
+    return scipy.sparse.issparse(value)
+
+
+def fuse_elementwise(symbol, variable_symbols, output_values):
+    """
+    Fuse runs of elementwise operations (e.g. `a * b + c`) into single numpy
+    expressions. The line of code of an elementwise operation whose value is a dense
+    array and that is only used once is substituted into the line that uses it,
+    instead of being assigned to its own variable.
+
+    Parameters
+    ----------
+    symbol : :class:`pybamm.Symbol`
+        The symbol that was converted by :func:`find_symbols`
+    variable_symbols : collections.OrderedDict
+        The dictionary of variable symbol ids to lines of code, from
+        :func:`find_symbols`
+    output_values : dict
+        The dictionary of symbol ids to traced values, from :func:`find_symbols`
+
+    Returns
+    -------
+    collections.OrderedDict
+        The dictionary of (remaining) variable symbol ids to lines of code
+    """
+    # find the elementwise operations with dense values
+    fusable = set()
+    visited = set()
+    stack = [symbol]
+    while stack:
+        node = stack.pop()
+        if node.id in visited or node.id not in variable_symbols:
+            continue
+        visited.add(node.id)
+        stack.extend(node.children)
+        if isinstance(node, _ELEMENTWISE_OPERATORS) and isinstance(
+            output_values.get(node.id), (np.ndarray, numbers.Number)
+        ):
+            fusable.add(node.id)
+
+    # count the number of times each variable is used
+    uses = Counter()
+    for symbol_line in variable_symbols.values():
+        uses.update(_VARIABLE_NAME.findall(symbol_line))
+
+    inlined = {}
+    fused_symbols = OrderedDict()
+    for symbol_id, symbol_line in variable_symbols.items():
+        if inlined:
+            symbol_line = _VARIABLE_NAME.sub(
+                lambda match: inlined.get(match.group(0), match.group(0)), symbol_line
+            )
+        var = id_to_python_variable(symbol_id, False)
+        if symbol_id in fusable and symbol_id != symbol.id and uses[var] == 1:
+            inlined[var] = "(" + symbol_line + ")"
+        else:
+            fused_symbols[symbol_id] = symbol_line
+    return fused_symbols
 
 
 def to_python(symbol, debug=False):
@@ -211,7 +361,9 @@ def to_python(symbol, debug=False):
 
     constant_values = OrderedDict()
     variable_symbols = OrderedDict()
-    find_symbols(symbol, constant_values, variable_symbols)
+    output_values = {}
+    find_symbols(symbol, constant_values, variable_symbols, output_values)
+    variable_symbols = fuse_elementwise(symbol, variable_symbols, output_values)
 
     line_format = "{} = {}"
 
@@ -275,9 +427,13 @@ class EvaluatorPython:
 
     def evaluate(self, t=None, y=None, u=None, known_evals=None):
         """
-        Acts as a drop-in replacement for :func:`pybamm.Symbol.evaluate`
+        Acts as a drop-in replacement for :func:`pybamm.Symbol.evaluate`.
+
+        `y` can also be a matrix whose columns are the states at several times, with
+        `t` an array of those times, in which case the columns of the result are the
+        values at each time.
         """
-        # generated code assumes y is a column vector
+        # generated code assumes y is a column vector (or a matrix of column vectors)
         if y is not None and y.ndim == 1:
             y = y.reshape(-1, 1)
 
@@ -0,0 +1,284 @@
+#
+# Compile a symbol to a flat list of instructions
+#
+import pybamm
+import numpy as np
+
+# Instruction kinds
+_UNARY = 0
+_BINARY = 1
+_LIST = 2
+_LEAF = 3
+_INPUT = 4
+
+# Registers reserved for the inputs t, y and u
+_T, _Y, _U = 0, 1, 2
+
+
+class EvaluatorFlat(object):
+    """
+    Compiles a pybamm expression tree into a flat list of instructions that give the
+    result of calling `evaluate(t, y, u)` on the given expression tree.
+
+    The tree is sorted topologically (without recursion), identical subtrees (with
+    the same id) are only computed once, and constant subtrees are evaluated when the
+    evaluator is created. Each instruction then applies one node's operation (e.g.
+    :meth:`pybamm.BinaryOperator._binary_evaluate`) to the values held in a list of
+    registers, and stores the result in another register. Registers are reused once
+    the value they hold is no longer needed, to limit the memory held during
+    evaluation.
+
+    A list of symbols can also be given, in which case the symbols are compiled into
+    a single list of instructions, so that the subtrees they share (e.g. the
+    exchange-current densities in the rhs, algebraic equations and events of a
+    model) are only computed once, and `evaluate` returns the list of their values.
+    Each of the symbols can also be evaluated on its own with :meth:`output`.
+
+    Parameters
+    ----------
+    symbol : :class:`pybamm.Symbol` or list of :class:`pybamm.Symbol`
+        The symbol(s) to compile
+    """
+
+    def __init__(self, symbol):
+        self._multiple = isinstance(symbol, (list, tuple))
+        symbols = list(symbol) if self._multiple else [symbol]
+        nodes, constants = self._sort(*symbols)
+
+        # Each constant that is needed by a non-constant node, or that is one of the
+        # results, gets its own register, after the registers for t, y and u
+        registers = [None, None, None]
+        constant_registers = {}
+        for node in nodes:
+            for child in node.children:
+                if child.id in constants and child.id not in constant_registers:
+                    constant_registers[child.id] = len(registers)
+                    registers.append(constants[child.id])
+        for sym in symbols:
+            if sym.id in constants and sym.id not in constant_registers:
+                constant_registers[sym.id] = len(registers)
+                registers.append(constants[sym.id])
+
+        # Find the last instruction that uses each node's value (the results are
+        # needed until the end)
+        last_use = {}
+        for idx, node in enumerate(nodes):
+            for child in node.children:
+                last_use[child.id] = idx
+        for sym in symbols:
+            last_use[sym.id] = len(nodes)
+
+        # Allocate registers to the non-constant nodes, reusing registers whose
+        # value is no longer needed
+        node_registers = {}
+        free_registers = []
+        instructions = []
+        for idx, node in enumerate(nodes):
+            args = tuple(
+                constant_registers[child.id]
+                if child.id in constant_registers
+                else node_registers[child.id]
+                for child in node.children
+            )
+            for child in node.children:
+                if last_use[child.id] == idx and child.id in node_registers:
+                    free_registers.append(node_registers.pop(child.id))
+            if free_registers:
+                out = free_registers.pop()
+            else:
+                out = len(registers)
+                registers.append(None)
+            node_registers[node.id] = out
+
+            if isinstance(node, pybamm.BinaryOperator):
+                kind, function = _BINARY, node._binary_evaluate
+            elif isinstance(node, pybamm.UnaryOperator):
+                kind, function = _UNARY, node._unary_evaluate
+            elif isinstance(node, pybamm.Function):
+                kind, function = _LIST, node._function_evaluate
+            elif isinstance(node, pybamm.Concatenation):
+                kind, function = _LIST, node._concatenation_evaluate
+            elif isinstance(node, pybamm.InputParameter):
+                kind, function = _INPUT, node.evaluate
+            else:
+                kind, function = _LEAF, node._base_evaluate
+            instructions.append((node.id, kind, function, args, out))
+
+        self._registers = registers
+        self._instructions = instructions
+        self._result_registers = [
+            constant_registers[sym.id]
+            if sym.id in constant_registers
+            else node_registers[sym.id]
+            for sym in symbols
+        ]
+        # the point at which the outputs were last evaluated, and their values
+        self._last_point = None
+        self._last_values = None
+
+    @staticmethod
+    def _sort(*symbols):
+        """
+        Sort the non-constant nodes of the tree(s) so that each node comes after its
+        children, and evaluate the constant nodes.
+
+        Returns
+        -------
+        nodes : list of :class:`pybamm.Symbol`
+            The non-constant nodes, without repeats, in evaluation order
+        constants : dict
+            Dictionary of constant node ids and their values
+        """
+        variable_types = (
+            pybamm.Variable,
+            pybamm.StateVector,
+            pybamm.Time,
+            pybamm.InputParameter,
+        )
+        nodes = []
+        constants = {}
+        visited = set()
+        stack = [(symbol, False) for symbol in reversed(symbols)]
+        while stack:
+            node, children_done = stack.pop()
+            if node.id in visited:
+                continue
+            children = node.children
+            if not children_done:
+                stack.append((node, True))
+                stack.extend(
+                    (child, False)
+                    for child in reversed(children)
+                    if child.id not in visited
+                )
+                continue
+            visited.add(node.id)
+            if not isinstance(node, variable_types) and all(
+                child.id in constants for child in children
+            ):
+                constants[node.id] = _evaluate_node(
+                    node, [constants[child.id] for child in children]
+                )
+            else:
+                nodes.append(node)
+        return nodes, constants
+
+    @property
+    def instructions(self):
+        "The number of instructions executed by each evaluation"
+        return len(self._instructions)
+
+    def evaluate(self, t=None, y=None, u=None, known_evals=None):
+        """
+        Acts as a drop-in replacement for :func:`pybamm.Symbol.evaluate`. If the
+        evaluator was created from a list of symbols, the list of their values is
+        returned.
+        """
+        registers = self._registers[:]
+        registers[_T] = t
+        registers[_Y] = y
+        registers[_U] = u
+        for node_id, kind, function, args, out in self._instructions:
+            # If known_evals is provided, values of nodes that have already been
+            # evaluated (e.g. by another evaluator) are reused, and new values are
+            # added to known_evals. The children of a known node are known too, so
+            # only the nodes that are not known are computed.
+            if known_evals is not None:
+                value = known_evals.get(node_id)
+                if value is not None:
+                    registers[out] = value
+                    continue
+            if kind == _BINARY:
+                value = function(registers[args[0]], registers[args[1]])
+            elif kind == _UNARY:
+                value = function(registers[args[0]])
+            elif kind == _LIST:
+                value = function([registers[arg] for arg in args])
+            elif kind == _LEAF:
+                value = function(t, y)
+            else:
+                value = function(t, y, u)
+            registers[out] = value
+            if known_evals is not None:
+                known_evals[node_id] = value
+
+        if self._multiple:
+            result = [registers[register] for register in self._result_registers]
+        else:
+            result = registers[self._result_registers[0]]
+        if known_evals is not None:
+            return result, known_evals
+        return result
+
+    def output(self, index):
+        """
+        Returns an evaluator for one of the symbols that the evaluator was created
+        from. When the outputs are evaluated one after the other at the same point
+        (t, y, u), as the solvers do for the rhs, algebraic equations and events of
+        a model, all the symbols are evaluated together the first time and the
+        values are reused afterwards.
+
+        Parameters
+        ----------
+        index : int
+            The position of the symbol in the list given to the evaluator
+        """
+        return EvaluatorFlatOutput(self, index)
+
+    def _evaluate_at(self, t, y, u):
+        "Evaluate all the outputs at (t, y, u), reusing the last values if possible"
+        last_point = self._last_point
+        if (
+            last_point is None
+            or last_point[0] != t
+            or last_point[2] is not u
+            or not np.array_equal(last_point[1], y)
+        ):
+            values = self.evaluate(t, y, u)
+            if not self._multiple:
+                values = [values]
+            # copy y, as the solvers may change it in place
+            self._last_point = (t, np.array(y, copy=True), u)
+            self._last_values = values
+        return self._last_values
+
+
+class EvaluatorFlatOutput(object):
+    """
+    One of the outputs of an :class:`EvaluatorFlat` created from a list of symbols
+    (see :meth:`EvaluatorFlat.output`)
+
+    Parameters
+    ----------
+    evaluator : :class:`EvaluatorFlat`
+        The evaluator for all the symbols
+    index : int
+        The position of the symbol in the list given to the evaluator
+    """
+
+    def __init__(self, evaluator, index):
+        self.evaluator = evaluator
+        self.index = index
+
+    def evaluate(self, t=None, y=None, u=None, known_evals=None):
+        """
+        Acts as a drop-in replacement for :func:`pybamm.Symbol.evaluate`
+        """
+        value = self.evaluator._evaluate_at(t, y, u)[self.index]
+        if known_evals is not None:
+            return value, known_evals
+        return value
+
+
+def _evaluate_node(node, children_values):
+    "Evaluate a single node from the values of its children"
+    if isinstance(node, pybamm.BinaryOperator):
+        return node._binary_evaluate(*children_values)
+    elif isinstance(node, pybamm.UnaryOperator):
+        return node._unary_evaluate(*children_values)
+    elif isinstance(node, pybamm.Function):
+        return node._function_evaluate(children_values)
+    elif isinstance(node, pybamm.Concatenation):
+        return node._concatenation_evaluate(children_values)
+    else:
+        return node.evaluate()
@@ -0,0 +1,769 @@
+#
+# Compile a symbol to numba kernels
+#
+import pybamm
+from pybamm.expression_tree.operations.evaluate import _trace_value
+
+import hashlib
+import importlib.util
+import os
+import re
+import sys
+import numpy as np
+import scipy.sparse
+from collections import Counter
+
+numba_spec = importlib.util.find_spec("numba")
+
+# Default directory for the generated kernels (numba caches the compiled kernels
+# next to their source)
+NUMBA_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pybamm", "numba")
+
+# Generated modules that have already been loaded in this session, by source hash
+_numba_modules = {}
+
+# Elementwise binary operators, and the numpy operator they correspond to
+_BINARY_OPERATORS = {
+    pybamm.Addition: "+",
+    pybamm.Subtraction: "-",
+    pybamm.Multiplication: "*",
+    pybamm.Inner: "*",
+    pybamm.Division: "/",
+    pybamm.Power: "**",
+}
+
+# Functions that can be compiled by numba, and their derivatives in terms of the
+# argument `x`, the function value `f` and the derivative of the argument `dx`
+_FUNCTIONS = {
+    np.exp: ("np.exp({x})", "{f} * {dx}"),
+    np.log: ("np.log({x})", "{dx} / {x}"),
+    np.sin: ("np.sin({x})", "np.cos({x}) * {dx}"),
+    np.cos: ("np.cos({x})", "-np.sin({x}) * {dx}"),
+    np.sinh: ("np.sinh({x})", "np.cosh({x}) * {dx}"),
+    np.cosh: ("np.cosh({x})", "np.sinh({x}) * {dx}"),
+    np.tanh: ("np.tanh({x})", "(1 - {f} ** 2) * {dx}"),
+    np.sqrt: ("np.sqrt({x})", "{dx} / (2 * {f})"),
+    np.arcsinh: ("np.arcsinh({x})", "{dx} / np.sqrt({x} ** 2 + 1)"),
+    np.min: ("np.min({x})", "{dx}[np.argmin({x})]"),
+    np.max: ("np.max({x})", "{dx}[np.argmax({x})]"),
+}
+
+# Names of the variables in the generated code
+_NAME = re.compile(r"\bd?v[0-9]+\b")
+
+# Helper kernels that are included in every generated module
+_HELPERS = '''#
+# Generated by pybamm.EvaluatorNumba
+#
+import numba
+import numpy as np
+
+
+@numba.njit(cache=True)
+def csr_matvec(data, indices, indptr, x):
+    n_rows = len(indptr) - 1
+    out = np.empty(n_rows)
+    for i in range(n_rows):
+        total = 0.0
+        for k in range(indptr[i], indptr[i + 1]):
+            total += data[k] * x[indices[k]]
+        out[i] = total
+    return out
+
+
+@numba.njit(cache=True)
+def color_columns(csc_indptr, csc_indices, csr_indptr, csr_indices):
+    # greedy colouring of the columns, so that no two columns with the same colour
+    # share a row
+    n_cols = len(csc_indptr) - 1
+    colors = -np.ones(n_cols, dtype=np.int64)
+    forbidden = -np.ones(n_cols + 1, dtype=np.int64)
+    for j in range(n_cols):
+        for k in range(csc_indptr[j], csc_indptr[j + 1]):
+            row = csc_indices[k]
+            for m in range(csr_indptr[row], csr_indptr[row + 1]):
+                other = colors[csr_indices[m]]
+                if other >= 0:
+                    forbidden[other] = j
+        color = 0
+        while forbidden[color] == j:
+            color += 1
+        colors[j] = color
+    return colors
+'''
+
+# Kernel for the values of the Jacobian on its sparsity pattern, using one
+# Jacobian-vector product for each colour of the columns
+_JACOBIAN = '''
+
+@numba.njit(cache=True)
+def jacobian(t, y, u, c, data, indices, indptr, colors, n_colors, rows, cols):
+    tangents = np.empty((n_colors, {n_rows}))
+    w = np.zeros(len(y))
+    for k in range(n_colors):
+        for j in range(len(colors)):
+            w[j] = 1.0 if colors[j] == k else 0.0
+        tangents[k] = jvp(t, y, u, w, c, data, indices, indptr)
+    out = np.empty(len(rows))
+    for e in range(len(rows)):
+        out[e] = tangents[colors[cols[e]], rows[e]]
+    return out
+'''
+
+
+def have_numba():
+    return numba_spec is not None
+
+
+class EvaluatorNumba(object):
+    """
+    Compiles a pybamm expression tree into a numba kernel that gives the result of
+    calling `evaluate(t, y, u)` on the given expression tree.
+
+    The tree is written as python code operating on one-dimensional numpy arrays,
+    which is compiled to machine code by numba. Constant subtrees are evaluated when
+    the evaluator is created, and their values are passed to the kernel as arguments
+    rather than written into the code, so that models with the same structure but
+    different parameter values share the same kernel. Products with constant
+    (sparse or dense) matrices are written as loops over the rows of the matrix in
+    CSR format.
+
+    The generated code is written to `cache_dir`, in a file named after a hash of
+    the code, and numba caches the compiled kernel next to it. Compilation can take
+    a while for large models, but only happens once for each model structure.
+
+    Only trees whose non-constant nodes are vectors or scalars and whose functions
+    are numpy functions known to numba (e.g. :class:`pybamm.Exponential`) can be
+    compiled; a NotImplementedError is raised otherwise.
+
+    Parameters
+    ----------
+    symbol : :class:`pybamm.Symbol`
+        The symbol to compile
+    n_states : int, optional
+        If given, the evaluator gives the Jacobian of the symbol with respect to the
+        first `n_states` entries of the state vector, as a sparse matrix, instead of
+        the value of the symbol. The values of the Jacobian are calculated exactly
+        (by forward differentiation of the compiled code) on a fixed sparsity pattern,
+        grouping the columns that do not share a row.
+    cache_dir : str, optional
+        The directory in which to store the generated code and compiled kernels.
+        Default is "~/.cache/pybamm/numba".
+    """
+
+    def __init__(self, symbol, n_states=None, cache_dir=None):
+        if not have_numba():
+            raise ImportError("numba is not installed")
+        self._cache_dir = cache_dir or NUMBA_CACHE_DIR
+        self._n_states = n_states
+
+        nodes, constants = pybamm.EvaluatorFlat._sort(symbol)
+        self._nodes = nodes
+        self._constants = constants
+        self._input_names = []
+        self._kernel = None
+
+        if symbol.id in constants:
+            # nothing to compile
+            value = constants[symbol.id]
+            if n_states is not None:
+                value = scipy.sparse.csr_matrix((np.size(value), n_states))
+            self._constant_result = value
+            return
+        self._constant_result = None
+
+        # trace the value of each node at a dummy point, to find its shape
+        values = dict(constants)
+        self._lengths = {}
+        for node in nodes:
+            value = _trace_value(node, [values[child.id] for child in node.children])
+            if value is None:
+                raise NotImplementedError(
+                    "Cannot compile symbol '{}' with numba".format(node.name)
+                )
+            values[node.id] = value
+            self._lengths[node.id] = self._length(node, value)
+
+        self._set_constant_arguments()
+
+        # write the code
+        names = {node.id: "v{}".format(i) for i, node in enumerate(nodes)}
+        self._names = names
+        result_length = self._lengths[symbol.id]
+        if n_states is None:
+            code = self._value_code(symbol)
+            function_name = "evaluate"
+        else:
+            code = self._jvp_code(symbol)
+            code += _JACOBIAN.format(n_rows=_rows(result_length))
+            function_name = "jacobian"
+        self._source = _HELPERS + code
+        module = self._load_module()
+        self._kernel = getattr(module, function_name)
+
+        if n_states is not None:
+            self._set_jacobian_pattern(symbol, module)
+
+    @staticmethod
+    def _length(node, value):
+        """
+        Length of the one-dimensional array that holds the value of a node in the
+        kernel (None for scalars)
+        """
+        if np.ndim(value) == 0:
+            return None
+        if scipy.sparse.issparse(value) or np.shape(value)[1:] not in [(), (1,)]:
+            raise NotImplementedError(
+                "Cannot compile symbol '{}' with numba, as its value is a "
+                "matrix".format(node.name)
+            )
+        return value.shape[0]
+
+    def _set_constant_arguments(self):
+        """
+        Gather the values of the constants used by the non-constant nodes into a
+        vector of values, and the CSR arrays of the constant matrices
+        """
+        vector, data, indices, indptr = [], [], [], []
+        # current lengths of the vector of values, data (and indices) and indptr
+        n_vector = n_data = n_indptr = 0
+        self._refs = {}
+        for node in self._nodes:
+            for i, child in enumerate(node.children):
+                if child.id not in self._constants or child.id in self._refs:
+                    continue
+                value = self._constants[child.id]
+                if isinstance(node, pybamm.MatrixMultiplication) and i == 0:
+                    matrix = scipy.sparse.csr_matrix(value)
+                    self._refs[child.id] = (
+                        "data[{0}:{1}], indices[{0}:{1}], indptr[{2}:{3}]".format(
+                            n_data,
+                            n_data + matrix.nnz,
+                            n_indptr,
+                            n_indptr + len(matrix.indptr),
+                        )
+                    )
+                    data.append(matrix.data)
+                    indices.append(matrix.indices)
+                    indptr.append(matrix.indptr)
+                    n_data += matrix.nnz
+                    n_indptr += len(matrix.indptr)
+                    continue
+                length = self._length(child, value)
+                if length is None:
+                    self._refs[child.id] = "c[{}]".format(n_vector)
+                else:
+                    self._refs[child.id] = "c[{}:{}]".format(
+                        n_vector, n_vector + length
+                    )
+                self._lengths[child.id] = length
+                vector.append(np.ravel(value))
+                n_vector += np.size(value)
+
+        def join(arrays, dtype):
+            if len(arrays) == 0:
+                return np.zeros(0, dtype=dtype)
+            return np.concatenate(arrays).astype(dtype)
+
+        self._arguments = (
+            join(vector, np.float64),
+            join(data, np.float64),
+            join(indices, np.int64),
+            join(indptr, np.int64),
+        )
+
+    def _ref(self, child):
+        "Code for the value of a child node"
+        if child.id in self._refs:
+            return self._refs[child.id]
+        return self._names[child.id]
+
+    def _as_array(self, code, node):
+        "Code for the value of a node as an array, even if it is a scalar"
+        if self._lengths[node.id] is None:
+            return "np.full(1, {})".format(code)
+        return code
+
+    def _value_line(self, node, args):
+        """
+        Code for the value of a node given the code for the values of its children.
+        Returns a list of lines if the value needs several lines.
+        """
+        name = self._names[node.id]
+        if isinstance(node, pybamm.StateVector):
+            return _state_vector_slices(node, "y")
+        elif isinstance(node, pybamm.Time):
+            return "t"
+        elif isinstance(node, pybamm.InputParameter):
+            if node.name not in self._input_names:
+                self._input_names.append(node.name)
+            return "u[{}]".format(self._input_names.index(node.name))
+        elif isinstance(node, pybamm.Heaviside):
+            return "({} {} {})".format(args[0], "<=" if node.equal else "<", args[1])
+        elif type(node) in _BINARY_OPERATORS:
+            return "{} {} {}".format(args[0], _BINARY_OPERATORS[type(node)], args[1])
+        elif isinstance(node, pybamm.MatrixMultiplication):
+            if node.children[0].id not in self._refs:
+                raise NotImplementedError(
+                    "Cannot compile matrix multiplication by a non-constant matrix"
+                )
+            return "csr_matvec({}, {})".format(
+                args[0], self._as_array(args[1], node.children[1])
+            )
+        elif isinstance(node, pybamm.Outer):
+            return "np.outer({}, {}).ravel()".format(
+                self._as_array(args[0], node.children[0]),
+                self._as_array(args[1], node.children[1]),
+            )
+        elif isinstance(node, pybamm.Negate):
+            return "-{}".format(args[0])
+        elif isinstance(node, pybamm.AbsoluteValue):
+            return "np.abs({})".format(args[0])
+        elif isinstance(node, pybamm.Index):
+            return "{}[{}]".format(args[0], _slice_code(node.slice))
+        elif isinstance(node, pybamm.Function):
+            if node.function not in _FUNCTIONS or len(args) != 1:
+                raise NotImplementedError(
+                    "Cannot compile function '{}' with numba".format(node.name)
+                )
+            return _FUNCTIONS[node.function][0].format(x=args[0])
+        elif isinstance(node, (pybamm.NumpyConcatenation, pybamm.DomainConcatenation)):
+            lines = ["{} = np.empty({})".format(name, self._lengths[node.id])]
+            for out_slice, child, child_slice in _concatenation_slices(
+                node, self._lengths
+            ):
+                lines.append(
+                    "{}[{}] = {}".format(
+                        name, _slice_code(out_slice), _part(args[child], child_slice)
+                    )
+                )
+            return lines
+        raise NotImplementedError(
+            "Cannot compile symbol of type '{}' with numba".format(type(node))
+        )
+
+    def _value_code(self, symbol):
+        "Code for the kernel that evaluates the symbol"
+        statements = []
+        for node in self._nodes:
+            args = [self._ref(child) for child in node.children]
+            statements.extend(
+                _statements(self._names[node.id], self._value_line(node, args))
+            )
+        return _kernel_source(
+            "evaluate",
+            "t, y, u, c, data, indices, indptr",
+            statements,
+            self._names[symbol.id],
+        )
+
+    def _jvp_code(self, symbol):
+        """
+        Code for the kernel that evaluates the product of the Jacobian of the symbol
+        with a vector `w`, by forward differentiation
+        """
+        statements = []
+        # code for the derivative of each node (nodes whose derivative is zero are
+        # not included)
+        tangents = {}
+        for node in self._nodes:
+            name = self._names[node.id]
+            args = [self._ref(child) for child in node.children]
+            statements.extend(_statements(name, self._value_line(node, args)))
+            tangent = self._tangent_line(node, args, tangents)
+            if tangent is not None:
+                statements.extend(_statements("d" + name, tangent))
+                tangents[node.id] = "d" + name
+
+        n_rows = self._lengths[symbol.id]
+        if symbol.id not in tangents:
+            result = "np.zeros({})".format(_rows(n_rows))
+        elif n_rows is None:
+            result = "np.full(1, {})".format(tangents[symbol.id])
+        else:
+            result = tangents[symbol.id]
+        return _kernel_source(
+            "jvp", "t, y, u, w, c, data, indices, indptr", statements, result
+        )
+
+    def _tangent_line(self, node, args, tangents):
+        """
+        Code for the derivative of a node, given the code for the values and
+        derivatives of its children. Returns None if the derivative is zero.
+        """
+        name = self._names[node.id]
+        children = node.children
+        d = [tangents.get(child.id) for child in children]
+        length = self._lengths[node.id]
+
+        def term_length(*nodes):
+            "Length of the result of an elementwise operation on some nodes"
+            lengths = [self._lengths[node.id] for node in nodes]
+            lengths = [n for n in lengths if n is not None]
+            return max(lengths) if lengths else None
+
+        if isinstance(node, pybamm.StateVector):
+            if np.flatnonzero(node.evaluation_array).min() >= self._n_states:
+                return None
+            return _state_vector_slices(node, "w")
+        elif isinstance(node, pybamm.MatrixMultiplication):
+            if d[1] is None:
+                return None
+            return "csr_matvec({}, {})".format(
+                args[0], self._as_array(d[1], children[1])
+            )
+        elif isinstance(node, pybamm.Outer):
+            # the right child is always constant
+            if d[0] is None:
+                return None
+            return "np.outer({}, {}).ravel()".format(
+                self._as_array(d[0], children[0]), self._as_array(args[1], children[1])
+            )
+        elif isinstance(node, pybamm.Negate):
+            return None if d[0] is None else "-{}".format(d[0])
+        elif isinstance(node, pybamm.AbsoluteValue):
+            return None if d[0] is None else "np.sign({}) * {}".format(args[0], d[0])
+        elif isinstance(node, pybamm.Index):
+            return None if d[0] is None else "{}[{}]".format(
+                d[0], _slice_code(node.slice)
+            )
+        elif isinstance(node, pybamm.Function):
+            if d[0] is None:
+                return None
+            return _FUNCTIONS[node.function][1].format(x=args[0], f=name, dx=d[0])
+        elif isinstance(node, (pybamm.NumpyConcatenation, pybamm.DomainConcatenation)):
+            if all(tangent is None for tangent in d):
+                return None
+            lines = ["d{} = np.zeros({})".format(name, length)]
+            for out_slice, child, child_slice in _concatenation_slices(
+                node, self._lengths
+            ):
+                if d[child] is not None:
+                    lines.append(
+                        "d{}[{}] = {}".format(
+                            name, _slice_code(out_slice), _part(d[child], child_slice)
+                        )
+                    )
+            return lines
+        elif not isinstance(node, pybamm.BinaryOperator) or isinstance(
+            node, pybamm.Heaviside
+        ):
+            # leaves other than state vectors, and step functions
+            return None
+
+        # elementwise binary operators: write the derivative as a sum of terms,
+        # each of which is a product of (derivatives of) the children
+        left, right = children
+        a, b = args
+        da, db = d
+        terms = []
+        if isinstance(node, pybamm.Addition):
+            if da is not None:
+                terms.append((da, [left]))
+            if db is not None:
+                terms.append((db, [right]))
+        elif isinstance(node, pybamm.Subtraction):
+            if da is not None:
+                terms.append((da, [left]))
+            if db is not None:
+                terms.append(("-{}".format(db), [right]))
+        elif isinstance(node, (pybamm.Multiplication, pybamm.Inner)):
+            if da is not None:
+                terms.append(("{} * {}".format(da, b), [left, right]))
+            if db is not None:
+                terms.append(("{} * {}".format(a, db), [left, right]))
+        elif isinstance(node, pybamm.Division):
+            if da is not None:
+                terms.append(("{} / {}".format(da, b), [left, right]))
+            if db is not None:
+                terms.append(("-{} * {} / {}".format(name, db, b), [node, right]))
+        elif isinstance(node, pybamm.Power):
+            if da is not None:
+                terms.append(
+                    ("{1} * {0} ** ({1} - 1) * {2}".format(a, b, da), [left, right])
+                )
+            if db is not None:
+                terms.append(
+                    ("{} * np.log({}) * {}".format(name, a, db), [node, left, right])
+                )
+        if not terms:
+            return None
+        tangent = " + ".join(term for term, _ in terms)
+        # make sure that the derivative has the same shape as the value
+        term_nodes = [child for _, term_children in terms for child in term_children]
+        if term_length(*term_nodes) != length:
+            tangent = "np.zeros({}) + {}".format(length, tangent)
+        return tangent
+
+    def _set_jacobian_pattern(self, symbol, module):
+        "Find the sparsity pattern of the Jacobian, and colour its columns"
+        patterns = {}
+        n_states = self._n_states
+        for node in self._nodes:
+            patterns[node.id] = _pattern(
+                node, patterns, self._constants, self._lengths, n_states
+            )
+        pattern = patterns[symbol.id]
+        n_rows = _rows(self._lengths[symbol.id])
+        if pattern is None:
+            pattern = scipy.sparse.csr_matrix((n_rows, n_states))
+        if pattern.shape[0] != n_rows:
+            pattern = pattern[np.zeros(n_rows, dtype=int)]
+        pattern = scipy.sparse.csr_matrix(pattern, dtype=bool)
+        pattern.sort_indices()
+
+        csc = pattern.tocsc()
+        colors = module.color_columns(
+            csc.indptr.astype(np.int64),
+            csc.indices.astype(np.int64),
+            pattern.indptr.astype(np.int64),
+            pattern.indices.astype(np.int64),
+        )
+        coo = pattern.tocoo()
+        self._jacobian_arguments = (
+            colors,
+            int(colors.max()) + 1 if n_states > 0 else 0,
+            coo.row.astype(np.int64),
+            coo.col.astype(np.int64),
+        )
+        self._sparsity = pattern
+
+    @property
+    def sparsity(self):
+        """
+        The sparsity pattern of the Jacobian (a sparse matrix with ones where the
+        Jacobian may be nonzero), if `n_states` was given
+        """
+        if self._n_states is None:
+            return None
+        if self._constant_result is not None:
+            return self._constant_result
+        return scipy.sparse.csr_matrix(self._sparsity, dtype=float)
+
+    @property
+    def source(self):
+        "The generated python code"
+        if self._kernel is None:
+            return None
+        return self._source
+
+    def _load_module(self):
+        "Write the generated code to the cache directory (if needed), and import it"
+        key = hashlib.sha1(self._source.encode()).hexdigest()
+        if key in _numba_modules:
+            return _numba_modules[key]
+        module_name = "pybamm_numba_" + key
+        path = os.path.join(self._cache_dir, module_name + ".py")
+        if not os.path.exists(path):
+            os.makedirs(self._cache_dir, exist_ok=True)
+            # write to a temporary file first, so that other processes never see a
+            # partially written file
+            temporary_path = "{}.{}.tmp".format(path, os.getpid())
+            with open(temporary_path, "w") as f:
+                f.write(self._source)
+            os.replace(temporary_path, path)
+        pybamm.logger.info("Compiling {} with numba".format(module_name))
+        spec = importlib.util.spec_from_file_location(module_name, path)
+        module = importlib.util.module_from_spec(spec)
+        # numba needs to be able to import the module to load cached kernels
+        sys.modules[module_name] = module
+        spec.loader.exec_module(module)
+        _numba_modules[key] = module
+        return module
+
+    def evaluate(self, t=None, y=None, u=None, known_evals=None):
+        """
+        Acts as a drop-in replacement for :func:`pybamm.Symbol.evaluate`
+        """
+        if self._kernel is None:
+            result = self._constant_result
+        else:
+            t = 0.0 if t is None else float(t)
+            if y is None:
+                y = np.zeros(0)
+            y = np.ascontiguousarray(y, dtype=np.float64).reshape(-1)
+            u = u or {}
+            try:
+                u = np.array([u[name] for name in self._input_names], dtype=np.float64)
+            except KeyError as e:
+                raise KeyError("Input parameter '{}' not found".format(e.args[0]))
+
+            if self._n_states is None:
+                result = self._kernel(t, y, u, *self._arguments)
+                if isinstance(result, np.ndarray):
+                    result = result[:, np.newaxis]
+            else:
+                result = scipy.sparse.csr_matrix(
+                    (
+                        self._kernel(
+                            t, y, u, *self._arguments, *self._jacobian_arguments
+                        ),
+                        self._sparsity.indices,
+                        self._sparsity.indptr,
+                    ),
+                    shape=self._sparsity.shape,
+                )
+
+        if known_evals is not None:
+            return result, known_evals
+        return result
+
+
+def _statements(name, code):
+    """
+    Statements assigning the code for a value to a variable, as a list of tuples of
+    (variable name, code). Values that are written over several lines (e.g.
+    concatenations) are given as lists of lines, with no variable name.
+    """
+    if isinstance(code, str):
+        return [(name, code)]
+    return [(None, line) for line in code]
+
+
+def _kernel_source(name, arguments, statements, result):
+    """
+    Source code of a numba kernel with the given statements. Variables that are
+    only used once are substituted into the statement that uses them, so that numba
+    fuses chains of elementwise operations into single loops (and compiles much
+    faster).
+    """
+    uses = Counter()
+    for _, code in statements:
+        uses.update(_NAME.findall(code))
+    uses.update(_NAME.findall(result))
+
+    lines = []
+    inlined = {}
+
+    def substitute(code):
+        "Substitute the inlined variables into some code"
+        return _NAME.sub(
+            lambda match: inlined.pop(match.group(0), match.group(0)), code
+        )
+
+    for variable, code in statements:
+        code = substitute(code)
+        if variable is None:
+            lines.append(code)
+        elif uses[variable] == 1:
+            inlined[variable] = "(" + code + ")"
+        else:
+            lines.append("{} = {}".format(variable, code))
+    lines.append("return {}".format(substitute(result)))
+    return (
+        "\n\n@numba.njit(cache=True)\ndef {}({}):\n".format(name, arguments)
+        + "".join("    " + line + "\n" for line in lines)
+    )
+
+
+def _rows(length):
+    "Number of rows of a value, given its length in the kernel (None for scalars)"
+    return 1 if length is None else length
+
+
+def _slice_code(index):
+    "Code for a slice"
+    start = "" if index.start is None else index.start
+    stop = "" if index.stop is None else index.stop
+    return "{}:{}".format(start, stop)
+
+
+def _part(code, index):
+    "Code for a slice of an array, without slicing if the slice is None"
+    if index is None:
+        return code
+    return "{}[{}]".format(code, _slice_code(index))
+
+
+def _state_vector_slices(node, vector):
+    "Code for the entries of a vector (`y` or `w`) selected by a StateVector"
+    indices = np.flatnonzero(node.evaluation_array)
+    # split the selected indices into contiguous runs
+    breaks = np.flatnonzero(np.diff(indices) != 1) + 1
+    runs = np.split(indices, breaks)
+    parts = ["{}[{}:{}]".format(vector, run[0], run[-1] + 1) for run in runs]
+    if len(parts) == 1:
+        return parts[0]
+    return "np.concatenate(({},))".format(", ".join(parts))
+
+
+def _concatenation_slices(node, lengths):
+    """
+    Slices of the value of a concatenation that each child is written to, as tuples
+    of (slice of the result, index of the child, slice of the child's value)
+    """
+    if isinstance(node, pybamm.DomainConcatenation):
+        for child, slices in enumerate(node._children_slices):
+            for child_dom, child_slices in slices.items():
+                for i, child_slice in enumerate(child_slices):
+                    yield node._slices[child_dom][i], child, child_slice
+    else:
+        start = 0
+        for child, child_node in enumerate(node.children):
+            size = _rows(lengths[child_node.id])
+            yield slice(start, start + size), child, None
+            start += size
+
+
+def _pattern(node, patterns, constants, lengths, n_states):
+    """
+    Sparsity pattern of the Jacobian of a node (a boolean sparse matrix), given the
+    patterns of its children (None if the Jacobian is zero)
+    """
+    children = node.children
+    n_rows = _rows(lengths[node.id])
+    child_patterns = [patterns.get(child.id) for child in children]
+    if isinstance(node, pybamm.StateVector):
+        indices = np.flatnonzero(node.evaluation_array)
+        keep = indices < n_states
+        matrix = scipy.sparse.csr_matrix(
+            (
+                np.ones(np.count_nonzero(keep), dtype=bool),
+                (np.flatnonzero(keep), indices[keep]),
+            ),
+            shape=(len(indices), n_states),
+        )
+        return matrix
+    if all(pattern is None for pattern in child_patterns):
+        return None
+    if isinstance(node, pybamm.Heaviside):
+        return None
+    if isinstance(node, pybamm.MatrixMultiplication):
+        matrix = scipy.sparse.csr_matrix(constants[children[0].id] != 0, dtype=bool)
+        return scipy.sparse.csr_matrix(matrix @ child_patterns[1], dtype=bool)
+    if isinstance(node, pybamm.Index):
+        return child_patterns[0][node.slice]
+    if isinstance(node, pybamm.Function) and node.function in (np.min, np.max):
+        # the result depends on all the entries of the child
+        pattern = child_patterns[0]
+        return scipy.sparse.csr_matrix(pattern.sum(axis=0) != 0, dtype=bool)
+    if isinstance(node, pybamm.Outer):
+        # each entry of the left child is repeated once for each entry of the right
+        # child
+        n_left = child_patterns[0].shape[0]
+        return child_patterns[0][np.repeat(np.arange(n_left), n_rows // n_left)]
+    if isinstance(node, (pybamm.NumpyConcatenation, pybamm.DomainConcatenation)):
+        rows = []
+        blocks = []
+        for out_slice, child, child_slice in _concatenation_slices(node, lengths):
+            block = child_patterns[child]
+            if block is None:
+                block = scipy.sparse.csr_matrix(
+                    (_rows(lengths[children[child].id]), n_states), dtype=bool
+                )
+            if child_slice is not None:
+                block = block[child_slice]
+            blocks.append(block)
+            rows.append(np.arange(n_rows)[out_slice])
+        stacked = scipy.sparse.vstack(blocks, format="csr")
+        order = np.argsort(np.concatenate(rows))
+        return stacked[order]
+    # elementwise operations
+    pattern = None
+    for child_pattern in child_patterns:
+        if child_pattern is None:
+            continue
+        if child_pattern.shape[0] != n_rows:
+            child_pattern = child_pattern[np.zeros(n_rows, dtype=int)]
+        pattern = child_pattern if pattern is None else pattern + child_pattern
+    return scipy.sparse.csr_matrix(pattern, dtype=bool)
@@ -0,0 +1,322 @@
+#
+# Fold chains of constant matrices into single sparse matrices
+#
+import pybamm
+import numbers
+import numpy as np
+from scipy.sparse import csr_matrix, diags, identity, issparse
+
+
+class ConstantFolding(object):
+    """
+    Folds the constant parts of expression trees, so that fewer operations are
+    carried out each time the trees are evaluated.
+
+    Discretising a model gives chains of products of constant matrices and vectors
+    with a part of the state vector, e.g. `div @ (D * (grad @ c))` for a constant
+    diffusivity `D`. Each product in the chain is a separate (sparse) matrix-vector
+    product when the tree is evaluated. The chains are made of matrix multiplications
+    by a constant matrix, multiplications and divisions by a constant (seen as a
+    multiplication by a diagonal matrix) and negations, and are merged into as few
+    sparse matrices (in CSR format) as possible: the constant matrices are multiplied
+    together when the trees are folded, and the partition of the chain into products
+    is chosen to minimise the number of non-zero entries (and rows) of the matrices
+    that are left, so that matrices are not merged if their product has many more
+    non-zero entries than the matrices themselves (fill-in).
+
+    Other constant subtrees (e.g. indexing or concatenations of constants) are
+    evaluated and replaced by a single :class:`pybamm.Scalar`, :class:`pybamm.Vector`
+    or :class:`pybamm.Matrix`.
+
+    Constants that hold parameter values (i.e. named Scalars, as given by
+    :class:`pybamm.ParameterValues`) are not folded, so that the parameter values of
+    the folded trees can still be updated (see
+    :meth:`pybamm.ParameterValues.update_model`).
+
+    The trees are traversed with an explicit stack, and the folded symbols are stored
+    by id and reused by all the trees folded by the same object. The number of
+    matrix-vector products (and elementwise products) removed from the trees is
+    stored in :attr:`operations_removed`.
+
+    Parameters
+    ----------
+    folded_symbols : dict, optional
+        Dictionary of symbols that have already been folded, keyed by id
+    """
+
+    def __init__(self, folded_symbols=None):
+        if folded_symbols is None:
+            folded_symbols = {}
+        self._folded_symbols = folded_symbols
+        # whether each symbol is a constant that can be folded, keyed by id
+        self._fixed_symbols = {}
+        self.operations_removed = 0
+
+    def fold(self, symbol):
+        """
+        Returns the folded version of `symbol`, which evaluates to the same value
+        with fewer operations.
+
+        Parameters
+        ----------
+        symbol : :class:`pybamm.Symbol`
+            The symbol to fold
+
+        Returns
+        -------
+        :class:`pybamm.Symbol`
+            The folded symbol
+        """
+        folded_symbols = self._folded_symbols
+        if symbol.id not in folded_symbols:
+            # Fold the operands of each node (the base of the chain for the head of a
+            # chain of constant products) before the node itself
+            stack = [(symbol, False)]
+            chains = {}
+            while stack:
+                node, operands_done = stack.pop()
+                if node.id in folded_symbols:
+                    continue
+                if not operands_done:
+                    if self._is_fixed(node):
+                        folded_symbols[node.id] = self._fold_constant(node)
+                        continue
+                    chain = self._chain(node)
+                    if chain is None:
+                        operands = node.children
+                    else:
+                        chains[node.id] = chain
+                        operands = [chain[1]]
+                    stack.append((node, True))
+                    stack.extend(
+                        (operand, False)
+                        for operand in reversed(operands)
+                        if operand.id not in folded_symbols
+                    )
+                    continue
+                if node.id in chains:
+                    elements, base = chains.pop(node.id)
+                    folded_node = self._fold_chain(
+                        node, elements, base, folded_symbols[base.id]
+                    )
+                else:
+                    folded_node = self._new_node(
+                        node, [folded_symbols[child.id] for child in node.children]
+                    )
+                folded_symbols[node.id] = folded_node
+
+        return folded_symbols[symbol.id]
+
+    def _is_fixed(self, symbol):
+        """
+        Whether `symbol` is constant and does not hold any parameter values, in which
+        case it can be folded
+        """
+        fixed_symbols = self._fixed_symbols
+        if symbol.id not in fixed_symbols:
+            stack = [symbol]
+            while stack:
+                node = stack[-1]
+                if node.id in fixed_symbols:
+                    stack.pop()
+                    continue
+                if not node.is_constant():
+                    fixed_symbols[node.id] = False
+                    stack.pop()
+                    continue
+                missing = [
+                    child for child in node.children if child.id not in fixed_symbols
+                ]
+                if missing:
+                    stack.extend(missing)
+                    continue
+                stack.pop()
+                if isinstance(node, pybamm.Scalar):
+                    fixed_symbols[node.id] = node.name == str(node.value)
+                else:
+                    fixed_symbols[node.id] = all(
+                        fixed_symbols[child.id] for child in node.children
+                    )
+        return fixed_symbols[symbol.id]
+
+    def _fold_constant(self, symbol):
+        "Replace a constant subtree by its value"
+        if len(symbol.children) == 0:
+            return symbol
+        folded = pybamm.simplify_if_constant(symbol)
+        if folded is not symbol:
+            if isinstance(folded, pybamm.Array) and issparse(folded.entries):
+                folded = pybamm.Matrix(csr_matrix(folded.entries))
+            folded.domain = symbol.domain
+            folded.auxiliary_domains = symbol.auxiliary_domains
+        return folded
+
+    def _chain(self, symbol):
+        """
+        Find the chain of constant products that `symbol` is the head of, made of at
+        least one matrix multiplication by a constant matrix.
+
+        Returns
+        -------
+        elements : list of tuple
+            The (csr_matrix, node) pairs for each product in the chain, from the head
+            of the chain to its base
+        base : :class:`pybamm.Symbol`
+            The non-constant symbol that the chain of products is applied to
+
+        or None if `symbol` is not the head of such a chain
+        """
+        # Go down the chain, storing the constant factors
+        factors = []
+        node = symbol
+        while True:
+            if isinstance(node, pybamm.MatrixMultiplication):
+                left, right = node.children
+                if not self._is_fixed(left) or right.is_constant():
+                    break
+                factors.append((left.evaluate(), node, True))
+                node = right
+            elif isinstance(node, (pybamm.Multiplication, pybamm.Division)):
+                left, right = node.children
+                if self._is_fixed(left) and not right.is_constant():
+                    if isinstance(node, pybamm.Division):
+                        break
+                    factors.append((left.evaluate(), node, False))
+                    node = right
+                elif self._is_fixed(right) and not left.is_constant():
+                    value = right.evaluate()
+                    if isinstance(node, pybamm.Division):
+                        value = 1 / value
+                    factors.append((value, node, False))
+                    node = left
+                else:
+                    break
+            elif isinstance(node, pybamm.Negate):
+                factors.append((-1, node, False))
+                node = node.child
+            else:
+                break
+
+        # Go back up the chain, turning the factors into sparse matrices. The size of
+        # the vectors that the chain is applied to is only known from the first
+        # matrix multiplication: elementwise products by vectors below it (which may
+        # broadcast) stay in the base of the chain.
+        elements = []
+        size = None
+        base = node
+        for value, factor_node, matrix_product in reversed(factors):
+            if issparse(value) and not matrix_product:
+                value = value.toarray()
+            if matrix_product:
+                if not (issparse(value) or getattr(value, "ndim", 0) == 2):
+                    return None
+                matrix = csr_matrix(value)
+                if size is not None and matrix.shape[1] != size:
+                    return None
+                size = matrix.shape[0]
+            elif isinstance(value, numbers.Number) or np.size(value) == 1:
+                value = float(np.asarray(value).flat[0])
+                matrix = value if size is None else value * identity(size, format="csr")
+            elif size is not None and np.shape(value) == (size, 1):
+                matrix = diags(np.asarray(value)[:, 0], format="csr")
+            elif size is None:
+                # keep the product in the base of the chain
+                elements = []
+                base = factor_node
+                continue
+            else:
+                return None
+            elements.append((matrix, factor_node))
+
+        if size is None or base is symbol:
+            return None
+        # the scalar factors below the first matrix multiplication apply to vectors
+        # of the size of its columns
+        for idx, (matrix, factor_node) in enumerate(elements):
+            if isinstance(matrix, numbers.Number):
+                n_rows = next(
+                    element[0].shape[1]
+                    for element in elements[idx:]
+                    if not isinstance(element[0], numbers.Number)
+                )
+                elements[idx] = (matrix * identity(n_rows, format="csr"), factor_node)
+        # from the head of the chain to its base
+        return list(reversed(elements)), base
+
+    def _fold_chain(self, symbol, elements, base, folded_base):
+        """
+        Apply the chain of constant products of `symbol` to the folded base of the
+        chain, multiplying together the matrices of the products so that the total
+        number of non-zero entries and rows of the matrices that are left is as small
+        as possible
+        """
+        n_elements = len(elements)
+
+        def cost(matrix):
+            return matrix.nnz + matrix.shape[0]
+
+        # products[i][j] is the product of the matrices of elements i to j
+        products = [[None] * n_elements for _ in range(n_elements)]
+        for i in range(n_elements):
+            products[i][i] = elements[i][0]
+            for j in range(i + 1, n_elements):
+                products[i][j] = csr_matrix(products[i][j - 1] @ elements[j][0])
+
+        # best[j] is the lowest cost of applying elements j to the end to the base,
+        # starting with the product of elements j to split[j]
+        best = [0] * (n_elements + 1)
+        split = [None] * n_elements
+        for j in reversed(range(n_elements)):
+            best[j], split[j] = min(
+                (cost(products[j][k]) + best[k + 1], k) for k in range(j, n_elements)
+            )
+
+        # Build the new chain, from its base up
+        groups = []
+        j = 0
+        while j < n_elements:
+            groups.append((j, split[j]))
+            j = split[j] + 1
+        if len(groups) == n_elements and folded_base.id == base.id:
+            return symbol
+        self.operations_removed += n_elements - len(groups)
+
+        new_symbol = folded_base
+        for i, k in reversed(groups):
+            head_node = elements[i][1]
+            if i == k:
+                new_symbol = self._new_link(head_node, new_symbol)
+            else:
+                new_symbol = pybamm.MatrixMultiplication(
+                    pybamm.Matrix(products[i][k]), new_symbol
+                )
+            new_symbol.domain = head_node.domain
+            new_symbol.auxiliary_domains = head_node.auxiliary_domains
+        return new_symbol
+
+    def _new_link(self, symbol, operand):
+        "Rebuild a single product of a chain, applied to a new operand"
+        if isinstance(symbol, pybamm.Negate):
+            return symbol._unary_new_copy(operand)
+        left, right = symbol.children
+        if self._is_fixed(left) and not right.is_constant():
+            return symbol._binary_new_copy(self.fold(left), operand)
+        return symbol._binary_new_copy(operand, self.fold(right))
+
+    def _new_node(self, symbol, children):
+        "Rebuild a node from its folded children, reusing it if they are unchanged"
+        if all(new.id == child.id for new, child in zip(children, symbol.children)):
+            return symbol
+        if isinstance(symbol, pybamm.BinaryOperator):
+            new_symbol = symbol._binary_new_copy(*children)
+        elif isinstance(symbol, pybamm.UnaryOperator):
+            new_symbol = symbol._unary_new_copy(*children)
+        elif isinstance(symbol, pybamm.Function):
+            new_symbol = symbol._function_new_copy(children)
+        elif isinstance(symbol, pybamm.Concatenation):
+            new_symbol = symbol._concatenation_new_copy(children)
+        else:
+            new_symbol = symbol.new_copy()
+        new_symbol.domain = symbol.domain
+        new_symbol.auxiliary_domains = symbol.auxiliary_domains
+        return new_symbol
@@ -0,0 +1,81 @@
+#
+# Share identical subtrees between expression trees
+#
+import copy
+
+
+class Interner(object):
+    """
+    Turns expression trees into a directed acyclic graph in which identical subtrees
+    (i.e. subtrees with the same id) are a single object, shared between all the nodes
+    (and trees) that use them.
+
+    Creating a node stores copies of its children, so building expressions (e.g.
+    discretising a model) leaves many copies of the same subexpressions, e.g. in the
+    rhs, algebraic equations and variables of a model. Interning the trees keeps a
+    single copy of each of them, which reduces the memory held by the trees.
+
+    The trees are traversed with an explicit stack, and the given trees are never
+    changed: a node is reused as it is when its children are already the shared ones,
+    and otherwise a shallow copy of the node, pointing to the shared children, is made.
+    The shared symbols are stored by id and reused by all the trees interned by the
+    same object.
+
+    Parameters
+    ----------
+    interned_symbols : dict, optional
+        Dictionary of symbols that have already been interned, keyed by id
+    """
+
+    def __init__(self, interned_symbols=None):
+        if interned_symbols is None:
+            interned_symbols = {}
+        self._interned_symbols = interned_symbols
+
+    def __len__(self):
+        "The number of distinct symbols that have been interned"
+        return len(self._interned_symbols)
+
+    def intern(self, symbol):
+        """
+        Returns the shared version of `symbol`, in which identical subtrees are the
+        same object.
+
+        Parameters
+        ----------
+        symbol : :class:`pybamm.Symbol`
+            The symbol to intern
+
+        Returns
+        -------
+        :class:`pybamm.Symbol`
+            Symbol with the same id as `symbol`, made of shared subtrees
+        """
+        interned_symbols = self._interned_symbols
+        if symbol.id not in interned_symbols:
+            # Intern the children of each node before the node itself
+            stack = [(symbol, False)]
+            while stack:
+                node, children_done = stack.pop()
+                if node.id in interned_symbols:
+                    continue
+                children = node.children
+                if not children_done:
+                    stack.append((node, True))
+                    stack.extend(
+                        (child, False)
+                        for child in reversed(children)
+                        if child.id not in interned_symbols
+                    )
+                    continue
+                shared_children = [interned_symbols[child.id] for child in children]
+                if all(
+                    shared is child for shared, child in zip(shared_children, children)
+                ):
+                    shared_node = node
+                else:
+                    shared_node = copy.copy(node)
+                    shared_node.cached_children = shared_children
+                interned_symbols[node.id] = shared_node
+
+        return interned_symbols[symbol.id]
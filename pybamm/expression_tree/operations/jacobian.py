@@ -2,11 +2,36 @@
 # Calculate the Jacobian of a symbol
 #
 import pybamm
+import numpy as np
+from scipy.sparse import csr_matrix, issparse, kron, vstack
 
 
 class Jacobian(object):
-    def __init__(self, known_jacs=None):
+    """
+    Calculates the Jacobian of expression trees with respect to a (slice of a)
+    state vector.
+
+    If `structure` is True, only the sparsity pattern of the Jacobian is calculated:
+    :meth:`jac` then returns a boolean sparse matrix that is True wherever the
+    Jacobian may be nonzero. The patterns are propagated directly through the tree
+    (matrices are reduced to their patterns, elementwise operations take the union
+    of the patterns of their children, and indexing and concatenations slice and
+    stack them), without building the Jacobian expression tree or any of its
+    values, so the structure of the Jacobian of a large model is cheap to find.
+
+    Parameters
+    ----------
+    known_jacs : dict, optional
+        Dictionary of Jacobians (or sparsity patterns) that have already been
+        calculated, keyed by symbol id
+    structure : bool, optional
+        Whether to only calculate the sparsity pattern of the Jacobian. Default is
+        False.
+    """
+
+    def __init__(self, known_jacs=None, structure=False):
         self._known_jacs = known_jacs or {}
+        self._structure = structure
 
     def jac(self, symbol, variable):
         """
@@ -27,9 +52,12 @@ class Jacobian(object):
 
         Returns
         -------
-        :class:`pybamm.Symbol`
-            Symbol representing the Jacobian
+        :class:`pybamm.Symbol` or :class:`scipy.sparse.csr_matrix`
+            Symbol representing the Jacobian, or boolean matrix giving its sparsity
+            pattern if the Jacobian was created with `structure=True`
         """
+        if self._structure:
+            return self._jac_structure(symbol, variable)
 
         try:
             return self._known_jacs[symbol.id]
@@ -86,3 +114,167 @@ class Jacobian(object):
         jac.domain = []
         jac.auxiliary_domains = {}
         return jac
+
+    def _jac_structure(self, symbol, variable):
+        """
+        See :meth:`Jacobian.jac()`. The tree is traversed with an explicit stack, so
+        that the structure of deep trees can also be found.
+        """
+        if len(variable.y_slices) > 1:
+            raise NotImplementedError(
+                "Jacobian only implemented for a single-slice StateVector"
+            )
+        known_jacs = self._known_jacs
+        stack = [(symbol, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if node.id in known_jacs:
+                continue
+            children = node.children
+            if not children_done:
+                stack.append((node, True))
+                stack.extend(
+                    (child, False)
+                    for child in reversed(children)
+                    if child.id not in known_jacs
+                )
+                continue
+            children_structures = [known_jacs[child.id] for child in children]
+            known_jacs[node.id] = self._node_structure(
+                node, children_structures, variable
+            )
+        return known_jacs[symbol.id]
+
+    def _node_structure(self, symbol, children_structures, variable):
+        """
+        Find the sparsity pattern of the Jacobian of a single node, from the
+        sparsity patterns of the Jacobians of its children. Symbols that evaluate to
+        numbers have patterns with a single row, which are broadcast as needed.
+        """
+        n = variable.last_point - variable.first_point
+
+        if isinstance(symbol, pybamm.StateVector):
+            structures = []
+            for y_slice in symbol.y_slices:
+                indices = np.arange(y_slice.start, y_slice.stop)
+                match = (indices >= variable.first_point) & (
+                    indices < variable.last_point
+                )
+                rows = np.flatnonzero(match)
+                structures.append(
+                    csr_matrix(
+                        (
+                            np.ones(len(rows), dtype=bool),
+                            (rows, indices[match] - variable.first_point),
+                        ),
+                        shape=(len(indices), n),
+                    )
+                )
+            return csr_matrix(vstack(structures))
+
+        elif isinstance(symbol, pybamm.Array):
+            return csr_matrix((symbol.shape[0], n), dtype=bool)
+
+        elif isinstance(symbol, (pybamm.Scalar, pybamm.Time, pybamm.InputParameter)):
+            return csr_matrix((1, n), dtype=bool)
+
+        elif isinstance(symbol, pybamm.IndependentVariable):
+            return csr_matrix((symbol.size, n), dtype=bool)
+
+        elif isinstance(symbol, pybamm.Heaviside):
+            rows = max(structure.shape[0] for structure in children_structures)
+            return csr_matrix((rows, n), dtype=bool)
+
+        elif isinstance(symbol, pybamm.MatrixMultiplication):
+            # As for the Jacobian itself, the left child must be a constant matrix
+            left = symbol.left
+            if isinstance(left, pybamm.Negate):
+                left = left.child
+            if not isinstance(left, pybamm.Array):
+                raise NotImplementedError(
+                    "jac of 'MatrixMultiplication' is only implemented for left of "
+                    "type 'pybamm.Array', not {}".format(symbol.left.__class__)
+                )
+            return csr_matrix(
+                matrix_structure(left.entries) @ children_structures[1]
+            )
+
+        elif isinstance(symbol, pybamm.Outer):
+            # the right child cannot depend on the state vector
+            right = matrix_structure(symbol.right.evaluate())
+            return csr_matrix(kron(children_structures[0], right.reshape((-1, 1))))
+
+        elif isinstance(
+            symbol,
+            (
+                pybamm.Addition,
+                pybamm.Subtraction,
+                pybamm.Multiplication,
+                pybamm.Division,
+                pybamm.Power,
+                pybamm.Inner,
+                pybamm.Negate,
+                pybamm.AbsoluteValue,
+            ),
+        ):
+            return union_structure(symbol, children_structures)
+
+        elif isinstance(symbol, pybamm.Index):
+            return children_structures[0][symbol.slice]
+
+        elif isinstance(symbol, pybamm.Function):
+            structure = union_structure(symbol, children_structures)
+            if symbol.function in (np.max, np.min):
+                # reduction to a single value
+                return csr_matrix(structure.sum(axis=0, dtype=bool))
+            return structure
+
+        elif isinstance(symbol, pybamm.NumpyConcatenation):
+            if len(children_structures) == 0:
+                return csr_matrix((0, n), dtype=bool)
+            return csr_matrix(vstack(children_structures))
+
+        elif isinstance(symbol, pybamm.DomainConcatenation):
+            return csr_matrix(vstack(children_structures))[symbol.permutation]
+
+        raise NotImplementedError(
+            "Cannot calculate Jacobian structure of symbol of type '{}'".format(
+                type(symbol)
+            )
+        )
+
+
+def matrix_structure(matrix):
+    """
+    Returns the sparsity pattern of a (dense or sparse) matrix, as a boolean sparse
+    matrix
+    """
+    if issparse(matrix):
+        structure = csr_matrix(matrix, dtype=bool)
+        structure.eliminate_zeros()
+        return structure
+    return csr_matrix(np.atleast_2d(np.asarray(matrix) != 0))
+
+
+def union_structure(symbol, children_structures):
+    """
+    Returns the union of the sparsity patterns of the Jacobians of the children of
+    an elementwise operation, broadcasting the patterns of children that evaluate to
+    numbers
+    """
+    rows = max(structure.shape[0] for structure in children_structures)
+    union = None
+    for structure in children_structures:
+        if structure.nnz == 0:
+            continue
+        if structure.shape[0] != rows:
+            if structure.shape[0] != 1:
+                raise NotImplementedError(
+                    "Cannot calculate Jacobian structure of symbol of type '{}' "
+                    "with children of different sizes".format(type(symbol))
+                )
+            structure = structure[np.zeros(rows, dtype=int)]
+        union = structure if union is None else union + structure
+    if union is None:
+        return csr_matrix((rows, children_structures[0].shape[1]), dtype=bool)
+    return csr_matrix(union)
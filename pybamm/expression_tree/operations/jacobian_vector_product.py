@@ -0,0 +1,232 @@
+#
+# Calculate Jacobian-vector products of a symbol
+#
+import pybamm
+import numpy as np
+
+
+class JacobianVectorProduct(object):
+    """
+    Creates expression trees for the product J(t, y) v of the Jacobian of a symbol
+    with a vector v, by forward-mode differentiation of the symbol in the direction
+    v, without forming the Jacobian itself. This is all that Krylov linear solvers
+    need, and is much cheaper than building and evaluating the full Jacobian of large
+    models (e.g. 2+1D models).
+
+    The vector v is read from the state vector, after its first `offset` entries: the
+    resulting expression tree is evaluated with the state vector `y` stacked on top
+    of `v`, i.e. `jvp.evaluate(t, np.concatenate([y, v]), u)`. The tree only contains
+    the usual pybamm symbols, so it can be simplified and converted (e.g. with
+    :class:`pybamm.EvaluatorPython`) like any other expression tree.
+
+    Parameters
+    ----------
+    offset : int
+        The length of the state vector `y` (including any external variables), after
+        which the vector `v` is stored
+    known_jvps : dict, optional
+        Dictionary of Jacobian-vector products that have already been calculated,
+        keyed by symbol id
+    """
+
+    def __init__(self, offset, known_jvps=None):
+        self.offset = offset
+        self._known_jvps = known_jvps or {}
+
+    def jvp(self, symbol, variable):
+        """
+        Returns the expression tree for the product of the Jacobian of `symbol` with
+        respect to `variable` (a slice of the state vector) with the vector v. The
+        tree is traversed with an explicit stack, and the products of subtrees that
+        do not depend on `variable` are left out.
+
+        Parameters
+        ----------
+        symbol : :class:`pybamm.Symbol`
+            The symbol to differentiate
+        variable : :class:`pybamm.StateVector`
+            The (slice of the) state vector with respect to which to differentiate
+
+        Returns
+        -------
+        :class:`pybamm.Symbol`
+            Symbol representing the Jacobian-vector product
+        """
+        if len(variable.y_slices) > 1:
+            raise NotImplementedError(
+                "Jacobian only implemented for a single-slice StateVector"
+            )
+        known_jvps = self._known_jvps
+        stack = [(symbol, False)]
+        while stack:
+            node, children_done = stack.pop()
+            if node.id in known_jvps:
+                continue
+            children = node.children
+            if not children_done:
+                stack.append((node, True))
+                stack.extend(
+                    (child, False)
+                    for child in reversed(children)
+                    if child.id not in known_jvps
+                )
+                continue
+            children_jvps = [known_jvps[child.id] for child in children]
+            jvp = self._jvp(node, children_jvps, variable)
+            if jvp is not None:
+                # Jacobian-vector products remove the domain(s)
+                jvp.domain = []
+                jvp.auxiliary_domains = {}
+            known_jvps[node.id] = jvp
+
+        jvp = known_jvps[symbol.id]
+        if jvp is None:
+            jvp = _zeros_like(symbol)
+        return jvp
+
+    def _jvp(self, symbol, children_jvps, variable):
+        """
+        Returns the Jacobian-vector product of a single node, given the products of
+        its children, or None if the node does not depend on `variable`
+        """
+        children = symbol.children
+
+        if isinstance(symbol, pybamm.StateVector):
+            return self._state_vector_jvp(symbol, variable)
+
+        elif len(children) == 0:
+            if isinstance(
+                symbol,
+                (pybamm.Scalar, pybamm.Array, pybamm.Time, pybamm.InputParameter),
+            ):
+                return None
+            raise NotImplementedError(
+                "Cannot calculate Jacobian-vector product of symbol of type "
+                "'{}'".format(type(symbol))
+            )
+
+        elif all(jvp is None for jvp in children_jvps):
+            return None
+
+        elif isinstance(symbol, pybamm.BinaryOperator):
+            left, right = children
+            left_jvp, right_jvp = children_jvps
+            if isinstance(symbol, (pybamm.Addition, pybamm.Subtraction)):
+                # keep the shape of the result when one of the children is constant
+                if left_jvp is None:
+                    left_jvp = _zeros_like(left)
+                if right_jvp is None:
+                    right_jvp = _zeros_like(right)
+                return symbol._binary_new_copy(left_jvp, right_jvp)
+            elif isinstance(symbol, (pybamm.Multiplication, pybamm.Inner)):
+                terms = []
+                if left_jvp is not None:
+                    terms.append(symbol._binary_new_copy(left_jvp, right))
+                if right_jvp is not None:
+                    terms.append(symbol._binary_new_copy(left, right_jvp))
+                return _sum(terms)
+            elif isinstance(symbol, pybamm.Division):
+                terms = []
+                if left_jvp is not None:
+                    terms.append(left_jvp / right)
+                if right_jvp is not None:
+                    terms.append(-left / right ** 2 * right_jvp)
+                return _sum(terms)
+            elif isinstance(symbol, pybamm.Power):
+                terms = []
+                if left_jvp is not None:
+                    terms.append(right * left ** (right - 1) * left_jvp)
+                if right_jvp is not None:
+                    terms.append(left ** right * pybamm.log(left) * right_jvp)
+                return _sum(terms)
+            elif isinstance(symbol, pybamm.MatrixMultiplication):
+                if left_jvp is not None:
+                    raise NotImplementedError(
+                        "Jacobian-vector product of 'MatrixMultiplication' is only "
+                        "implemented for a constant left child"
+                    )
+                return left @ right_jvp
+            elif isinstance(symbol, pybamm.Heaviside):
+                return None
+            elif isinstance(symbol, pybamm.Outer):
+                # the right child cannot depend on the state vector
+                return pybamm.Outer(left_jvp, right)
+
+        elif isinstance(symbol, pybamm.Negate):
+            return -children_jvps[0]
+
+        elif isinstance(symbol, pybamm.AbsoluteValue):
+            return pybamm.Function(np.sign, children[0]) * children_jvps[0]
+
+        elif isinstance(symbol, pybamm.Index):
+            return pybamm.Index(children_jvps[0], symbol.index, check_size=False)
+
+        elif isinstance(symbol, pybamm.Function):
+            if symbol.function in (np.max, np.min):
+                raise NotImplementedError(
+                    "Jacobian-vector product of reductions is not implemented"
+                )
+            terms = [
+                symbol._function_diff(children, idx) * jvp
+                for idx, jvp in enumerate(children_jvps)
+                if jvp is not None
+            ]
+            return _sum(terms)
+
+        elif isinstance(
+            symbol, (pybamm.NumpyConcatenation, pybamm.DomainConcatenation)
+        ):
+            children_jvps = [
+                _zeros_like(child) if jvp is None else jvp
+                for child, jvp in zip(children, children_jvps)
+            ]
+            return symbol._concatenation_new_copy(children_jvps)
+
+        raise NotImplementedError(
+            "Cannot calculate Jacobian-vector product of symbol of type '{}'".format(
+                type(symbol)
+            )
+        )
+
+    def _state_vector_jvp(self, symbol, variable):
+        """
+        The product of the Jacobian of a StateVector with v: the entries of v that
+        correspond to the entries of `variable` in the StateVector, and zeros
+        elsewhere
+        """
+        pieces = []
+        depends_on_variable = False
+        for y_slice in symbol.y_slices:
+            start = max(y_slice.start, variable.first_point)
+            stop = min(y_slice.stop, variable.last_point)
+            if start >= stop:
+                pieces.append(pybamm.Vector(np.zeros(y_slice.stop - y_slice.start)))
+                continue
+            depends_on_variable = True
+            if start > y_slice.start:
+                pieces.append(pybamm.Vector(np.zeros(start - y_slice.start)))
+            shift = self.offset - variable.first_point
+            pieces.append(pybamm.StateVector(slice(start + shift, stop + shift)))
+            if y_slice.stop > stop:
+                pieces.append(pybamm.Vector(np.zeros(y_slice.stop - stop)))
+        if not depends_on_variable:
+            return None
+        if len(pieces) == 1:
+            return pieces[0]
+        return pybamm.NumpyConcatenation(*pieces)
+
+
+def _zeros_like(symbol):
+    "Zeros of the same shape as a symbol that does not depend on the state vector"
+    zeros = pybamm.Scalar(0) * symbol
+    zeros.domain = []
+    zeros.auxiliary_domains = {}
+    return zeros
+
+
+def _sum(terms):
+    "Add up a list of Jacobian-vector products"
+    result = terms[0]
+    for term in terms[1:]:
+        result = result + term
+    return result
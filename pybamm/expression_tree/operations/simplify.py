@@ -3,8 +3,10 @@
 #
 import pybamm
 
+import copy
 import numpy as np
 import numbers
+import time
 from scipy.sparse import issparse
 
 
@@ -66,9 +68,10 @@ def simplify_addition_subtraction(myclass, left, right):
     numerator = []
     numerator_types = []
 
-    def flatten(this_class, left_child, right_child, in_subtraction):
+    def flatten(this_class, left_child, right_child):
         """
-        recursive function to flatten a term involving only additions or subtractions
+        function to flatten a term involving only additions or subtractions, with an
+        explicit stack (rather than recursion) so that long sums can be flattened
 
         outputs to lists `numerator` and `numerator_types`
 
@@ -83,13 +86,32 @@ def simplify_addition_subtraction(myclass, left, right):
         (1 + 2) - (2 + 3) -> [1, 2, 2, 3] and [None, Addition, Subtraction, Subtraction]
         """
 
+        def right_in_subtraction(this_class, in_subtraction):
+            "whether the right child of a term of class `this_class` is subtracted"
+            if in_subtraction is None:
+                return this_class == pybamm.Subtraction
+            elif this_class == pybamm.Subtraction:
+                return not in_subtraction
+            return in_subtraction
+
         left_child.domain = []
         right_child.domain = []
-        for side, child in [("left", left_child), ("right", right_child)]:
+        stack = [
+            (right_child, right_in_subtraction(this_class, None)),
+            (left_child, None),
+        ]
+        while stack:
+            child, in_subtraction = stack.pop()
             if isinstance(child, (pybamm.Addition, pybamm.Subtraction)):
-                left, right = child.orphans
-                flatten(child.__class__, left, right, in_subtraction)
-
+                # shallow copies are enough, as the domains are the only attributes
+                # that are changed
+                left, right = [copy.copy(grandchild) for grandchild in child.children]
+                left.domain = []
+                right.domain = []
+                stack.append(
+                    (right, right_in_subtraction(child.__class__, in_subtraction))
+                )
+                stack.append((left, in_subtraction))
             else:
                 numerator.append(child)
                 if in_subtraction is None:
@@ -99,13 +121,7 @@ def simplify_addition_subtraction(myclass, left, right):
                 else:
                     numerator_types.append(pybamm.Addition)
 
-            if side == "left":
-                if in_subtraction is None:
-                    in_subtraction = this_class == pybamm.Subtraction
-                elif this_class == pybamm.Subtraction:
-                    in_subtraction = not in_subtraction
-
-    flatten(myclass, left, right, None)
+    flatten(myclass, left, right)
 
     def partition_by_constant(source, types):
         """
@@ -156,7 +172,7 @@ def simplify_addition_subtraction(myclass, left, right):
         if isinstance(numerator[i], pybamm.Multiplication) and isinstance(
             numerator[i].children[0], pybamm.Scalar
         ):
-            term_i = numerator[i].orphans[1]
+            term_i = numerator[i].children[1]
             term_i_count = numerator[i].children[0].evaluate()
         else:
             term_i = numerator[i]
@@ -300,7 +316,7 @@ def simplify_multiplication_division(myclass, left, right):
                 in_matrix_multiplication
                 or isinstance(other_child, (pybamm.Scalar, pybamm.Vector))
             ):
-                left, right = child.orphans
+                left, right = [copy.copy(grandchild) for grandchild in child.children]
                 if (
                     side == "left"
                     and this_class == pybamm.Multiplication
@@ -327,7 +343,7 @@ def simplify_multiplication_division(myclass, left, right):
                 isinstance(child, (pybamm.Multiplication, pybamm.Division))
                 and not in_matrix_multiplication
             ):
-                left, right = child.orphans
+                left, right = [copy.copy(grandchild) for grandchild in child.children]
                 if side == "left":
                     flatten(
                         previous_class,
@@ -549,12 +565,44 @@ def simplify_multiplication_division(myclass, left, right):
 
 
 class Simplification(object):
-    def __init__(self, simplified_symbols=None):
-        self._simplified_symbols = simplified_symbols or {}
+    """
+    Simplifies expression trees, applying the simplification rules defined in the
+    classes derived from :class:`pybamm.Symbol` (e.g. `_binary_simplify`).
+
+    The trees are traversed with an explicit stack (rather than recursion), so that
+    very large or deep trees can be simplified. The simplified symbols are stored by
+    id, and reused whenever the same subtree is found again, including in other trees
+    simplified by the same object (e.g. the rhs, algebraic equations, Jacobian and
+    events of a model). When a rule rewrites a node into a different expression, the
+    rules are applied again to the new expression, until it no longer changes (or up
+    to `max_iterations` times).
+
+    The number of calls to each rule, the number of times it rewrote a node, the
+    number of nodes it removed from the tree and the time spent in it are stored in
+    :attr:`stats`.
+
+    Parameters
+    ----------
+    simplified_symbols : dict, optional
+        Dictionary of symbols that have already been simplified, keyed by id
+    max_iterations : int, optional
+        The maximum number of times the rules are applied again to a rewritten
+        expression (default is 10)
+    """
+
+    def __init__(self, simplified_symbols=None, max_iterations=10):
+        if simplified_symbols is None:
+            simplified_symbols = {}
+        self._simplified_symbols = simplified_symbols
+        self.max_iterations = max_iterations
+        self._iteration = 0
+        # number of nodes in each (simplified or original) tree, keyed by id
+        self._sizes = {}
+        self.stats = {}
 
     def simplify(self, symbol):
         """
-        This function recurses down the tree, applying any simplifications defined in
+        This function goes down the tree, applying any simplifications defined in
         classes derived from pybamm.Symbol. E.g. any expression multiplied by a
         pybamm.Scalar(0) will be simplified to a pybamm.Scalar(0).
         If a symbol has already been simplified, the stored value is returned.
@@ -569,18 +617,96 @@ class Simplification(object):
         :class:`pybamm.Symbol`
         Simplified symbol
         """
+        simplified_symbols = self._simplified_symbols
+        symbol_id = symbol.id
+        if symbol_id not in simplified_symbols:
+            # Simplify the children of each node before the node itself
+            stack = [(symbol, symbol_id, False)]
+            while stack:
+                node, node_id, children_done = stack.pop()
+                if node_id in simplified_symbols:
+                    continue
+                if not children_done:
+                    stack.append((node, node_id, True))
+                    stack.extend(
+                        (child, child.id, False)
+                        for child in reversed(node.children)
+                        if child.id not in simplified_symbols
+                    )
+                    continue
+                simplified_symbol = self._simplify_node(node)
+                simplified_symbols[node_id] = simplified_symbol
+                # the simplified symbol does not need to be simplified again
+                simplified_symbols.setdefault(simplified_symbol.id, simplified_symbol)
 
-        try:
-            return self._simplified_symbols[symbol.id]
-        except KeyError:
-            simplified_symbol = self._simplify(symbol)
-
-            self._simplified_symbols[symbol.id] = simplified_symbol
+        return simplified_symbols[symbol_id]
 
-            return simplified_symbol
+    def _simplify_node(self, symbol):
+        """
+        Simplify a symbol whose children have already been simplified, applying the
+        rules again to the result if they rewrote it
+        """
+        simplified_symbols = self._simplified_symbols
+        simplified_children = [
+            simplified_symbols[child.id] for child in symbol.children
+        ]
+        # size of the tree before the rule is applied
+        size = 1 + sum(self._size(child) for child in simplified_children)
+        rule = type(symbol).__name__
+        start = time.perf_counter()
+        new_symbol = self._simplify(symbol)
+        elapsed = time.perf_counter() - start
+
+        # If the rule only rebuilt the node from its simplified children, applying it
+        # again would give the same result. Otherwise, simplify the new expression.
+        rewritten = not (
+            type(new_symbol) is type(symbol)
+            and len(new_symbol.children) == len(simplified_children)
+            and all(
+                new_child.id == child.id
+                for new_child, child in zip(new_symbol.children, simplified_children)
+            )
+        )
+        if rewritten and new_symbol.id in simplified_symbols:
+            new_symbol = simplified_symbols[new_symbol.id]
+        elif rewritten and self._iteration < self.max_iterations:
+            self._iteration += 1
+            try:
+                new_symbol = self.simplify(new_symbol)
+            finally:
+                self._iteration -= 1
+
+        stats = self.stats.setdefault(
+            rule, {"calls": 0, "rewrites": 0, "nodes removed": 0, "time": 0}
+        )
+        stats["calls"] += 1
+        stats["rewrites"] += rewritten
+        stats["nodes removed"] += size - self._size(new_symbol)
+        stats["time"] += elapsed
+        return new_symbol
+
+    def _size(self, symbol):
+        "Number of nodes in the tree (counting shared subtrees each time they appear)"
+        sizes = self._sizes
+        stack = [symbol]
+        while stack:
+            node = stack[-1]
+            if node.id in sizes:
+                stack.pop()
+                continue
+            missing = [child for child in node.children if child.id not in sizes]
+            if missing:
+                stack.extend(missing)
+            else:
+                stack.pop()
+                sizes[node.id] = 1 + sum(sizes[child.id] for child in node.children)
+        return sizes[symbol.id]
 
     def _simplify(self, symbol):
         """ See :meth:`Simplification.simplify()`. """
+        # the domains are not needed once the model has been discretised. Clear them
+        # on a (shallow) copy of the symbol, to leave the original tree unchanged
+        symbol = copy.copy(symbol)
         symbol.domain = []
         symbol.auxiliary_domains = {}
 
@@ -74,6 +74,14 @@ class FunctionParameter(pybamm.Symbol):
             + tuple(self.domain)
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        if self.diff_variable is None:
+            diff_variable = ""
+        else:
+            diff_variable = self.diff_variable.content_hash
+        return super()._content_hash_parts() + [diff_variable]
+
     def get_children_domains(self, children_list):
         """Obtains the unique domain of the children. If the
         children have different domains then raise an error"""
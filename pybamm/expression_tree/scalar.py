@@ -50,6 +50,10 @@ class Scalar(pybamm.Symbol):
             (self.__class__, self.name) + tuple(self.domain) + tuple(str(self._value))
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [repr(self._value)]
+
     def _base_evaluate(self, t=None, y=None):
         """ See :meth:`pybamm.Symbol._base_evaluate()`. """
         return self._value
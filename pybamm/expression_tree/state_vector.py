@@ -29,6 +29,8 @@ class StateVector(pybamm.Symbol):
     *Extends:* :class:`Array`
     """
 
+    _node_dependencies = pybamm.Symbol.DEPENDS_ON_STATES
+
     def __init__(
         self,
         *y_slices,
@@ -82,12 +84,21 @@ class StateVector(pybamm.Symbol):
         """Array to use for evaluating"""
         return self._evaluation_array
 
+    @property
+    def evaluation_index(self):
+        """
+        Index of the entries of y to read: a slice if the entries are contiguous, in
+        which case reading them gives a view of y rather than a copy, and an array of
+        integer indices otherwise
+        """
+        return self._evaluation_index
+
     @property
     def size(self):
         return self.evaluation_array.count(True)
 
     def set_evaluation_array(self, y_slices, evaluation_array):
-        "Set evaluation array using slices"
+        "Set evaluation array (and evaluation index) using slices"
         if evaluation_array is not None and pybamm.settings.debug_mode is False:
             self._evaluation_array = evaluation_array
         else:
@@ -96,6 +107,14 @@ class StateVector(pybamm.Symbol):
                 array[y_slice] = True
             self._evaluation_array = [bool(x) for x in array]
 
+        indices = np.flatnonzero(self._evaluation_array)
+        if len(indices) == 0:
+            self._evaluation_index = slice(0, 0)
+        elif indices[-1] - indices[0] + 1 == len(indices):
+            self._evaluation_index = slice(int(indices[0]), int(indices[-1]) + 1)
+        else:
+            self._evaluation_index = indices
+
     def set_id(self):
         """ See :meth:`pybamm.Symbol.set_id()` """
         self._id = hash(
@@ -103,6 +122,12 @@ class StateVector(pybamm.Symbol):
             + tuple(self.domain)
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [
+            repr([(s.start, s.stop, s.step) for s in self.y_slices])
+        ]
+
     def _base_evaluate(self, t=None, y=None):
         """ See :meth:`pybamm.Symbol._base_evaluate()`. """
         if y is None:
@@ -112,7 +137,7 @@ class StateVector(pybamm.Symbol):
                 "y is too short, so value with slice is smaller than expected"
             )
         else:
-            out = (y[: len(self._evaluation_array)])[self._evaluation_array]
+            out = y[self._evaluation_index]
             if isinstance(out, np.ndarray) and out.ndim == 1:
                 out = out[:, np.newaxis]
             return out
@@ -4,11 +4,17 @@
 import pybamm
 
 import anytree
+import hashlib
 import numbers
 import copy
 import numpy as np
 from anytree.exporter import DotExporter
 
+# Sets of classes of the nodes in a tree, shared between trees, and the results of
+# :meth:`Symbol.has_symbol_of_classes` for each set
+_SYMBOL_CLASSES = {}
+_HAS_SYMBOL_OF_CLASSES = {}
+
 
 def domain_size(domain):
     """
@@ -85,6 +91,13 @@ class Symbol(anytree.NodeMixin):
 
     """
 
+    # Flags for the quantities that an expression can depend on
+    DEPENDS_ON_TIME = 1
+    DEPENDS_ON_STATES = 2
+    DEPENDS_ON_INPUTS = 4
+    # The quantities that the node itself (not its children) depends on
+    _node_dependencies = 0
+
     def __init__(self, name, children=None, domain=None, auxiliary_domains=None):
         super(Symbol, self).__init__()
         self.name = name
@@ -101,13 +114,14 @@ class Symbol(anytree.NodeMixin):
             if isinstance(dom, str):
                 auxiliary_domains[level] = [dom]
 
-        for child in children:
-            # copy child before adding
-            # this also adds copy.copy(child) to self.children
-            copy.copy(child).parent = self
+        # Store (shallow) copies of the children, so that changing the domain of a
+        # child after creating the node does not change the node. The children are
+        # not attached to the node through anytree, so the same subtree can be shared
+        # by several nodes (see :class:`pybamm.Interner`)
+        self.cached_children = [copy.copy(child) for child in children]
 
-        # cache children
-        self.cached_children = super(Symbol, self).children
+        # cache the structure of the tree
+        self.set_structure_flags()
 
         # Set auxiliary domains
         self.auxiliary_domains = auxiliary_domains
@@ -117,10 +131,9 @@ class Symbol(anytree.NodeMixin):
         # Test shape on everything but nodes that contain the base Symbol class or
         # the base BinaryOperator class
         if pybamm.settings.debug_mode is True:
-            if not any(
-                issubclass(pybamm.Symbol, type(x))
-                or issubclass(pybamm.BinaryOperator, type(x))
-                for x in self.pre_order()
+            if (
+                pybamm.Symbol not in self._symbol_classes
+                and pybamm.BinaryOperator not in self._symbol_classes
             ):
                 self.test_shape()
 
@@ -211,13 +224,108 @@ class Symbol(anytree.NodeMixin):
             + tuple([(k, tuple(v)) for k, v in self.auxiliary_domains.items()])
         )
 
+    @property
+    def content_hash(self):
+        """
+        A hash of the contents of the tree below this node (classes, names, domains,
+        values and entries of the constants, etc.).
+
+        Unlike :attr:`id`, which uses Python's `hash` and hence changes from one
+        process to the next, the content hash is a blake2b digest of a canonical
+        serialisation of the tree, and is the same in every process and on every
+        machine. It can therefore be used to identify expressions in caches that are
+        shared between processes or stored on disk.
+
+        The hash is computed (without recursion) the first time it is needed, and
+        stored until the id of the node changes.
+        """
+        content_hash = self._get_content_hash()
+        if content_hash is None:
+            # Hash the children of each node before the node itself
+            stack = [(self, False)]
+            while stack:
+                node, children_done = stack.pop()
+                if node._get_content_hash() is not None:
+                    continue
+                if not children_done:
+                    stack.append((node, True))
+                    stack.extend((child, False) for child in node.children)
+                    continue
+                hasher = hashlib.blake2b(digest_size=16)
+                for part in node._content_hash_parts():
+                    if isinstance(part, str):
+                        part = part.encode()
+                    # prefix each part with its length, so that the serialisation
+                    # of the parts is unambiguous
+                    hasher.update(str(len(part)).encode() + b":" + part)
+                node._content_hash = (node.id, hasher.hexdigest())
+            content_hash = self._get_content_hash()
+        return content_hash
+
+    def _get_content_hash(self):
+        "The stored content hash, or None if it is out of date"
+        try:
+            node_id, content_hash = self._content_hash
+        except AttributeError:
+            return None
+        if node_id != self.id:
+            return None
+        return content_hash
+
+    def _content_hash_parts(self):
+        """
+        The parts (str or bytes) that are hashed to give :attr:`content_hash`. Classes
+        with attributes that are part of their id (e.g. the value of a
+        :class:`pybamm.Scalar`) add them to the parts.
+        """
+        cls = self.__class__
+        return (
+            [cls.__module__ + "." + cls.__qualname__, self.name, repr(self.domain)]
+            + [repr(sorted(self.auxiliary_domains.items()))]
+            + [child.content_hash for child in self.children]
+        )
+
+    def set_structure_flags(self):
+        """
+        Set the flags that describe the structure of the tree below this node: the
+        classes of the nodes in the tree, and whether the tree depends on time, on the
+        state vector (or variables) and on input parameters. The flags are found from
+        the flags of the children, so that :meth:`is_constant` and
+        :meth:`has_symbol_of_classes` do not need to go through the whole tree.
+        """
+        classes = {self.__class__}
+        dependencies = self._node_dependencies
+        for child in self.children:
+            classes |= child._symbol_classes
+            dependencies |= child._dependencies
+        # trees with the same classes share the same (immutable) set
+        classes = frozenset(classes)
+        self._symbol_classes = _SYMBOL_CLASSES.setdefault(classes, classes)
+        self._dependencies = dependencies
+        self._evaluates_to_number = None
+
+    @property
+    def depends_on_time(self):
+        "Whether the expression depends on time"
+        return bool(self._dependencies & self.DEPENDS_ON_TIME)
+
+    @property
+    def depends_on_states(self):
+        "Whether the expression depends on the state vector (or variables)"
+        return bool(self._dependencies & self.DEPENDS_ON_STATES)
+
+    @property
+    def depends_on_inputs(self):
+        "Whether the expression depends on input parameters"
+        return bool(self._dependencies & self.DEPENDS_ON_INPUTS)
+
     @property
     def orphans(self):
         """
-        Returning new copies of the children, with parents removed to avoid corrupting
-        the expression tree internal data
+        Returning new (shallow) copies of the children, so that changing their domains
+        does not change this node
         """
-        return tuple([child.new_copy() for child in self.children])
+        return tuple([copy.copy(child) for child in self.children])
 
     def render(self):  # pragma: no cover
         """print out a visual representation of the tree (this node and its
@@ -505,17 +613,8 @@ class Symbol(anytree.NodeMixin):
         evaluate : evaluate the expression
 
         """
-        # if any of the nodes are instances of any of these types, then the whole
-        # expression depends on either t or y or u
-        search_types = (
-            pybamm.Variable,
-            pybamm.StateVector,
-            pybamm.Time,
-            pybamm.InputParameter,
-        )
-
-        # do the search, return true if no relevent nodes are found
-        return not any((isinstance(n, search_types)) for n in self.pre_order())
+        # the dependencies are found when the tree is created
+        return self._dependencies == 0
 
     def evaluate_ignoring_errors(self):
         """
@@ -555,12 +654,15 @@ class Symbol(anytree.NodeMixin):
         evaluate : evaluate the expression
 
         """
-        result = self.evaluate_ignoring_errors()
-
-        if isinstance(result, numbers.Number):
-            return True
-        else:
-            return False
+        # the result is stored, as the tree does not change after it is created
+        if self._evaluates_to_number is None:
+            if self._dependencies & self.DEPENDS_ON_STATES:
+                # expressions that depend on y cannot be evaluated without y
+                self._evaluates_to_number = False
+            else:
+                result = self.evaluate_ignoring_errors()
+                self._evaluates_to_number = isinstance(result, numbers.Number)
+        return self._evaluates_to_number
 
     def evaluates_on_edges(self):
         """
@@ -578,7 +680,13 @@ class Symbol(anytree.NodeMixin):
         symbol_classes : pybamm class or iterable of classes
             The classes to test the symbol against
         """
-        return any(isinstance(symbol, symbol_classes) for symbol in self.pre_order())
+        key = (self._symbol_classes, symbol_classes)
+        try:
+            return _HAS_SYMBOL_OF_CLASSES[key]
+        except KeyError:
+            result = any(issubclass(cls, symbol_classes) for cls in key[0])
+            _HAS_SYMBOL_OF_CLASSES[key] = result
+            return result
 
     def simplify(self, simplified_symbols=None):
         """ Simplify the expression tree. See :class:`pybamm.Simplification`. """
@@ -31,7 +31,11 @@ class UnaryOperator(pybamm.Symbol):
         super().__init__(
             name, children=[child], domain=domain, auxiliary_domains=auxiliary_domains
         )
-        self.child = self.children[0]
+
+    @property
+    def child(self):
+        "The child of the operator"
+        return self.cached_children[0]
 
     def __str__(self):
         """ See :meth:`pybamm.Symbol.__str__()`. """
@@ -219,6 +223,12 @@ class Index(UnaryOperator):
             + tuple(self.domain)
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [
+            repr((self.slice.start, self.slice.stop, self.slice.step))
+        ]
+
     def _unary_evaluate(self, child):
         """ See :meth:`UnaryOperator._unary_evaluate()`. """
         return child[self.slice]
@@ -446,6 +456,13 @@ class Integral(SpatialOperator):
             + tuple(self.domain)
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [
+            integration_variable.content_hash
+            for integration_variable in self.integration_variable
+        ]
+
     def _unary_simplify(self, simplified_child):
         """ See :meth:`UnaryOperator._unary_simplify()`. """
 
@@ -542,6 +559,10 @@ class DefiniteIntegralVector(SpatialOperator):
             + tuple(self.domain)
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [self.vector_type]
+
     def _unary_simplify(self, simplified_child):
         """ See :meth:`UnaryOperator._unary_simplify()`. """
 
@@ -603,6 +624,10 @@ class BoundaryIntegral(SpatialOperator):
             (self.__class__, self.name) + (self.children[0].id,) + tuple(self.domain)
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [self.region]
+
     def _unary_simplify(self, simplified_child):
         """ See :meth:`UnaryOperator._unary_simplify()`. """
 
@@ -651,6 +676,10 @@ class DeltaFunction(SpatialOperator):
             + tuple([(k, tuple(v)) for k, v in self.auxiliary_domains.items()])
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [self.side]
+
     def evaluates_on_edges(self):
         """ See :meth:`pybamm.Symbol.evaluates_on_edges()`. """
         return False
@@ -714,6 +743,10 @@ class BoundaryOperator(SpatialOperator):
             + tuple([(k, tuple(v)) for k, v in self.auxiliary_domains.items()])
         )
 
+    def _content_hash_parts(self):
+        """ See :meth:`pybamm.Symbol._content_hash_parts()`. """
+        return super()._content_hash_parts() + [self.side]
+
     def _unary_simplify(self, simplified_child):
         """ See :meth:`UnaryOperator._unary_simplify()`. """
         return self.__class__(simplified_child, self.side)
@@ -914,9 +947,7 @@ def x_average(symbol):
     """
     # If symbol doesn't have a domain, its average value is itself
     if symbol.domain in [[], ["current collector"]]:
-        new_symbol = symbol.new_copy()
-        new_symbol.parent = None
-        return new_symbol
+        return symbol.new_copy()
     # If symbol is a Broadcast, its average value is its child
     elif isinstance(symbol, pybamm.Broadcast):
         return symbol.orphans[0]
@@ -983,9 +1014,7 @@ def z_average(symbol):
         )
     # If symbol doesn't have a domain, its average value is itself
     if symbol.domain == []:
-        new_symbol = symbol.new_copy()
-        new_symbol.parent = None
-        return new_symbol
+        return symbol.new_copy()
     # If symbol is a Broadcast, its average value is its child
     elif isinstance(symbol, pybamm.Broadcast):
         return symbol.orphans[0]
@@ -1019,9 +1048,7 @@ def yz_average(symbol):
         )
     # If symbol doesn't have a domain, its average value is itself
     if symbol.domain == []:
-        new_symbol = symbol.new_copy()
-        new_symbol.parent = None
-        return new_symbol
+        return symbol.new_copy()
     # If symbol is a Broadcast, its average value is its child
     elif isinstance(symbol, pybamm.Broadcast):
         return symbol.orphans[0]
@@ -1051,9 +1078,7 @@ def boundary_value(symbol, side):
     """
     # If symbol doesn't have a domain, its boundary value is itself
     if symbol.domain == []:
-        new_symbol = symbol.new_copy()
-        new_symbol.parent = None
-        return new_symbol
+        return symbol.new_copy()
     # If symbol is a Broadcast, its boundary value is its child
     if isinstance(symbol, pybamm.Broadcast):
         return symbol.orphans[0]
@@ -1077,9 +1102,7 @@ def r_average(symbol):
     """
     # If symbol doesn't have a particle domain, its r-averaged value is itself
     if symbol.domain not in [["positive particle"], ["negative particle"]]:
-        new_symbol = symbol.new_copy()
-        new_symbol.parent = None
-        return new_symbol
+        return symbol.new_copy()
     # If symbol is a Broadcast, its average value is its child
     elif isinstance(symbol, pybamm.Broadcast):
         return symbol.orphans[0]
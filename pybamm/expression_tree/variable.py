@@ -28,6 +28,8 @@ class Variable(pybamm.Symbol):
     *Extends:* :class:`Symbol`
     """
 
+    _node_dependencies = pybamm.Symbol.DEPENDS_ON_STATES
+
     def __init__(self, name, domain=None, auxiliary_domains=None):
         if domain is None:
             domain = []
@@ -87,8 +87,32 @@ class BaseModel(object):
         calling `evaluate(t, y)` on the given expression treeself.
         - "casadi": convert into CasADi expression tree, which then uses CasADi's \
         algorithm to calculate the Jacobian.
+        - "numba": compile into numba kernels (see :class:`pybamm.EvaluatorNumba`), \
+        for the solvers that are not CasADi-based.
 
         Default is "python".
+    compile_casadi : bool
+        If convert_to_format is "casadi", whether to compile the CasADi functions
+        for the rhs and algebraic equations, Jacobian and events into shared
+        libraries (see :func:`pybamm.compile_casadi_function`) for faster
+        evaluation by the solvers that are not CasADi-based (default is False). This
+        has no effect for the :class:`pybamm.CasadiSolver`, which builds its
+        integrators from the symbolic functions (a warning is logged).
+    casadi_graph : str
+        If convert_to_format is "casadi", the type of CasADi graph to use:
+
+        - "MX": convert the expression trees to MX graphs, which are quick to build \
+        and keep matrix products as single operations.
+        - "SX": convert the expression trees to SX graphs of scalar operations, \
+        which are faster to evaluate for small models (not for models with cubic \
+        spline interpolants on a grid, whose derivatives cannot be evaluated as SX).
+        - "expand": convert the expression trees to MX graphs and expand the \
+        functions into SX functions (not for models with interpolants, whose \
+        derivatives cannot be expanded).
+        - "auto": choose from the size and operations of the model (see \
+        :func:`pybamm.choose_casadi_graph`).
+
+        Default is "auto".
 
     """
 
@@ -115,6 +139,8 @@ class BaseModel(object):
         self.use_jacobian = True
         self.use_simplify = True
         self.convert_to_format = "casadi"
+        self.compile_casadi = False
+        self.casadi_graph = "auto"
 
     def _set_dictionary(self, dict, name):
         """
@@ -302,6 +328,8 @@ class BaseModel(object):
         new_model.use_jacobian = self.use_jacobian
         new_model.use_simplify = self.use_simplify
         new_model.convert_to_format = self.convert_to_format
+        new_model.compile_casadi = self.compile_casadi
+        new_model.casadi_graph = self.casadi_graph
         return new_model
 
     def update(self, *submodels):
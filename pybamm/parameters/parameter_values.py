@@ -130,6 +130,15 @@ class ParameterValues(dict):
         "Call the update functionality when doing a setitem"
         self.update({key: value})
 
+    def copy(self):
+        """
+        Returns a copy of the parameter values. The values have already been checked,
+        so they are copied as they are.
+        """
+        new_copy = ParameterValues(values={})
+        super(ParameterValues, new_copy).update(self)
+        return new_copy
+
     def update(self, values, check_conflict=False, path=""):
         # check parameter values
         values = self.check_and_update_parameter_values(values)
@@ -438,11 +447,14 @@ class ParameterValues(dict):
                 # If function_name is a tuple then it should be (name, data) and we need
                 # to create an Interpolant
                 name, data = function_name
-                function = pybamm.Interpolant(data, *new_children, name=name)
+                function = pybamm.Interpolant(data, new_children, name=name)
             elif isinstance(function_name, numbers.Number):
                 # If the "function" is provided is actually a scalar, return a Scalar
                 # object instead of throwing an error
                 function = pybamm.Scalar(function_name, name=symbol.name)
+            elif isinstance(function_name, pybamm.InputParameter):
+                # Similarly, an input parameter gives a constant value
+                function = function_name
             else:
                 # otherwise evaluate the function to create a new PyBaMM object
                 function = function_name(*new_children)
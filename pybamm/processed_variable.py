@@ -36,15 +36,33 @@ def post_process_variables(
         Dictionary of processed variables
     """
     processed_variables = {}
-    known_evals = {t: {} for t in t_sol}
+    inputs = inputs or {}
+    # values of the nodes at the first, middle and last times and at all times,
+    # shared between the variables
+    known_evals = {"first time": {}, "mid time": {}, "last time": {}, "all times": {}}
+    # Evaluate all the variables in one pass, so that the nodes they share are only
+    # computed once. If this fails (e.g. for a variable that cannot be evaluated at
+    # all times at once), the remaining nodes are evaluated by each variable.
+    evaluator = pybamm.EvaluatorFlat(list(variables.values()))
+    mid = len(t_sol) // 2
+    points = {
+        "first time": (t_sol[0], u_sol[:, 0]),
+        "mid time": (t_sol[mid], u_sol[:, mid]),
+        "last time": (t_sol[-1], u_sol[:, -1]),
+        "all times": (t_sol, u_sol),
+    }
+    for name, (t, u) in points.items():
+        try:
+            evaluator.evaluate(t, u, inputs, known_evals=known_evals[name])
+        except (TypeError, ValueError, IndexError, NotImplementedError) as e:
+            pybamm.logger.debug(
+                "Could not evaluate all variables at the {} ({})".format(name, e)
+            )
     for var, eqn in variables.items():
         pybamm.logger.debug("Post-processing {}".format(var))
         processed_variables[var] = ProcessedVariable(
             eqn, t_sol, u_sol, mesh, inputs, interp_kind, known_evals
         )
-
-        for t in known_evals:
-            known_evals[t].update(processed_variables[var].known_evals[t])
     return processed_variables
 
 
@@ -72,6 +90,11 @@ class ProcessedVariable(object):
             Any input parameters to pass to the model
     interp_kind : str
         The method to use for interpolation
+    known_evals : dict, optional
+        Dictionaries of known values of nodes at the first time ("first time"), the
+        middle time ("mid time"), the last time ("last time") and all the times
+        ("all times") in `t_sol`, which are shared between variables (see
+        :func:`post_process_variables`)
     """
 
     def __init__(
@@ -95,14 +118,17 @@ class ProcessedVariable(object):
         self.known_evals = known_evals
 
         if self.known_evals:
-            self.base_eval, self.known_evals[t_sol[0]] = base_variable.evaluate(
+            self.base_eval, _ = self.base_variable.evaluate(
                 t_sol[0],
                 u_sol[:, 0],
                 self.inputs,
-                known_evals=self.known_evals[t_sol[0]],
+                known_evals=self.known_evals["first time"],
             )
         else:
-            self.base_eval = base_variable.evaluate(t_sol[0], u_sol[:, 0])
+            self.base_eval = self.base_variable.evaluate(
+                t_sol[0], u_sol[:, 0], self.inputs
+            )
+        self.evaluate_all_times()
 
         # handle 2D (in space) finite element variables differently
         if (
@@ -133,21 +159,88 @@ class ProcessedVariable(object):
 
         # Remove base_variable attribute to allow pickling
         del self.base_variable
+        del self.all_entries
 
-    def initialise_1D(self):
-        # initialise empty array of the correct size
-        entries = np.empty(len(self.t_sol))
-        # Evaluate the base_variable index-by-index
-        for idx in range(len(self.t_sol)):
-            t = self.t_sol[idx]
+    def evaluate_all_times(self):
+        """
+        Evaluate the base variable at all the times in `t_sol`. If all the nodes of
+        the variable act on each column of `u_sol` separately (see
+        :func:`evaluates_by_column`), the variable is evaluated at all times in a
+        single call, with `t_sol` and `u_sol` as inputs (so that each sparse matrix
+        product is applied to all the times at once). Otherwise, or if that fails or
+        gives results that differ from the values of the variable at the first,
+        middle and last times, the variable is evaluated at each time separately
+        instead.
+
+        The result is stored in `all_entries`, an array of size (n, m) whose columns
+        are the (flattened) values of the variable at each time.
+        """
+        n_times = len(self.t_sol)
+        size = np.size(self.base_eval)
+        try:
+            if not evaluates_by_column(self.base_variable):
+                raise NotImplementedError(
+                    "variable contains nodes that are not known to act on each time "
+                    "separately"
+                )
             if self.known_evals:
-                entries[idx], self.known_evals[t] = self.base_variable.evaluate(
-                    t, self.u_sol[:, idx], self.inputs, known_evals=self.known_evals[t]
+                entries, _ = self.base_variable.evaluate(
+                    self.t_sol,
+                    self.u_sol,
+                    self.inputs,
+                    known_evals=self.known_evals["all times"],
                 )
             else:
-                entries[idx] = self.base_variable.evaluate(
-                    t, self.u_sol[:, idx], self.inputs
+                entries = self.base_variable.evaluate(
+                    self.t_sol, self.u_sol, self.inputs
+                )
+            entries = np.array(entries, dtype=float)
+            if entries.ndim < 2 and size == 1:
+                entries = np.reshape(entries, (1, -1))
+            entries = np.broadcast_to(entries, (size, n_times))
+            # check the results against the values at the first, middle and last
+            # times
+            np.testing.assert_allclose(
+                entries[:, 0], np.reshape(self.base_eval, -1), rtol=1e-10, atol=1e-12
+            )
+            for idx, name in [(n_times // 2, "mid time"), (-1, "last time")]:
+                if self.known_evals:
+                    value, _ = self.base_variable.evaluate(
+                        self.t_sol[idx],
+                        self.u_sol[:, idx],
+                        self.inputs,
+                        known_evals=self.known_evals[name],
+                    )
+                else:
+                    value = self.base_variable.evaluate(
+                        self.t_sol[idx], self.u_sol[:, idx], self.inputs
+                    )
+                np.testing.assert_allclose(
+                    entries[:, idx], np.reshape(value, -1), rtol=1e-10, atol=1e-12
                 )
+            self.all_entries = entries
+            return
+        except (
+            TypeError,
+            ValueError,
+            IndexError,
+            AssertionError,
+            NotImplementedError,
+        ) as e:
+            pybamm.logger.debug(
+                "Could not evaluate at all times at once ({}), "
+                "evaluating time by time instead".format(e)
+            )
+
+        evaluator = pybamm.EvaluatorFlat(self.base_variable)
+        self.all_entries = np.empty((size, n_times))
+        for idx in range(n_times):
+            self.all_entries[:, idx] = np.reshape(
+                evaluator.evaluate(self.t_sol[idx], self.u_sol[:, idx], self.inputs), -1
+            )
+
+    def initialise_1D(self):
+        entries = self.all_entries[0, :]
 
         # No discretisation provided, or variable has no domain (function of t only)
         self._interpolation_function = interp.interp1d(
@@ -162,21 +255,7 @@ class ProcessedVariable(object):
         self.dimensions = 1
 
     def initialise_2D(self):
-        len_space = self.base_eval.shape[0]
-        entries = np.empty((len_space, len(self.t_sol)))
-
-        # Evaluate the base_variable index-by-index
-        for idx in range(len(self.t_sol)):
-            t = self.t_sol[idx]
-            u = self.u_sol[:, idx]
-            if self.known_evals:
-                eval_and_known_evals = self.base_variable.evaluate(
-                    t, u, self.inputs, known_evals=self.known_evals[t]
-                )
-                entries[:, idx] = eval_and_known_evals[0][:, 0]
-                self.known_evals[t] = eval_and_known_evals[1]
-            else:
-                entries[:, idx] = self.base_variable.evaluate(t, u, self.inputs)[:, 0]
+        entries = self.all_entries
 
         # Process the discretisation to get x values
         nodes = self.mesh.combine_submeshes(*self.domain)[0].nodes
@@ -306,28 +385,11 @@ class ProcessedVariable(object):
 
         first_dim_size = len(first_dim_nodes)
         second_dim_size = len(second_dim_nodes)
-        entries = np.empty((first_dim_size, second_dim_size, len(self.t_sol)))
-
-        # Evaluate the base_variable index-by-index
-        for idx in range(len(self.t_sol)):
-            t = self.t_sol[idx]
-            u = self.u_sol[:, idx]
-            if self.known_evals:
-                eval_and_known_evals = self.base_variable.evaluate(
-                    t, u, self.inputs, known_evals=self.known_evals[t]
-                )
-                entries[:, :, idx] = np.reshape(
-                    eval_and_known_evals[0],
-                    [first_dim_size, second_dim_size],
-                    order=order,
-                )
-                self.known_evals[t] = eval_and_known_evals[1]
-            else:
-                entries[:, :, idx] = np.reshape(
-                    self.base_variable.evaluate(t, u, self.inputs),
-                    [first_dim_size, second_dim_size],
-                    order=order,
-                )
+        entries = np.reshape(
+            self.all_entries,
+            [first_dim_size, second_dim_size, len(self.t_sol)],
+            order=order,
+        )
 
         # assign attributes for reference
         self.entries = entries
@@ -350,8 +412,7 @@ class ProcessedVariable(object):
         z_sol = self.mesh[self.domain[0]][0].edges["z"]
         len_z = len(z_sol)
 
-        # Evaluate the base_variable
-        entries = np.reshape(self.base_variable.evaluate(0, self.u_sol), [len_y, len_z])
+        entries = np.reshape(self.all_entries[:, 0], [len_y, len_z])
 
         # assign attributes for reference
         self.entries = entries
@@ -371,22 +432,7 @@ class ProcessedVariable(object):
         len_y = len(y_sol)
         z_sol = self.mesh[self.domain[0]][0].edges["z"]
         len_z = len(z_sol)
-        entries = np.empty((len_y, len_z, len(self.t_sol)))
-
-        # Evaluate the base_variable index-by-index
-        for idx in range(len(self.t_sol)):
-            t = self.t_sol[idx]
-            u = self.u_sol[:, idx]
-            if self.known_evals:
-                eval_and_known_evals = self.base_variable.evaluate(
-                    t, u, self.inputs, known_evals=self.known_evals[t]
-                )
-                entries[:, :, idx] = np.reshape(eval_and_known_evals[0], [len_y, len_z])
-                self.known_evals[t] = eval_and_known_evals[1]
-            else:
-                entries[:, :, idx] = np.reshape(
-                    self.base_variable.evaluate(t, u, self.inputs), [len_y, len_z]
-                )
+        entries = np.reshape(self.all_entries, [len_y, len_z, len(self.t_sol)])
 
         # assign attributes for reference
         self.entries = entries
@@ -459,3 +505,46 @@ def eval_dimension_name(name, x, r, y, z):
         raise ValueError("inputs {} cannot be None".format(name))
     else:
         return out
+
+
+def evaluates_by_column(symbol):
+    """
+    Check whether a symbol can be evaluated at several times at once, by passing a
+    vector of times and a matrix of states (one column per time), i.e. whether all
+    of its nodes act on each time separately. Functions are only accepted if they
+    are known to be elementwise (e.g. :class:`pybamm.Exponential` or numpy ufuncs),
+    so that reductions such as :func:`pybamm.max` are evaluated time by time.
+
+    Parameters
+    ----------
+    symbol : :class:`pybamm.Symbol`
+        The (discretised) symbol to check
+
+    Returns
+    -------
+    bool
+        Whether the symbol can be evaluated at several times at once
+    """
+    for node in symbol.pre_order():
+        if isinstance(node, (pybamm.SpecificFunction, pybamm.Interpolant)):
+            continue
+        if isinstance(node, pybamm.Function):
+            if not isinstance(node.function, np.ufunc):
+                return False
+        elif not isinstance(
+            node,
+            (
+                pybamm.Array,
+                pybamm.Scalar,
+                pybamm.StateVector,
+                pybamm.Time,
+                pybamm.InputParameter,
+                pybamm.BinaryOperator,
+                pybamm.Negate,
+                pybamm.AbsoluteValue,
+                pybamm.Index,
+                pybamm.Concatenation,
+            ),
+        ):
+            return False
+    return True
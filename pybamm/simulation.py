@@ -76,6 +76,7 @@ class Simulation:
             self._parameter_values.update({"C-rate": self.C_rate})
 
         self._made_first_step = False
+        self._input_names = set()
 
         self.reset(update_model=False)
 
@@ -122,10 +123,58 @@ class Simulation:
         if self.model_with_set_params:
             return None
 
-        self._model_with_set_params = self._parameter_values.process_model(
+        # The input parameters are set in a copy of the parameter values, so that the
+        # parameter values given to the simulation are not modified
+        parameter_values = self._parameter_values
+        if self._input_names:
+            parameter_values = parameter_values.copy()
+            parameter_values.update({name: "[input]" for name in self._input_names})
+        self._parameter_values_with_inputs = parameter_values
+
+        self._model_with_set_params = parameter_values.process_model(
             self._model, inplace=True
         )
-        self._parameter_values.process_geometry(self._geometry)
+        parameter_values.process_geometry(self._geometry)
+
+    def set_input_parameters(self, names):
+        """
+        Set the parameters that are input parameters (see
+        :class:`pybamm.InputParameter`), whose values are given when solving the
+        model. The other parameters take their values from the parameter values again.
+        If the input parameters change, the simulation is reset, so that the model is
+        built again. The parameter values of the simulation are not modified: the input
+        parameters are only set in a copy of them. Names that are not in the parameter
+        values (e.g. input parameters created directly in the model) are ignored.
+
+        Parameters
+        ----------
+        names : iterable of str
+            The names of the parameters
+
+        Raises
+        ------
+        ValueError
+            If one of the parameters is a function (or data to interpolate), as an
+            input parameter can only take a constant value
+        """
+        input_names = set()
+        for name in names:
+            if name not in self._parameter_values:
+                continue
+            value = self._parameter_values[name]
+            if callable(value) or isinstance(value, tuple):
+                raise ValueError(
+                    "'{}' is a function parameter, which cannot be an input "
+                    "parameter".format(name)
+                )
+            if not isinstance(value, pybamm.InputParameter):
+                input_names.add(name)
+        if input_names != self._input_names:
+            pybamm.logger.info(
+                "Set input parameters {}".format(", ".join(sorted(input_names)))
+            )
+            self._input_names = input_names
+            self.reset()
 
     def build(self, check_model=True):
         """
@@ -167,17 +216,27 @@ class Simulation:
         solver : :class:`pybamm.BaseSolver`
             The solver to use to solve the model.
         inputs : dict, optional
-            Any input parameters to pass to the model when solving
+            Any input parameters to pass to the model when solving. Parameters that
+            are given as inputs but are not input parameters yet (e.g. the parameters
+            of a parameter sweep) are turned into input parameters, and the model is
+            built again, the first time (see :meth:`set_input_parameters`). The model
+            is then only simplified, differentiated and converted once by the solver,
+            and is solved for any other values of the inputs without being set up
+            again.
         check_model : bool, optional
             If True, model checks are performed after discretisation (see
             :meth:`pybamm.Discretisation.process_model`). Default is True.
         """
+        inputs = inputs or {}
+        self.set_input_parameters(inputs.keys())
         self.build(check_model=check_model)
 
         if t_eval is None:
             try:
                 # Try to compute discharge time
-                tau = self._parameter_values.evaluate(self.model.param.tau_discharge)
+                tau = self._parameter_values_with_inputs.process_symbol(
+                    self.model.param.tau_discharge
+                ).evaluate(u=inputs)
                 C_rate = self._parameter_values["C-rate"]
                 t_end = 3600 / tau / C_rate
                 t_eval = np.linspace(0, t_end, 100)
@@ -229,6 +288,50 @@ class Simulation:
 
         self._made_first_step = True
 
+    def checkpoint(self, solver=None):
+        """
+        Save the current state of a simulation that is being stepped, so that
+        stepping can later be resumed from this point with :meth:`restore` (see
+        :meth:`pybamm.BaseSolver.checkpoint`).
+
+        Parameters
+        ----------
+        solver : :class:`pybamm.BaseSolver`
+            The solver being used to step the model. If None, the simulation's
+            solver is used.
+
+        Returns
+        -------
+        :class:`pybamm.Checkpoint`
+            The state of the solver, and the solution up to the checkpoint
+        """
+        if solver is None:
+            solver = self.solver
+
+        checkpoint = solver.checkpoint()
+        checkpoint.solution = copy.copy(self._solution)
+        return checkpoint
+
+    def restore(self, checkpoint, solver=None):
+        """
+        Restore the state of a simulation from a checkpoint (see :meth:`checkpoint`),
+        so that the next call to :meth:`step` continues from the checkpoint and the
+        solution is reset to the solution up to the checkpoint.
+
+        Parameters
+        ----------
+        checkpoint : :class:`pybamm.Checkpoint`
+            The checkpoint to restore
+        solver : :class:`pybamm.BaseSolver`
+            The solver being used to step the model. If None, the simulation's
+            solver is used.
+        """
+        if solver is None:
+            solver = self.solver
+
+        solver.restore(checkpoint)
+        self._solution = copy.copy(checkpoint.solution)
+
     def _update_solution(self, solution):
 
         self._solution.set_up_time += solution.set_up_time
@@ -490,13 +593,15 @@ class Simulation:
 
     def save(self, filename):
         """Save simulation using pickle"""
-        if self.model.convert_to_format == "python":
-            # We currently cannot save models in the 'python'
+        if self.model.convert_to_format in ["python", "numba"]:
+            # We currently cannot save models in the 'python' or 'numba' formats
             raise NotImplementedError(
                 """
-                Cannot save simulation if model format is python.
+                Cannot save simulation if model format is {}.
                 Set model.convert_to_format = 'casadi' instead.
-                """
+                """.format(
+                    self.model.convert_to_format
+                )
             )
         with open(filename, "wb") as f:
             pickle.dump(self, f, pickle.HIGHEST_PROTOCOL)
@@ -207,6 +207,14 @@ class AlgebraicSolver(object):
             if model.convert_to_format == "python":
                 pybamm.logger.info("Converting jacobian to python")
                 jac = pybamm.EvaluatorPython(jac)
+            elif model.convert_to_format == "numba":
+                pybamm.logger.info("Compiling jacobian with numba")
+                jac = pybamm.EvaluatorNumba(
+                    concatenated_algebraic,
+                    n_states=np.size(model.concatenated_initial_conditions),
+                )
+            else:
+                jac = pybamm.EvaluatorFlat(jac)
 
         else:
             jac = None
@@ -214,6 +222,11 @@ class AlgebraicSolver(object):
         if model.convert_to_format == "python":
             pybamm.logger.info("Converting algebraic to python")
             concatenated_algebraic = pybamm.EvaluatorPython(concatenated_algebraic)
+        elif model.convert_to_format == "numba":
+            pybamm.logger.info("Compiling algebraic with numba")
+            concatenated_algebraic = pybamm.EvaluatorNumba(concatenated_algebraic)
+        else:
+            concatenated_algebraic = pybamm.EvaluatorFlat(concatenated_algebraic)
 
         pybamm.logger.info("Finish solver set-up")
 
@@ -0,0 +1,285 @@
+#
+# Solver autotuner
+#
+import pybamm
+import hashlib
+import json
+import numpy as np
+import os
+
+AUTOTUNE_CACHE_DIR = os.path.join(
+    os.path.expanduser("~"), ".cache", "pybamm", "autotune"
+)
+
+# Results of previous calls to autotune_solver in this process, keyed by the path of
+# the file in which they are stored on disk
+_autotune_cache = {}
+
+
+def default_solver_candidates(model):
+    """
+    Return the solvers that can be used to solve a model and are installed, as a
+    dictionary of names and functions that take in rtol and atol and return a new
+    solver.
+
+    Parameters
+    ----------
+    model : :class:`pybamm.BaseModel`
+        The (discretised) model to be solved
+    """
+    candidates = {}
+    if len(model.algebraic) == 0:
+        candidates["Scipy solver (BDF)"] = lambda rtol, atol: pybamm.ScipySolver(
+            method="BDF", rtol=rtol, atol=atol
+        )
+        if pybamm.have_scikits_odes():
+            candidates["Scikits ODE solver"] = lambda rtol, atol: (
+                pybamm.ScikitsOdeSolver(rtol=rtol, atol=atol)
+            )
+    if pybamm.have_scikits_odes():
+        candidates["Scikits DAE solver"] = lambda rtol, atol: pybamm.ScikitsDaeSolver(
+            rtol=rtol, atol=atol
+        )
+    if pybamm.have_idaklu() and model.convert_to_format == "python":
+        candidates["IDA KLU solver"] = lambda rtol, atol: pybamm.IDAKLUSolver(
+            rtol=rtol, atol=atol
+        )
+    candidates["CasADi solver (fast)"] = lambda rtol, atol: pybamm.CasadiSolver(
+        mode="fast", rtol=rtol, atol=atol
+    )
+    candidates["CasADi solver (safe)"] = lambda rtol, atol: pybamm.CasadiSolver(
+        mode="safe", rtol=rtol, atol=atol
+    )
+    return candidates
+
+
+def solution_error(solution, reference):
+    """
+    Calculate the error of a solution compared to a reference solution, as the
+    maximum over all states and common times of the absolute error, scaled by the
+    largest magnitude of that state in the reference solution.
+
+    Parameters
+    ----------
+    solution : :class:`pybamm.Solution`
+        The solution whose error to calculate
+    reference : :class:`pybamm.Solution`
+        The reference solution
+
+    Returns
+    -------
+    float
+        The scaled error. This is infinite if the two solutions do not share any
+        times, for example if the solution terminated at an earlier event.
+    """
+    n_times = min(len(solution.t), len(reference.t))
+    if n_times == 0 or not np.allclose(solution.t[:n_times], reference.t[:n_times]):
+        return np.inf
+    y = solution.y[:, :n_times]
+    y_ref = reference.y[:, :n_times]
+    scale = np.max(np.abs(y_ref), axis=1, keepdims=True)
+    scale[scale == 0] = 1
+    return np.max(np.abs(y - y_ref) / scale)
+
+
+def autotune_solver(
+    model,
+    t_eval,
+    reference=None,
+    error_target=1e-4,
+    candidates=None,
+    tolerances=None,
+    inputs=None,
+    use_cache=True,
+    cache_dir=None,
+):
+    """
+    Find the fastest solver and tolerances for a (discretised) model. Each candidate
+    solver is used to solve the model with each of the candidate tolerances, and
+    the fastest configuration whose error compared to a reference solution is
+    below the error target is returned. The trial solves are over `t_eval`, so a
+    short `t_eval` can be used to keep the trials cheap.
+
+    The trial results are cached by model signature (the content hashes of the
+    model equations, see :attr:`pybamm.Symbol.content_hash`, and `t_eval`, inputs,
+    the reference, the candidates and the tolerances), both in memory and on disk
+    in `cache_dir`, so later calls for the same model (possibly with a different
+    error target, and in a different process) pick the configuration from the
+    cached results without re-running the trials. The candidates are identified by
+    their names and the content of their functions, and a reference solver by its
+    class, method and tolerances. Models or candidates whose content cannot be
+    computed (see :func:`pybamm.callable_content`) are not cached.
+
+    Parameters
+    ----------
+    model : :class:`pybamm.BaseModel`
+        The discretised model to solve
+    t_eval : :class:`numpy.array`
+        The times at which to compute the solution in the trial solves
+    reference : :class:`pybamm.Solution` or :class:`pybamm.BaseSolver`, optional
+        The reference solution, or a solver to calculate it with. If None, the
+        reference solution is calculated using a :class:`pybamm.CasadiSolver` with
+        rtol = atol = 1e-10.
+    error_target : float, optional
+        The maximum allowed error compared to the reference solution (see
+        :func:`pybamm.solution_error`). Default is 1e-4.
+    candidates : dict, optional
+        Dictionary of names and functions that take in rtol and atol and return a
+        solver. Default is all the installed solvers that can solve the model (see
+        :func:`pybamm.default_solver_candidates`).
+    tolerances : list of float, optional
+        The tolerances to try (rtol and atol are set to the same value). Default is
+        [1e-3, 1e-4, 1e-5, 1e-6, 1e-8].
+    inputs : dict, optional
+        Any input parameters to pass to the model when solving
+    use_cache : bool, optional
+        Whether to use (and store) cached results. Default is True.
+    cache_dir : str, optional
+        The directory in which the results are stored. Default is
+        "~/.cache/pybamm/autotune".
+
+    Returns
+    -------
+    solver : :class:`pybamm.BaseSolver`
+        A new solver with the fastest configuration that meets the error target
+    results : list of dict
+        The name, rtol, atol, time and error of each trial solve ("time" and
+        "error" are infinite for trials that failed)
+
+    Raises
+    ------
+    :class:`pybamm.SolverError`
+        If no configuration meets the error target
+    """
+    inputs = inputs or {}
+    if candidates is None:
+        candidates = default_solver_candidates(model)
+    if tolerances is None:
+        tolerances = [1e-3, 1e-4, 1e-5, 1e-6, 1e-8]
+
+    # the results are stored in a file named after the model signature
+    cache_path = None
+    if use_cache:
+        try:
+            key = _model_signature(
+                model, t_eval, inputs, candidates, tolerances, reference
+            )
+            cache_path = os.path.join(
+                cache_dir or AUTOTUNE_CACHE_DIR, "{}.json".format(key)
+            )
+        except TypeError as e:
+            pybamm.logger.info("Not caching solver autotuning results ({})".format(e))
+    if (
+        cache_path is not None
+        and cache_path not in _autotune_cache
+        and os.path.exists(cache_path)
+    ):
+        with open(cache_path) as f:
+            _autotune_cache[cache_path] = json.load(f)
+    if cache_path is not None and cache_path in _autotune_cache:
+        pybamm.logger.info("Using cached solver autotuning results")
+        results = _autotune_cache[cache_path]
+    else:
+        if reference is None:
+            reference = pybamm.CasadiSolver(rtol=1e-10, atol=1e-10)
+        if isinstance(reference, pybamm.BaseSolver):
+            pybamm.logger.info("Calculating reference solution")
+            reference = reference.solve(model, t_eval, inputs=inputs)
+
+        results = []
+        for name, make_solver in candidates.items():
+            for tol in tolerances:
+                pybamm.logger.info("Trying {} with rtol = atol = {}".format(name, tol))
+                result = {"name": name, "rtol": tol, "atol": tol}
+                try:
+                    timer = pybamm.Timer()
+                    solution = make_solver(tol, tol).solve(model, t_eval, inputs=inputs)
+                    result["time"] = timer.time()
+                    result["error"] = solution_error(solution, reference)
+                except (pybamm.SolverError, ValueError, RuntimeError) as e:
+                    pybamm.logger.info("{} failed ({})".format(name, e))
+                    result["time"] = np.inf
+                    result["error"] = np.inf
+                results.append(result)
+
+        if cache_path is not None:
+            _autotune_cache[cache_path] = results
+            _save_results(results, cache_path)
+
+    valid = [result for result in results if result["error"] <= error_target]
+    if not valid:
+        raise pybamm.SolverError(
+            "No solver configuration meets the error target {}".format(error_target)
+        )
+    best = min(valid, key=lambda result: result["time"])
+    pybamm.logger.info(
+        "Fastest configuration is {} with rtol = {}, atol = {} "
+        "(time {}, error {})".format(
+            best["name"], best["rtol"], best["atol"], best["time"], best["error"]
+        )
+    )
+    solver = candidates[best["name"]](best["rtol"], best["atol"])
+    return solver, results
+
+
+def _model_signature(model, t_eval, inputs, candidates, tolerances, reference=None):
+    """
+    Key identifying a model and the autotuning settings, for caching results. The
+    key is the same in every process (and when the model is built again).
+    """
+    if reference is None:
+        reference_parts = ["default reference"]
+    elif isinstance(reference, pybamm.BaseSolver):
+        reference_parts = [
+            "{}.{}".format(type(reference).__module__, type(reference).__qualname__),
+            repr(
+                [
+                    getattr(reference, attr, None)
+                    for attr in ["method", "mode", "rtol", "atol"]
+                ]
+            ),
+        ]
+    else:
+        reference_parts = [
+            np.asarray(reference.t, dtype=float).tobytes(),
+            np.asarray(reference.y, dtype=float).tobytes(),
+        ]
+    events = model.events.items()
+    parts = [
+        model.name,
+        model.concatenated_rhs.content_hash,
+        model.concatenated_algebraic.content_hash,
+        np.asarray(model.concatenated_initial_conditions, dtype=float).tobytes(),
+        repr(sorted((name, event.content_hash) for name, event in events)),
+        model.convert_to_format,
+        np.asarray(t_eval, dtype=float).tobytes(),
+        repr(sorted(inputs.items())),
+        repr(
+            [
+                (name, pybamm.callable_content(make_solver))
+                for name, make_solver in candidates.items()
+            ]
+        ),
+        repr(list(tolerances)),
+        *reference_parts,
+    ]
+    hasher = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode()
+        hasher.update(str(len(part)).encode() + b":" + part)
+    return hasher.hexdigest()
+
+
+def _save_results(results, path):
+    "Store autotuning results on disk (without leaving a partly written file)"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(results, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        pybamm.logger.warning(
+            "Could not store solver autotuning results ({})".format(e)
+        )
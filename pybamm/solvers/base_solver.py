@@ -1,8 +1,11 @@
 #
 # Base solver class
 #
+import copy
+import numbers
 import pybamm
 import numpy as np
+from scipy.sparse import csr_matrix, issparse
 
 
 class BaseSolver(object):
@@ -12,8 +15,9 @@ class BaseSolver(object):
     ----------
     rtol : float, optional
         The relative tolerance for the solver (default is 1e-6).
-    atol : float, optional
-        The absolute tolerance for the solver (default is 1e-6).
+    atol : float or array-like, optional
+        The absolute tolerance for the solver (default is 1e-6). Can also be a vector
+        with one entry per state (see also :meth:`set_atol_by_variable`).
     """
 
     def __init__(self, method=None, rtol=1e-6, atol=1e-6):
@@ -24,6 +28,12 @@ class BaseSolver(object):
 
         self.y_pad = None
         self.y_ext = None
+        # the model (and options) that the solver was last set up for by `solve`, and
+        # the event functions created by that set-up
+        self._set_up_key = None
+        self._set_up_event_funs = None
+        # the type of CasADi graph used by the last CasADi set-up
+        self.casadi_graph = None
 
     @property
     def method(self):
@@ -49,6 +59,31 @@ class BaseSolver(object):
     def atol(self, value):
         self._atol = value
 
+    @property
+    def use_jac_times_vec(self):
+        """
+        Whether the solver may use products of the Jacobian with vectors (e.g. in a
+        Krylov linear solver). The function to calculate them is only created when
+        the solver is set up if it is needed (see :meth:`needs_jac_times_vec`).
+        """
+        return False
+
+    def needs_jac_times_vec(self, jac_sparsity, mass_matrix=None):
+        """
+        Whether the solver uses products of the Jacobian with vectors to solve a model
+        whose Jacobian has the sparsity pattern `jac_sparsity`, in which case a
+        function to calculate them is created when the solver is set up. By default,
+        this is :attr:`use_jac_times_vec`.
+
+        Parameters
+        ----------
+        jac_sparsity : :class:`scipy.sparse.csr_matrix`
+            The sparsity pattern of the Jacobian
+        mass_matrix : :class:`scipy.sparse.csr_matrix`, optional
+            The mass matrix of the model
+        """
+        return self.use_jac_times_vec
+
     def solve(self, model, t_eval, inputs=None):
         """
         Execute the solver setup and calculate the solution of the model at
@@ -80,10 +115,8 @@ class BaseSolver(object):
         timer = pybamm.Timer()
         start_time = timer.time()
         inputs = inputs or {}
-        if model.convert_to_format == "casadi" or isinstance(self, pybamm.CasadiSolver):
-            self.set_up_casadi(model, inputs)
-        else:
-            self.set_up(model, inputs)
+        self.inputs = inputs
+        self.set_up_or_reuse(model, inputs)
         set_up_time = timer.time() - start_time
 
         # Solve
@@ -123,9 +156,13 @@ class BaseSolver(object):
             the step dt. default is 2 (returns the solution at t0 and t0 + dt).
         external_variables : dict
             A dictionary of external variables and their corresponding
-            values at the current time
+            values at the current time. If None and the solver has just been
+            restored from a checkpoint (see :meth:`restore`), the external variables
+            from the checkpoint are used.
         inputs : dict, optional
-            Any input parameters to pass to the model when solving
+            Any input parameters to pass to the model when solving. If None, no
+            inputs are used, unless the solver has just been restored from a
+            checkpoint, in which case the inputs from the checkpoint are used.
 
 
         Raises
@@ -140,13 +177,20 @@ class BaseSolver(object):
 
         # Set timer
         timer = pybamm.Timer()
-        inputs = inputs or {}
+        # Re-use the inputs and external variables from a restored checkpoint if
+        # none are given
+        restored = getattr(self, "_restored", False)
+        self._restored = False
+        if inputs is None:
+            inputs = self.inputs if restored else {}
+        self.inputs = inputs
 
         if not hasattr(self, "y0"):
             # create a y_pad vector of the correct size:
             self.y_pad = np.zeros((model.y_length - model.external_start, 1))
 
-        self.set_external_variables(model, external_variables)
+        if not (restored and external_variables is None and self.y_ext is not None):
+            self.set_external_variables(model, external_variables)
 
         # Run set up on first step
         if not hasattr(self, "y0"):
@@ -204,6 +248,185 @@ class BaseSolver(object):
             )
         return solution
 
+    def set_atol_by_variable(self, variables_with_tols, model):
+        """
+        A method to set the absolute tolerances in the solver by state variable.
+        This method attaches a vector of tolerance to the model. (i.e. model.atol),
+        which is then used by the solver in place of `self.atol` when solving that
+        model. State variables that are not in `variables_with_tols` keep the
+        solver's absolute tolerance.
+
+        Parameters
+        ----------
+        variables_with_tols : dict
+            A dictionary with keys that are strings indicating the variable you
+            wish to set the tolerance of and values that are the tolerances.
+
+        model : :class:`pybamm.BaseModel`
+            The model that is going to be solved.
+        """
+
+        size = model.concatenated_initial_conditions.size
+        atol = self._check_atol_type(self._atol, size).copy()
+        for var, tol in variables_with_tols.items():
+            variable = model.variables[var]
+            if isinstance(variable, pybamm.StateVector):
+                atol = self.set_state_vec_tol(atol, variable, tol)
+            elif isinstance(variable, pybamm.Concatenation):
+                for child in variable.children:
+                    if isinstance(child, pybamm.StateVector):
+                        atol = self.set_state_vec_tol(atol, child, tol)
+                    else:
+                        raise pybamm.SolverError(
+                            """Can only set tolerances for state variables
+                            or concatenations of state variables"""
+                        )
+            else:
+                raise pybamm.SolverError(
+                    """Can only set tolerances for state variables or
+                    concatenations of state variables"""
+                )
+
+        model.atol = atol
+
+    def set_state_vec_tol(self, atol, state_vec, tol):
+        """
+        A method to set the tolerances in the atol vector of a specific
+        state variable. The solver's own tolerances (self._atol) are not modified.
+
+        Parameters
+        ----------
+        atol : :class:`numpy.array`
+            The vector of absolute tolerances, with one entry per state, which is
+            modified in place
+        state_vec : :class:`pybamm.StateVector`
+            The state vector to apply to the tolerance to (all of its slices)
+        tol: float
+            The tolerance value
+
+        Returns
+        -------
+        :class:`numpy.array`
+            The updated vector of absolute tolerances
+        """
+        for y_slice in state_vec.y_slices:
+            atol[y_slice] = tol
+        return atol
+
+    def _check_atol_type(self, atol, size):
+        """
+        This method checks that the atol vector is of the right shape and
+        type.
+
+        Parameters
+        ----------
+        atol: double or np.array or list
+            Absolute tolerances. If this is a vector then each entry corresponds to
+            the absolute tolerance of one entry in the state vector.
+        size: int
+            The length of the atol vector
+        """
+
+        if isinstance(atol, numbers.Number):
+            atol = atol * np.ones(size)
+        elif isinstance(atol, list):
+            atol = np.array(atol)
+        elif isinstance(atol, np.ndarray):
+            atol = atol.flatten()
+        else:
+            raise pybamm.SolverError(
+                "Absolute tolerances must be a numpy array, float, or list"
+            )
+
+        if atol.size != size:
+            raise pybamm.SolverError(
+                """Absolute tolerances must be either a scalar or a numpy arrray
+                of the same shape at y0"""
+            )
+
+        return atol
+
+    def get_atol(self, size, model=None):
+        """
+        Get the vector of absolute tolerances to use when solving a model: the
+        tolerances set by :meth:`set_atol_by_variable` if there are any, and
+        otherwise `self.atol` (a scalar or a vector with one entry per state).
+
+        Parameters
+        ----------
+        size: int
+            The size of the state vector
+        model : :class:`pybamm.BaseModel`, optional
+            The model that is being solved
+
+        Returns
+        -------
+        :class:`numpy.array`
+            The absolute tolerance for each entry of the state vector
+        """
+        atol = getattr(model, "atol", None)
+        if atol is None:
+            atol = self._atol
+        return self._check_atol_type(atol, size)
+
+    def checkpoint(self):
+        """
+        Save the current state of the solver (time, state vector, inputs and
+        external variables) part-way through stepping a
+        model, so that stepping can later be resumed from this point with
+        :meth:`restore`. This allows several branches to be run from a common
+        prefix without re-integrating from t=0.
+
+        Returns
+        -------
+        :class:`pybamm.Checkpoint`
+            The state of the solver
+
+        Raises
+        ------
+        :class:`pybamm.SolverError`
+            If the solver has not yet been used to step a model
+        """
+        if not hasattr(self, "t"):
+            raise pybamm.SolverError("Cannot checkpoint solver before the first step")
+        return pybamm.Checkpoint(self.t, self.y0, self.inputs, self.y_pad, self.y_ext)
+
+    def restore(self, checkpoint):
+        """
+        Restore the state of the solver from a checkpoint (see :meth:`checkpoint`),
+        so that the next call to :meth:`step` continues from the checkpoint. If that
+        call is not given any inputs or external variables, the ones stored in the
+        checkpoint are used. The solver must already have been set up for the same
+        model.
+
+        Parameters
+        ----------
+        checkpoint : :class:`pybamm.Checkpoint`
+            The checkpoint to restore
+
+        Raises
+        ------
+        :class:`pybamm.SolverError`
+            If the solver has not yet been used to step a model, or the checkpoint
+            state vector is the wrong size
+        """
+        if not hasattr(self, "t"):
+            raise pybamm.SolverError(
+                "Cannot restore solver before the first step: the solver must be "
+                "set up for the model first"
+            )
+        if np.size(checkpoint.y) != np.size(self.y0):
+            raise pybamm.SolverError(
+                "Checkpoint state vector has size {}, but solver state vector has "
+                "size {}".format(np.size(checkpoint.y), np.size(self.y0))
+            )
+        self.t = checkpoint.t
+        self.y0 = np.copy(checkpoint.y)
+        self.inputs = copy.copy(checkpoint.inputs)
+        self.y_pad = None if checkpoint.y_pad is None else np.copy(checkpoint.y_pad)
+        self.y_ext = None if checkpoint.y_ext is None else np.copy(checkpoint.y_ext)
+        self._restored = True
+
     def set_external_variables(self, model, external_variables):
         if external_variables is None:
             external_variables = {}
@@ -275,6 +498,280 @@ class BaseSolver(object):
         """
         raise NotImplementedError
 
+    def set_up_or_reuse(self, model, inputs):
+        """
+        Set up the solver for the model (with :meth:`set_up` or :meth:`set_up_casadi`),
+        unless the solver was last set up for the same model, with the same options and
+        input parameters (see :meth:`get_set_up_key`). In that case, only the parts of
+        the set-up that depend on the values of the inputs are updated (see
+        :meth:`reuse_set_up`).
+
+        Parameters
+        ----------
+        model : :class:`pybamm.BaseModel`
+            The model whose solution to calculate. Must have attributes rhs and
+            initial_conditions
+        inputs : dict
+            Any input parameters to pass to the model when solving
+        """
+        set_up_key = self.get_set_up_key(model, inputs)
+        if self._is_set_up_for(set_up_key):
+            # Only the values of the input parameters can have changed, so the
+            # simplified and differentiated model can be reused as it is
+            pybamm.logger.info("Reuse solver set-up for {}".format(model.name))
+            self.reuse_set_up(model, inputs)
+        elif model.convert_to_format == "casadi" or isinstance(
+            self, pybamm.CasadiSolver
+        ):
+            self.set_up_casadi(model, inputs)
+        else:
+            self.set_up(model, inputs)
+        self._set_up_event_funs = getattr(self, "event_funs", None)
+        if self._set_up_event_funs is None:
+            self._set_up_key = None
+        else:
+            self._set_up_key = set_up_key
+
+    def get_set_up_key(self, model, inputs):
+        """
+        Returns what the set-up of the solver depends on: the (discretised) model
+        equations and events, the options of the model, and the names (but not the
+        values) of the input parameters. If these have not changed since the last
+        set-up, the solver does not need to simplify, differentiate and convert the
+        model again, e.g. when the same model is solved for different values of its
+        input parameters.
+
+        The expressions are compared by identity rather than by id, as updating the
+        parameters of a discretised model (see
+        :meth:`pybamm.ParameterValues.update_model`) changes its expressions in place
+        but creates new concatenated equations.
+
+        Parameters
+        ----------
+        model : :class:`pybamm.BaseModel`
+            The model to solve
+        inputs : dict
+            Any input parameters to pass to the model when solving
+
+        Returns
+        -------
+        tuple
+            The expressions, and the options of the set-up
+        """
+        symbols = (
+            model,
+            model.concatenated_rhs,
+            model.concatenated_algebraic,
+            *model.events.values(),
+        )
+        options = (
+            model.convert_to_format,
+            model.use_simplify,
+            model.use_jacobian,
+            getattr(model, "compile_casadi", False),
+            getattr(model, "casadi_graph", "auto"),
+            tuple(model.events.keys()),
+            tuple(inputs.keys()),
+            None if self.y_pad is None else len(self.y_pad),
+            self.use_jac_times_vec,
+        )
+        return symbols, options
+
+    def _is_set_up_for(self, set_up_key):
+        "Whether the solver is already set up for the given set-up key"
+        # The event functions are created again by each set-up, so they also tell
+        # whether the solver has been set up for something else since (e.g. by
+        # `step`)
+        if (
+            self._set_up_key is None
+            or getattr(self, "event_funs", None) is not self._set_up_event_funs
+        ):
+            return False
+        symbols, options = set_up_key
+        old_symbols, old_options = self._set_up_key
+        return (
+            options == old_options
+            and len(symbols) == len(old_symbols)
+            and all(new is old for new, old in zip(symbols, old_symbols))
+        )
+
+    def reuse_set_up(self, model, inputs=None):
+        """
+        Update the parts of the set-up that depend on the values of the input
+        parameters (e.g. the initial conditions), when the rest of the set-up is
+        reused for a new solve.
+
+        Parameters
+        ----------
+        model : :class:`pybamm.BaseModel`
+            The model whose solution to calculate. Must have attributes rhs and
+            initial_conditions
+        inputs : dict, optional
+            Any input parameters to pass to the model when solving
+
+        """
+        raise NotImplementedError
+
+    def get_casadi_graph(self, model):
+        """
+        Find the type of CasADi graph ("MX", "SX" or "expand") to convert the model
+        to: `model.casadi_graph`, or, if it is "auto", the type chosen from the
+        operations in the model (see :func:`pybamm.choose_casadi_graph`). The choice
+        is logged, and stored as `casadi_graph`.
+
+        Parameters
+        ----------
+        model : :class:`pybamm.BaseModel`
+            The model being solved
+
+        Returns
+        -------
+        str
+            The type of CasADi graph
+        """
+        graph = getattr(model, "casadi_graph", "auto")
+        if graph == "auto":
+            graph = pybamm.choose_casadi_graph(
+                [
+                    model.concatenated_rhs,
+                    model.concatenated_algebraic,
+                    *model.events.values(),
+                ],
+                np.size(model.concatenated_initial_conditions),
+            )
+            pybamm.logger.info(
+                "Using CasADi {} graph (chosen automatically)".format(graph)
+            )
+        elif graph in ["MX", "SX", "expand"]:
+            pybamm.logger.info("Using CasADi {} graph".format(graph))
+        else:
+            raise ValueError(
+                "CasADi graph '{}' not recognised: must be 'auto', 'MX', 'SX' or "
+                "'expand'".format(graph)
+            )
+        self.casadi_graph = graph
+        return graph
+
+    def compile_casadi(self, model, function):
+        """
+        Prepare a CasADi function for evaluation: expand it into an SX function if
+        the last CasADi set-up uses an "expand" graph (see :meth:`get_casadi_graph`),
+        and compile it into a shared library if `model.compile_casadi` is True (see
+        :func:`pybamm.compile_casadi_function`). The CasADi solver builds its
+        integrators from the symbolic functions, so its functions are never compiled.
+
+        Parameters
+        ----------
+        model : :class:`pybamm.BaseModel`
+            The model being solved
+        function : :class:`casadi.Function`
+            The function to compile
+        """
+        if self.casadi_graph == "expand":
+            function = function.expand()
+        if model.compile_casadi and not isinstance(self, pybamm.CasadiSolver):
+            return pybamm.compile_casadi_function(function)
+        return function
+
+    def jac_times_vec_evaluator(self, model, symbol, n_states):
+        """
+        Create an evaluator for the product of the Jacobian of a (discretised) symbol
+        with respect to the state vector with a vector v, without forming the
+        Jacobian (see :class:`pybamm.JacobianVectorProduct`). The evaluator must be
+        called with the state vector (including any external variables) stacked on
+        top of v.
+
+        Parameters
+        ----------
+        model : :class:`pybamm.BaseModel`
+            The model being solved
+        symbol : :class:`pybamm.Symbol`
+            The symbol whose Jacobian-vector product to calculate
+        n_states : int
+            The number of states
+
+        Returns
+        -------
+        :class:`pybamm.EvaluatorPython` or :class:`pybamm.EvaluatorFlat`
+            The evaluator, or None if the Jacobian-vector product of the symbol could
+            not be calculated
+        """
+        offset = n_states + (0 if self.y_pad is None else len(self.y_pad))
+        y = pybamm.StateVector(slice(0, n_states))
+        try:
+            jvp = pybamm.JacobianVectorProduct(offset).jvp(symbol, y)
+        except NotImplementedError as e:
+            pybamm.logger.warning(
+                "Could not calculate jacobian-vector product ({})".format(e)
+            )
+            return None
+        if model.use_simplify:
+            jvp = pybamm.Simplification().simplify(jvp)
+        if model.convert_to_format == "python":
+            return pybamm.EvaluatorPython(jvp)
+        return pybamm.EvaluatorFlat(jvp)
+
+    def jacobian_sparsity(self, symbol, y0, inputs=None, jac=None):
+        """
+        Find the sparsity pattern of the Jacobian of a (discretised) symbol with
+        respect to the state vector. The pattern is propagated through the tree of
+        the symbol (see :class:`pybamm.Jacobian`), without calculating the Jacobian
+        itself. If that is not possible for some of the symbols in the tree, the
+        symbolic Jacobian is evaluated at a random state instead.
+
+        Parameters
+        ----------
+        symbol : :class:`pybamm.Symbol`
+            The symbol whose Jacobian sparsity pattern to find
+        y0 : :class:`numpy.array`
+            The initial conditions, used to find the size of the state vector
+        inputs : dict, optional
+            Any input parameters to pass to the model when solving
+        jac : :class:`pybamm.Symbol`, optional
+            The Jacobian of the symbol, if it has already been calculated
+
+        Returns
+        -------
+        :class:`scipy.sparse.csr_matrix`
+            Matrix with ones where the Jacobian may be nonzero, or None if the
+            Jacobian of the symbol could not be calculated
+        """
+        y = pybamm.StateVector(slice(0, np.size(y0)))
+        try:
+            structure = pybamm.Jacobian(structure=True).jac(symbol, y)
+        except (NotImplementedError, ValueError) as e:
+            pybamm.logger.debug(
+                "Could not find jacobian structure ({}), evaluating the "
+                "jacobian instead".format(e)
+            )
+        else:
+            return csr_matrix(structure, dtype=float)
+
+        y_random = np.random.random(size=np.size(y0))[:, np.newaxis]
+        y_random = add_external(y_random, self.y_pad, self.y_ext)
+        try:
+            if jac is None:
+                jac = pybamm.Jacobian().jac(symbol, y)
+            jac_eval = jac.evaluate(0, y_random, inputs or {})
+        except (
+            NotImplementedError,
+            TypeError,
+            ValueError,
+            pybamm.UndefinedOperationError,
+        ) as e:
+            pybamm.logger.warning(
+                "Could not calculate jacobian sparsity pattern ({})".format(e)
+            )
+            return None
+        if issparse(jac_eval) or isinstance(jac_eval, np.ndarray):
+            sparsity = csr_matrix(jac_eval)
+        else:
+            # Jacobian evaluates to a scalar zero
+            n_rows = np.size(symbol.evaluate(0, y_random, inputs or {}))
+            sparsity = csr_matrix((n_rows, np.size(y0)))
+        sparsity.data = np.ones_like(sparsity.data)
+        return sparsity
+
     def get_termination_reason(self, solution, events):
         """
         Identify the cause for termination. In particular, if the solver terminated
@@ -288,17 +785,19 @@ class BaseSolver(object):
         solution : :class:`pybamm.Solution`
             The solution object
         events : dict
-            Dictionary of events
+            Dictionary of events (expression trees or evaluators, such as
+            :class:`pybamm.EvaluatorFlat`)
         """
         if solution.termination == "final time":
             return "the solver successfully reached the end of the integration interval"
         elif solution.termination == "event":
             # Get final event value
+            inputs = getattr(self, "inputs", None) or {}
+            y_event = add_external(solution.y_event, self.y_pad, self.y_ext)
             final_event_values = {}
             for name, event in events.items():
-                y_event = add_external(solution.y_event, self.y_pad, self.y_ext)
                 final_event_values[name] = abs(
-                    event.evaluate(solution.t_event, y_event)
+                    event.evaluate(solution.t_event, y_event, inputs)
                 )
             termination_event = min(final_event_values, key=final_event_values.get)
             # Add the event to the solution object
@@ -314,3 +813,25 @@ def add_external(y, y_pad, y_ext):
     if y_pad is not None and y_ext is not None:
         y = np.concatenate([y, y_pad]) + y_ext
     return y
+
+
+def get_bandwidth(sparsity):
+    """
+    Find the lower and upper bandwidths of a matrix, i.e. the largest distance
+    below and above the diagonal of any nonzero entry
+
+    Parameters
+    ----------
+    sparsity : :class:`scipy.sparse.spmatrix`
+        The matrix (or its sparsity pattern)
+
+    Returns
+    -------
+    lband, uband : int
+        The lower and upper bandwidths
+    """
+    sparsity = sparsity.tocoo()
+    if sparsity.nnz == 0:
+        return 0, 0
+    offsets = sparsity.row - sparsity.col
+    return int(max(np.max(offsets), 0)), int(max(-np.min(offsets), 0))
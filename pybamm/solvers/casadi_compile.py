@@ -0,0 +1,100 @@
+#
+# Compile CasADi functions to shared libraries
+#
+import pybamm
+import casadi
+import hashlib
+import os
+import subprocess
+
+# Default directory for the generated code and compiled libraries
+CASADI_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "pybamm", "casadi")
+
+
+def compile_casadi_function(function, cache_dir=None, compiler=None, flags=None):
+    """
+    Generate C code for a CasADi function, compile it into a shared library with the
+    local C compiler, and load the library as a CasADi function (with
+    :func:`casadi.external`). The compiled function gives the same results as the
+    original one, but is much faster to evaluate than a function that is interpreted
+    at run time.
+
+    Compiling can take a while for large models, so the libraries are cached in
+    `cache_dir`, named after a hash of the generated code (and the compiler flags),
+    and are reloaded instead of being compiled again when the same function is
+    compiled later, even in another session.
+
+    If the code cannot be generated or compiled (e.g. if there is no C compiler), a
+    warning is logged and the original function is returned.
+
+    Parameters
+    ----------
+    function : :class:`casadi.Function`
+        The function to compile
+    cache_dir : str, optional
+        The directory in which to store the generated code and compiled libraries.
+        Default is "~/.cache/pybamm/casadi".
+    compiler : str, optional
+        The C compiler to use. Default is the "CC" environment variable, or "cc"
+        if it is not set.
+    flags : list of str, optional
+        Flags to pass to the compiler (on top of the ones needed to build a shared
+        library). Default is ["-O1"], which gives most of the speed-up while
+        keeping the compilation time reasonable for large models.
+
+    Returns
+    -------
+    :class:`casadi.Function`
+        The compiled function
+    """
+    cache_dir = cache_dir or CASADI_CACHE_DIR
+    compiler = compiler or os.environ.get("CC", "cc")
+    if flags is None:
+        flags = ["-O1"]
+
+    try:
+        generator = casadi.CodeGenerator(function.name() + ".c")
+        generator.add(function)
+        source = generator.dump()
+    except RuntimeError as e:
+        pybamm.logger.warning(
+            "Could not generate code for CasADi function '{}' ({})".format(
+                function.name(), e
+            )
+        )
+        return function
+
+    key = hashlib.sha1(
+        (source + " ".join([compiler] + flags)).encode()
+    ).hexdigest()
+    library = os.path.join(cache_dir, "pybamm_casadi_{}.so".format(key))
+    if not os.path.exists(library):
+        pybamm.logger.info(
+            "Compiling CasADi function '{}' to {}".format(function.name(), library)
+        )
+        os.makedirs(cache_dir, exist_ok=True)
+        source_file = library[: -len(".so")] + ".c"
+        with open(source_file, "w") as f:
+            f.write(source)
+        # compile to a temporary file first, so that other processes never load a
+        # partially written library
+        temporary_library = "{}.{}.tmp".format(library, os.getpid())
+        try:
+            subprocess.run(
+                [compiler, "-fPIC", "-shared"]
+                + flags
+                + [source_file, "-o", temporary_library],
+                check=True,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+        except (OSError, subprocess.CalledProcessError) as e:
+            pybamm.logger.warning(
+                "Could not compile CasADi function '{}' ({})".format(
+                    function.name(), getattr(e, "stderr", None) or e
+                )
+            )
+            return function
+        os.replace(temporary_library, library)
+
+    return casadi.external(function.name(), library)
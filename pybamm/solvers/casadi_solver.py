@@ -26,8 +26,10 @@ class CasadiSolver(pybamm.DaeSolver):
             been triggered. Recommended for simulations of a full charge or discharge.
     rtol : float, optional
         The relative tolerance for the solver (default is 1e-6).
-    atol : float, optional
-        The absolute tolerance for the solver (default is 1e-6).
+    atol : float or array-like, optional
+        The absolute tolerance for the solver (default is 1e-6). If the tolerances
+        differ between states, the states are scaled by their tolerances so that
+        CasADi can be given a single absolute tolerance.
     root_method : str, optional
         The method to use for finding consistend initial conditions. Default is 'lm'.
     root_tol : float, optional
@@ -93,16 +95,18 @@ class CasadiSolver(pybamm.DaeSolver):
         """
         if self.mode == "fast":
             # Solve model normally by calling the solve method from parent class
-            return super().solve(model, t_eval)
+            return super().solve(model, t_eval, inputs=inputs)
         elif model.events == {}:
             pybamm.logger.info("No events found, running fast mode")
             # Solve model normally by calling the solve method from parent class
-            return super().solve(model, t_eval)
+            return super().solve(model, t_eval, inputs=inputs)
         elif self.mode == "safe":
             # Step-and-check
             timer = pybamm.Timer()
             inputs = inputs or {}
-            self.set_up_casadi(model, inputs)
+            self.inputs = inputs
+            self.set_up_or_reuse(model, inputs)
+            self.set_inputs_and_external(inputs)
             set_up_time = timer.time()
             init_event_signs = np.sign(
                 np.concatenate([event(0, self.y0) for event in self.event_funs])
@@ -122,7 +126,7 @@ class CasadiSolver(pybamm.DaeSolver):
                     # different to t_eval, but shouldn't matter too much as it should
                     # only happen near events.
                     try:
-                        current_step_sol = self.step(model, dt)
+                        current_step_sol = self.step(model, dt, inputs=inputs)
                         solved = True
                     except pybamm.SolverError:
                         dt /= 2
@@ -205,6 +209,7 @@ class CasadiSolver(pybamm.DaeSolver):
             t_eval,
             inputs,
             mass_matrix=model.mass_matrix.entries,
+            model=model,
         )
         solve_time = timer.time() - solve_start_time
 
@@ -214,7 +219,7 @@ class CasadiSolver(pybamm.DaeSolver):
         return solution, solve_time, termination
 
     def integrate_casadi(
-        self, rhs, algebraic, y0, t_eval, inputs=None, mass_matrix=None
+        self, rhs, algebraic, y0, t_eval, inputs=None, mass_matrix=None, model=None
     ):
         """
         Solve a DAE model defined by residuals with initial conditions y0.
@@ -234,12 +239,26 @@ class CasadiSolver(pybamm.DaeSolver):
             The (sparse) mass matrix for the chosen spatial method. This is only passed
             to check that the mass matrix is diagonal with 1s for the odes and 0s for
             the algebraic equations, as CasADi does not allow to pass mass matrices.
+        model : :class:`pybamm.BaseModel`, optional
+            The model whose solution to calculate, used to find the absolute
+            tolerances (see :meth:`pybamm.BaseSolver.get_atol`)
         """
         inputs = inputs or {}
+        atol = self.get_atol(y0.size, model)
+        if np.all(atol == atol[0]):
+            abstol = atol[0]
+            scale = None
+        else:
+            # CasADi only accepts a scalar absolute tolerance, so integrate the
+            # scaled states y / atol with unit absolute tolerance. The error test
+            # |e / atol| <= rtol * |y / atol| + 1 is then exactly the test
+            # |e| <= rtol * |y| + atol for each state
+            abstol = 1
+            scale = atol
         options = {
             "grid": t_eval,
             "reltol": self.rtol,
-            "abstol": self.atol,
+            "abstol": abstol,
             "output_t0": True,
             "max_num_steps": self.max_steps,
         }
@@ -251,19 +270,40 @@ class CasadiSolver(pybamm.DaeSolver):
         t = casadi.MX.sym("t")
         u = casadi.vertcat(*[x for x in inputs.values()])
         y_diff = casadi.MX.sym("y_diff", rhs(0, y0, u).shape[0])
+        n_diff = y_diff.shape[0]
+        if scale is None:
+            y_diff_unscaled = y_diff
+        else:
+            y_diff_unscaled = scale[:n_diff] * y_diff
         problem = {"t": t, "x": y_diff}
         if algebraic is None:
-            problem.update({"ode": rhs(t, y_diff, u)})
+            ode = rhs(t, y_diff_unscaled, u)
         else:
             y_alg = casadi.MX.sym("y_alg", algebraic(0, y0, u).shape[0])
-            y = casadi.vertcat(y_diff, y_alg)
-            problem.update({"z": y_alg, "ode": rhs(t, y, u), "alg": algebraic(t, y, u)})
+            if scale is None:
+                y_alg_unscaled = y_alg
+            else:
+                y_alg_unscaled = scale[n_diff:] * y_alg
+            y = casadi.vertcat(y_diff_unscaled, y_alg_unscaled)
+            ode = rhs(t, y, u)
+            alg = algebraic(t, y, u)
+            if scale is not None:
+                # scale the algebraic equations consistently with their states
+                alg = alg / scale[n_diff:]
+            problem.update({"z": y_alg, "alg": alg})
+        if scale is not None:
+            ode = ode / scale[:n_diff]
+        problem["ode"] = ode
         integrator = casadi.integrator("F", self.method, problem, options)
         try:
             # Try solving
-            y0_diff, y0_alg = np.split(y0, [y_diff.shape[0]])
+            if scale is not None:
+                y0 = y0 / scale
+            y0_diff, y0_alg = np.split(y0, [n_diff])
             sol = integrator(x0=y0_diff, z0=y0_alg)
             y_values = np.concatenate([sol["xf"].full(), sol["zf"].full()])
+            if scale is not None:
+                y_values = scale[:, np.newaxis] * y_values
             return pybamm.Solution(t_eval, y_values, None, None, "final time")
         except RuntimeError as e:
             # If it doesn't work raise error
@@ -0,0 +1,38 @@
+#
+# Checkpoint class
+#
+import copy
+import numpy as np
+
+
+class Checkpoint(object):
+    """
+    Class containing the state of a solver (and optionally a simulation) part-way
+    through stepping a model, so that stepping can later be resumed from that point
+    (see :meth:`pybamm.BaseSolver.checkpoint` and
+    :meth:`pybamm.BaseSolver.restore`).
+
+    Parameters
+    ----------
+    t : float
+        The time at the checkpoint
+    y : :class:`numpy.array`, size (m,)
+        The state vector at the checkpoint (without any external variables)
+    inputs : dict
+        The input parameters used for the last step before the checkpoint
+    y_pad : :class:`numpy.array`
+        The padding used to add external variables to the state vector
+    y_ext : :class:`numpy.array`
+        The values of the external variables at the checkpoint
+    solution : :class:`pybamm.Solution`, optional
+        The solution up to the checkpoint (used by
+        :meth:`pybamm.Simulation.checkpoint`)
+    """
+
+    def __init__(self, t, y, inputs, y_pad, y_ext, solution=None):
+        self.t = t
+        self.y = np.copy(y)
+        self.inputs = copy.copy(inputs)
+        self.y_pad = None if y_pad is None else np.copy(y_pad)
+        self.y_ext = None if y_ext is None else np.copy(y_ext)
+        self.solution = solution
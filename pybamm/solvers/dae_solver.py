@@ -5,9 +5,14 @@ import casadi
 import pybamm
 import numpy as np
 from scipy import optimize
-from scipy.sparse import issparse
+from scipy.sparse import csr_matrix, issparse, vstack
 
 from .base_solver import add_external
+from .solver_callables import (
+    SolverCallable,
+    JacobianTimesVector,
+    JacobianTimesVectorCasadi,
+)
 
 
 class DaeSolver(pybamm.BaseSolver):
@@ -95,6 +100,8 @@ class DaeSolver(pybamm.BaseSolver):
             mass_matrix=model.mass_matrix.entries,
             jacobian=self.jacobian,
             model=model,
+            jac_sparsity=self.jac_sparsity,
+            jac_times_vec=self.jac_times_vec,
         )
 
         solve_time = timer.time() - solve_start_time
@@ -133,7 +140,28 @@ class DaeSolver(pybamm.BaseSolver):
             pybamm.logger.info("Simplifying events")
             events = {name: simp.simplify(event) for name, event in events.items()}
 
-        if model.use_jacobian:
+        y0_guess = model.concatenated_initial_conditions[:, 0]
+        if model.use_jacobian and model.convert_to_format == "numba":
+            # The numba kernels calculate the jacobians themselves, so the symbolic
+            # jacobians are not needed
+            pybamm.logger.info("Calculating jacobian sparsity pattern")
+            jac_sparsity = self.dae_jacobian_sparsity(
+                concatenated_rhs, concatenated_algebraic, y0_guess, inputs
+            )
+            pybamm.logger.info("Compiling jacobian with numba")
+            n_states = np.size(model.concatenated_initial_conditions)
+            jac_algebraic = pybamm.EvaluatorNumba(
+                concatenated_algebraic, n_states=n_states
+            )
+            jac = pybamm.EvaluatorNumba(
+                pybamm.NumpyConcatenation(concatenated_rhs, concatenated_algebraic),
+                n_states=n_states,
+            )
+            jacobian = Jacobian(jac.evaluate)
+            jacobian_alg = JacobianAlgebraic(jac_algebraic.evaluate)
+            jacobian_alg.set_pad_ext(self.y_pad, self.y_ext)
+            jacobian_alg.set_inputs(inputs)
+        elif model.use_jacobian:
             # Create Jacobian from concatenated rhs and algebraic
             y = pybamm.StateVector(
                 slice(0, np.size(model.concatenated_initial_conditions))
@@ -148,6 +176,16 @@ class DaeSolver(pybamm.BaseSolver):
             model.jacobian_rhs = jac_rhs
             model.jacobian_algebraic = jac_algebraic
 
+            pybamm.logger.info("Calculating jacobian sparsity pattern")
+            jac_sparsity = self.dae_jacobian_sparsity(
+                concatenated_rhs,
+                concatenated_algebraic,
+                y0_guess,
+                inputs,
+                jac_rhs=jac_rhs,
+                jac_algebraic=jac_algebraic,
+            )
+
             if model.use_simplify:
                 pybamm.logger.info("Simplifying jacobian")
                 jac_algebraic = simp.simplify(jac_algebraic)
@@ -157,6 +195,9 @@ class DaeSolver(pybamm.BaseSolver):
                 pybamm.logger.info("Converting jacobian to python")
                 jac_algebraic = pybamm.EvaluatorPython(jac_algebraic)
                 jac = pybamm.EvaluatorPython(jac)
+            else:
+                jac_algebraic = pybamm.EvaluatorFlat(jac_algebraic)
+                jac = pybamm.EvaluatorFlat(jac)
 
             jacobian = Jacobian(jac.evaluate)
             jacobian_alg = JacobianAlgebraic(jac_algebraic.evaluate)
@@ -166,6 +207,25 @@ class DaeSolver(pybamm.BaseSolver):
         else:
             jacobian = None
             jacobian_alg = None
+            pybamm.logger.info("Calculating jacobian sparsity pattern")
+            jac_sparsity = self.dae_jacobian_sparsity(
+                concatenated_rhs, concatenated_algebraic, y0_guess, inputs
+            )
+
+        # Only create the jacobian-vector product if the solver uses it for this model
+        if model.use_jacobian and self.needs_jac_times_vec(
+            jac_sparsity, model.mass_matrix.entries
+        ):
+            pybamm.logger.info("Calculating jacobian-vector product")
+            jac_times_vec = self.jac_times_vec_evaluator(
+                model,
+                pybamm.NumpyConcatenation(concatenated_rhs, concatenated_algebraic),
+                np.size(y0_guess),
+            )
+        else:
+            jac_times_vec = None
+        if jac_times_vec is not None:
+            jac_times_vec = JacobianTimesVector(jac_times_vec.evaluate)
 
         if model.convert_to_format == "python":
             pybamm.logger.info("Converting RHS to python")
@@ -176,6 +236,27 @@ class DaeSolver(pybamm.BaseSolver):
             events = {
                 name: pybamm.EvaluatorPython(event) for name, event in events.items()
             }
+        elif model.convert_to_format == "numba":
+            pybamm.logger.info("Compiling RHS with numba")
+            concatenated_rhs = pybamm.EvaluatorNumba(concatenated_rhs)
+            pybamm.logger.info("Compiling algebraic with numba")
+            concatenated_algebraic = pybamm.EvaluatorNumba(concatenated_algebraic)
+            pybamm.logger.info("Compiling events with numba")
+            events = {
+                name: pybamm.EvaluatorNumba(event) for name, event in events.items()
+            }
+        else:
+            # Compile the expression trees to avoid recursion at each evaluation. The
+            # rhs, algebraic equations and events are compiled together, so that the
+            # nodes they share are only computed once at each point
+            evaluator = pybamm.EvaluatorFlat(
+                [concatenated_rhs, concatenated_algebraic, *events.values()]
+            )
+            concatenated_rhs = evaluator.output(0)
+            concatenated_algebraic = evaluator.output(1)
+            events = {
+                name: evaluator.output(idx + 2) for idx, name in enumerate(events)
+            }
 
         # Calculate consistent initial conditions for the algebraic equations
         rhs = Rhs(concatenated_rhs.evaluate)
@@ -188,14 +269,11 @@ class DaeSolver(pybamm.BaseSolver):
 
         if len(model.algebraic) > 0:
             y0 = self.calculate_consistent_initial_conditions(
-                rhs,
-                algebraic,
-                model.concatenated_initial_conditions[:, 0],
-                jacobian_alg,
+                rhs, algebraic, y0_guess, jacobian_alg
             )
         else:
             # can use DAE solver to solve ODE model
-            y0 = model.concatenated_initial_conditions[:, 0]
+            y0 = y0_guess
 
         # Create event-dependent function to evaluate events
         def get_event_class(event):
@@ -214,9 +292,28 @@ class DaeSolver(pybamm.BaseSolver):
         self.events = events
         self.event_funs = [get_event_class(event) for event in events.values()]
         self.jacobian = jacobian
+        self.jacobian_algebraic = jacobian_alg
+        self.jac_sparsity = jac_sparsity
+        self.jac_times_vec = jac_times_vec
 
         pybamm.logger.info("Finish solver set-up")
 
+    def reuse_set_up(self, model, inputs=None):
+        """ See :meth:`pybamm.BaseSolver.reuse_set_up()`. """
+        inputs = inputs or {}
+        self.set_inputs_and_external(inputs)
+        y0_guess = model.concatenated_initial_conditions[:, 0]
+        if len(model.algebraic) > 0:
+            # The consistent initial conditions depend on the inputs
+            if self.jacobian_algebraic is not None:
+                self.jacobian_algebraic.set_pad_ext(self.y_pad, self.y_ext)
+                self.jacobian_algebraic.set_inputs(inputs)
+            self.y0 = self.calculate_consistent_initial_conditions(
+                self.rhs, self.algebraic, y0_guess, self.jacobian_algebraic
+            )
+        else:
+            self.y0 = y0_guess
+
     def set_up_casadi(self, model, inputs=None):
         """Convert model to casadi format and use their inbuilt functionalities.
 
@@ -233,36 +330,42 @@ class DaeSolver(pybamm.BaseSolver):
 
         # Convert model attributes to casadi
         pybamm.logger.info("Start converting model to CasADi")
-        t_casadi = casadi.MX.sym("t")
+        # Convert to SX graphs, or to MX graphs (which may then be expanded)
+        casadi_type = casadi.SX if self.get_casadi_graph(model) == "SX" else casadi.MX
+        t_casadi = casadi_type.sym("t")
         y0 = model.concatenated_initial_conditions
         y0 = add_external(y0, self.y_pad, self.y_ext)
 
-        y_diff = casadi.MX.sym(
+        y_diff = casadi_type.sym(
             "y_diff", len(model.concatenated_rhs.evaluate(0, y0, inputs))
         )
-        y_alg = casadi.MX.sym(
+        y_alg = casadi_type.sym(
             "y_alg", len(model.concatenated_algebraic.evaluate(0, y0, inputs))
         )
         y_casadi = casadi.vertcat(y_diff, y_alg)
         if self.y_pad is not None:
-            y_ext = casadi.MX.sym("y_ext", len(self.y_pad))
+            y_ext = casadi_type.sym("y_ext", len(self.y_pad))
             y_casadi_w_ext = casadi.vertcat(y_casadi, y_ext)
         else:
             y_casadi_w_ext = y_casadi
-        u_casadi = {name: casadi.MX.sym(name) for name in inputs.keys()}
+        u_casadi = {name: casadi_type.sym(name) for name in inputs.keys()}
 
+        # Use the same converter for the rhs, algebraic equations and events, so
+        # that the subtrees they share are converted to the same CasADi expressions
+        # and are only computed once by the functions that combine them
+        converter = pybamm.CasadiConverter()
         pybamm.logger.info("Converting RHS to CasADi")
-        concatenated_rhs = model.concatenated_rhs.to_casadi(
-            t_casadi, y_casadi_w_ext, u_casadi
+        concatenated_rhs = converter.convert(
+            model.concatenated_rhs, t_casadi, y_casadi_w_ext, u_casadi
         )
         pybamm.logger.info("Converting algebraic to CasADi")
-        concatenated_algebraic = model.concatenated_algebraic.to_casadi(
-            t_casadi, y_casadi_w_ext, u_casadi
+        concatenated_algebraic = converter.convert(
+            model.concatenated_algebraic, t_casadi, y_casadi_w_ext, u_casadi
         )
         all_states = casadi.vertcat(concatenated_rhs, concatenated_algebraic)
         pybamm.logger.info("Converting events to CasADi")
         casadi_events = {
-            name: event.to_casadi(t_casadi, y_casadi_w_ext, u_casadi)
+            name: converter.convert(event, t_casadi, y_casadi_w_ext, u_casadi)
             for name, event in model.events.items()
         }
 
@@ -294,8 +397,10 @@ class DaeSolver(pybamm.BaseSolver):
                 [casadi_jac_alg],
             )
 
-            jacobian = JacobianCasadi(casadi_jac_fn)
-            jacobian_alg = JacobianAlgebraicCasadi(casadi_jac_alg_fn)
+            jacobian = JacobianCasadi(self.compile_casadi(model, casadi_jac_fn))
+            jacobian_alg = JacobianAlgebraicCasadi(
+                self.compile_casadi(model, casadi_jac_alg_fn)
+            )
             jacobian_alg.set_pad_ext(self.y_pad, self.y_ext)
             jacobian_alg.set_inputs(inputs)
 
@@ -303,8 +408,38 @@ class DaeSolver(pybamm.BaseSolver):
             jacobian = None
             jacobian_alg = None
 
-        rhs = RhsCasadi(concatenated_rhs_fn)
-        algebraic = AlgebraicCasadi(concatenated_algebraic_fn)
+        # CasADi can find the structural sparsity of the Jacobian directly
+        pybamm.logger.info("Calculating jacobian sparsity pattern")
+        sparsity = casadi.jacobian_sparsity(all_states, y_casadi)
+        rows, cols = sparsity.get_triplet()
+        jac_sparsity = csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=sparsity.shape
+        )
+
+        # Create function to evaluate jacobian-vector products, which CasADi
+        # calculates by forward-mode differentiation without forming the jacobian,
+        # if the solver uses them for this model
+        if model.use_jacobian and self.needs_jac_times_vec(
+            jac_sparsity, model.mass_matrix.entries
+        ):
+            pybamm.logger.info("Calculating jacobian-vector product")
+            v_casadi = casadi_type.sym("v", y_casadi.shape[0])
+            casadi_jtimes = casadi.jtimes(all_states, y_casadi, v_casadi)
+            casadi_jtimes_fn = casadi.Function(
+                "jtimes",
+                [t_casadi, y_casadi_w_ext, u_casadi_stacked, v_casadi],
+                [casadi_jtimes],
+            )
+            jac_times_vec = JacobianTimesVectorCasadi(
+                self.compile_casadi(model, casadi_jtimes_fn)
+            )
+        else:
+            jac_times_vec = None
+
+        rhs = RhsCasadi(self.compile_casadi(model, concatenated_rhs_fn))
+        algebraic = AlgebraicCasadi(
+            self.compile_casadi(model, concatenated_algebraic_fn)
+        )
 
         rhs.set_pad_ext(self.y_pad, self.y_ext)
         rhs.set_inputs(inputs)
@@ -327,7 +462,7 @@ class DaeSolver(pybamm.BaseSolver):
             casadi_event_fn = casadi.Function(
                 "event", [t_casadi, y_casadi_w_ext, u_casadi_stacked], [event]
             )
-            return EvalEventCasadi(casadi_event_fn)
+            return EvalEventCasadi(self.compile_casadi(model, casadi_event_fn))
 
         # Add the solver attributes
         # Note: these are the converted to casadi versions of rhs, algebraic
@@ -335,24 +470,79 @@ class DaeSolver(pybamm.BaseSolver):
         self.y0 = y0
         self.rhs = rhs
         self.algebraic = algebraic
-        self.residuals = ResidualsCasadi(model, all_states_fn)
-        self.events = model.events
+        self.residuals = ResidualsCasadi(
+            model, self.compile_casadi(model, all_states_fn)
+        )
+        self.events = {
+            name: pybamm.EvaluatorFlat(event) for name, event in model.events.items()
+        }
         self.event_funs = [get_event_class(event) for event in casadi_events.values()]
         self.jacobian = jacobian
+        self.jacobian_algebraic = jacobian_alg
+        self.jac_sparsity = jac_sparsity
+        self.jac_times_vec = jac_times_vec
 
         # Save CasADi functions for the CasADi solver
         # Note: when we pass to casadi the ode part of the problem must be in explicit
         # form so we pre-multiply by the inverse of the mass matrix
         if isinstance(self, pybamm.CasadiSolver):
-            mass_matrix_inv = casadi.MX(model.mass_matrix_inv.entries)
+            if model.compile_casadi:
+                pybamm.logger.warning(
+                    "The CasADi solver does not use compiled functions: "
+                    "'compile_casadi' has no effect"
+                )
+            mass_matrix_inv = casadi_type(model.mass_matrix_inv.entries)
             explicit_rhs = mass_matrix_inv @ concatenated_rhs
-            self.casadi_rhs = casadi.Function(
-                "rhs", [t_casadi, y_casadi_w_ext, u_casadi_stacked], [explicit_rhs]
+            self.casadi_rhs = self.compile_casadi(
+                model,
+                casadi.Function(
+                    "rhs", [t_casadi, y_casadi_w_ext, u_casadi_stacked], [explicit_rhs]
+                ),
+            )
+            self.casadi_algebraic = self.compile_casadi(
+                model, concatenated_algebraic_fn
             )
-            self.casadi_algebraic = concatenated_algebraic_fn
 
         pybamm.logger.info("Finish solver set-up")
 
+    def dae_jacobian_sparsity(
+        self, rhs, algebraic, y0, inputs=None, jac_rhs=None, jac_algebraic=None
+    ):
+        """
+        Find the sparsity pattern of the Jacobian of the stacked rhs and algebraic
+        equations with respect to the state vector (see
+        :meth:`pybamm.BaseSolver.jacobian_sparsity`).
+
+        Parameters
+        ----------
+        rhs : :class:`pybamm.Symbol`
+            The concatenated rhs equations
+        algebraic : :class:`pybamm.Symbol`
+            The concatenated algebraic equations
+        y0 : :class:`numpy.array`
+            The initial conditions, used to find the size of the state vector
+        inputs : dict, optional
+            Any input parameters to pass to the model when solving
+        jac_rhs : :class:`pybamm.Symbol`, optional
+            The Jacobian of the rhs equations, if it has already been calculated
+        jac_algebraic : :class:`pybamm.Symbol`, optional
+            The Jacobian of the algebraic equations, if it has already been
+            calculated
+
+        Returns
+        -------
+        :class:`scipy.sparse.csr_matrix`
+            Matrix with ones where the Jacobian may be nonzero, or None if the
+            Jacobian could not be calculated
+        """
+        sparsity_rhs = self.jacobian_sparsity(rhs, y0, inputs, jac=jac_rhs)
+        sparsity_algebraic = self.jacobian_sparsity(
+            algebraic, y0, inputs, jac=jac_algebraic
+        )
+        if sparsity_rhs is None or sparsity_algebraic is None:
+            return None
+        return csr_matrix(vstack([sparsity_rhs, sparsity_algebraic]))
+
     def set_inputs_and_external(self, inputs):
         """
         Set values that are controlled externally, such as external variables and input
@@ -376,6 +566,9 @@ class DaeSolver(pybamm.BaseSolver):
         if self.jacobian:
             self.jacobian.set_pad_ext(self.y_pad, self.y_ext)
             self.jacobian.set_inputs(inputs)
+        if self.jac_times_vec:
+            self.jac_times_vec.set_pad_ext(self.y_pad, self.y_ext)
+            self.jac_times_vec.set_inputs(inputs)
 
     def calculate_consistent_initial_conditions(
         self, rhs, algebraic, y0_guess, jac=None
@@ -472,7 +665,16 @@ class DaeSolver(pybamm.BaseSolver):
             )
 
     def integrate(
-        self, residuals, y0, t_eval, events=None, mass_matrix=None, jacobian=None
+        self,
+        residuals,
+        y0,
+        t_eval,
+        events=None,
+        mass_matrix=None,
+        jacobian=None,
+        model=None,
+        jac_sparsity=None,
+        jac_times_vec=None,
     ):
         """
         Solve a DAE model defined by residuals with initial conditions y0.
@@ -493,26 +695,17 @@ class DaeSolver(pybamm.BaseSolver):
             The (sparse) mass matrix for the chosen spatial method.
         jacobian : method, optional
             A function that takes in t, y and ydot and returns the Jacobian
+        model : :class:`pybamm.BaseModel`, optional
+            The model whose solution to calculate.
+        jac_sparsity : :class:`scipy.sparse.csr_matrix`, optional
+            The sparsity pattern of the Jacobian
+        jac_times_vec : method, optional
+            A function that takes in t, y and v and returns the product of the
+            Jacobian of the stacked rhs and algebraic equations with v
         """
         raise NotImplementedError
 
 
-class SolverCallable:
-    "A class that will be called by the solver when integrating"
-    y_pad = None
-    y_ext = None
-    inputs = {}
-    inputs_casadi = casadi.DM()
-
-    def set_pad_ext(self, y_pad, y_ext):
-        self.y_pad = y_pad
-        self.y_ext = y_ext
-
-    def set_inputs(self, inputs):
-        self.inputs = inputs
-        self.inputs_casadi = casadi.vertcat(*[x for x in inputs.values()])
-
-
 class Rhs(SolverCallable):
     "Returns information about rhs at time t and state y"
 
@@ -45,94 +45,18 @@ class IDAKLUSolver(pybamm.DaeSolver):
         super().__init__("ida", rtol, atol, root_method, root_tol, max_steps)
         self.name = "IDA KLU solver"
 
-    def set_atol_by_variable(self, variables_with_tols, model):
-        """
-        A method to set the absolute tolerances in the solver by state variable.
-        This method attaches a vector of tolerance to the model. (i.e. model.atol)
-
-        Parameters
-        ----------
-        variables_with_tols : dict
-            A dictionary with keys that are strings indicating the variable you
-            wish to set the tolerance of and values that are the tolerances.
-
-        model : :class:`pybamm.BaseModel`
-            The model that is going to be solved.
-        """
-
-        size = model.concatenated_initial_conditions.size
-        atol = self._check_atol_type(self._atol, size)
-        for var, tol in variables_with_tols.items():
-            variable = model.variables[var]
-            if isinstance(variable, pybamm.StateVector):
-                atol = self.set_state_vec_tol(atol, variable, tol)
-            elif isinstance(variable, pybamm.Concatenation):
-                for child in variable.children:
-                    if isinstance(child, pybamm.StateVector):
-                        atol = self.set_state_vec_tol(atol, child, tol)
-                    else:
-                        raise pybamm.SolverError(
-                            """Can only set tolerances for state variables
-                            or concatenations of state variables"""
-                        )
-            else:
-                raise pybamm.SolverError(
-                    """Can only set tolerances for state variables or
-                    concatenations of state variables"""
-                )
-
-        model.atol = atol
-
-    def set_state_vec_tol(self, atol, state_vec, tol):
-        """
-        A method to set the tolerances in the atol vector of a specific
-        state variable. This method modifies self._atol
-
-        Parameters
-        ----------
-        state_vec : :class:`pybamm.StateVector`
-            The state vector to apply to the tolerance to
-        tol: float
-            The tolerance value
-        """
-        slices = state_vec.y_slices[0]
-        atol[slices] = tol
-        return atol
-
-    def _check_atol_type(self, atol, size):
-        """
-        This method checks that the atol vector is of the right shape and
-        type.
-
-        Parameters
-        ----------
-        atol: double or np.array or list
-            Absolute tolerances. If this is a vector then each entry corresponds to
-            the absolute tolerance of one entry in the state vector.
-        size: int
-            The length of the atol vector
-        """
-
-        if isinstance(atol, float):
-            atol = atol * np.ones(size)
-        elif isinstance(atol, list):
-            atol = np.array(atol)
-        elif isinstance(atol, np.ndarray):
-            pass
-        else:
-            raise pybamm.SolverError(
-                "Absolute tolerances must be a numpy array, float, or list"
-            )
-
-        if atol.size != size:
-            raise pybamm.SolverError(
-                """Absolute tolerances must be either a scalar or a numpy arrray
-                of the same shape at y0"""
-            )
-
-        return atol
-
-    def integrate(self, residuals, y0, t_eval, events, mass_matrix, jacobian, model):
+    def integrate(
+        self,
+        residuals,
+        y0,
+        t_eval,
+        events,
+        mass_matrix,
+        jacobian,
+        model,
+        jac_sparsity=None,
+        jac_times_vec=None,
+    ):
         """
         Solve a DAE model defined by residuals with initial conditions y0.
 
@@ -156,6 +80,14 @@ class IDAKLUSolver(pybamm.DaeSolver):
             (see `SUNDIALS docs. <https://computation.llnl.gov/projects/sundials>`).
         model : :class:`pybamm.BaseModel`
             The model whose solution to calculate.
+        jac_sparsity : :class:`scipy.sparse.csr_matrix`, optional
+            The sparsity pattern of the Jacobian. If given, the Jacobian is stored on
+            this pattern, so that its number of nonzeros stays the same throughout
+            the solve.
+        jac_times_vec : method, optional
+            A function that takes in t, y and v and returns the product of the
+            Jacobian with v (not used by this solver, which uses a direct sparse
+            linear solver)
         """
 
         if jacobian is None:
@@ -164,13 +96,8 @@ class IDAKLUSolver(pybamm.DaeSolver):
         if events is None:
             pybamm.SolverError("KLU requires events to be provided")
 
-        try:
-            atol = model.atol
-        except AttributeError:
-            atol = self._atol
-
         rtol = self._rtol
-        atol = self._check_atol_type(atol, y0.size)
+        atol = self.get_atol(y0.size, model)
 
         if jacobian:
             jac_y0_t0 = jacobian(t_eval[0], y0)
@@ -186,19 +113,40 @@ class IDAKLUSolver(pybamm.DaeSolver):
                     jac_eval = jacobian(t, y) - cj * mass_matrix
                     return sparse.csr_matrix(jac_eval)
 
+        if jac_sparsity is not None:
+            # the structure of the Jacobian of the residuals, including the mass matrix
+            pattern = sparse.csr_matrix(
+                sparse.csr_matrix(jac_sparsity, dtype=bool)
+                + sparse.csr_matrix(mass_matrix, dtype=bool)
+            )
+            pattern.sort_indices()
+            pattern_rows, pattern_cols = pattern.nonzero()
+
         class SundialsJacobian:
             def __init__(self):
                 self.J = None
 
-                random = np.random.random(size=y0.size)
-                J = jacfn(10, random, 20)
-                self.nnz = J.nnz  # hoping nnz remains constant...
+                if jac_sparsity is not None:
+                    self.nnz = pattern.nnz
+                else:
+                    random = np.random.random(size=y0.size)
+                    J = jacfn(10, random, 20)
+                    self.nnz = J.nnz  # hoping nnz remains constant...
 
             def jac_res(self, t, y, cj):
                 # must be of form j_res = (dr/dy) - (cj) (dr/dy')
                 # cj is just the input parameter
                 # see p68 of the ida_guide.pdf for more details
-                self.J = jacfn(t, y, cj)
+                J = jacfn(t, y, cj)
+                if jac_sparsity is not None:
+                    # store the values on the fixed sparsity pattern
+                    data = np.asarray(
+                        sparse.csr_matrix(J)[pattern_rows, pattern_cols]
+                    ).ravel()
+                    J = sparse.csr_matrix(
+                        (data, pattern.indices, pattern.indptr), shape=pattern.shape
+                    )
+                self.J = J
 
             def get_jac_data(self):
                 return self.J.data
@@ -4,8 +4,14 @@
 import casadi
 import pybamm
 import numpy as np
+from scipy.sparse import csr_matrix
 
 from .base_solver import add_external
+from .solver_callables import (
+    SolverCallable,
+    JacobianTimesVector,
+    JacobianTimesVectorCasadi,
+)
 
 
 class OdeSolver(pybamm.BaseSolver):
@@ -52,6 +58,9 @@ class OdeSolver(pybamm.BaseSolver):
             events=self.event_funs,
             mass_matrix=model.mass_matrix.entries,
             jacobian=self.jacobian,
+            jac_sparsity=self.jac_sparsity,
+            model=model,
+            jac_times_vec=self.jac_times_vec,
         )
 
         solve_time = timer.time() - solve_start_time
@@ -104,7 +113,14 @@ class OdeSolver(pybamm.BaseSolver):
 
         y0 = model.concatenated_initial_conditions[:, 0]
 
-        if model.use_jacobian:
+        if model.use_jacobian and model.convert_to_format == "numba":
+            # The numba kernels calculate the jacobian themselves, so the symbolic
+            # jacobian is not needed
+            pybamm.logger.info("Calculating jacobian sparsity pattern")
+            jac_sparsity = self.jacobian_sparsity(concatenated_rhs, y0, inputs)
+            pybamm.logger.info("Compiling jacobian with numba")
+            jac_rhs = pybamm.EvaluatorNumba(concatenated_rhs, n_states=np.size(y0))
+        elif model.use_jacobian:
             # Create Jacobian from concatenated rhs
             y = pybamm.StateVector(slice(0, np.size(y0)))
             # set up Jacobian object, for re-use of dict
@@ -118,11 +134,33 @@ class OdeSolver(pybamm.BaseSolver):
                 pybamm.logger.info("Simplifying jacobian")
                 jac_rhs = simp.simplify(jac_rhs)
 
+            pybamm.logger.info("Calculating jacobian sparsity pattern")
+            jac_sparsity = self.jacobian_sparsity(
+                concatenated_rhs, y0, inputs, jac=jac_rhs
+            )
+
             if model.convert_to_format == "python":
                 pybamm.logger.info("Converting jacobian to python")
                 jac_rhs = pybamm.EvaluatorPython(jac_rhs)
+            else:
+                jac_rhs = pybamm.EvaluatorFlat(jac_rhs)
         else:
             jac_rhs = None
+            # Without a Jacobian function, the solver can still use the sparsity
+            # pattern of the Jacobian to approximate it by finite differences
+            pybamm.logger.info("Calculating jacobian sparsity pattern")
+            jac_sparsity = self.jacobian_sparsity(concatenated_rhs, y0, inputs)
+
+        # Only create the jacobian-vector product if the solver uses it for this model
+        if model.use_jacobian and self.needs_jac_times_vec(
+            jac_sparsity, model.mass_matrix.entries
+        ):
+            pybamm.logger.info("Calculating jacobian-vector product")
+            jac_times_vec = self.jac_times_vec_evaluator(
+                model, concatenated_rhs, np.size(y0)
+            )
+        else:
+            jac_times_vec = None
 
         if model.convert_to_format == "python":
             pybamm.logger.info("Converting RHS to python")
@@ -131,6 +169,22 @@ class OdeSolver(pybamm.BaseSolver):
             events = {
                 name: pybamm.EvaluatorPython(event) for name, event in events.items()
             }
+        elif model.convert_to_format == "numba":
+            pybamm.logger.info("Compiling RHS with numba")
+            concatenated_rhs = pybamm.EvaluatorNumba(concatenated_rhs)
+            pybamm.logger.info("Compiling events with numba")
+            events = {
+                name: pybamm.EvaluatorNumba(event) for name, event in events.items()
+            }
+        else:
+            # Compile the expression trees to avoid recursion at each evaluation. The
+            # rhs and events are compiled together, so that the nodes they share are
+            # only computed once at each point
+            evaluator = pybamm.EvaluatorFlat([concatenated_rhs, *events.values()])
+            concatenated_rhs = evaluator.output(0)
+            events = {
+                name: evaluator.output(idx + 1) for idx, name in enumerate(events)
+            }
 
         # Create event-dependent function to evaluate events
         def get_event_class(event):
@@ -141,6 +195,8 @@ class OdeSolver(pybamm.BaseSolver):
             jacobian = Jacobian(jac_rhs.evaluate)
         else:
             jacobian = None
+        if jac_times_vec is not None:
+            jac_times_vec = JacobianTimesVector(jac_times_vec.evaluate)
 
         # Add the solver attributes
         # Note: these are the (possibly) converted to python version rhs, algebraic
@@ -150,9 +206,15 @@ class OdeSolver(pybamm.BaseSolver):
         self.events = events
         self.event_funs = [get_event_class(event) for event in events.values()]
         self.jacobian = jacobian
+        self.jac_sparsity = jac_sparsity
+        self.jac_times_vec = jac_times_vec
 
         pybamm.logger.info("Finish solver set-up")
 
+    def reuse_set_up(self, model, inputs=None):
+        """ See :meth:`pybamm.BaseSolver.reuse_set_up()`. """
+        self.y0 = model.concatenated_initial_conditions[:, 0]
+
     def set_up_casadi(self, model, inputs=None):
         """Convert model to casadi format and use their inbuilt functionalities.
 
@@ -179,24 +241,29 @@ class OdeSolver(pybamm.BaseSolver):
 
         y0 = model.concatenated_initial_conditions[:, 0]
 
-        t_casadi = casadi.MX.sym("t")
-        y_casadi = casadi.MX.sym("y", len(y0))
+        # Convert to SX graphs, or to MX graphs (which may then be expanded)
+        casadi_type = casadi.SX if self.get_casadi_graph(model) == "SX" else casadi.MX
+        t_casadi = casadi_type.sym("t")
+        y_casadi = casadi_type.sym("y", len(y0))
         inputs = inputs or {}
-        u_casadi = {name: casadi.MX.sym(name) for name in inputs.keys()}
+        u_casadi = {name: casadi_type.sym(name) for name in inputs.keys()}
 
         if self.y_pad is not None:
-            y_ext = casadi.MX.sym("y_ext", len(self.y_pad))
+            y_ext = casadi_type.sym("y_ext", len(self.y_pad))
             y_casadi_w_ext = casadi.vertcat(y_casadi, y_ext)
         else:
             y_casadi_w_ext = y_casadi
 
+        # Use the same converter for the rhs and events, so that the subtrees they
+        # share are converted to the same CasADi expressions
+        converter = pybamm.CasadiConverter()
         pybamm.logger.info("Converting RHS to CasADi")
-        concatenated_rhs = model.concatenated_rhs.to_casadi(
-            t_casadi, y_casadi_w_ext, u_casadi
+        concatenated_rhs = converter.convert(
+            model.concatenated_rhs, t_casadi, y_casadi_w_ext, u_casadi
         )
         pybamm.logger.info("Converting events to CasADi")
         casadi_events = {
-            name: event.to_casadi(t_casadi, y_casadi_w_ext, u_casadi)
+            name: converter.convert(event, t_casadi, y_casadi_w_ext, u_casadi)
             for name, event in model.events.items()
         }
 
@@ -211,7 +278,7 @@ class OdeSolver(pybamm.BaseSolver):
             casadi_event_fn = casadi.Function(
                 "event", [t_casadi, y_casadi_w_ext, u_casadi_stacked], [event]
             )
-            return EvalEventCasadi(casadi_event_fn)
+            return EvalEventCasadi(self.compile_casadi(model, casadi_event_fn))
 
         # Create function to evaluate jacobian
         if model.use_jacobian:
@@ -221,17 +288,49 @@ class OdeSolver(pybamm.BaseSolver):
                 "jacobian", [t_casadi, y_casadi_w_ext, u_casadi_stacked], [casadi_jac]
             )
 
-            jacobian = JacobianCasadi(casadi_jac_fn)
+            jacobian = JacobianCasadi(self.compile_casadi(model, casadi_jac_fn))
 
         else:
             jacobian = None
 
+        # CasADi can find the structural sparsity of the Jacobian directly
+        pybamm.logger.info("Calculating jacobian sparsity pattern")
+        sparsity = casadi.jacobian_sparsity(concatenated_rhs, y_casadi)
+        rows, cols = sparsity.get_triplet()
+        jac_sparsity = csr_matrix(
+            (np.ones(len(rows)), (rows, cols)), shape=sparsity.shape
+        )
+
+        # Create function to evaluate jacobian-vector products, which CasADi
+        # calculates by forward-mode differentiation without forming the jacobian,
+        # if the solver uses them for this model
+        if model.use_jacobian and self.needs_jac_times_vec(
+            jac_sparsity, model.mass_matrix.entries
+        ):
+            pybamm.logger.info("Calculating jacobian-vector product")
+            v_casadi = casadi_type.sym("v", len(y0))
+            casadi_jtimes = casadi.jtimes(concatenated_rhs, y_casadi, v_casadi)
+            casadi_jtimes_fn = casadi.Function(
+                "jtimes",
+                [t_casadi, y_casadi_w_ext, u_casadi_stacked, v_casadi],
+                [casadi_jtimes],
+            )
+            jac_times_vec = JacobianTimesVectorCasadi(
+                self.compile_casadi(model, casadi_jtimes_fn)
+            )
+        else:
+            jac_times_vec = None
+
         # Add the solver attributes
         self.y0 = y0
-        self.dydt = DydtCasadi(model, concatenated_rhs_fn)
-        self.events = model.events
+        self.dydt = DydtCasadi(model, self.compile_casadi(model, concatenated_rhs_fn))
+        self.events = {
+            name: pybamm.EvaluatorFlat(event) for name, event in model.events.items()
+        }
         self.event_funs = [get_event_class(event) for event in casadi_events.values()]
         self.jacobian = jacobian
+        self.jac_sparsity = jac_sparsity
+        self.jac_times_vec = jac_times_vec
 
         pybamm.logger.info("Finish solver set-up")
 
@@ -254,9 +353,21 @@ class OdeSolver(pybamm.BaseSolver):
         if self.jacobian:
             self.jacobian.set_pad_ext(self.y_pad, self.y_ext)
             self.jacobian.set_inputs(inputs)
+        if self.jac_times_vec:
+            self.jac_times_vec.set_pad_ext(self.y_pad, self.y_ext)
+            self.jac_times_vec.set_inputs(inputs)
 
     def integrate(
-        self, derivs, y0, t_eval, events=None, mass_matrix=None, jacobian=None
+        self,
+        derivs,
+        y0,
+        t_eval,
+        events=None,
+        mass_matrix=None,
+        jacobian=None,
+        jac_sparsity=None,
+        model=None,
+        jac_times_vec=None,
     ):
         """
         Solve a model defined by dydt with initial conditions y0.
@@ -276,26 +387,18 @@ class OdeSolver(pybamm.BaseSolver):
             The (sparse) mass matrix for the chosen spatial method.
         jacobian : method, optional
             A function that takes in t and y and returns the Jacobian
+        jac_sparsity : :class:`scipy.sparse.csr_matrix`, optional
+            The sparsity pattern of the Jacobian, used when no Jacobian is given
+        model : :class:`pybamm.BaseModel`, optional
+            The model whose solution to calculate, used to find the absolute
+            tolerances (see :meth:`pybamm.BaseSolver.get_atol`)
+        jac_times_vec : method, optional
+            A function that takes in t, y and v and returns the product of the
+            Jacobian with v
         """
         raise NotImplementedError
 
 
-class SolverCallable:
-    "A class that will be called by the solver when integrating"
-    y_pad = None
-    y_ext = None
-    inputs = {}
-    inputs_casadi = casadi.DM()
-
-    def set_pad_ext(self, y_pad, y_ext):
-        self.y_pad = y_pad
-        self.y_ext = y_ext
-
-    def set_inputs(self, inputs):
-        self.inputs = inputs
-        self.inputs_casadi = casadi.vertcat(*[x for x in inputs.values()])
-
-
 # Set up caller classes outside of the solver object to allow pickling
 class Dydt(SolverCallable):
     "Returns information about time derivatives at time t and state y"
@@ -7,6 +7,8 @@ import numpy as np
 import importlib
 import scipy.sparse as sparse
 
+from .scikits_ode_solver import choose_linsolver, unpermute_states, KRYLOV_LINSOLVERS
+
 scikits_odes_spec = importlib.util.find_spec("scikits")
 if scikits_odes_spec is not None:
     scikits_odes_spec = importlib.util.find_spec("scikits.odes")
@@ -33,6 +35,15 @@ class ScikitsDaeSolver(pybamm.DaeSolver):
     max_steps: int, optional
         The maximum number of steps the solver will take before terminating
         (default is 1000).
+    linsolver : str, optional
+            Can be 'dense' (= default), 'lapackdense', 'band', 'lapackband', 'spgmr',
+            'spbcgs', 'sptfqmr' or 'auto'. If 'auto', the linear solver is chosen
+            from the sparsity pattern of the Jacobian (see
+            :func:`pybamm.choose_linsolver`), and stored as `chosen_linsolver`.
+            Note that the analytic Jacobian is only used by the dense solvers: with
+            the band solvers, SUNDIALS approximates the banded Jacobian by finite
+            differences, and the Krylov solvers are not preconditioned, which may
+            be slow for stiff systems.
     """
 
     def __init__(
@@ -43,13 +54,33 @@ class ScikitsDaeSolver(pybamm.DaeSolver):
         root_method="lm",
         root_tol=1e-6,
         max_steps=1000,
+        linsolver="dense",
     ):
         if scikits_odes_spec is None:
             raise ImportError("scikits.odes is not installed")
 
         super().__init__(method, rtol, atol, root_method, root_tol, max_steps)
+        self.linsolver = linsolver
+        self.chosen_linsolver = None
         self.name = "Scikits DAE solver ({})".format(method)
 
+    @property
+    def use_jac_times_vec(self):
+        """ See :meth:`pybamm.BaseSolver.use_jac_times_vec` """
+        return self.linsolver == "auto" or self.linsolver in KRYLOV_LINSOLVERS
+
+    def needs_jac_times_vec(self, jac_sparsity, mass_matrix=None):
+        """
+        See :meth:`pybamm.BaseSolver.needs_jac_times_vec`. With `linsolver="auto"`,
+        this is only the case if a Krylov linear solver is chosen for the model.
+        """
+        if not self.use_jac_times_vec:
+            return False
+        linsolver, _ = choose_linsolver(
+            self.linsolver, jac_sparsity, mass_matrix
+        )
+        return linsolver in KRYLOV_LINSOLVERS
+
     def integrate(
         self,
         residuals,
@@ -59,6 +90,8 @@ class ScikitsDaeSolver(pybamm.DaeSolver):
         mass_matrix=None,
         jacobian=None,
         model=None,
+        jac_sparsity=None,
+        jac_times_vec=None,
     ):
         """
         Solve a DAE model defined by residuals with initial conditions y0.
@@ -82,24 +115,67 @@ class ScikitsDaeSolver(pybamm.DaeSolver):
             None, the solver will approximate the Jacobian.
             (see `SUNDIALS docs. <https://computation.llnl.gov/projects/sundials>`).
         model : :class:`pybamm.BaseModel`
-            The model whose solution to calculate.
+            The model whose solution to calculate, also used to find the absolute
+            tolerances (see :meth:`pybamm.BaseSolver.get_atol`)
+        jac_sparsity : :class:`scipy.sparse.csr_matrix`, optional
+            The sparsity pattern of the Jacobian, used to choose the linear solver.
+            If None, the pattern is found by evaluating the Jacobian at y0.
+        jac_times_vec : method, optional
+            A function that takes in t, y and v and returns the product of the
+            Jacobian of the stacked rhs and algebraic equations with v. If given, the
+            Krylov linear solvers use it instead of approximating these products by
+            finite differences.
         """
 
-        def eqsres(t, y, ydot, return_residuals):
-            return_residuals[:] = residuals(t, y, ydot)
+        if jacobian:
+            jac_y0_t0 = jacobian(t_eval[0], y0)
+            if jac_sparsity is None:
+                jac_sparsity = sparse.csr_matrix(jac_y0_t0)
+        linsolver, linsolver_options = choose_linsolver(
+            self.linsolver, jac_sparsity, mass_matrix
+        )
+        self.chosen_linsolver = linsolver
+        atol = self.get_atol(y0.size, model)
+
+        # with the band solvers, solve for the reordered states y[permutation] (see
+        # choose_linsolver)
+        permutation = linsolver_options.pop("permutation", None)
+        if permutation is None:
 
-        def rootfn(t, y, ydot, return_root):
-            return_root[:] = [event(t, y) for event in events]
+            def eqsres(t, y, ydot, return_residuals):
+                return_residuals[:] = residuals(t, y, ydot)
+
+            def rootfn(t, y, ydot, return_root):
+                return_root[:] = [event(t, y) for event in events]
+
+        else:
+            inverse = np.argsort(permutation)
+
+            def eqsres(t, y, ydot, return_residuals):
+                return_residuals[:] = residuals(t, y[inverse], ydot[inverse])[
+                    permutation
+                ]
+
+            def rootfn(t, y, ydot, return_root):
+                return_root[:] = [event(t, y[inverse]) for event in events]
+
+            y0 = y0[permutation]
+            if np.size(atol) > 1:
+                atol = atol[permutation]
 
         extra_options = {
             "old_api": False,
             "rtol": self.rtol,
-            "atol": self.atol,
+            "atol": atol,
             "max_steps": self.max_steps,
+            "linsolver": linsolver,
         }
+        extra_options.update(linsolver_options)
 
-        if jacobian:
-            jac_y0_t0 = jacobian(t_eval[0], y0)
+        # The user-supplied Jacobian is only used with the dense solvers, and the
+        # Jacobian-vector products with the Krylov solvers; otherwise SUNDIALS
+        # approximates them (by banded finite differences for the band solvers)
+        if jacobian and linsolver in ("dense", "lapackdense"):
             if sparse.issparse(jac_y0_t0):
 
                 def jacfn(t, y, ydot, residuals, cj, J):
@@ -113,6 +189,13 @@ class ScikitsDaeSolver(pybamm.DaeSolver):
                     J[:][:] = jac_eval
 
             extra_options.update({"jacfn": jacfn})
+        elif jac_times_vec is not None and linsolver in KRYLOV_LINSOLVERS:
+
+            def jac_times_vecfn(t, y, ydot, residuals, v, Jv, cj, userdata=None):
+                Jv[:] = jac_times_vec(t, y, v) - cj * (mass_matrix @ v)
+                return 0
+
+            extra_options.update({"jac_times_vecfn": jac_times_vecfn})
 
         if events:
             extra_options.update({"rootfn": rootfn, "nr_rootfns": len(events)})
@@ -132,11 +215,14 @@ class ScikitsDaeSolver(pybamm.DaeSolver):
             # 2 = found root(s)
             elif sol.flag == 2:
                 termination = "event"
+            y_values, y_roots = unpermute_states(
+                sol.values.y, sol.roots.y, permutation
+            )
             return pybamm.Solution(
                 sol.values.t,
-                np.transpose(sol.values.y),
+                np.transpose(y_values),
                 sol.roots.t,
-                np.transpose(sol.roots.y),
+                np.transpose(y_roots),
                 termination,
             )
         else:
@@ -6,6 +6,7 @@ import pybamm
 import numpy as np
 import importlib
 import scipy.sparse as sparse
+from scipy.sparse.csgraph import reverse_cuthill_mckee
 
 scikits_odes_spec = importlib.util.find_spec("scikits")
 if scikits_odes_spec is not None:
@@ -15,10 +16,113 @@ if scikits_odes_spec is not None:
         scikits_odes_spec.loader.exec_module(scikits_odes)
 
 
+# SUNDIALS linear solvers that only need products of the Jacobian with vectors
+KRYLOV_LINSOLVERS = ("spgmr", "spbcgs", "sptfqmr")
+
+
 def have_scikits_odes():
     return scikits_odes_spec is not None
 
 
+def choose_linsolver(linsolver, sparsity, mass_matrix=None):
+    """
+    Choose the SUNDIALS linear solver to use, based on the sparsity pattern of the
+    Jacobian. With `linsolver="auto"`, a narrowly banded Jacobian uses the band
+    solver, a large sparse Jacobian with a wide band uses a Krylov
+    (preconditioner-free GMRES) solver, and anything else uses the dense solver.
+
+    The states of a model are ordered by variable, so that the Jacobian of a model
+    with several coupled variables (e.g. the DFN) has a wide band even if each
+    state only depends on a few others. The bandwidths are therefore measured after
+    reordering the states with the reverse Cuthill-McKee algorithm
+    (:func:`scipy.sparse.csgraph.reverse_cuthill_mckee`). If this reduces the
+    bandwidths, the band solvers must be given the reordered states, and the
+    reordering is returned in the options as "permutation" (i.e. the states to
+    solve for are `y[permutation]`).
+
+    Parameters
+    ----------
+    linsolver : str
+        The requested linear solver, or "auto" to choose automatically
+    sparsity : :class:`scipy.sparse.spmatrix`
+        The sparsity pattern of the Jacobian. If None, the dense solver is used when
+        `linsolver` is "auto".
+    mass_matrix : :class:`scipy.sparse.spmatrix`, optional
+        The mass matrix, whose sparsity pattern is added to that of the Jacobian
+        (the linear solver works with the matrix J - cj * M)
+
+    Returns
+    -------
+    linsolver : str
+        The chosen linear solver
+    options : dict
+        Extra options to pass to scikits.odes for the chosen linear solver (the
+        lower and upper bandwidths for the band solvers), and the reordering of the
+        states for the band solvers if there is one (which must be removed from the
+        options before passing them to scikits.odes)
+    """
+    if sparsity is None:
+        if linsolver in ("band", "lapackband"):
+            raise pybamm.SolverError(
+                "Cannot use '{}' linear solver without a Jacobian sparsity "
+                "pattern".format(linsolver)
+            )
+        if linsolver == "auto":
+            linsolver = "dense"
+        return linsolver, {}
+
+    n = sparsity.shape[0]
+    pattern = sparse.csr_matrix(sparsity) + sparse.eye(n)
+    if mass_matrix is not None:
+        pattern = pattern + sparse.csr_matrix(mass_matrix)
+    pattern = sparse.csr_matrix(pattern)
+    lband, uband = pybamm.get_bandwidth(pattern)
+
+    # reorder the states to reduce the bandwidths
+    permutation = reverse_cuthill_mckee(pattern + pattern.T, symmetric_mode=True)
+    permuted_lband, permuted_uband = pybamm.get_bandwidth(
+        pattern[permutation][:, permutation]
+    )
+    if permuted_lband + permuted_uband < lband + uband:
+        lband, uband = permuted_lband, permuted_uband
+    else:
+        permutation = None
+
+    if linsolver == "auto":
+        nnz = pattern.nnz
+        if lband + uband + 1 <= n // 4:
+            linsolver = "band"
+        elif n >= 400 and nnz < 0.05 * n ** 2:
+            linsolver = "spgmr"
+        else:
+            linsolver = "dense"
+        pybamm.logger.info(
+            "Chose '{}' linear solver (size {}, bandwidths ({}, {}), "
+            "{} nonzeros)".format(linsolver, n, lband, uband, nnz)
+        )
+
+    if linsolver in ("band", "lapackband"):
+        options = {"lband": lband, "uband": uband}
+        if permutation is not None:
+            options["permutation"] = permutation
+        return linsolver, options
+    return linsolver, {}
+
+
+def unpermute_states(y_values, y_roots, permutation):
+    """
+    Undo the reordering of the states chosen by :func:`choose_linsolver` in the
+    solution values and roots returned by scikits.odes (whose rows are times).
+    """
+    if permutation is None:
+        return y_values, y_roots
+    inverse = np.argsort(permutation)
+    y_values = np.asarray(y_values)[:, inverse]
+    if np.size(y_roots) > 0:
+        y_roots = np.asarray(y_roots)[..., inverse]
+    return y_values, y_roots
+
+
 class ScikitsOdeSolver(pybamm.OdeSolver):
     """Solve a discretised model, using scikits.odes.
 
@@ -31,7 +135,14 @@ class ScikitsOdeSolver(pybamm.OdeSolver):
     atol : float, optional
         The absolute tolerance for the solver (default is 1e-6).
     linsolver : str, optional
-            Can be 'dense' (= default), 'lapackdense', 'spgmr', 'spbcgs', 'sptfqmr'
+            Can be 'dense' (= default), 'lapackdense', 'band', 'lapackband', 'spgmr',
+            'spbcgs', 'sptfqmr' or 'auto'. If 'auto', the linear solver is chosen
+            from the sparsity pattern of the Jacobian (see
+            :func:`pybamm.choose_linsolver`), and stored as `chosen_linsolver`.
+            Note that the analytic Jacobian is only used by the dense solvers: with
+            the band solvers, SUNDIALS approximates the banded Jacobian by finite
+            differences, and the Krylov solvers are not preconditioned, which may
+            be slow for stiff systems.
     """
 
     def __init__(self, method="cvode", rtol=1e-6, atol=1e-6, linsolver="dense"):
@@ -40,10 +151,35 @@ class ScikitsOdeSolver(pybamm.OdeSolver):
 
         super().__init__(method, rtol, atol)
         self.linsolver = linsolver
+        self.chosen_linsolver = None
         self.name = "Scikits ODE solver ({})".format(method)
 
+    @property
+    def use_jac_times_vec(self):
+        """ See :meth:`pybamm.BaseSolver.use_jac_times_vec` """
+        return self.linsolver == "auto" or self.linsolver in KRYLOV_LINSOLVERS
+
+    def needs_jac_times_vec(self, jac_sparsity, mass_matrix=None):
+        """
+        See :meth:`pybamm.BaseSolver.needs_jac_times_vec`. With `linsolver="auto"`,
+        this is only the case if a Krylov linear solver is chosen for the model.
+        """
+        if not self.use_jac_times_vec:
+            return False
+        linsolver, _ = choose_linsolver(self.linsolver, jac_sparsity)
+        return linsolver in KRYLOV_LINSOLVERS
+
     def integrate(
-        self, derivs, y0, t_eval, events=None, mass_matrix=None, jacobian=None
+        self,
+        derivs,
+        y0,
+        t_eval,
+        events=None,
+        mass_matrix=None,
+        jacobian=None,
+        jac_sparsity=None,
+        model=None,
+        jac_times_vec=None,
     ):
         """
         Solve a model defined by dydt with initial conditions y0.
@@ -65,15 +201,19 @@ class ScikitsOdeSolver(pybamm.OdeSolver):
             A function that takes in t and y and returns the Jacobian. If
             None, the solver will approximate the Jacobian.
             (see `SUNDIALS docs. <https://computation.llnl.gov/projects/sundials>`).
+        jac_sparsity : :class:`scipy.sparse.csr_matrix`, optional
+            The sparsity pattern of the Jacobian, used to choose the linear solver.
+            If None, the pattern is found by evaluating the Jacobian at y0.
+        model : :class:`pybamm.BaseModel`, optional
+            The model whose solution to calculate, used to find the absolute
+            tolerances (see :meth:`pybamm.BaseSolver.get_atol`)
+        jac_times_vec : method, optional
+            A function that takes in t, y and v and returns the product of the
+            Jacobian with v. If given, the Krylov linear solvers use it instead of
+            the Jacobian, which is then never formed during the solve.
 
         """
 
-        def eqsydot(t, y, return_ydot):
-            return_ydot[:] = derivs(t, y)
-
-        def rootfn(t, y, return_root):
-            return_root[:] = [event(t, y) for event in events]
-
         if jacobian:
             jac_y0_t0 = jacobian(t_eval[0], y0)
             if sparse.issparse(jac_y0_t0):
@@ -98,17 +238,58 @@ class ScikitsOdeSolver(pybamm.OdeSolver):
                 userdata._jac_eval = jacobian(t, y)
                 return 0
 
+        if jac_times_vec is not None:
+
+            def matrix_free_jac_times_vecfn(v, Jv, t, y, userdata):
+                Jv[:] = jac_times_vec(t, y, v)
+                return 0
+
+        if jac_sparsity is None and jacobian:
+            jac_sparsity = sparse.csr_matrix(jac_y0_t0)
+        linsolver, linsolver_options = choose_linsolver(self.linsolver, jac_sparsity)
+        self.chosen_linsolver = linsolver
+        atol = self.get_atol(y0.size, model)
+
+        # with the band solvers, solve for the reordered states y[permutation] (see
+        # choose_linsolver)
+        permutation = linsolver_options.pop("permutation", None)
+        if permutation is None:
+
+            def eqsydot(t, y, return_ydot):
+                return_ydot[:] = derivs(t, y)
+
+            def rootfn(t, y, return_root):
+                return_root[:] = [event(t, y) for event in events]
+
+        else:
+            inverse = np.argsort(permutation)
+
+            def eqsydot(t, y, return_ydot):
+                return_ydot[:] = derivs(t, y[inverse])[permutation]
+
+            def rootfn(t, y, return_root):
+                return_root[:] = [event(t, y[inverse]) for event in events]
+
+            y0 = y0[permutation]
+            if np.size(atol) > 1:
+                atol = atol[permutation]
+
         extra_options = {
             "old_api": False,
             "rtol": self.rtol,
-            "atol": self.atol,
-            "linsolver": self.linsolver,
+            "atol": atol,
+            "linsolver": linsolver,
         }
+        extra_options.update(linsolver_options)
 
-        if jacobian:
-            if self.linsolver in ("dense", "lapackdense"):
+        # With the band solvers, SUNDIALS approximates the banded Jacobian by
+        # finite differences, which only needs lband + uband + 1 evaluations of dydt
+        if linsolver in KRYLOV_LINSOLVERS and jac_times_vec is not None:
+            extra_options.update({"jac_times_vecfn": matrix_free_jac_times_vecfn})
+        elif jacobian:
+            if linsolver in ("dense", "lapackdense"):
                 extra_options.update({"jacfn": jacfn})
-            elif self.linsolver in ("spgmr", "spbcgs", "sptfqmr"):
+            elif linsolver in KRYLOV_LINSOLVERS:
                 extra_options.update(
                     {
                         "jac_times_setupfn": jac_times_setupfn,
@@ -131,11 +312,14 @@ class ScikitsOdeSolver(pybamm.OdeSolver):
             # 2 = found root(s)
             elif sol.flag == 2:
                 termination = "event"
+            y_values, y_roots = unpermute_states(
+                sol.values.y, sol.roots.y, permutation
+            )
             return pybamm.Solution(
                 sol.values.t,
-                np.transpose(sol.values.y),
+                np.transpose(y_values),
                 sol.roots.t,
-                np.transpose(sol.roots.y),
+                np.transpose(y_roots),
                 termination,
             )
         else:
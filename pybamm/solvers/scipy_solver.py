@@ -25,7 +25,16 @@ class ScipySolver(pybamm.OdeSolver):
         self.name = "Scipy solver ({})".format(method)
 
     def integrate(
-        self, derivs, y0, t_eval, events=None, mass_matrix=None, jacobian=None
+        self,
+        derivs,
+        y0,
+        t_eval,
+        events=None,
+        mass_matrix=None,
+        jacobian=None,
+        jac_sparsity=None,
+        model=None,
+        jac_times_vec=None,
     ):
         """
         Solve a model defined by dydt with initial conditions y0.
@@ -47,6 +56,16 @@ class ScipySolver(pybamm.OdeSolver):
         jacobian : method, optional
             A function that takes in t and y and returns the Jacobian. If
             None, the solver will approximate the Jacobian.
+        jac_sparsity : :class:`scipy.sparse.csr_matrix`, optional
+            The sparsity pattern of the Jacobian. If given (and `jacobian` is None),
+            the "Radau" and "BDF" methods use it to approximate the Jacobian by finite
+            differences more cheaply.
+        model : :class:`pybamm.BaseModel`, optional
+            The model whose solution to calculate, used to find the absolute
+            tolerances (see :meth:`pybamm.BaseSolver.get_atol`)
+        jac_times_vec : method, optional
+            A function that takes in t, y and v and returns the product of the
+            Jacobian with v (not used by this solver)
 
         Returns
         -------
@@ -55,13 +74,16 @@ class ScipySolver(pybamm.OdeSolver):
             various diagnostic messages.
 
         """
-        extra_options = {"rtol": self.rtol, "atol": self.atol}
+        extra_options = {"rtol": self.rtol, "atol": self.get_atol(y0.size, model)}
 
         # check for user-supplied Jacobian
         implicit_methods = ["Radau", "BDF", "LSODA"]
         if np.any([self.method in implicit_methods]):
             if jacobian:
                 extra_options.update({"jac": jacobian})
+            # LSODA does not support a sparsity pattern
+            elif jac_sparsity is not None and self.method != "LSODA":
+                extra_options.update({"jac_sparsity": jac_sparsity})
 
         # make events terminal so that the solver stops when they are reached
         if events:
@@ -0,0 +1,52 @@
+#
+# Callables shared by the ODE and DAE solvers
+#
+import casadi
+import numpy as np
+
+from .base_solver import add_external
+
+
+class SolverCallable:
+    "A class that will be called by the solver when integrating"
+    y_pad = None
+    y_ext = None
+    inputs = {}
+    inputs_casadi = casadi.DM()
+
+    def set_pad_ext(self, y_pad, y_ext):
+        self.y_pad = y_pad
+        self.y_ext = y_ext
+
+    def set_inputs(self, inputs):
+        self.inputs = inputs
+        self.inputs_casadi = casadi.vertcat(*[x for x in inputs.values()])
+
+
+# Set up caller classes outside of the solver object to allow pickling
+class JacobianTimesVector(SolverCallable):
+    """
+    Returns the product of the jacobian of the model equations (the rhs, and the
+    algebraic equations for a DAE) at time t and state y with a vector v
+    """
+
+    def __init__(self, jac_times_vec_fn):
+        self.jac_times_vec_fn = jac_times_vec_fn
+
+    def __call__(self, t, y, v):
+        y = y[:, np.newaxis]
+        y = add_external(y, self.y_pad, self.y_ext)
+        y = np.concatenate([y, np.reshape(v, (-1, 1))])
+        return self.jac_times_vec_fn(t, y, self.inputs, known_evals={})[0][:, 0]
+
+
+class JacobianTimesVectorCasadi(JacobianTimesVector):
+    """
+    Returns the product of the jacobian of the model equations at time t and state y
+    with a vector v, with CasADi
+    """
+
+    def __call__(self, t, y, v):
+        y = y[:, np.newaxis]
+        y = add_external(y, self.y_pad, self.y_ext)
+        return self.jac_times_vec_fn(t, y, self.inputs_casadi, v).full()[:, 0]
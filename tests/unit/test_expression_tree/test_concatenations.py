@@ -164,6 +164,45 @@ class TestConcatenations(unittest.TestCase):
             ),
         )
 
+    def test_domain_concatenation_permutation(self):
+        mesh = get_mesh_for_testing()
+        a_dom = ["separator"]
+        b_dom = ["negative electrode", "positive electrode"]
+        a_pts = mesh[a_dom[0]][0].npts
+        b0_pts = mesh[b_dom[0]][0].npts
+        b1_pts = mesh[b_dom[1]][0].npts
+        a = pybamm.StateVector(slice(0, a_pts), domain=a_dom)
+        b = pybamm.StateVector(slice(a_pts, a_pts + b0_pts + b1_pts), domain=b_dom)
+        conc = pybamm.DomainConcatenation([a, b], mesh)
+
+        # the concatenation is a gather from the stacked children
+        np.testing.assert_array_equal(
+            conc.permutation,
+            np.concatenate(
+                [
+                    np.arange(a_pts, a_pts + b0_pts),
+                    np.arange(a_pts),
+                    np.arange(a_pts + b0_pts, a_pts + b0_pts + b1_pts),
+                ]
+            ),
+        )
+        y = np.arange(conc.size, dtype=float)[:, np.newaxis]
+        np.testing.assert_array_equal(conc.evaluate(y=y), y[conc.permutation])
+        np.testing.assert_array_equal(
+            conc.permutation_matrix @ y, y[conc.permutation]
+        )
+
+        # the permutation is shared with copies
+        self.assertIs(conc.new_copy().permutation, conc.permutation)
+
+        # evaluate at several points at once, with a constant child
+        c = pybamm.Vector(np.full(a_pts, 2), domain=a_dom)
+        conc = pybamm.DomainConcatenation([c, b], mesh)
+        y = np.random.rand(conc.size, 3)
+        np.testing.assert_array_equal(
+            conc.evaluate(y=y)[:, 1], conc.evaluate(y=y[:, 1:2])[:, 0]
+        )
+
     def test_domain_concatenation_domains(self):
         mesh = get_mesh_for_testing()
         # ensure concatenated domains are sorted correctly
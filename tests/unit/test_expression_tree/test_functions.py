@@ -3,7 +3,9 @@
 #
 import pybamm
 
+import gc
 import unittest
+import weakref
 import numpy as np
 from scipy.interpolate import interp1d
 
@@ -20,6 +22,11 @@ def test_multi_var_function_cube(arg1, arg2):
     return arg1 + arg2 ** 3
 
 
+def test_branch_function(arg):
+    # cannot be traced by CasADi
+    return arg ** 2 if np.all(arg > 0) else -arg
+
+
 class TestFunction(unittest.TestCase):
     def test_number_input(self):
         # with numbers
@@ -90,6 +97,78 @@ class TestFunction(unittest.TestCase):
         with self.assertRaises(ValueError):
             func.diff(a)
 
+    def test_diff_cache(self):
+        a = pybamm.StateVector(slice(0, 2))
+        b = pybamm.StateVector(slice(2, 4))
+        y = np.array([1, 2, 3, 4])
+        func = pybamm.Function(test_multi_var_function_cube, a, b)
+
+        # derivatives are only created once for each function and argument
+        func_diff_a = func._function_diff(func.children, 0)
+        func_diff_b = func._function_diff(func.children, 1)
+        derivative = func_diff_b.function
+        self.assertIs(derivative, func._function_diff(func.children, 1).function)
+        self.assertIs(
+            derivative, pybamm.function_derivative(test_multi_var_function_cube, 1)
+        )
+        self.assertIsNot(func_diff_a.function, derivative)
+        self.assertEqual(
+            func_diff_b.name,
+            "function (elementwise_grad_of_test_multi_var_function_cube_wrt_argnum_1)",
+        )
+        self.assertNotEqual(func_diff_a.id, func_diff_b.id)
+
+        # derivatives are evaluated at all the points at once, with CasADi
+        self.assertIsNotNone(derivative.casadi_function(2))
+        np.testing.assert_array_equal(func.diff(a).evaluate(y=y), np.ones((2, 1)))
+        np.testing.assert_array_equal(
+            func.diff(b).evaluate(y=y), 3 * y[2:, np.newaxis] ** 2
+        )
+        np.testing.assert_array_equal(derivative(y[:2], 2), np.array([12, 12]))
+        np.testing.assert_array_equal(
+            derivative(np.array([[1], [2]]), np.array([[3], [4]])),
+            np.array([[27], [48]]),
+        )
+        # scalar arguments give a float, as with autograd
+        self.assertIsInstance(derivative(1, 2), float)
+        self.assertEqual(derivative(1, 2), 12)
+        # and so are derivatives of derivatives
+        second_derivative = func_diff_b._function_diff(func.children, 1).function
+        self.assertIs(second_derivative, pybamm.function_derivative(derivative, 1))
+        self.assertEqual(second_derivative.argnums, (1, 1))
+        np.testing.assert_array_equal(
+            func.diff(b).diff(b).evaluate(y=y), 6 * y[2:, np.newaxis]
+        )
+        np.testing.assert_array_equal(func.diff(b).diff(a).evaluate(y=y), 0)
+
+        # functions that CasADi cannot trace are differentiated with autograd
+        func = pybamm.Function(test_branch_function, a)
+        derivative = func._function_diff(func.children, 0).function
+        self.assertIsNone(derivative.casadi_function(1))
+        np.testing.assert_array_equal(
+            func.diff(a).evaluate(y=y), 2 * y[:2, np.newaxis]
+        )
+        np.testing.assert_array_equal(func.diff(a).diff(a).evaluate(y=y), 2)
+
+        # the cached derivatives do not keep their functions alive, but the
+        # derivatives that are used do
+        cache = pybamm.expression_tree.functions._function_derivatives
+        function = lambda x: x ** 3  # noqa: E731
+        function_ref = weakref.ref(function)
+        derivative = pybamm.Function(function, a).diff(a)
+        self.assertIn(function, cache)
+        del function
+        gc.collect()
+        self.assertIsNotNone(function_ref())
+        np.testing.assert_array_equal(
+            derivative.evaluate(y=y), 3 * y[:2, np.newaxis] ** 2
+        )
+        n_functions = len(cache)
+        del derivative
+        gc.collect()
+        self.assertIsNone(function_ref())
+        self.assertEqual(len(cache), n_functions - 1)
+
     def test_function_of_multiple_variables(self):
         a = pybamm.Variable("a")
         b = pybamm.Parameter("b")
@@ -115,6 +194,42 @@ class TestFunction(unittest.TestCase):
         with self.assertRaises(pybamm.DomainError):
             pybamm.Function(test_multi_var_function, a, b)
 
+    def test_content_hash(self):
+        a = pybamm.StateVector(slice(0, 2))
+
+        def scale(c):
+            return lambda x: c * x
+
+        # functions are identified by what they compute, not by their name
+        same = [
+            pybamm.Function(lambda x: x + 1, a),
+            pybamm.Function(lambda x: x + 1, a),
+        ]
+        self.assertEqual(same[0].content_hash, same[1].content_hash)
+        different = [
+            pybamm.Function(lambda x: x + 2, a),
+            pybamm.Function(lambda x: np.exp(x), a),
+            pybamm.Function(lambda x: np.sin(x), a),
+            pybamm.Function(scale(1), a),
+            pybamm.Function(scale(2), a),
+            pybamm.Function(test_function, a),
+            pybamm.Function(interp1d([0, 1], [0, 1]), a),
+            pybamm.Function(interp1d([0, 1], [0, 2]), a),
+            pybamm.Function(test_function, a)._function_diff([a], 0),
+        ]
+        hashes = [same[0].content_hash] + [fun.content_hash for fun in different]
+        self.assertEqual(len(set(hashes)), len(hashes))
+
+        # callables that cannot be identified
+        class Opaque(object):
+            __slots__ = []
+
+            def __call__(self, x):
+                return x
+
+        with self.assertRaisesRegex(TypeError, "Cannot compute the content hash"):
+            pybamm.Function(Opaque(), a).content_hash
+
     def test_function_unnamed(self):
         t = np.linspace(0, 1)
         entries = 2 * t
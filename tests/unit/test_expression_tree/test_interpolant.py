@@ -13,6 +13,8 @@ class TestInterpolant(unittest.TestCase):
             pybamm.Interpolant(np.ones(10), None)
         with self.assertRaisesRegex(ValueError, "interpolator 'bla' not recognised"):
             pybamm.Interpolant(np.ones((10, 2)), None, interpolator="bla")
+        with self.assertRaisesRegex(ValueError, "interpolator 'bla' not recognised"):
+            pybamm.get_interpolating_function(np.ones((10, 2)), interpolator="bla")
 
     def test_interpolation(self):
         x = np.linspace(0, 1)[:, np.newaxis]
@@ -42,6 +44,178 @@ class TestInterpolant(unittest.TestCase):
                 interp.evaluate(y=np.array([2]))[:, 0], np.array([np.nan])
             )
 
+    def test_linear_and_constant(self):
+        x = np.array([[0], [1], [3], [4]])
+        data = np.hstack([x, np.array([[1], [3], [-1], [2]])])
+        y = pybamm.StateVector(slice(0, 7))
+        y_test = np.array([-1, 0, 0.5, 1, 2.5, 4, 5])
+
+        interp = pybamm.Interpolant(data, y, interpolator="linear")
+        np.testing.assert_array_almost_equal(
+            interp.evaluate(y=y_test)[:, 0], np.array([-1, 1, 2, 3, 0, 2, 5])
+        )
+        np.testing.assert_array_almost_equal(
+            interp.diff(y).evaluate(y=y_test)[:, 0], np.array([2, 2, 2, -2, -2, 3, 3])
+        )
+
+        # each value is held until the next data point
+        interp = pybamm.Interpolant(data, y, interpolator="constant")
+        np.testing.assert_array_equal(
+            interp.evaluate(y=y_test)[:, 0], np.array([1, 1, 1, 3, 3, 2, 2])
+        )
+        np.testing.assert_array_equal(
+            interp.diff(y).evaluate(y=y_test)[:, 0], np.zeros(7)
+        )
+        interp = pybamm.Interpolant(data, y, interpolator="constant", extrapolate=False)
+        np.testing.assert_array_equal(
+            interp.evaluate(y=y_test)[:, 0], np.array([np.nan, 1, 1, 3, 3, 2, np.nan])
+        )
+
+    def test_shared_interpolating_function(self):
+        x = np.linspace(0, 1)[:, np.newaxis]
+        y = pybamm.StateVector(slice(0, 1))
+        square = np.hstack([x, x ** 2])
+        interp = pybamm.Interpolant(square, y)
+        # interpolants of the same data share their interpolating function
+        self.assertIs(interp.new_copy().function, interp.function)
+        self.assertIs(
+            pybamm.Interpolant(square.copy(), 2 * y).function, interp.function
+        )
+        self.assertIs(pybamm.get_interpolating_function(square), interp.function)
+        self.assertIsNot(
+            pybamm.Interpolant(square, y, interpolator="pchip").function,
+            interp.function,
+        )
+        self.assertIsNot(
+            pybamm.Interpolant(square, y, extrapolate=False).function, interp.function
+        )
+        self.assertIsNot(
+            pybamm.Interpolant(np.hstack([x, x ** 3]), y).function, interp.function
+        )
+
+        # the cache only holds the most recent functions
+        cache_size = pybamm.expression_tree.interpolant.INTERPOLANT_CACHE_SIZE
+        for i in range(cache_size):
+            pybamm.get_interpolating_function(np.hstack([x, x + i + 1]))
+        self.assertIsNot(pybamm.get_interpolating_function(square), interp.function)
+
+    def test_grid_interpolation(self):
+        x1 = np.linspace(0, 1, 6)
+        x2 = np.array([0, 0.5, 2, 3, 4])
+        y1 = pybamm.StateVector(slice(0, 3))
+        y2 = pybamm.StateVector(slice(3, 4))
+        y_test = np.array([0.1, 0.55, 1.2, 2.5])
+
+        # bilinear data is interpolated exactly, and extrapolated linearly
+        bilinear = np.add.outer(2 * x1, x2) + np.outer(x1, x2)
+        interp = pybamm.Interpolant(
+            ((x1, x2), bilinear), [y1, y2], interpolator="linear"
+        )
+        np.testing.assert_array_almost_equal(
+            interp.evaluate(y=y_test)[:, 0], np.array([2.95, 4.975, 7.9])
+        )
+        # cubic data is interpolated exactly by splines, which are held constant
+        # outside of the grid
+        cubic = np.add.outer(x1 ** 3, x2 ** 2)
+        interp = pybamm.Interpolant(((x1, x2), cubic), [y1, y2])
+        np.testing.assert_array_almost_equal(
+            interp.evaluate(y=y_test)[:, 0],
+            np.array([0.1 ** 3, 0.55 ** 3, 1]) + 2.5 ** 2,
+        )
+        # the grid values are reproduced
+        y = pybamm.StateVector(slice(0, 1))
+        for interpolator in ["linear", "cubic spline"]:
+            interp = pybamm.Interpolant(
+                ((x1, x2), np.sin(np.add.outer(x1, x2))),
+                [y, pybamm.Scalar(3)],
+                interpolator=interpolator,
+            )
+            np.testing.assert_array_almost_equal(
+                interp.evaluate(y=np.array([0.4])), np.sin(3.4)
+            )
+
+        # in 3D, with scalar children
+        x3 = np.linspace(-1, 1, 4)
+        trilinear = np.multiply.outer(np.add.outer(x1, x2), x3)
+        for interpolator in ["linear", "cubic spline"]:
+            interp = pybamm.Interpolant(
+                ((x1, x2, x3), trilinear),
+                [y1, pybamm.Scalar(2.5), pybamm.Scalar(0.3)],
+                interpolator=interpolator,
+            )
+            np.testing.assert_array_almost_equal(
+                interp.evaluate(y=np.array([0.1, 0.55, 0.9, 0]))[:, 0],
+                (np.array([0.1, 0.55, 0.9]) + 2.5) * 0.3,
+            )
+
+        # with extrapolation set to False
+        for interpolator in ["linear", "cubic spline"]:
+            interp = pybamm.Interpolant(
+                ((x1, x2), bilinear),
+                [y1, y2],
+                interpolator=interpolator,
+                extrapolate=False,
+            )
+            np.testing.assert_array_equal(
+                np.isnan(interp.evaluate(y=y_test)[:, 0]), [False, False, True]
+            )
+
+    def test_grid_diff(self):
+        x1 = np.linspace(0, 1, 6)
+        x2 = np.array([0, 0.5, 2, 3, 4])
+        y1 = pybamm.StateVector(slice(0, 3))
+        y2 = pybamm.StateVector(slice(3, 4))
+        y_test = np.array([0.1, 0.55, 0.9, 2.5])
+
+        bilinear = np.add.outer(2 * x1, x2) + np.outer(x1, x2)
+        cubic = np.add.outer(x1 ** 3, x2 ** 2) + np.outer(x1, x2)
+        for interpolator, data, dy1, dy2 in [
+            ("linear", bilinear, 2 + 2.5, 1 + y_test[:3]),
+            ("cubic spline", cubic, 3 * y_test[:3] ** 2 + 2.5, 5 + y_test[:3]),
+        ]:
+            interp = pybamm.Interpolant(
+                ((x1, x2), data), [y1, y2], interpolator=interpolator
+            )
+            np.testing.assert_array_almost_equal(
+                interp.diff(y1).evaluate(y=y_test)[:, 0], dy1
+            )
+            np.testing.assert_array_almost_equal(
+                interp.diff(y2).evaluate(y=y_test)[:, 0], dy2
+            )
+        # second derivatives
+        np.testing.assert_array_almost_equal(
+            interp.diff(y1).diff(y1).evaluate(y=y_test)[:, 0], 6 * y_test[:3]
+        )
+        np.testing.assert_array_almost_equal(
+            interp.diff(y1).diff(y2).evaluate(y=y_test)[:, 0], np.ones(3)
+        )
+        # partial derivatives are different symbols
+        self.assertNotEqual(
+            interp._function_diff(interp.children, 0).id,
+            interp._function_diff(interp.children, 1).id,
+        )
+
+        # Jacobian
+        y = pybamm.StateVector(slice(0, 4))
+        jac = interp.jac(y).evaluate(y=y_test).toarray()
+        np.testing.assert_array_almost_equal(jac[:, :3], np.diag(dy1))
+        np.testing.assert_array_almost_equal(jac[:, 3], dy2)
+
+    def test_grid_errors(self):
+        x = np.linspace(0, 1, 5)
+        a = pybamm.Symbol("a")
+        with self.assertRaisesRegex(ValueError, "needs 2 children, but 1 were given"):
+            pybamm.Interpolant(((x, x), np.ones((5, 5))), a)
+        with self.assertRaisesRegex(ValueError, "values should have shape"):
+            pybamm.Interpolant(((x, x), np.ones((5, 4))), [a, a])
+        with self.assertRaisesRegex(ValueError, "not recognised for data on a grid"):
+            pybamm.Interpolant(((x, x), np.ones((5, 5))), [a, a], interpolator="pchip")
+        with self.assertRaisesRegex(ValueError, "at least 4 points"):
+            pybamm.Interpolant(((x, x[:3]), np.ones((5, 3))), [a, a])
+        function = pybamm.get_interpolating_function(((x, x), np.ones((5, 5))))
+        with self.assertRaisesRegex(ValueError, "2D grid called with 1 arguments"):
+            function(0.5)
+
     def test_name(self):
         a = pybamm.Symbol("a")
         x = np.linspace(0, 1)[:, np.newaxis]
@@ -81,6 +255,13 @@ class TestInterpolant(unittest.TestCase):
         self.assertEqual(interp.id, interp.new_copy().id)
         self.assertEqual(interp.id, interp.simplify().id)
 
+        # on a grid
+        interp = pybamm.Interpolant(((x[:, 0], x[:, 0]), np.eye(50)), [y, 2 * y])
+        self.assertEqual(interp.id, interp.new_copy().id)
+        self.assertEqual(interp.content_hash, interp.new_copy().content_hash)
+        self.assertIs(interp.new_copy().function, interp.function)
+        self.assertEqual(interp.id, interp.simplify().id)
+
 
 if __name__ == "__main__":
     print("Add -v for more debug output")
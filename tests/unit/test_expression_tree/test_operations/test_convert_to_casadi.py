@@ -4,8 +4,10 @@
 import casadi
 import numpy as np
 import pybamm
+import scipy.sparse
 import unittest
 from tests import get_mesh_for_testing, get_1p1d_discretisation_for_testing
+from pybamm.expression_tree.operations.convert_to_casadi import CASADI_SX_MAX_STATES
 
 
 class TestCasadiConverter(unittest.TestCase):
@@ -97,7 +99,7 @@ class TestCasadiConverter(unittest.TestCase):
         # linear
         linear = np.hstack([x, 2 * x])
         y_test = np.array([0.4, 0.6])
-        for interpolator in ["pchip", "cubic spline"]:
+        for interpolator in ["linear", "constant", "pchip", "cubic spline"]:
             interp = pybamm.Interpolant(linear, y, interpolator=interpolator)
             interp_casadi = interp.to_casadi(y=casadi_y)
             f = casadi.Function("f", [casadi_y], [interp_casadi])
@@ -105,12 +107,90 @@ class TestCasadiConverter(unittest.TestCase):
         # square
         square = np.hstack([x, x ** 2])
         y = pybamm.StateVector(slice(0, 1))
-        for interpolator in ["pchip", "cubic spline"]:
+        for interpolator in ["linear", "constant", "pchip", "cubic spline"]:
             interp = pybamm.Interpolant(square, y, interpolator=interpolator)
             interp_casadi = interp.to_casadi(y=casadi_y)
             f = casadi.Function("f", [casadi_y], [interp_casadi])
             np.testing.assert_array_almost_equal(interp.evaluate(y=y_test), f(y_test))
 
+    def test_interpolation_matches_scipy(self):
+        # the CasADi interpolants give the same values as the scipy ones, as MX or SX,
+        # inside and outside the range of the data, and so do their derivatives
+        x = np.linspace(0, 1, 20)[:, np.newaxis]
+        data = np.hstack([x, np.sin(3 * x) + x ** 2])
+        y = pybamm.StateVector(slice(0, 6))
+        y_test = np.array([-0.2, 0, 0.13, 0.77, 1, 1.3])
+        for interpolator in ["linear", "constant", "pchip", "cubic spline"]:
+            for extrapolate in [True, False]:
+                interp = pybamm.Interpolant(
+                    data, y, interpolator=interpolator, extrapolate=extrapolate
+                )
+                for expr in [interp, interp.diff(y)]:
+                    for casadi_type in [casadi.MX, casadi.SX]:
+                        casadi_y = casadi_type.sym("y", 6)
+                        f = casadi.Function(
+                            "f", [casadi_y], [expr.to_casadi(y=casadi_y)]
+                        )
+                        np.testing.assert_allclose(
+                            f(y_test), expr.evaluate(y=y_test), rtol=1e-12
+                        )
+
+    def test_grid_interpolation(self):
+        # the CasADi interpolants give the same values and derivatives as the Python
+        # ones, inside and outside the grid, as MX or SX
+        x1 = np.linspace(0, 1, 8)
+        x2 = np.linspace(280, 320, 5)
+        values = np.sin(3 * x1)[:, np.newaxis] * np.cos(x2 / 40)
+        y1 = pybamm.StateVector(slice(0, 5))
+        y2 = pybamm.StateVector(slice(5, 6))
+        y = pybamm.StateVector(slice(0, 6))
+        y_tests = [
+            np.array([0, 0.13, 0.5, 0.77, 1, 300.3]),
+            np.array([-0.1, 0, 0.5, 1, 1.2, 330]),
+        ]
+        for interpolator in ["linear", "cubic spline"]:
+            for extrapolate in [True, False]:
+                interp = pybamm.Interpolant(
+                    ((x1, x2), values),
+                    [y1, y2],
+                    interpolator=interpolator,
+                    extrapolate=extrapolate,
+                )
+                exprs = [interp, interp.diff(y1), interp.diff(y2)]
+                # the derivatives of B-spline lookup tables cannot be evaluated as SX
+                if interpolator == "linear":
+                    casadi_types = [casadi.MX, casadi.SX]
+                else:
+                    casadi_types = [casadi.MX]
+                for expr in exprs:
+                    for casadi_type in casadi_types:
+                        casadi_y = casadi_type.sym("y", 6)
+                        f = casadi.Function(
+                            "f", [casadi_y], [expr.to_casadi(y=casadi_y)]
+                        )
+                        for y_test in y_tests:
+                            np.testing.assert_allclose(
+                                f(y_test),
+                                expr.evaluate(y=y_test),
+                                rtol=1e-10,
+                                atol=1e-12,
+                            )
+                # the Jacobians agree (inside the grid if there is no extrapolation)
+                casadi_y = casadi.MX.sym("y", 6)
+                casadi_jac = casadi.Function(
+                    "jacobian",
+                    [casadi_y],
+                    [casadi.jacobian(interp.to_casadi(y=casadi_y), casadi_y)],
+                )
+                jac = interp.jac(y)
+                for y_test in y_tests[: 2 if extrapolate else 1]:
+                    np.testing.assert_allclose(
+                        casadi_jac(y_test).full(),
+                        jac.evaluate(y=y_test).toarray(),
+                        rtol=1e-10,
+                        atol=1e-12,
+                    )
+
     def test_concatenations(self):
         y = np.linspace(0, 1, 10)[:, np.newaxis]
         a = pybamm.Vector(y)
@@ -145,6 +225,11 @@ class TestCasadiConverter(unittest.TestCase):
         y_eval = np.linspace(0, 1, expr.size)
         self.assert_casadi_equal(f(y_eval), casadi.SX(expr.evaluate(y=y_eval)))
 
+        # with MX, the concatenation is a single gather from the stacked children
+        y = casadi.MX.sym("y", expr.size)
+        f = casadi.Function("f", [y], [expr.to_casadi(None, y)])
+        np.testing.assert_array_equal(f(y_eval), expr.evaluate(y=y_eval))
+
     def test_convert_differentiated_function(self):
         a = pybamm.Scalar(0)
         b = pybamm.Scalar(1)
@@ -157,6 +242,26 @@ class TestCasadiConverter(unittest.TestCase):
         f = pybamm.Function(myfunction, a, b).diff(b)
         self.assert_casadi_equal(f.to_casadi(), casadi.MX(3), evalf=True)
 
+        # vectors and second derivatives
+        y = pybamm.StateVector(slice(0, 4))
+        casadi_y = casadi.MX.sym("y", 4)
+        y_test = np.array([1, 2, 3, 4])
+        func = pybamm.Function(myfunction, y, 2)
+        for expr in [func.diff(y), func.diff(y).diff(y)]:
+            f = casadi.Function("f", [casadi_y], [expr.to_casadi(y=casadi_y)])
+            np.testing.assert_array_equal(f(y_test), expr.evaluate(y=y_test))
+        func = pybamm.Function(myfunction, 2, y)
+        for expr in [func.diff(y), func.diff(y).diff(y)]:
+            f = casadi.Function("f", [casadi_y], [expr.to_casadi(y=casadi_y)])
+            np.testing.assert_array_equal(f(y_test), expr.evaluate(y=y_test))
+
+        # functions that CasADi cannot trace
+        def branch(x):
+            return x if np.all(x > 0) else -x
+
+        with self.assertRaisesRegex(NotImplementedError, "derivative of 'branch'"):
+            pybamm.Function(branch, y).diff(y).to_casadi(y=casadi_y)
+
     def test_convert_input_parameter(self):
         # Arrays
         a = np.array([1, 2, 3, 4, 5])
@@ -191,6 +296,79 @@ class TestCasadiConverter(unittest.TestCase):
             casadi_us["Input 2"] * casadi_y,
         )
 
+    def test_shared_converter(self):
+        casadi_y = casadi.MX.sym("y", 10)
+        pybamm_y = pybamm.StateVector(slice(0, 10))
+        shared = pybamm.exp(pybamm_y) * pybamm.sin(pybamm_y)
+        expr1 = shared + 1
+        expr2 = shared * pybamm_y
+
+        # the shared subtree is only converted (and evaluated) once
+        converter = pybamm.CasadiConverter()
+        f_shared = casadi.Function(
+            "f",
+            [casadi_y],
+            [converter.convert(expr, y=casadi_y) for expr in [expr1, expr2]],
+        )
+        f_separate = casadi.Function(
+            "f", [casadi_y], [expr.to_casadi(y=casadi_y) for expr in [expr1, expr2]]
+        )
+        self.assertLess(f_shared.n_instructions(), f_separate.n_instructions())
+        y = np.linspace(0, 1, 10)
+        for out_shared, out_separate in zip(f_shared(y), f_separate(y)):
+            np.testing.assert_array_equal(out_shared.full(), out_separate.full())
+
+        # an empty dictionary of converted symbols is shared too
+        casadi_symbols = {}
+        expr1.to_casadi(y=casadi_y, casadi_symbols=casadi_symbols)
+        self.assertIn(shared.id, casadi_symbols)
+
+    def test_convert_to_sx(self):
+        casadi_t = casadi.SX.sym("t")
+        casadi_y = casadi.SX.sym("y", 10)
+        casadi_u = {"Input": casadi.SX.sym("Input")}
+        pybamm_y = pybamm.StateVector(slice(0, 10))
+        A = pybamm.Matrix(np.diag(np.arange(10.0)))
+        expr = (
+            pybamm.exp(A @ pybamm_y) * pybamm.t
+            + pybamm.InputParameter("Input")
+            + pybamm.Vector(np.ones(10))
+            + pybamm.Function(np.sin, pybamm_y).diff(pybamm_y)
+        )
+        converted = expr.to_casadi(casadi_t, casadi_y, casadi_u)
+        self.assertIsInstance(converted, casadi.SX)
+        f = casadi.Function("f", [casadi_t, casadi_y, casadi_u["Input"]], [converted])
+        self.assertTrue(f.is_a("SXFunction"))
+        y = np.linspace(0, 1, 10)
+        np.testing.assert_allclose(
+            f(2, y, 3).full(),
+            expr.evaluate(t=2, y=y[:, np.newaxis], u={"Input": 3}),
+            rtol=1e-14,
+        )
+
+    def test_choose_casadi_graph(self):
+        # small models use SX graphs, and larger ones MX graphs
+        y = pybamm.StateVector(slice(0, 10))
+        A = pybamm.Matrix(scipy.sparse.eye(10))
+        self.assertEqual(pybamm.choose_casadi_graph([A @ y], 10), "SX")
+        n = CASADI_SX_MAX_STATES + 1
+        y = pybamm.StateVector(slice(0, n))
+        self.assertEqual(pybamm.choose_casadi_graph([2 * y], n), "MX")
+
+        # dense matrix products use MX graphs
+        y = pybamm.StateVector(slice(0, 40))
+        A = pybamm.Matrix(np.ones((40, 40)))
+        self.assertEqual(pybamm.choose_casadi_graph([y, A @ y], 40), "MX")
+
+        # and so do cubic spline interpolants on a grid
+        y = pybamm.StateVector(slice(0, 10))
+        x = np.linspace(0, 1, 5)
+        for interpolator, graph in [("linear", "SX"), ("cubic spline", "MX")]:
+            interp = pybamm.Interpolant(
+                ((x, x), np.ones((5, 5))), [y, 2 * y], interpolator=interpolator
+            )
+            self.assertEqual(pybamm.choose_casadi_graph([2 * interp], 10), graph)
+
     def test_errors(self):
         y = pybamm.StateVector(slice(0, 10))
         with self.assertRaisesRegex(
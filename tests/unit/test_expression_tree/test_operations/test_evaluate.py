@@ -32,8 +32,8 @@ class TestEvaluate(unittest.TestCase):
         self.assertEqual(list(variable_symbols.keys())[2], expr.id)
 
         # test values of variable_symbols
-        self.assertEqual(list(variable_symbols.values())[0], "y[:1][[True]]")
-        self.assertEqual(list(variable_symbols.values())[1], "y[:2][[False, True]]")
+        self.assertEqual(list(variable_symbols.values())[0], "y[0:1]")
+        self.assertEqual(list(variable_symbols.values())[1], "y[1:2]")
 
         var_a = pybamm.id_to_python_variable(a.id)
         var_b = pybamm.id_to_python_variable(b.id)
@@ -55,8 +55,8 @@ class TestEvaluate(unittest.TestCase):
         self.assertEqual(list(variable_symbols.keys())[3], expr.id)
 
         # test values of variable_symbols
-        self.assertEqual(list(variable_symbols.values())[0], "y[:1][[True]]")
-        self.assertEqual(list(variable_symbols.values())[1], "y[:2][[False, True]]")
+        self.assertEqual(list(variable_symbols.values())[0], "y[0:1]")
+        self.assertEqual(list(variable_symbols.values())[1], "y[1:2]")
         self.assertEqual(
             list(variable_symbols.values())[2], "{} + {}".format(var_a, var_b)
         )
@@ -80,8 +80,8 @@ class TestEvaluate(unittest.TestCase):
         self.assertEqual(list(variable_symbols.keys())[3], expr.id)
 
         # test values of variable_symbols
-        self.assertEqual(list(variable_symbols.values())[0], "y[:1][[True]]")
-        self.assertEqual(list(variable_symbols.values())[1], "y[:2][[False, True]]")
+        self.assertEqual(list(variable_symbols.values())[0], "y[0:1]")
+        self.assertEqual(list(variable_symbols.values())[1], "y[1:2]")
         self.assertEqual(list(variable_symbols.values())[2], "-{}".format(var_b))
         var_child = pybamm.id_to_python_variable(expr.children[1].id)
         self.assertEqual(
@@ -97,7 +97,7 @@ class TestEvaluate(unittest.TestCase):
         self.assertEqual(list(constant_symbols.values())[0], test_function)
         self.assertEqual(list(variable_symbols.keys())[0], a.id)
         self.assertEqual(list(variable_symbols.keys())[1], expr.id)
-        self.assertEqual(list(variable_symbols.values())[0], "y[:1][[True]]")
+        self.assertEqual(list(variable_symbols.values())[0], "y[0:1]")
         var_funct = pybamm.id_to_python_variable(expr.id, True)
         self.assertEqual(
             list(variable_symbols.values())[1], "{}({})".format(var_funct, var_a)
@@ -163,6 +163,88 @@ class TestEvaluate(unittest.TestCase):
             with self.assertRaises(NotImplementedError):
                 pybamm.find_symbols(expr, constant_symbols, variable_symbols)
 
+    def test_find_symbols_traced_types(self):
+        a = pybamm.StateVector(slice(0, 2))
+        b = pybamm.StateVector(slice(2, 4))
+        B = pybamm.Matrix(scipy.sparse.csr_matrix(np.array([[1, 0], [0, 4]])))
+        var_a = pybamm.id_to_python_variable(a.id)
+        var_b = pybamm.id_to_python_variable(b.id)
+        var_B = pybamm.id_to_python_variable(B.id, True)
+
+        # dense multiplication and division don't check for sparse matrices
+        for expr, expected in [
+            (a * b, "{} * {}".format(var_a, var_b)),
+            (a / b, "{} / {}".format(var_a, var_b)),
+            (pybamm.inner(a, b), "{} * {}".format(var_a, var_b)),
+        ]:
+            constant_symbols = OrderedDict()
+            variable_symbols = OrderedDict()
+            output_values = {}
+            pybamm.find_symbols(expr, constant_symbols, variable_symbols, output_values)
+            self.assertEqual(variable_symbols[expr.id], expected)
+            np.testing.assert_array_equal(output_values[expr.id], np.ones((2, 1)))
+
+        # sparse multiplication and division
+        for expr, expected in [
+            (B * a, "scipy.sparse.csr_matrix({}.multiply({}))".format(var_B, var_a)),
+            (a * B, "scipy.sparse.csr_matrix({}.multiply({}))".format(var_B, var_a)),
+            (
+                B / a,
+                "scipy.sparse.csr_matrix({}.multiply(1/{}))".format(var_B, var_a),
+            ),
+        ]:
+            constant_symbols = OrderedDict()
+            variable_symbols = OrderedDict()
+            output_values = {}
+            pybamm.find_symbols(expr, constant_symbols, variable_symbols, output_values)
+            self.assertEqual(variable_symbols[expr.id], expected)
+            self.assertTrue(scipy.sparse.issparse(output_values[expr.id]))
+
+        # types that cannot be traced are checked at run time
+        expr = pybamm.Function(lambda x: x.undefined_method(), a) * b
+        constant_symbols = OrderedDict()
+        variable_symbols = OrderedDict()
+        output_values = {}
+        pybamm.find_symbols(expr, constant_symbols, variable_symbols, output_values)
+        self.assertIn("scipy.sparse.issparse", variable_symbols[expr.id])
+        self.assertIsNone(output_values[expr.id])
+
+    def test_fuse_elementwise(self):
+        a = pybamm.StateVector(slice(0, 2))
+        b = pybamm.StateVector(slice(2, 4))
+        A = pybamm.Matrix(np.array([[1, 2], [3, 4]]))
+        var_a = pybamm.id_to_python_variable(a.id)
+        var_b = pybamm.id_to_python_variable(b.id)
+
+        expr = A @ (-(a * b) + 2 * b)
+        constant_symbols = OrderedDict()
+        variable_symbols = OrderedDict()
+        output_values = {}
+        pybamm.find_symbols(expr, constant_symbols, variable_symbols, output_values)
+        fused = pybamm.fuse_elementwise(expr, variable_symbols, output_values)
+        self.assertEqual(list(fused.keys()), [a.id, b.id, expr.id])
+        var_2 = pybamm.id_to_python_variable(pybamm.Scalar(2).id, True)
+        self.assertEqual(
+            fused[expr.id],
+            "{} @ ((-({} * {})) + ({} * {}))".format(
+                pybamm.id_to_python_variable(A.id, True), var_a, var_b, var_2, var_b
+            ),
+        )
+
+        # expressions that are used more than once are not fused
+        expr = A @ (a * b) + pybamm.exp(a * b)
+        constant_symbols = OrderedDict()
+        variable_symbols = OrderedDict()
+        output_values = {}
+        pybamm.find_symbols(expr, constant_symbols, variable_symbols, output_values)
+        fused = pybamm.fuse_elementwise(expr, variable_symbols, output_values)
+        self.assertIn((a * b).id, fused)
+
+        y = np.array([[1], [-2], [3], [4]])
+        for expr in [expr, pybamm.AbsoluteValue(a) * b]:
+            evaluator = pybamm.EvaluatorPython(expr)
+            np.testing.assert_allclose(evaluator.evaluate(y=y), expr.evaluate(y=y))
+
     def test_domain_concatenation(self):
         disc = get_discretisation_for_testing()
         mesh = disc.mesh
@@ -189,10 +271,15 @@ class TestEvaluate(unittest.TestCase):
 
         var_a = pybamm.id_to_python_variable(a.id)
         var_b = pybamm.id_to_python_variable(b.id)
-        self.assertEqual(len(constant_symbols), 0)
+        var_permutation = pybamm.id_to_python_variable(expr.id, True)
+        self.assertEqual(len(constant_symbols), 1)
+        np.testing.assert_array_equal(
+            constant_symbols[expr.id],
+            np.concatenate([np.arange(b_pts, a_pts + b_pts), np.arange(b_pts)]),
+        )
         self.assertEqual(
             list(variable_symbols.values())[2],
-            "np.concatenate(({}[0:{}],{}[0:{}]))".format(var_a, a_pts, var_b, b_pts),
+            "np.concatenate(({},{}))[{}]".format(var_b, var_a, var_permutation),
         )
 
         evaluator = pybamm.EvaluatorPython(expr)
@@ -201,6 +288,12 @@ class TestEvaluate(unittest.TestCase):
 
         # check that concatenating a single domain is consistent
         expr = pybamm.DomainConcatenation([a], mesh)
+        constant_symbols = OrderedDict()
+        variable_symbols = OrderedDict()
+        pybamm.find_symbols(expr, constant_symbols, variable_symbols)
+        # the child is already in the right order
+        self.assertEqual(len(constant_symbols), 0)
+        self.assertEqual(list(variable_symbols.values())[1], var_a)
         evaluator = pybamm.EvaluatorPython(expr)
         result = evaluator.evaluate(y=y)
         np.testing.assert_allclose(result, expr.evaluate(y=y))
@@ -226,20 +319,50 @@ class TestEvaluate(unittest.TestCase):
         variable_symbols = OrderedDict()
         pybamm.find_symbols(expr, constant_symbols, variable_symbols)
 
-        b0_str = "{}[0:{}]".format(var_b, b0_pts)
-        a0_str = "{}[0:{}]".format(var_a, a0_pts)
-        b1_str = "{}[{}:{}]".format(var_b, b0_pts, b0_pts + b1_pts)
-
-        self.assertEqual(len(constant_symbols), 0)
+        var_permutation = pybamm.id_to_python_variable(expr.id, True)
+
+        self.assertEqual(len(constant_symbols), 1)
+        np.testing.assert_array_equal(
+            constant_symbols[expr.id],
+            np.concatenate(
+                [
+                    np.arange(a0_pts, a0_pts + b0_pts),
+                    np.arange(a0_pts),
+                    np.arange(a0_pts + b0_pts, a0_pts + b0_pts + b1_pts),
+                ]
+            ),
+        )
         self.assertEqual(
             list(variable_symbols.values())[2],
-            "np.concatenate(({},{},{}))".format(b0_str, a0_str, b1_str),
+            "np.concatenate(({},{}))[{}]".format(var_a, var_b, var_permutation),
         )
 
         evaluator = pybamm.EvaluatorPython(expr)
         result = evaluator.evaluate(y=y)
         np.testing.assert_allclose(result, expr.evaluate(y=y))
 
+    def test_evaluator_python_several_times(self):
+        disc = get_1p1d_discretisation_for_testing()
+        a = pybamm.Variable("a", domain=["negative electrode"])
+        b = pybamm.Variable("b", domain=["positive electrode"])
+        disc.set_variable_slices([a, b])
+        expr = disc.process_symbol(
+            pybamm.Concatenation(a * pybamm.t, pybamm.exp(b)) + pybamm.t
+        )
+        n_times = 5
+        t = np.linspace(0, 1, n_times)
+        y = np.random.rand(expr.size, n_times)
+        evaluator = pybamm.EvaluatorPython(expr)
+        result = evaluator.evaluate(t=t, y=y)
+        self.assertEqual(result.shape, (expr.size, n_times))
+        for idx in range(n_times):
+            np.testing.assert_allclose(
+                result[:, idx], evaluator.evaluate(t=t[idx], y=y[:, idx])[:, 0]
+            )
+            np.testing.assert_allclose(
+                result[:, idx], expr.evaluate(t=t[idx], y=y[:, idx])[:, 0]
+            )
+
     def test_domain_concatenation_2D(self):
         disc = get_1p1d_discretisation_for_testing()
 
@@ -266,7 +389,18 @@ class TestEvaluate(unittest.TestCase):
         self.assertEqual(list(variable_symbols.keys())[1], b_disc.id)
         self.assertEqual(list(variable_symbols.keys())[2], expr.id)
 
-        self.assertEqual(len(constant_symbols), 0)
+        # the points of a and b alternate, so a and b are read from y with integer
+        # indices, and the concatenation is a single gather
+        self.assertEqual(len(constant_symbols), 3)
+        np.testing.assert_array_equal(
+            y[constant_symbols[a_disc.id]], a_disc.evaluate(y=y)
+        )
+        np.testing.assert_array_equal(
+            np.concatenate([a_disc.evaluate(y=y), b_disc.evaluate(y=y)])[
+                constant_symbols[expr.id]
+            ],
+            expr.evaluate(y=y),
+        )
 
         evaluator = pybamm.EvaluatorPython(expr)
         result = evaluator.evaluate(y=y)
@@ -286,8 +420,8 @@ class TestEvaluate(unittest.TestCase):
         expr = a + b
         constant_str, variable_str = pybamm.to_python(expr)
         expected_str = (
-            "self\.var_[0-9m]+ = y\[:1\]\[\[True\]\].*\\n"
-            "self\.var_[0-9m]+ = y\[:2\]\[\[False, True\]\].*\\n"
+            "self\.var_[0-9m]+ = y\[0:1\].*\\n"
+            "self\.var_[0-9m]+ = y\[1:2\].*\\n"
             "self\.var_[0-9m]+ = self\.var_[0-9m]+ \+ self\.var_[0-9m]+"
         )
 
@@ -0,0 +1,180 @@
+#
+# Tests for the flat evaluator
+#
+import pybamm
+
+import unittest
+import numpy as np
+import scipy.sparse
+from unittest import mock
+
+
+def test_function(arg):
+    return arg + arg
+
+
+class TestEvaluatorFlat(unittest.TestCase):
+    def test_evaluate(self):
+        a = pybamm.StateVector(slice(0, 1))
+        b = pybamm.StateVector(slice(1, 2))
+        y_tests = [np.array([[2], [3]]), np.array([[1], [3]])]
+        t_tests = [1, 2]
+        A = pybamm.Matrix(np.array([[1, 2], [3, 4]]))
+        B = pybamm.Matrix(scipy.sparse.csr_matrix(np.array([[1, 0], [0, 4]])))
+        v = pybamm.Vector(np.array([1, 2]))
+
+        exprs = [
+            a * b,
+            pybamm.Function(test_function, a * b),
+            a * b + b + a ** 2 / b + 2 * a + b / 2 + 4,
+            a * pybamm.t,
+            -a + pybamm.exp(b),
+            A @ B @ pybamm.StateVector(slice(0, 2)),
+            v <= pybamm.StateVector(slice(0, 2)),
+            pybamm.Index(A @ pybamm.StateVector(slice(0, 2)), 0),
+            pybamm.NumpyConcatenation(a, b, pybamm.t * v),
+            pybamm.SparseStack(B * a, B),
+        ]
+        for expr in exprs:
+            evaluator = pybamm.EvaluatorFlat(expr)
+            for t, y in zip(t_tests, y_tests):
+                result = evaluator.evaluate(t=t, y=y)
+                expected = expr.evaluate(t=t, y=y)
+                if scipy.sparse.issparse(expected):
+                    result = result.toarray()
+                    expected = expected.toarray()
+                np.testing.assert_array_equal(result, expected)
+
+    def test_constant(self):
+        expr = pybamm.Scalar(2) * pybamm.Scalar(3)
+        evaluator = pybamm.EvaluatorFlat(expr)
+        self.assertEqual(evaluator.evaluate(), 6)
+        self.assertEqual(evaluator.instructions, 0)
+        self.assertEqual(evaluator.evaluate(known_evals={}), (6, {}))
+
+        # constant subtrees are evaluated once, when the evaluator is created
+        a = pybamm.StateVector(slice(0, 1))
+        expr = (pybamm.Scalar(2) + pybamm.Scalar(3)) * pybamm.exp(pybamm.Scalar(0)) * a
+        evaluator = pybamm.EvaluatorFlat(expr)
+        self.assertEqual(evaluator.instructions, 2)
+        self.assertEqual(evaluator.evaluate(y=np.array([2])), 10)
+
+    def test_shared_subexpressions(self):
+        a = pybamm.StateVector(slice(0, 1))
+        b = pybamm.StateVector(slice(1, 2))
+        # a + b is only computed once
+        expr = (a + b) * (a + b) - (a + b)
+        evaluator = pybamm.EvaluatorFlat(expr)
+        self.assertEqual(evaluator.instructions, 5)
+        y = np.array([1, 2])
+        self.assertEqual(evaluator.evaluate(y=y), expr.evaluate(y=y))
+
+    def test_known_evals(self):
+        a = pybamm.StateVector(slice(0, 1))
+        b = pybamm.StateVector(slice(1, 2))
+        y = np.array([1, 2])
+        expr1 = pybamm.exp(a + b)
+        expr2 = (a + b) * 2
+
+        known_evals = {}
+        value, known_evals = pybamm.EvaluatorFlat(expr1).evaluate(
+            y=y, known_evals=known_evals
+        )
+        self.assertEqual(value, np.exp(3))
+        self.assertEqual(known_evals[(a + b).id], 3)
+
+        # known values are reused
+        known_evals[(a + b).id] = 4
+        value, known_evals = pybamm.EvaluatorFlat(expr2).evaluate(
+            y=y, known_evals=known_evals
+        )
+        self.assertEqual(value, 8)
+
+    def test_multiple_symbols(self):
+        a = pybamm.StateVector(slice(0, 1))
+        b = pybamm.StateVector(slice(1, 2))
+        y = np.array([1, 2])
+        shared = pybamm.exp(a + b)
+        exprs = [shared * a, shared + b, pybamm.Scalar(3), shared]
+        evaluator = pybamm.EvaluatorFlat(exprs)
+        # a, b, a + b and exp(a + b) are only computed once
+        self.assertEqual(evaluator.instructions, 6)
+        values = evaluator.evaluate(t=0, y=y)
+        self.assertEqual(len(values), 4)
+        for value, expr in zip(values, exprs):
+            self.assertEqual(value, expr.evaluate(y=y))
+        values, known_evals = evaluator.evaluate(t=0, y=y, known_evals={})
+        self.assertEqual(known_evals[shared.id], np.exp(3))
+
+        # outputs evaluated at the same point share the same evaluation
+        outputs = [evaluator.output(idx) for idx in range(len(exprs))]
+        self.assertEqual(outputs[0].evaluate(0, y), np.exp(3))
+        self.assertIs(outputs[1].evaluate(0, y), evaluator._last_values[1])
+        self.assertEqual(outputs[1].evaluate(0, y), np.exp(3) + 2)
+        self.assertEqual(outputs[2].evaluate(0, y, known_evals={}), (3, {}))
+        # and are evaluated again at a new point
+        y[0] = 0
+        self.assertEqual(outputs[3].evaluate(0, y), np.exp(2))
+        self.assertEqual(outputs[0].evaluate(1, y), 0)
+
+    def test_inputs(self):
+        a = pybamm.StateVector(slice(0, 1))
+        expr = pybamm.InputParameter("p") * a
+        evaluator = pybamm.EvaluatorFlat(expr)
+        self.assertEqual(evaluator.evaluate(y=np.array([2]), u={"p": 3}), 6)
+        with self.assertRaisesRegex(KeyError, "Input parameter 'p' not found"):
+            evaluator.evaluate(y=np.array([2]), u={})
+
+    def test_deep_tree(self):
+        # trees that are too deep for recursive evaluation
+        a = pybamm.StateVector(slice(0, 1))
+        expr = a
+        for i in range(2000):
+            expr = pybamm.Addition(expr, pybamm.Scalar(1))
+        evaluator = pybamm.EvaluatorFlat(expr)
+        self.assertEqual(evaluator.evaluate(y=np.array([1])), 2001)
+
+    def test_discretised_model(self):
+        sim = pybamm.Simulation(pybamm.lithium_ion.SPMe())
+        sim.build()
+        model = sim.built_model
+        y = model.concatenated_initial_conditions
+        symbols = [model.concatenated_rhs, *model.events.values()]
+        evaluator = pybamm.EvaluatorFlat(symbols)
+
+        # the subtrees shared by the rhs and events are only computed once, and the
+        # registers are reused once the values they hold are no longer needed
+        self.assertLess(
+            evaluator.instructions,
+            sum(pybamm.EvaluatorFlat(symbol).instructions for symbol in symbols),
+        )
+        self.assertLess(len(evaluator._registers), evaluator.instructions)
+
+        # the outputs are all evaluated together the first time they are needed at
+        # a point, and the values are reused by the other outputs
+        outputs = [evaluator.output(idx) for idx in range(len(symbols))]
+        with mock.patch.object(
+            evaluator, "evaluate", wraps=evaluator.evaluate
+        ) as evaluate:
+            for output, symbol in zip(outputs, symbols):
+                np.testing.assert_allclose(
+                    output.evaluate(0, y), symbol.evaluate(0, y), rtol=1e-14
+                )
+            self.assertEqual(evaluate.call_count, 1)
+            y_new = 2 * y
+            np.testing.assert_allclose(
+                outputs[0].evaluate(0, y_new),
+                model.concatenated_rhs.evaluate(0, y_new),
+                rtol=1e-14,
+            )
+            self.assertEqual(evaluate.call_count, 2)
+
+
+if __name__ == "__main__":
+    print("Add -v for more debug output")
+    import sys
+
+    if "-v" in sys.argv:
+        debug = True
+    pybamm.settings.debug_mode = True
+    unittest.main()
@@ -0,0 +1,219 @@
+#
+# Tests for the numba evaluator
+#
+import pybamm
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+import scipy.sparse
+
+
+def test_function(arg):
+    return arg + arg
+
+
+@unittest.skipIf(not pybamm.have_numba(), "numba is not installed")
+class TestEvaluatorNumba(unittest.TestCase):
+    def setUp(self):
+        # compile into a temporary cache directory
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patch = mock.patch.object(
+            pybamm.expression_tree.operations.evaluate_numba,
+            "NUMBA_CACHE_DIR",
+            cache_dir.name,
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_evaluate(self):
+        a = pybamm.StateVector(slice(0, 1))
+        b = pybamm.StateVector(slice(1, 2))
+        y = pybamm.StateVector(slice(0, 2))
+        y_tests = [np.array([[2.0], [3.0]]), np.array([[1.0], [3.0]])]
+        t_tests = [1, 2]
+        A = pybamm.Matrix(np.array([[1, 2], [3, 4]]))
+        B = pybamm.Matrix(scipy.sparse.csr_matrix(np.array([[1, 0], [0, 4]])))
+        v = pybamm.Vector(np.array([1, 2]))
+
+        exprs = [
+            a * b + b + a ** 2 / b + 2 * a + b / 2 + 4 - a * pybamm.t,
+            -y + pybamm.exp(y) * pybamm.log(y) + pybamm.sqrt(y) ** a,
+            A @ (B @ y) + (v <= y) * y,
+            pybamm.NumpyConcatenation(a, b, pybamm.t * v),
+        ]
+        for expr in exprs:
+            evaluator = pybamm.EvaluatorNumba(expr)
+            jacobian = pybamm.EvaluatorNumba(expr, n_states=2)
+            expected_jacobian = pybamm.Jacobian().jac(expr, y)
+            for t, y_test in zip(t_tests, y_tests):
+                np.testing.assert_allclose(
+                    evaluator.evaluate(t=t, y=y_test), expr.evaluate(t=t, y=y_test)
+                )
+                np.testing.assert_allclose(
+                    jacobian.evaluate(t=t, y=y_test).toarray(),
+                    scipy.sparse.csr_matrix(
+                        expected_jacobian.evaluate(t=t, y=y_test)
+                    ).toarray(),
+                )
+
+        # Symbols without a pybamm Jacobian
+        expr = pybamm.Index(A @ y, 0) + abs(y - 2.5) + pybamm.max(y)
+        evaluator = pybamm.EvaluatorNumba(expr)
+        jacobian = pybamm.EvaluatorNumba(expr, n_states=2)
+        for t, y_test in zip(t_tests, y_tests):
+            np.testing.assert_allclose(
+                evaluator.evaluate(t=t, y=y_test), expr.evaluate(t=t, y=y_test)
+            )
+            np.testing.assert_allclose(
+                jacobian.evaluate(t=t, y=y_test).toarray(),
+                np.array([[1, 3], [1, 3]]) + np.diag(np.sign(y_test[:, 0] - 2.5)),
+            )
+
+    def test_jacobian(self):
+        a = pybamm.StateVector(slice(0, 3))
+        b = pybamm.StateVector(slice(3, 6))
+        A = pybamm.Matrix(scipy.sparse.diags([1, -2, 1], [-1, 0, 1], shape=(3, 3)))
+        expr = pybamm.NumpyConcatenation(A @ a * b, pybamm.tanh(b) / a)
+        jacobian = pybamm.EvaluatorNumba(expr, n_states=6)
+
+        # sparsity pattern
+        np.testing.assert_array_equal(
+            jacobian.sparsity.toarray(),
+            [
+                [1, 1, 0, 1, 0, 0],
+                [1, 1, 1, 0, 1, 0],
+                [0, 1, 1, 0, 0, 1],
+                [1, 0, 0, 1, 0, 0],
+                [0, 1, 0, 0, 1, 0],
+                [0, 0, 1, 0, 0, 1],
+            ],
+        )
+
+        y_test = np.linspace(1, 2, 6)
+        expected = pybamm.Jacobian().jac(expr, pybamm.StateVector(slice(0, 6)))
+        np.testing.assert_allclose(
+            jacobian.evaluate(y=y_test).toarray(),
+            expected.evaluate(y=y_test).toarray(),
+        )
+
+        # Jacobian with respect to the first few states only
+        jacobian = pybamm.EvaluatorNumba(expr, n_states=3)
+        self.assertEqual(jacobian.evaluate(y=y_test).shape, (6, 3))
+        np.testing.assert_allclose(
+            jacobian.evaluate(y=y_test).toarray(),
+            expected.evaluate(y=y_test).toarray()[:, :3],
+        )
+
+    def test_constant(self):
+        expr = pybamm.Scalar(2) * pybamm.Scalar(3)
+        evaluator = pybamm.EvaluatorNumba(expr)
+        self.assertEqual(evaluator.evaluate(), 6)
+        self.assertEqual(evaluator.evaluate(known_evals={}), (6, {}))
+        self.assertIsNone(evaluator.source)
+        jacobian = pybamm.EvaluatorNumba(expr, n_states=2)
+        self.assertEqual(jacobian.evaluate().shape, (1, 2))
+        self.assertEqual(jacobian.evaluate().nnz, 0)
+
+    def test_inputs(self):
+        a = pybamm.StateVector(slice(0, 1))
+        expr = pybamm.InputParameter("p") * a
+        evaluator = pybamm.EvaluatorNumba(expr)
+        self.assertEqual(evaluator.evaluate(y=np.array([2]), u={"p": 3}), 6)
+        with self.assertRaisesRegex(KeyError, "Input parameter 'p' not found"):
+            evaluator.evaluate(y=np.array([2]), u={})
+
+    def test_not_implemented(self):
+        a = pybamm.StateVector(slice(0, 1))
+        with self.assertRaisesRegex(NotImplementedError, "Cannot compile function"):
+            pybamm.EvaluatorNumba(pybamm.Function(test_function, a))
+        B = pybamm.Matrix(scipy.sparse.csr_matrix(np.array([[1, 0], [0, 4]])))
+        with self.assertRaisesRegex(NotImplementedError, "matrix"):
+            pybamm.EvaluatorNumba(B * a)
+
+    def test_cache(self):
+        a = pybamm.StateVector(slice(0, 2))
+        with tempfile.TemporaryDirectory() as cache_dir:
+            evaluator = pybamm.EvaluatorNumba(
+                pybamm.Vector(np.array([1, 2])) * a, cache_dir=cache_dir
+            )
+            files = [f for f in os.listdir(cache_dir) if f.endswith(".py")]
+            self.assertEqual(len(files), 1)
+            # the constants are not written into the code, so an expression with the
+            # same structure uses the same kernel
+            other = pybamm.EvaluatorNumba(
+                pybamm.Vector(np.array([3, 4])) * a, cache_dir=cache_dir
+            )
+            self.assertEqual(evaluator.source, other.source)
+            files = [f for f in os.listdir(cache_dir) if f.endswith(".py")]
+            self.assertEqual(len(files), 1)
+            np.testing.assert_array_equal(
+                other.evaluate(y=np.array([1, 1])), np.array([[3], [4]])
+            )
+
+    def test_discretised_model(self):
+        def build_spme(diffusivity_scale):
+            model = pybamm.lithium_ion.SPMe()
+            param = model.default_parameter_values
+            param["Negative electrode diffusivity [m2.s-1]"] *= diffusivity_scale
+            sim = pybamm.Simulation(model, parameter_values=param)
+            sim.build()
+            return sim.built_model
+
+        model = build_spme(1)
+        other_model = build_spme(2)
+        y0 = model.concatenated_initial_conditions
+        y = y0 * np.linspace(1, 1.1, y0.size)[:, np.newaxis]
+        cache_dir = pybamm.expression_tree.operations.evaluate_numba.NUMBA_CACHE_DIR
+
+        evaluator = pybamm.EvaluatorNumba(model.concatenated_rhs)
+        files = os.listdir(cache_dir)
+
+        # a model with different parameter values reuses the same kernel
+        other = pybamm.EvaluatorNumba(other_model.concatenated_rhs)
+        self.assertEqual(os.listdir(cache_dir), files)
+        self.assertIs(other._kernel, evaluator._kernel)
+        np.testing.assert_allclose(
+            other.evaluate(0, y),
+            other_model.concatenated_rhs.evaluate(0, y),
+            rtol=1e-10,
+        )
+        self.assertGreater(
+            np.max(abs(other.evaluate(0, y) - evaluator.evaluate(0, y))), 1
+        )
+
+        # in a new session, the compiled kernel is loaded from the cache directory
+        with mock.patch.dict(
+            pybamm.expression_tree.operations.evaluate_numba._numba_modules, clear=True
+        ):
+            reloaded = pybamm.EvaluatorNumba(other_model.concatenated_rhs)
+            np.testing.assert_array_equal(
+                reloaded.evaluate(0, y), other.evaluate(0, y)
+            )
+        self.assertIsNot(reloaded._kernel, evaluator._kernel)
+        self.assertEqual(sum(reloaded._kernel.stats.cache_hits.values()), 1)
+        self.assertEqual(sum(reloaded._kernel.stats.cache_misses.values()), 0)
+
+        # the Jacobian kernel agrees with the symbolic Jacobian of the model
+        jacobian = pybamm.EvaluatorNumba(model.concatenated_rhs, n_states=y.size)
+        expected = pybamm.Jacobian().jac(
+            model.concatenated_rhs, pybamm.StateVector(slice(0, y.size))
+        )
+        np.testing.assert_allclose(
+            jacobian.evaluate(0, y).toarray(),
+            expected.evaluate(0, y).toarray(),
+            rtol=1e-10,
+        )
+
+
+if __name__ == "__main__":
+    print("Add -v for more debug output")
+    import sys
+
+    if "-v" in sys.argv:
+        debug = True
+    pybamm.settings.debug_mode = True
+    unittest.main()
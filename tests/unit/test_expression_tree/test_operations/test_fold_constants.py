@@ -0,0 +1,177 @@
+#
+# Tests for the ConstantFolding class
+#
+import pybamm
+
+import unittest
+import numpy as np
+from unittest import mock
+from scipy.sparse import csr_matrix, diags
+
+
+class TestConstantFolding(unittest.TestCase):
+    def test_fold_chain(self):
+        y = pybamm.StateVector(slice(0, 4))
+        A = pybamm.Matrix(csr_matrix(np.array([[1, 0, 2, 0], [0, 3, 0, 4.0]])))
+        B = pybamm.Matrix(diags([1, 2, 3, 4.0], format="csr"))
+        v = pybamm.Vector(np.array([1, 2.0]))
+        y_test = np.array([[1], [2], [3], [4.0]])
+
+        # products by constant matrices, vectors and scalars are merged into a single
+        # matrix-vector product
+        for expr, removed in [
+            (A @ (B @ y), 1),
+            (v * (A @ (2 * (B @ y))), 3),
+            (-(A @ y) / v, 2),
+            ((B @ y * 3) / 2, 2),
+        ]:
+            folding = pybamm.ConstantFolding()
+            folded = folding.fold(expr)
+            self.assertIsInstance(folded, pybamm.MatrixMultiplication)
+            self.assertIsInstance(folded.left, pybamm.Matrix)
+            self.assertEqual(folded.right.id, y.id)
+            self.assertEqual(folding.operations_removed, removed)
+            np.testing.assert_array_almost_equal(
+                folded.evaluate(y=y_test), expr.evaluate(y=y_test)
+            )
+
+        # chains inside other expressions
+        expr = pybamm.exp(A @ (B @ y)) + A @ (-y)
+        folding = pybamm.ConstantFolding()
+        folded = folding.fold(expr)
+        self.assertEqual(folding.operations_removed, 2)
+        np.testing.assert_array_almost_equal(
+            folded.evaluate(y=y_test), expr.evaluate(y=y_test)
+        )
+
+    def test_fold_nothing(self):
+        y = pybamm.StateVector(slice(0, 2))
+        A = pybamm.Matrix(csr_matrix(np.array([[1, 0], [2, 3.0]])))
+        v = pybamm.Vector(np.array([1, 2.0]))
+        # single matrix products, products that are not constant, and elementwise
+        # products that may broadcast are left as they are
+        for expr in [
+            A @ y,
+            A @ (pybamm.t * (A @ y)),
+            A @ (v * y),
+            pybamm.exp(y) + y,
+        ]:
+            folding = pybamm.ConstantFolding()
+            self.assertIs(folding.fold(expr), expr)
+            self.assertEqual(folding.operations_removed, 0)
+
+    def test_parameter_values(self):
+        # named scalars hold parameter values that can be updated, so are not folded
+        y = pybamm.StateVector(slice(0, 2))
+        A = pybamm.Matrix(csr_matrix(np.array([[1, 0], [2, 3.0]])))
+        D = pybamm.Scalar(2, name="Diffusivity")
+        for expr in [A @ (D * (A @ y)), (D * pybamm.Scalar(3)) * y]:
+            folding = pybamm.ConstantFolding()
+            folded = folding.fold(expr)
+            self.assertIs(folded, expr)
+            self.assertIn(D.id, [node.id for node in folded.pre_order()])
+
+    def test_fill_in(self):
+        # the product of a column and a row is a dense matrix, so the matrices are
+        # not merged
+        n = 10
+        y = pybamm.StateVector(slice(0, n))
+        column = pybamm.Matrix(csr_matrix(np.ones((n, 1))))
+        row = pybamm.Matrix(csr_matrix(np.ones((1, n))))
+        expr = column @ (row @ y)
+        folding = pybamm.ConstantFolding()
+        self.assertIs(folding.fold(expr), expr)
+
+        # but the diagonal scaling is merged with the cheapest of the two
+        D = pybamm.Matrix(diags(np.arange(n, dtype=float), format="csr"))
+        expr = column @ (row @ (D @ y))
+        folded = folding.fold(expr)
+        self.assertEqual(folding.operations_removed, 1)
+        self.assertEqual(folded.left.id, column.id)
+        self.assertEqual(folded.right.left.shape, (1, n))
+        y_test = np.linspace(0, 1, n)[:, np.newaxis]
+        np.testing.assert_array_almost_equal(
+            folded.evaluate(y=y_test), expr.evaluate(y=y_test)
+        )
+
+    def test_fold_constants(self):
+        a = pybamm.StateVector(slice(0, 2))
+        v = pybamm.Vector(np.array([1, 2, 3.0]))
+        expr = pybamm.Index(v, slice(0, 2)) * a + pybamm.NumpyConcatenation(
+            pybamm.Vector(np.array([1.0])), pybamm.Scalar(2) * pybamm.Vector(np.ones(1))
+        )
+        folded = pybamm.ConstantFolding().fold(expr)
+        self.assertIsInstance(folded.left.left, pybamm.Vector)
+        self.assertIsInstance(folded.right, pybamm.Vector)
+        np.testing.assert_array_equal(folded.right.entries, np.array([[1], [2.0]]))
+        y_test = np.array([[1], [2.0]])
+        np.testing.assert_array_equal(
+            folded.evaluate(y=y_test), expr.evaluate(y=y_test)
+        )
+
+    def test_fold_long_tree(self):
+        # shared chains are folded once
+        a = pybamm.StateVector(slice(0, 1))
+        A = pybamm.Matrix(csr_matrix(np.array([[2.0]])))
+        expr = a
+        for i in range(200):
+            expr = pybamm.Addition(expr, A @ (A @ a))
+        folding = pybamm.ConstantFolding()
+        folded = folding.fold(expr)
+        self.assertEqual(folding.operations_removed, 1)
+        self.assertEqual(folded.evaluate(y=np.array([[1.0]])), 801)
+
+    def test_discretised_model(self):
+        def discretise_spme():
+            model = pybamm.lithium_ion.SPMe()
+            geometry = model.default_geometry
+            param = model.default_parameter_values
+            param.process_model(model)
+            param.process_geometry(geometry)
+            mesh = pybamm.Mesh(
+                geometry, model.default_submesh_types, model.default_var_pts
+            )
+            disc = pybamm.Discretisation(mesh, model.default_spatial_methods)
+            disc.process_model(model)
+            return model
+
+        def count_products(symbol):
+            return sum(
+                isinstance(node, pybamm.MatrixMultiplication)
+                for node in symbol.pre_order()
+            )
+
+        model = discretise_spme()
+        with mock.patch.object(
+            pybamm.ConstantFolding, "fold", lambda self, symbol: symbol
+        ):
+            unfolded_model = discretise_spme()
+
+        # folding removes matrix products from the discretised model without
+        # changing its values
+        self.assertLess(
+            count_products(model.concatenated_rhs),
+            count_products(unfolded_model.concatenated_rhs),
+        )
+        y = model.concatenated_initial_conditions
+        np.testing.assert_allclose(
+            model.concatenated_rhs.evaluate(0, y),
+            unfolded_model.concatenated_rhs.evaluate(0, y),
+            rtol=1e-12,
+            atol=1e-12,
+        )
+
+        # and the chains of the discretised model are all folded
+        folding = pybamm.ConstantFolding()
+        folding.fold(model.concatenated_rhs)
+        self.assertEqual(folding.operations_removed, 0)
+
+
+if __name__ == "__main__":
+    print("Add -v for more debug output")
+    import sys
+
+    if "-v" in sys.argv:
+        debug = True
+    pybamm.settings.debug_mode = True
+    unittest.main()
@@ -0,0 +1,110 @@
+#
+# Tests for the Interner class
+#
+import pybamm
+
+import unittest
+import numpy as np
+from unittest import mock
+
+
+class TestInterner(unittest.TestCase):
+    def test_intern(self):
+        a = pybamm.StateVector(slice(0, 1))
+        b = pybamm.StateVector(slice(1, 2))
+        expr = pybamm.exp(a + b) * (a + b) - pybamm.exp(a + b)
+        interner = pybamm.Interner()
+        shared = interner.intern(expr)
+        self.assertEqual(shared.id, expr.id)
+        y = np.array([1, 2])
+        self.assertEqual(shared.evaluate(y=y), expr.evaluate(y=y))
+
+        # identical subtrees are the same object
+        exp1 = shared.children[0].children[0]
+        exp2 = shared.children[1]
+        self.assertIs(exp1, exp2)
+        self.assertIs(exp1.children[0], shared.children[0].children[1])
+        self.assertIs(shared.left.right, shared.right.children[0])
+        self.assertIs(shared.left.left, exp1)
+        # a, b, a + b, exp(a + b), the product and the difference
+        self.assertEqual(len(interner), 6)
+
+        # the original tree is not changed
+        self.assertIsNot(expr.children[0].children[0], expr.children[1])
+
+        # symbols are shared between trees interned by the same object
+        other = interner.intern(pybamm.exp(a + b) + b)
+        self.assertIs(other.children[0], exp1)
+        self.assertIs(other.children[1], exp1.children[0].children[1])
+        self.assertIs(interner.intern(pybamm.exp(a + b)), exp1)
+        self.assertEqual(len(interner), 7)
+
+    def test_intern_leaf(self):
+        a = pybamm.Scalar(1)
+        interner = pybamm.Interner()
+        self.assertIs(interner.intern(a), a)
+        self.assertIs(interner.intern(pybamm.Scalar(1)), a)
+
+    def test_intern_deep_tree(self):
+        # trees that are too deep for recursion
+        a = pybamm.StateVector(slice(0, 1))
+        expr = a
+        for i in range(2000):
+            expr = pybamm.Addition(expr, pybamm.Scalar(1))
+        shared = pybamm.Interner().intern(expr)
+        self.assertEqual(shared.id, expr.id)
+        self.assertIs(shared.children[1], shared.children[0].children[1])
+
+    def test_discretised_model(self):
+        def discretise_spm():
+            model = pybamm.lithium_ion.SPM()
+            geometry = model.default_geometry
+            param = model.default_parameter_values
+            param.process_model(model)
+            param.process_geometry(geometry)
+            mesh = pybamm.Mesh(
+                geometry, model.default_submesh_types, model.default_var_pts
+            )
+            disc = pybamm.Discretisation(mesh, model.default_spatial_methods)
+            disc.process_model(model)
+            return model
+
+        def node_objects(model):
+            "The ids and objects of all the nodes of the variables of a model"
+            nodes = {}
+            for variable in model.variables.values():
+                for node in variable.pre_order():
+                    nodes.setdefault(node.id, set()).add(id(node))
+            return nodes
+
+        model = discretise_spm()
+        with mock.patch.object(pybamm.Interner, "intern", lambda self, symbol: symbol):
+            unshared_model = discretise_spm()
+
+        # each subtree of the discretised model is a single object, so interning
+        # reduces the number of node objects without changing the trees
+        nodes = node_objects(model)
+        unshared_nodes = node_objects(unshared_model)
+        self.assertTrue(all(len(objects) == 1 for objects in nodes.values()))
+        self.assertEqual(nodes.keys(), unshared_nodes.keys())
+        self.assertLess(
+            len(nodes), sum(len(objects) for objects in unshared_nodes.values())
+        )
+        y = model.concatenated_initial_conditions
+        for name, variable in model.variables.items():
+            np.testing.assert_allclose(
+                variable.evaluate(0, y),
+                unshared_model.variables[name].evaluate(0, y),
+                rtol=1e-14,
+                atol=1e-12,
+            )
+
+
+if __name__ == "__main__":
+    print("Add -v for more debug output")
+    import sys
+
+    if "-v" in sys.argv:
+        debug = True
+    pybamm.settings.debug_mode = True
+    unittest.main()
@@ -5,7 +5,7 @@ import pybamm
 
 import numpy as np
 import unittest
-from scipy.sparse import eye
+from scipy.sparse import csr_matrix, eye
 from tests import get_mesh_for_testing
 
 
@@ -325,6 +325,95 @@ class TestJacobian(unittest.TestCase):
         ):
             conc.jac(y)
 
+    def test_jac_structure(self):
+        y = pybamm.StateVector(slice(0, 4))
+        u = pybamm.StateVector(slice(0, 2))
+        v = pybamm.StateVector(slice(2, 4))
+        A = pybamm.Matrix(np.array([[1.0, 0.0], [2.0, 3.0]]))
+        B = pybamm.Matrix(csr_matrix(np.array([[0.0, 1.0], [0.0, 0.0]])))
+        w = pybamm.Vector(np.array([1.0, 2.0]))
+        y0 = np.array([1.5, 2.5, 3.5, 4.5])
+
+        exprs = [
+            u,
+            -v + 3 * pybamm.t,
+            u * v + v ** 2 / u,
+            A @ u + B @ v,
+            -B @ v,
+            pybamm.exp(u) * pybamm.InputParameter("p") + w,
+            pybamm.Function(test_multi_var_function, u, v),
+            pybamm.Index(A @ u + v, 1),
+            pybamm.Index(v, slice(0, 1)) * u,
+            pybamm.NumpyConcatenation(u, pybamm.Index(v, 0) * v, pybamm.t * w),
+            (u <= v) * v,
+            pybamm.Outer(pybamm.Index(u, 0), w),
+        ]
+        for expr in exprs:
+            structure = pybamm.Jacobian(structure=True).jac(expr, y)
+            self.assertEqual(structure.dtype, bool)
+            jac = expr.jac(y).evaluate(t=1, y=y0, u={"p": 2})
+            jac = csr_matrix(jac, shape=structure.shape)
+            jac.eliminate_zeros()
+            np.testing.assert_array_equal(structure.toarray(), jac.toarray() != 0)
+
+        # the structure is defined even where the derivative is not
+        structure = pybamm.Jacobian(structure=True).jac(abs(u) + v, y)
+        np.testing.assert_array_equal(
+            structure.toarray(), [[1, 0, 1, 0], [0, 1, 0, 1]]
+        )
+
+        # reductions
+        structure = pybamm.Jacobian(structure=True).jac(pybamm.max(u), y)
+        np.testing.assert_array_equal(structure.toarray(), [[1, 1, 0, 0]])
+
+        # constants
+        structure = pybamm.Jacobian(structure=True).jac(w, y)
+        self.assertEqual(structure.shape, (2, 4))
+        self.assertEqual(structure.nnz, 0)
+
+        # Jacobian with respect to a slice of the state vector
+        structure = pybamm.Jacobian(structure=True).jac(u * v, v)
+        np.testing.assert_array_equal(structure.toarray(), np.eye(2))
+
+        # errors
+        with self.assertRaisesRegex(NotImplementedError, "single-slice"):
+            pybamm.Jacobian(structure=True).jac(
+                u, pybamm.StateVector(slice(0, 1), slice(2, 3))
+            )
+        with self.assertRaisesRegex(NotImplementedError, "MatrixMultiplication"):
+            pybamm.Jacobian(structure=True).jac((u * v) @ u, y)
+        with self.assertRaisesRegex(NotImplementedError, "structure"):
+            pybamm.Jacobian(structure=True).jac(pybamm.Variable("c"), y)
+
+    def test_jac_structure_of_domain_concatenation(self):
+        mesh = get_mesh_for_testing()
+        a_dom = ["negative electrode"]
+        b_dom = ["separator"]
+        a_npts = mesh[a_dom[0]][0].npts
+        b_npts = mesh[b_dom[0]][0].npts
+        y = pybamm.StateVector(slice(0, a_npts + b_npts))
+        a = 2 * pybamm.StateVector(slice(0, a_npts), domain=a_dom)
+        b = pybamm.Vector(np.ones(b_npts), domain=b_dom)
+        conc = pybamm.DomainConcatenation([a, b], mesh)
+        structure = pybamm.Jacobian(structure=True).jac(conc, y)
+        np.testing.assert_array_equal(
+            structure.toarray(),
+            np.diag(np.concatenate([np.ones(a_npts), np.zeros(b_npts)])),
+        )
+
+        # children with several domains
+        c_dom = ["negative electrode", "positive electrode"]
+        c_npts = a_npts + mesh[c_dom[1]][0].npts
+        y = pybamm.StateVector(slice(0, b_npts + c_npts))
+        b = pybamm.StateVector(slice(0, b_npts), domain=b_dom)
+        c = pybamm.StateVector(slice(b_npts, b_npts + c_npts), domain=c_dom)
+        conc = pybamm.DomainConcatenation([b, c], mesh)
+        structure = pybamm.Jacobian(structure=True).jac(conc, y)
+        y0 = np.arange(b_npts + c_npts, dtype=float)
+        np.testing.assert_array_equal(
+            structure.toarray() @ y0, conc.evaluate(y=y0[:, np.newaxis])[:, 0]
+        )
+
 
 if __name__ == "__main__":
     print("Add -v for more debug output")
@@ -0,0 +1,146 @@
+#
+# Tests for the Jacobian-vector products
+#
+import pybamm
+
+import numpy as np
+import unittest
+from scipy.sparse import issparse
+
+
+def test_multi_var_function(arg1, arg2):
+    return arg1 + arg2
+
+
+class TestJacobianVectorProduct(unittest.TestCase):
+    def assert_jvp_equal(self, func, y, y0, v, t=None, u=None):
+        "Compare the Jacobian-vector product with the product of the full Jacobian"
+        jac = pybamm.Jacobian().jac(func, y).evaluate(t=t, y=y0, u=u)
+        if issparse(jac):
+            jac = jac.toarray()
+        expected = jac @ v[:, np.newaxis]
+        jvp = pybamm.JacobianVectorProduct(len(y0)).jvp(func, y)
+        y_w_v = np.concatenate([y0, v])
+        np.testing.assert_allclose(
+            jvp.evaluate(t=t, y=y_w_v, u=u), expected, rtol=1e-14, atol=1e-15
+        )
+        # the product can be compiled
+        np.testing.assert_allclose(
+            pybamm.EvaluatorFlat(jvp).evaluate(t=t, y=y_w_v, u=u),
+            expected,
+            rtol=1e-14,
+            atol=1e-15,
+        )
+
+    def test_jvp(self):
+        y = pybamm.StateVector(slice(0, 4))
+        u = pybamm.StateVector(slice(0, 2))
+        w = pybamm.StateVector(slice(2, 4))
+        a = pybamm.StateVector(slice(0, 1))
+        A = pybamm.Matrix(np.array([[1, 2], [3, 4]]))
+        y0 = np.array([1.5, 2.5, 3.5, 4.5])
+        v = np.array([0.1, -0.2, 0.3, 0.4])
+
+        funcs = [
+            u,
+            -w,
+            u + w,
+            u - 2 * w,
+            3 - u,
+            u * w,
+            u / w,
+            2 / u,
+            u ** w,
+            u ** 2,
+            2 ** w,
+            pybamm.Inner(u, w),
+            A @ u,
+            -(A @ (u * w)),
+            pybamm.exp(u) + pybamm.sin(w),
+            pybamm.Function(test_multi_var_function, u, w),
+            pybamm.Index(u * w, 1),
+            pybamm.NumpyConcatenation(u, a, pybamm.Vector(np.array([1, 2]))),
+            pybamm.NumpyConcatenation(2 * a, w ** 2),
+            pybamm.Heaviside(u, w, equal=True) * w,
+            pybamm.StateVector(slice(1, 3), slice(0, 1)) * 2,
+            pybamm.InputParameter("p") * pybamm.t * u,
+        ]
+        for func in funcs:
+            self.assert_jvp_equal(func, y, y0, v, t=2, u={"p": 3})
+
+        # the derivative of abs is taken to be sign(x), as in CasADi
+        jvp = pybamm.JacobianVectorProduct(4).jvp(abs(u - 2 * w), y)
+        np.testing.assert_allclose(
+            jvp.evaluate(y=np.concatenate([y0, v])),
+            -(v[:2] - 2 * v[2:])[:, np.newaxis],
+        )
+
+        # with respect to part of the state vector
+        self.assert_jvp_equal(u * w, u, y0, v[:2])
+        self.assert_jvp_equal(u * w, w, y0, v[2:])
+
+    def test_constant(self):
+        y = pybamm.StateVector(slice(0, 2))
+        func = pybamm.Vector(np.array([1, 2, 3])) * pybamm.t
+        jvp = pybamm.JacobianVectorProduct(2).jvp(func, y)
+        np.testing.assert_array_equal(
+            jvp.evaluate(t=1, y=np.ones(4)), np.zeros((3, 1))
+        )
+
+    def test_errors(self):
+        y = pybamm.StateVector(slice(0, 2))
+        u = pybamm.StateVector(slice(0, 2))
+        a = pybamm.StateVector(slice(0, 1))
+        jvp = pybamm.JacobianVectorProduct(2)
+        with self.assertRaisesRegex(NotImplementedError, "reductions"):
+            jvp.jvp(pybamm.max(u), y)
+        with self.assertRaisesRegex(NotImplementedError, "constant left child"):
+            jvp.jvp((pybamm.Matrix(np.ones((2, 2))) * a) @ u, y)
+        with self.assertRaisesRegex(NotImplementedError, "single-slice"):
+            jvp.jvp(u, pybamm.StateVector(slice(0, 1), slice(1, 2)))
+        with self.assertRaisesRegex(NotImplementedError, "symbol of type"):
+            jvp.jvp(pybamm.Variable("c"), y)
+
+    def test_discretised_model(self):
+        for model in [pybamm.lithium_ion.SPMe(), pybamm.lead_acid.LOQS()]:
+            sim = pybamm.Simulation(model)
+            sim.build()
+            model = sim.built_model
+            y0 = model.concatenated_initial_conditions[:, 0]
+            y0 = y0 * (1 + 0.01 * np.arange(len(y0)) / len(y0))
+            n = len(y0)
+            y = pybamm.StateVector(slice(0, n))
+            # unit vectors (which pick out columns of the Jacobian), a vector with
+            # entries of both signs, a random vector and the zero vector
+            vectors = [
+                np.eye(n)[0],
+                np.eye(n)[n // 2],
+                np.eye(n)[-1],
+                np.linspace(-1, 1, n),
+                np.random.RandomState(0).randn(n),
+                np.zeros(n),
+            ]
+            for func in [model.concatenated_rhs, model.concatenated_algebraic]:
+                if func.size == 0:
+                    continue
+                jac = pybamm.Jacobian().jac(func, y).evaluate(t=0, y=y0).toarray()
+                jvp = pybamm.JacobianVectorProduct(n).jvp(func, y)
+                # the product is compiled once and evaluated for each vector
+                evaluator = pybamm.EvaluatorFlat(jvp)
+                for v in vectors:
+                    np.testing.assert_allclose(
+                        evaluator.evaluate(0, np.concatenate([y0, v])),
+                        jac @ v[:, np.newaxis],
+                        rtol=1e-10,
+                        atol=1e-12,
+                    )
+
+
+if __name__ == "__main__":
+    print("Add -v for more debug output")
+    import sys
+
+    if "-v" in sys.argv:
+        debug = True
+    pybamm.settings.debug_mode = True
+    unittest.main()
@@ -148,19 +148,15 @@ class TestSimplify(unittest.TestCase):
         self.assertEqual(expr.children[0].evaluate(), 4.0)
         self.assertIsInstance(expr.children[1], pybamm.Parameter)
 
+        # the rules are applied until the expression no longer changes, so the
+        # multiplication by 1 is removed
         expr = (e * (c / e)).simplify()
-        self.assertIsInstance(expr, pybamm.Multiplication)
-        self.assertIsInstance(expr.children[0], pybamm.Scalar)
-        self.assertEqual(expr.children[0].evaluate(), 1.0)
-        self.assertIsInstance(expr.children[1], pybamm.Parameter)
+        self.assertIsInstance(expr, pybamm.Parameter)
 
         expr = ((e * c) * (c / e)).simplify()
         self.assertIsInstance(expr, pybamm.Multiplication)
-        self.assertIsInstance(expr.children[0], pybamm.Scalar)
-        self.assertEqual(expr.children[0].evaluate(), 1.0)
-        self.assertIsInstance(expr.children[1], pybamm.Multiplication)
-        self.assertIsInstance(expr.children[1].children[0], pybamm.Parameter)
-        self.assertIsInstance(expr.children[1].children[1], pybamm.Parameter)
+        self.assertIsInstance(expr.children[0], pybamm.Parameter)
+        self.assertIsInstance(expr.children[1], pybamm.Parameter)
 
         expr = (e + (e + c)).simplify()
         self.assertIsInstance(expr, pybamm.Addition)
@@ -630,6 +626,50 @@ class TestSimplify(unittest.TestCase):
         self.assertEqual(pybamm.inner(a3, a2).simplify().evaluate(), 3)
         self.assertEqual(pybamm.inner(a3, a3).simplify().evaluate(), 9)
 
+    def test_simplify_deep_tree(self):
+        # trees that are too deep for recursive simplification
+        a = pybamm.StateVector(slice(0, 1))
+        b = pybamm.StateVector(slice(1, 2))
+        expr = a
+        for i in range(2000):
+            expr = pybamm.Addition(expr, pybamm.Scalar(1))
+        expr = expr * b
+        simp = pybamm.Simplification()
+        simplified = simp.simplify(expr)
+        y = np.array([1, 2])
+        self.assertEqual(simplified.evaluate(y=y), 4002)
+        self.assertLess(len(list(simplified.pre_order())), 10)
+
+        # statistics about each rule
+        # each addition is rewritten (with the constant first), and the rules are
+        # applied again to the result
+        self.assertEqual(simp.stats["Addition"]["calls"], 4000)
+        self.assertEqual(simp.stats["Addition"]["rewrites"], 2000)
+        self.assertGreater(simp.stats["Addition"]["nodes removed"], 0)
+        self.assertGreaterEqual(simp.stats["Addition"]["time"], 0)
+        self.assertEqual(simp.stats["Multiplication"]["calls"], 1)
+
+    def test_simplify_shared_memo(self):
+        a = pybamm.StateVector(slice(0, 1), domain="negative electrode")
+        shared = pybamm.exp(a * pybamm.Scalar(2) * pybamm.Scalar(3))
+        simp = pybamm.Simplification()
+        simplified_1 = simp.simplify(shared + 1)
+        simplified_2 = simp.simplify(shared - 1)
+        # the shared subtree is only simplified once
+        self.assertEqual(simp.stats["Exponential"]["calls"], 1)
+        self.assertEqual(simplified_1.children[1].id, simplified_2.children[1].id)
+        # the original tree is not changed
+        self.assertEqual(a.domain, ["negative electrode"])
+        self.assertEqual(shared.domain, ["negative electrode"])
+
+    def test_simplify_max_iterations(self):
+        c = pybamm.Parameter("c")
+        e = pybamm.Scalar(2)
+        expr = pybamm.Simplification(max_iterations=0).simplify(e * (c / e))
+        self.assertIsInstance(expr, pybamm.Multiplication)
+        expr = pybamm.Simplification().simplify(e * (c / e))
+        self.assertIsInstance(expr, pybamm.Parameter)
+
 
 if __name__ == "__main__":
     print("Add -v for more debug output")
@@ -35,6 +35,21 @@ class TestStateVector(unittest.TestCase):
         y = np.linspace(0, 3, 31)
         np.testing.assert_array_almost_equal(sv.evaluate(y=y), y[:, np.newaxis])
 
+    def test_evaluation_index(self):
+        # contiguous entries are read with a slice, which gives a view of y
+        sv = pybamm.StateVector(slice(0, 11), slice(11, 20), slice(20, 31))
+        self.assertEqual(sv.evaluation_index, slice(0, 31))
+        y = np.linspace(0, 3, 40)[:, np.newaxis]
+        self.assertTrue(np.shares_memory(sv.evaluate(y=y), y))
+        sv = pybamm.StateVector(slice(5, 10))
+        self.assertEqual(sv.evaluation_index, slice(5, 10))
+        np.testing.assert_array_equal(sv.evaluate(y=y), y[5:10])
+
+        # other entries are read with integer indices
+        sv = pybamm.StateVector(slice(0, 2), slice(5, 7))
+        np.testing.assert_array_equal(sv.evaluation_index, [0, 1, 5, 6])
+        np.testing.assert_array_equal(sv.evaluate(y=y), y[[0, 1, 5, 6]])
+
     def test_name(self):
         sv = pybamm.StateVector(slice(0, 10))
         self.assertEqual(sv.name, "y[0:10]")
@@ -6,6 +6,9 @@ import pybamm
 import unittest
 import numpy as np
 import os
+import scipy.sparse
+import subprocess
+import sys
 
 
 class TestSymbol(unittest.TestCase):
@@ -26,15 +29,20 @@ class TestSymbol(unittest.TestCase):
             for i in range(len(children1)):
                 self.assertEqual(children1[i].name, children2[i].name)
 
-        check_are_equal(symp.children, super(pybamm.Symbol, symp).children)
         check_are_equal(symp.children, (symc1, symc2))
+        # the children are copies, and are not attached to the parent through anytree
+        self.assertIsNot(symp.children[0], symc1)
+        self.assertIsNone(symp.children[0].parent)
+        self.assertEqual(super(pybamm.Symbol, symp).children, ())
 
         # update children, since we cache the children they will be unchanged
         symc3.parent = symp
         check_are_equal(symp.children, (symc1, symc2))
 
-        # check that the *actual* children are updated
-        check_are_equal(super(pybamm.Symbol, symp).children, (symc1, symc2, symc3))
+        # the same symbol can be a child of several nodes
+        symp2 = pybamm.Symbol("parent2", children=[symc1])
+        check_are_equal(symp2.children, (symc1,))
+        check_are_equal(symp.children, (symc1, symc2))
 
     def test_symbol_domains(self):
         a = pybamm.Symbol("a", domain="test")
@@ -164,6 +172,75 @@ class TestSymbol(unittest.TestCase):
         a = pybamm.Scalar(1) * pybamm.Vector(np.zeros(10))
         self.assertTrue(a.is_constant())
 
+    def test_symbol_structure_flags(self):
+        a = pybamm.StateVector(slice(0, 1))
+        u = pybamm.InputParameter("u")
+        expr = pybamm.exp(a) + 2 * pybamm.t
+        self.assertTrue(expr.depends_on_time)
+        self.assertTrue(expr.depends_on_states)
+        self.assertFalse(expr.depends_on_inputs)
+        self.assertTrue((u * pybamm.Parameter("p")).depends_on_inputs)
+        self.assertFalse((u * pybamm.Parameter("p")).depends_on_states)
+        self.assertTrue(pybamm.Variable("v").depends_on_states)
+
+        # classes in the tree
+        self.assertTrue(expr.has_symbol_of_classes(pybamm.Exponential))
+        self.assertTrue(expr.has_symbol_of_classes(pybamm.Function))
+        self.assertTrue(expr.has_symbol_of_classes((pybamm.Time, pybamm.Division)))
+        self.assertFalse(expr.has_symbol_of_classes(pybamm.Division))
+        self.assertFalse(expr.has_symbol_of_classes(pybamm.Variable))
+        # trees with the same classes share the same set
+        self.assertIs(
+            (a + a)._symbol_classes,
+            (pybamm.StateVector(slice(1, 2)) + a)._symbol_classes,
+        )
+
+        # the flags are copied with the symbol
+        self.assertTrue((-expr).new_copy().depends_on_time)
+
+    def test_content_hash(self):
+        a = pybamm.StateVector(slice(0, 2))
+        M = pybamm.Matrix(scipy.sparse.csr_matrix(np.array([[1, 0], [0, 2]])))
+        expr = pybamm.exp(M @ a) + pybamm.Scalar(2) * pybamm.t
+        self.assertEqual(len(expr.content_hash), 32)
+
+        # equal trees have the same hash, different trees different hashes
+        M2 = pybamm.Matrix(np.array([[1, 0], [0, 2]]))
+        self.assertEqual(
+            expr.content_hash,
+            (pybamm.exp(M @ a) + pybamm.Scalar(2) * pybamm.t).content_hash,
+        )
+        for other in [
+            pybamm.exp(M2 @ a) + pybamm.Scalar(2) * pybamm.t,
+            pybamm.exp(M @ a) + pybamm.Scalar(3) * pybamm.t,
+            pybamm.exp(M @ pybamm.StateVector(slice(1, 3))) + 2 * pybamm.t,
+            pybamm.sin(M @ a) + pybamm.Scalar(2) * pybamm.t,
+            pybamm.Scalar(2) * pybamm.t + pybamm.exp(M @ a),
+        ]:
+            self.assertNotEqual(expr.content_hash, other.content_hash)
+        b = pybamm.Symbol("b", domain="test")
+        self.assertNotEqual(
+            b.content_hash, pybamm.Symbol("b", domain="other").content_hash
+        )
+
+        # the hash is updated when the id changes
+        old_hash = b.content_hash
+        b.domain = "other"
+        self.assertNotEqual(b.content_hash, old_hash)
+
+        # the hash is the same in another process (with a different hash seed)
+        code = (
+            "import pybamm, numpy as np, scipy.sparse;"
+            "a = pybamm.StateVector(slice(0, 2));"
+            "M = pybamm.Matrix(scipy.sparse.csr_matrix(np.array([[1, 0], [0, 2]])));"
+            "print((pybamm.exp(M @ a) + pybamm.Scalar(2) * pybamm.t).content_hash)"
+        )
+        env = dict(os.environ, PYTHONHASHSEED="1")
+        output = subprocess.run(
+            [sys.executable, "-c", code], env=env, stdout=subprocess.PIPE, check=True
+        ).stdout.decode()
+        self.assertEqual(output.strip(), expr.content_hash)
+
     def test_symbol_evaluates_to_number(self):
         a = pybamm.Scalar(3)
         self.assertTrue(a.evaluates_to_number())
@@ -390,7 +467,6 @@ class TestSymbol(unittest.TestCase):
 
 if __name__ == "__main__":
     print("Add -v for more debug output")
-    import sys
 
     if "-v" in sys.argv:
         debug = True
@@ -58,6 +58,15 @@ class TestParameterValues(unittest.TestCase):
         ):
             param.update({"a": 4}, check_conflict=True)
 
+    def test_copy(self):
+        param = pybamm.ParameterValues({"a": 1, "C-rate": 2, "Cell capacity [A.h]": 3})
+        param_copy = param.copy()
+        self.assertIsInstance(param_copy, pybamm.ParameterValues)
+        self.assertEqual(param_copy, param)
+        param_copy.update({"a": "[input]"})
+        self.assertIsInstance(param_copy["a"], pybamm.InputParameter)
+        self.assertEqual(param["a"], 1)
+
     def test_check_and_update_parameter_values(self):
         # Can't provide a current density of 0, as this will cause a ZeroDivision error
         bad_values = {"Typical current [A]": 0}
@@ -271,6 +280,14 @@ class TestParameterValues(unittest.TestCase):
         processed_diff_func = parameter_values.process_symbol(diff_func)
         self.assertEqual(processed_diff_func.evaluate(), 123)
 
+        # process input function parameter (constant)
+        parameter_values.update({"const": "[input]"})
+        processed_const = parameter_values.process_symbol(const)
+        self.assertIsInstance(processed_const, pybamm.InputParameter)
+        self.assertEqual(processed_const.evaluate(u={"const": 3}), 3)
+        processed_diff_const = parameter_values.process_symbol(const.diff(a))
+        self.assertEqual(processed_diff_const.evaluate(), 0)
+
     def test_process_inline_function_parameters(self):
         def D(c):
             return c ** 2
@@ -333,6 +350,28 @@ class TestParameterValues(unittest.TestCase):
         processed_diff_func = parameter_values.process_symbol(diff_func)
         self.assertEqual(processed_diff_func.evaluate(), 2)
 
+    def test_process_grid_interpolant(self):
+        x1 = np.linspace(0, 10, 6)
+        x2 = np.linspace(0, 1, 5)
+        data = ((x1, x2), np.add.outer(2 * x1, 3 * x2))
+        parameter_values = pybamm.ParameterValues(
+            {"a": 3.01, "b": 0.5, "Diffusivity": ("linear", data)}
+        )
+
+        a = pybamm.Parameter("a")
+        b = pybamm.Parameter("b")
+        func = pybamm.FunctionParameter("Diffusivity", a, b)
+
+        processed_func = parameter_values.process_symbol(func)
+        self.assertIsInstance(processed_func, pybamm.Interpolant)
+        self.assertAlmostEqual(processed_func.evaluate(), 7.52)
+
+        # process differentiated function parameter
+        processed_diff_func = parameter_values.process_symbol(func.diff(a))
+        self.assertAlmostEqual(processed_diff_func.evaluate(), 2)
+        processed_diff_func = parameter_values.process_symbol(func.diff(b))
+        self.assertAlmostEqual(processed_diff_func.evaluate(), 3)
+
     def test_interpolant_against_function(self):
         parameter_values = pybamm.ParameterValues({"a": 0.6})
         parameter_values.update(
@@ -4,6 +4,8 @@
 import pybamm
 from tests import get_discretisation_for_testing
 
+import os
+import tempfile
 import unittest
 
 
@@ -17,7 +19,9 @@ class TestStandardParametersLeadAcid(unittest.TestCase):
     def test_all_defined(self):
         parameters = pybamm.standard_parameters_lead_acid
         parameter_values = pybamm.lead_acid.BaseModel().default_parameter_values
-        output_file = "results/2019_08_sulzer_thesis/parameters.txt"
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        output_file = os.path.join(tmp_dir.name, "parameters.txt")
         pybamm.print_parameters(parameters, parameter_values, output_file)
         # test print_parameters with dict and without C-rate
         del parameter_values["Cell capacity [A.h]"]
@@ -19,6 +19,81 @@ class TestProcessedVariable(unittest.TestCase):
         processed_var = pybamm.ProcessedVariable(var, t_sol, y_sol)
         np.testing.assert_array_equal(processed_var.entries, t_sol * y_sol[0])
 
+    def test_processed_variable_all_times(self):
+        t = pybamm.t
+        var = pybamm.Variable("var", domain=["negative electrode", "separator"])
+        disc = tests.get_discretisation_for_testing()
+        disc.set_variable_slices([var])
+        var_sol = disc.process_symbol(var)
+        t_sol = np.linspace(0, 1)
+        y_sol = np.ones((var_sol.size, 1)) * np.linspace(0, 5)
+
+        # evaluated at all times at once
+        eqn_sol = disc.process_symbol(pybamm.exp(var) * t + 1)
+        processed_var = pybamm.ProcessedVariable(eqn_sol, t_sol, y_sol, mesh=disc.mesh)
+        np.testing.assert_array_almost_equal(
+            processed_var.entries[1:-1], np.exp(y_sol) * t_sol + 1
+        )
+
+        # function that can only be evaluated at one time at a time
+        def scalar_function(x):
+            return np.array(float(x[0, 0]) * np.ones_like(x))
+
+        eqn_sol = disc.process_symbol(pybamm.Function(scalar_function, var))
+        processed_var = pybamm.ProcessedVariable(eqn_sol, t_sol, y_sol, mesh=disc.mesh)
+        np.testing.assert_array_equal(processed_var.entries[1:-1], y_sol)
+
+        # variables that change with time mid-range
+        eqn_sol = disc.process_symbol((t > 0.5) * var)
+        processed_var = pybamm.ProcessedVariable(eqn_sol, t_sol, y_sol, mesh=disc.mesh)
+        np.testing.assert_array_equal(
+            processed_var.entries[1:-1], (t_sol > 0.5) * y_sol
+        )
+        eqn_sol = disc.process_symbol(
+            pybamm.PrimaryBroadcast(t > 0.5, ["negative electrode", "separator"])
+        )
+        processed_var = pybamm.ProcessedVariable(eqn_sol, t_sol, y_sol, mesh=disc.mesh)
+        np.testing.assert_array_equal(
+            processed_var.entries[1:-1], (t_sol > 0.5) * np.ones_like(y_sol)
+        )
+
+        # function that gives the right values at the first and last times only when
+        # evaluated at all times at once (chord between the first and last times)
+        def chord(x):
+            ends = [np.min(x), np.max(x)]
+            return np.interp(x, ends, np.square(ends))
+
+        eqn_sol = disc.process_symbol(pybamm.Function(chord, t))
+        processed_var = pybamm.ProcessedVariable(eqn_sol, t_sol, y_sol, mesh=disc.mesh)
+        np.testing.assert_array_almost_equal(processed_var.entries, t_sol ** 2)
+
+        # reduction over the states that matches the per-time values at the first,
+        # middle and last times when evaluated at all times at once
+        y_max = np.ones_like(y_sol)
+        y_max[:, 1:-1] = 0.5
+        y_max[:, len(t_sol) // 2] = 1
+        eqn_sol = disc.process_symbol(pybamm.max(var))
+        processed_var = pybamm.ProcessedVariable(eqn_sol, t_sol, y_max, mesh=disc.mesh)
+        np.testing.assert_array_equal(processed_var.entries, np.max(y_max, axis=0))
+
+        # only nodes that act on each time separately are evaluated at all times
+        evaluates_by_column = pybamm.processed_variable.evaluates_by_column
+        self.assertTrue(evaluates_by_column(disc.process_symbol(pybamm.exp(var) * t)))
+        self.assertTrue(
+            evaluates_by_column(disc.process_symbol(pybamm.Function(np.square, var)))
+        )
+        self.assertFalse(evaluates_by_column(eqn_sol))
+        self.assertFalse(evaluates_by_column(disc.process_symbol(pybamm.min(var))))
+
+        # known evaluations are shared between variables
+        variables = {"a": eqn_sol, "b": 2 * eqn_sol}
+        processed_vars = pybamm.post_process_variables(
+            variables, t_sol, y_sol, mesh=disc.mesh
+        )
+        np.testing.assert_array_equal(
+            2 * processed_vars["a"].entries, processed_vars["b"].entries
+        )
+
     def test_processed_variable_2D(self):
         t = pybamm.t
         var = pybamm.Variable("var", domain=["negative electrode", "separator"])
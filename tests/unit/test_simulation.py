@@ -1,5 +1,7 @@
 import pybamm
 import numpy as np
+import os
+import tempfile
 import unittest
 
 
@@ -78,6 +80,48 @@ class TestSimulation(unittest.TestCase):
             self.assertFalse(val.has_symbol_of_classes(pybamm.Parameter))
             self.assertTrue(val.has_symbol_of_classes(pybamm.Matrix))
 
+    def test_solve_with_inputs(self):
+        sim = pybamm.Simulation(pybamm.lithium_ion.SPMe())
+        name = "Cation transference number"
+        value = sim.parameter_values[name]
+        sim.solve(inputs={name: 0.3})
+        # the parameter values of the simulation are not modified
+        self.assertEqual(sim.parameter_values[name], value)
+        built_model = sim.built_model
+        y = sim.solution.y
+
+        # the model is only built once for all the values of the input
+        sim.solve(inputs={name: 0.4})
+        self.assertIs(sim.built_model, built_model)
+        self.assertFalse(np.allclose(sim.solution.y, y))
+        sim.solve(inputs={name: 0.3})
+        self.assertIs(sim.built_model, built_model)
+        np.testing.assert_allclose(sim.solution.y, y)
+
+        # the previous values are used again when the inputs are dropped
+        sim.solve()
+        self.assertIsNot(sim.built_model, built_model)
+        y_default = sim.solution.y
+        sim.solve(inputs={name: value})
+        np.testing.assert_allclose(sim.solution.y, y_default)
+
+        # function parameters with a constant value can be input parameters
+        name = "Negative electrode diffusivity [m2.s-1]"
+        value = sim.parameter_values[name]
+        sim.solve(inputs={name: value})
+        np.testing.assert_allclose(sim.solution.y, y_default)
+        sim.solve(inputs={name: value / 2})
+        self.assertFalse(np.allclose(sim.solution.y, y_default))
+
+        # but functions cannot
+        name = "Electrolyte diffusivity [m2.s-1]"
+        function = sim.parameter_values[name]
+        with self.assertRaisesRegex(ValueError, "function parameter"):
+            sim.solve(inputs={name: 1e-10})
+        self.assertIs(sim.parameter_values[name], function)
+        sim.solve()
+        np.testing.assert_allclose(sim.solution.y, y_default)
+
     def test_reuse_commands(self):
 
         sim = pybamm.Simulation(pybamm.lithium_ion.SPM())
@@ -220,56 +264,88 @@ class TestSimulation(unittest.TestCase):
         self.assertEqual(sim.solution.t[0], 2 * dt)
         self.assertEqual(sim.solution.t[1], 3 * dt)
 
+    def test_checkpoint_restore(self):
+        dt = 0.001
+        sim = pybamm.Simulation(pybamm.lithium_ion.SPM())
+        sim.step(dt)
+        sim.step(dt)
+        checkpoint = sim.checkpoint()
+        self.assertEqual(checkpoint.t, 2 * dt)
+
+        # Step one branch
+        sim.step(dt)
+        sim.step(dt)
+        self.assertEqual(sim.solution.t.size, 5)
+        y_branch_1 = sim.solution.y[:, -1]
+
+        # Go back to the checkpoint and step again
+        sim.restore(checkpoint)
+        self.assertEqual(sim.solution.t.size, 3)
+        self.assertEqual(sim.solution.t[-1], 2 * dt)
+        sim.step(dt)
+        sim.step(dt)
+        np.testing.assert_array_equal(sim.solution.t, np.arange(5) * dt)
+        np.testing.assert_allclose(sim.solution.y[:, -1], y_branch_1)
+
+        # Checkpoint solution is not affected by stepping after restoring
+        self.assertEqual(checkpoint.solution.t.size, 3)
+
     def test_save_load(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        filename = os.path.join(tmp_dir.name, "test.pickle")
         model = pybamm.lead_acid.LOQS()
         model.use_jacobian = True
         sim = pybamm.Simulation(model)
 
-        sim.save("test.pickle")
-        sim_load = pybamm.load_sim("test.pickle")
+        sim.save(filename)
+        sim_load = pybamm.load_sim(filename)
         self.assertEqual(sim.model.name, sim_load.model.name)
 
         # save after solving
         sim.solve()
-        sim.save("test.pickle")
-        sim_load = pybamm.load_sim("test.pickle")
+        sim.save(filename)
+        sim_load = pybamm.load_sim(filename)
         self.assertEqual(sim.model.name, sim_load.model.name)
 
         # with python formats
         model.convert_to_format = None
         sim = pybamm.Simulation(model)
         sim.solve()
-        sim.save("test.pickle")
+        sim.save(filename)
         model.convert_to_format = "python"
         sim = pybamm.Simulation(model)
         sim.solve()
         with self.assertRaisesRegex(
             NotImplementedError, "Cannot save simulation if model format is python"
         ):
-            sim.save("test.pickle")
+            sim.save(filename)
 
     def test_save_load_dae(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        filename = os.path.join(tmp_dir.name, "test.pickle")
         model = pybamm.lead_acid.LOQS({"surface form": "algebraic"})
         model.use_jacobian = True
         sim = pybamm.Simulation(model)
 
         # save after solving
         sim.solve()
-        sim.save("test.pickle")
-        sim_load = pybamm.load_sim("test.pickle")
+        sim.save(filename)
+        sim_load = pybamm.load_sim(filename)
         self.assertEqual(sim.model.name, sim_load.model.name)
 
         # with python format
         model.convert_to_format = None
         sim = pybamm.Simulation(model)
         sim.solve()
-        sim.save("test.pickle")
+        sim.save(filename)
 
         # with Casadi solver
         sim = pybamm.Simulation(model, solver=pybamm.CasadiSolver())
         sim.solve()
-        sim.save("test.pickle")
-        sim_load = pybamm.load_sim("test.pickle")
+        sim.save(filename)
+        sim_load = pybamm.load_sim(filename)
         self.assertEqual(sim.model.name, sim_load.model.name)
 
     @unittest.skipIf(not pybamm.have_idaklu(), "idaklu solver is not installed")
@@ -279,8 +355,8 @@ class TestSimulation(unittest.TestCase):
         # with KLU solver
         sim = pybamm.Simulation(model, solver=pybamm.IDAKLUSolver())
         sim.solve()
-        sim.save("test.pickle")
-        sim_load = pybamm.load_sim("test.pickle")
+        sim.save(filename)
+        sim_load = pybamm.load_sim(filename)
         self.assertEqual(sim.model.name, sim_load.model.name)
 
     def test_set_defaults2(self):
@@ -0,0 +1,215 @@
+#
+# Tests for the solver autotuner
+#
+import pybamm
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import numpy as np
+from tests import get_discretisation_for_testing
+
+# Number of solvers created by the candidates (kept outside the candidates, whose
+# content identifies them in the cache)
+N_CALLS = {"count": 0}
+
+
+def make_scipy_solver(rtol, atol):
+    N_CALLS["count"] += 1
+    return pybamm.ScipySolver(method="BDF", rtol=rtol, atol=atol)
+
+
+def make_failing_solver(rtol, atol):
+    N_CALLS["count"] += 1
+    return pybamm.ScipySolver(method="not a method", rtol=rtol, atol=atol)
+
+
+class TestAutotune(unittest.TestCase):
+    def get_model(self):
+        model = pybamm.BaseModel()
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var = pybamm.Variable("var", domain=domain)
+        model.rhs = {var: -0.1 * var}
+        model.initial_conditions = {var: 1}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        return model
+
+    def test_default_candidates(self):
+        model = self.get_model()
+        candidates = pybamm.default_solver_candidates(model)
+        self.assertIn("Scipy solver (BDF)", candidates)
+        self.assertIn("CasADi solver (fast)", candidates)
+        solver = candidates["Scipy solver (BDF)"](1e-3, 1e-5)
+        self.assertIsInstance(solver, pybamm.ScipySolver)
+        self.assertEqual(solver.rtol, 1e-3)
+        self.assertEqual(solver.atol, 1e-5)
+
+        # Only DAE solvers for models with algebraic equations
+        var = pybamm.Variable("var")
+        model.algebraic = {var: var - 1}
+        self.assertNotIn(
+            "Scipy solver (BDF)", pybamm.default_solver_candidates(model)
+        )
+
+    def test_solution_error(self):
+        t = np.linspace(0, 1, 10)
+        reference = pybamm.Solution(t, np.vstack([t, 100 * t]), None, None, "")
+        solution = pybamm.Solution(t, np.vstack([t, 100 * t + 1]), None, None, "")
+        self.assertAlmostEqual(pybamm.solution_error(solution, reference), 0.01)
+        # only common times are compared
+        solution = pybamm.Solution(t[:5], reference.y[:, :5], None, None, "")
+        self.assertEqual(pybamm.solution_error(solution, reference), 0)
+        # different times
+        solution = pybamm.Solution(t + 1, reference.y, None, None, "")
+        self.assertEqual(pybamm.solution_error(solution, reference), np.inf)
+
+    def setUp(self):
+        self.cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.cache_dir.cleanup)
+
+    def test_autotune_solver(self):
+        model = self.get_model()
+        t_eval = np.linspace(0, 1, 10)
+        n_calls = N_CALLS
+        n_calls["count"] = 0
+        candidates = {"scipy": make_scipy_solver, "failing": make_failing_solver}
+        solver, results = pybamm.autotune_solver(
+            model,
+            t_eval,
+            candidates=candidates,
+            tolerances=[1e-2, 1e-8],
+            cache_dir=self.cache_dir.name,
+        )
+        self.assertEqual(len(results), 4)
+        self.assertIsInstance(solver, pybamm.ScipySolver)
+        self.assertEqual(solver.method, "BDF")
+        for result in results:
+            if result["name"] == "failing":
+                self.assertEqual(result["error"], np.inf)
+            elif result["rtol"] == 1e-8:
+                self.assertLess(result["error"], 1e-4)
+        # 4 trials + the returned solver
+        self.assertEqual(n_calls["count"], 5)
+
+        # Second call uses cached results (only the returned solver is created)
+        solver, cached_results = pybamm.autotune_solver(
+            model,
+            t_eval,
+            candidates=candidates,
+            tolerances=[1e-2, 1e-8],
+            cache_dir=self.cache_dir.name,
+        )
+        self.assertEqual(n_calls["count"], 6)
+        self.assertEqual(results, cached_results)
+
+        # The results are stored on disk, and reused for the same model built again
+        # (e.g. in another process)
+        self.assertEqual(len(os.listdir(self.cache_dir.name)), 1)
+        pybamm.solvers.autotune._autotune_cache.clear()
+        solver, cached_results = pybamm.autotune_solver(
+            self.get_model(),
+            t_eval,
+            candidates=candidates,
+            tolerances=[1e-2, 1e-8],
+            cache_dir=self.cache_dir.name,
+        )
+        self.assertEqual(n_calls["count"], 7)
+        self.assertEqual(results, cached_results)
+
+        # Reference solution can be passed directly
+        reference = pybamm.ScipySolver(rtol=1e-10, atol=1e-10).solve(model, t_eval)
+        solver, _ = pybamm.autotune_solver(
+            model,
+            t_eval,
+            reference=reference,
+            candidates={"scipy": make_scipy_solver},
+            tolerances=[1e-8],
+            use_cache=False,
+        )
+        self.assertEqual(solver.rtol, 1e-8)
+
+        # Impossible error target
+        with self.assertRaisesRegex(pybamm.SolverError, "No solver configuration"):
+            pybamm.autotune_solver(
+                model,
+                t_eval,
+                error_target=0,
+                candidates=candidates,
+                tolerances=[1e-2, 1e-8],
+                cache_dir=self.cache_dir.name,
+            )
+
+    def test_model_signature(self):
+        # the signature is the same in another process (with a different hash seed)
+        code = (
+            "import pybamm, numpy as np;"
+            "from tests.unit.test_solvers.test_autotune import TestAutotune;"
+            "print(pybamm.solvers.autotune._model_signature("
+            "TestAutotune().get_model(), np.linspace(0, 1, 10), {'a': 1}, "
+            "{'scipy': None}, [1e-3]))"
+        )
+        env = dict(os.environ, PYTHONHASHSEED="1")
+        root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__)
+        ))))
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            env=env,
+            cwd=root,
+            stdout=subprocess.PIPE,
+            check=True,
+        ).stdout.decode()
+        signature = pybamm.solvers.autotune._model_signature(
+            self.get_model(), np.linspace(0, 1, 10), {"a": 1}, {"scipy": None}, [1e-3]
+        )
+        self.assertEqual(output.strip().splitlines()[-1], signature)
+
+        # and changes with the reference
+        t_eval = np.linspace(0, 1, 10)
+        candidates = {"scipy": make_scipy_solver}
+        signatures = set()
+        for reference in [
+            None,
+            pybamm.ScipySolver(rtol=1e-10, atol=1e-10),
+            pybamm.ScipySolver(rtol=1e-9, atol=1e-9),
+            pybamm.CasadiSolver(rtol=1e-10, atol=1e-10),
+            pybamm.Solution(t_eval, np.ones((2, 10)), None, None, ""),
+            pybamm.Solution(t_eval, 2 * np.ones((2, 10)), None, None, ""),
+        ]:
+            signatures.add(
+                pybamm.solvers.autotune._model_signature(
+                    self.get_model(), t_eval, {}, candidates, [1e-3], reference
+                )
+            )
+        self.assertEqual(len(signatures), 6)
+
+        # and with the candidate functions (not only their names)
+        self.assertNotEqual(
+            pybamm.solvers.autotune._model_signature(
+                self.get_model(), t_eval, {}, candidates, [1e-3]
+            ),
+            pybamm.solvers.autotune._model_signature(
+                self.get_model(), t_eval, {}, {"scipy": make_failing_solver}, [1e-3]
+            ),
+        )
+
+        # and with the model equations
+        model = self.get_model()
+        model.concatenated_rhs = 2 * model.concatenated_rhs
+        self.assertNotEqual(
+            pybamm.solvers.autotune._model_signature(
+                model, np.linspace(0, 1, 10), {"a": 1}, {"scipy": None}, [1e-3]
+            ),
+            signature,
+        )
+
+
+if __name__ == "__main__":
+    print("Add -v for more debug output")
+
+    if "-v" in sys.argv:
+        debug = True
+    pybamm.settings.debug_mode = True
+    unittest.main()
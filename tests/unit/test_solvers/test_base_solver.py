@@ -3,6 +3,8 @@
 #
 import pybamm
 import numpy as np
+from scipy.sparse import csr_matrix
+from tests import get_discretisation_for_testing
 
 import unittest
 
@@ -42,6 +44,77 @@ class TestBaseSolver(unittest.TestCase):
         external_variables = {"Cell temperature": T}
         solver.set_external_variables(sim.built_model, external_variables)
 
+    def test_jacobian_sparsity(self):
+        solver = pybamm.BaseSolver()
+        y = pybamm.StateVector(slice(0, 4))
+        A = pybamm.Matrix(np.diag([1.0, 2.0, 3.0, 0.0], k=0) + np.eye(4, k=1))
+        sparsity = solver.jacobian_sparsity(A @ y, np.zeros(4))
+        np.testing.assert_array_equal(
+            sparsity.toarray(), np.diag([1, 1, 1, 0]) + np.eye(4, k=1)
+        )
+        # Jacobian that evaluates to zero
+        sparsity = solver.jacobian_sparsity(pybamm.Vector(np.ones(3)), np.zeros(4))
+        self.assertEqual(sparsity.shape, (3, 4))
+        self.assertEqual(sparsity.nnz, 0)
+        # the pattern is found from the structure of the tree, even for symbols
+        # whose Jacobian is not defined
+        sparsity = solver.jacobian_sparsity(abs(y) + pybamm.t, np.zeros(4))
+        np.testing.assert_array_equal(sparsity.toarray(), np.eye(4))
+        # Jacobian that cannot be calculated
+        self.assertIsNone(solver.jacobian_sparsity(pybamm.Variable("c"), np.zeros(4)))
+
+    def test_atol(self):
+        solver = pybamm.BaseSolver(atol=1e-4)
+        np.testing.assert_array_equal(solver.get_atol(3), 1e-4 * np.ones(3))
+        solver.atol = 1
+        np.testing.assert_array_equal(solver.get_atol(3), np.ones(3))
+        solver.atol = [1, 2, 3]
+        np.testing.assert_array_equal(solver.get_atol(3), [1, 2, 3])
+        with self.assertRaisesRegex(pybamm.SolverError, "same shape"):
+            solver.get_atol(4)
+        solver.atol = "1"
+        with self.assertRaisesRegex(pybamm.SolverError, "must be a numpy array"):
+            solver.get_atol(3)
+
+        # set by variable
+        model = pybamm.BaseModel()
+        var1 = pybamm.Variable("var1", domain="negative electrode")
+        var2 = pybamm.Variable("var2")
+        var3 = pybamm.Variable("var3")
+        model.rhs = {var1: -var1, var2: -var2}
+        model.algebraic = {var3: var3 - var2}
+        model.initial_conditions = {var1: 1, var2: 1, var3: 1}
+        model.variables = {"var1": var1, "var2": var2, "var3": var3, "2var2": 2 * var2}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        n = model.concatenated_initial_conditions.size
+
+        solver = pybamm.BaseSolver(atol=1e-6)
+        np.testing.assert_array_equal(solver.get_atol(n, model), 1e-6)
+        solver.set_atol_by_variable({"var2": 1e-2, "var3": 1e-3}, model)
+        atol = solver.get_atol(n, model)
+        np.testing.assert_array_equal(atol[:-2], 1e-6)
+        np.testing.assert_array_equal(atol[-2:], [1e-2, 1e-3])
+        # solver atol is unchanged
+        self.assertEqual(solver.atol, 1e-6)
+        with self.assertRaisesRegex(pybamm.SolverError, "Can only set tolerances"):
+            solver.set_atol_by_variable({"2var2": 1e-2}, model)
+
+        # all the slices of a state vector are set
+        state_vec = pybamm.StateVector(slice(0, 2), slice(4, 5))
+        atol = solver.set_state_vec_tol(np.ones(6), state_vec, 1e-3)
+        np.testing.assert_array_equal(atol, [1e-3, 1e-3, 1, 1, 1e-3, 1])
+
+    def test_get_bandwidth(self):
+        self.assertEqual(
+            pybamm.get_bandwidth(
+                csr_matrix(np.eye(5) + np.eye(5, k=2) + np.eye(5, k=-1))
+            ),
+            (1, 2),
+        )
+        self.assertEqual(pybamm.get_bandwidth(csr_matrix(np.eye(5, k=-3))), (3, 0))
+        self.assertEqual(pybamm.get_bandwidth(csr_matrix((5, 5))), (0, 0))
+
 
 if __name__ == "__main__":
     print("Add -v for more debug output")
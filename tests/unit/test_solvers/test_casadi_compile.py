@@ -0,0 +1,71 @@
+#
+# Tests for compiling CasADi functions
+#
+import pybamm
+
+import casadi
+import os
+import tempfile
+import unittest
+import numpy as np
+
+
+class TestCompileCasadiFunction(unittest.TestCase):
+    def setUp(self):
+        t = casadi.MX.sym("t")
+        y = casadi.MX.sym("y", 3)
+        self.function = casadi.Function("f", [t, y], [t * casadi.exp(y) - y[0]])
+
+    def test_compile(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            compiled = pybamm.compile_casadi_function(
+                self.function, cache_dir=cache_dir
+            )
+            self.assertIsInstance(compiled, casadi.Function)
+            self.assertEqual(compiled.name(), "f")
+            y = np.array([1.0, 2.0, 3.0])
+            np.testing.assert_allclose(
+                compiled(2, y).full(), self.function(2, y).full()
+            )
+            libraries = [f for f in os.listdir(cache_dir) if f.endswith(".so")]
+            self.assertEqual(len(libraries), 1)
+
+            # the library is reused when the same function is compiled again
+            mtime = os.path.getmtime(os.path.join(cache_dir, libraries[0]))
+            compiled = pybamm.compile_casadi_function(
+                self.function, cache_dir=cache_dir
+            )
+            np.testing.assert_allclose(
+                compiled(2, y).full(), self.function(2, y).full()
+            )
+            libraries = [f for f in os.listdir(cache_dir) if f.endswith(".so")]
+            self.assertEqual(len(libraries), 1)
+            self.assertEqual(
+                os.path.getmtime(os.path.join(cache_dir, libraries[0])), mtime
+            )
+
+            # different flags give a different library
+            pybamm.compile_casadi_function(
+                self.function, cache_dir=cache_dir, flags=["-O0"]
+            )
+            libraries = [f for f in os.listdir(cache_dir) if f.endswith(".so")]
+            self.assertEqual(len(libraries), 2)
+
+    def test_no_compiler(self):
+        with tempfile.TemporaryDirectory() as cache_dir:
+            compiled = pybamm.compile_casadi_function(
+                self.function, cache_dir=cache_dir, compiler="not-a-compiler"
+            )
+            self.assertIs(compiled, self.function)
+            libraries = [f for f in os.listdir(cache_dir) if f.endswith(".so")]
+            self.assertEqual(libraries, [])
+
+
+if __name__ == "__main__":
+    print("Add -v for more debug output")
+    import sys
+
+    if "-v" in sys.argv:
+        debug = True
+    pybamm.settings.debug_mode = True
+    unittest.main()
@@ -198,6 +198,82 @@ class TestCasadiSolver(unittest.TestCase):
         solution = solver.solve(model, t_eval)
         np.testing.assert_allclose(solution.y[0], step_sol.y[0])
 
+    def test_model_step_checkpoint(self):
+        # Create model
+        model = pybamm.BaseModel()
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var1 = pybamm.Variable("var1", domain=domain)
+        var2 = pybamm.Variable("var2", domain=domain)
+        rate = pybamm.InputParameter("rate")
+        model.rhs = {var1: -rate * var1}
+        model.algebraic = {var2: 2 * var1 - var2}
+        model.initial_conditions = {var1: 1, var2: 2}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+
+        solver = pybamm.CasadiSolver(rtol=1e-8, atol=1e-8)
+        with self.assertRaisesRegex(pybamm.SolverError, "Cannot checkpoint"):
+            solver.checkpoint()
+
+        # Step to t=0.5 and checkpoint
+        dt = 0.5
+        solver.step(model, dt, inputs={"rate": 0.1})
+        checkpoint = solver.checkpoint()
+        self.assertEqual(checkpoint.t, dt)
+        self.assertEqual(checkpoint.inputs, {"rate": 0.1})
+        N = len(checkpoint.y) // 2
+        np.testing.assert_allclose(checkpoint.y[:N], np.exp(-0.1 * dt))
+
+        # First branch, using the same inputs
+        step_sol = solver.step(model, dt, inputs={"rate": 0.1})
+        np.testing.assert_allclose(step_sol.y[0], np.exp(-0.1 * step_sol.t))
+
+        # Second branch, with a different rate from the checkpoint
+        solver.restore(checkpoint)
+        step_sol = solver.step(model, dt, inputs={"rate": 1})
+        np.testing.assert_array_equal(step_sol.t, [dt, 2 * dt])
+        np.testing.assert_allclose(
+            step_sol.y[0], np.exp(-0.1 * dt) * np.exp(-(step_sol.t - dt))
+        )
+        np.testing.assert_allclose(step_sol.y[N], 2 * step_sol.y[0])
+
+        # Back to the first branch, using the inputs from the checkpoint
+        solver.restore(checkpoint)
+        self.assertEqual(solver.inputs, {"rate": 0.1})
+        step_sol = solver.step(model, dt)
+        np.testing.assert_allclose(step_sol.y[0], np.exp(-0.1 * step_sol.t))
+
+        # Checkpoint from a different model
+        checkpoint.y = checkpoint.y[:N]
+        with self.assertRaisesRegex(pybamm.SolverError, "Checkpoint state vector"):
+            solver.restore(checkpoint)
+        with self.assertRaisesRegex(pybamm.SolverError, "Cannot restore"):
+            pybamm.CasadiSolver().restore(checkpoint)
+
+    def test_model_solver_atol_by_variable(self):
+        # Create model
+        model = pybamm.BaseModel()
+        var1 = pybamm.Variable("var1")
+        var2 = pybamm.Variable("var2")
+        var3 = pybamm.Variable("var3")
+        model.rhs = {var1: -var1, var2: -1e3 * var2}
+        model.algebraic = {var3: var3 - 1e-4 * var1}
+        model.initial_conditions = {var1: 1, var2: 1e-6, var3: 1e-4}
+        model.variables = {"var1": var1, "var2": var2, "var3": var3}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        t_eval = np.linspace(0, 0.005, 10)
+
+        # var2 is much smaller than atol, so needs its own tolerance to be accurate
+        solver = pybamm.CasadiSolver(rtol=1e-8, atol=1e-3)
+        solver.set_atol_by_variable({"var2": 1e-14, "var3": 1e-14}, model)
+        solution = solver.solve(model, t_eval)
+        np.testing.assert_allclose(solution.y[0], np.exp(-t_eval), rtol=1e-6)
+        np.testing.assert_allclose(
+            solution.y[1], 1e-6 * np.exp(-1e3 * t_eval), rtol=1e-4
+        )
+        np.testing.assert_allclose(solution.y[2], 1e-4 * solution.y[0])
+
     def test_model_solver_with_inputs(self):
         # Create model
         model = pybamm.BaseModel()
@@ -222,6 +298,105 @@ class TestCasadiSolver(unittest.TestCase):
         np.testing.assert_array_equal(solution.t, t_eval[: len(solution.t)])
         np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t))
 
+    def test_model_solver_dae_reuse_set_up(self):
+        # Create model
+        model = pybamm.BaseModel()
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var1 = pybamm.Variable("var1", domain=domain)
+        var2 = pybamm.Variable("var2", domain=domain)
+        model.rhs = {var1: -0.1 * var1}
+        model.algebraic = {var2: pybamm.InputParameter("ratio") * var1 - var2}
+        model.initial_conditions = {var1: 1, var2: 1}
+        disc = pybamm.Discretisation(
+            get_mesh_for_testing(), {"macroscale": pybamm.FiniteVolume()}
+        )
+        disc.process_model(model)
+        n = model.concatenated_rhs.size
+
+        t_eval = np.linspace(0, 1, 10)
+        for mode in ["safe", "fast"]:
+            solver = pybamm.CasadiSolver(mode=mode, rtol=1e-8, atol=1e-8)
+            for ratio in [2, 3]:
+                solution = solver.solve(model, t_eval, inputs={"ratio": ratio})
+                if ratio == 2:
+                    residuals = solver.residuals
+                # only the inputs change: the set-up is reused, but the consistent
+                # initial conditions are computed again
+                self.assertIs(solver.residuals, residuals)
+                np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t))
+                np.testing.assert_allclose(
+                    solution.y[n], ratio * np.exp(-0.1 * solution.t), rtol=1e-6
+                )
+
+    def test_model_solver_dae_casadi_graph(self):
+        # Create model
+        model = pybamm.BaseModel()
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var1 = pybamm.Variable("var1", domain=domain)
+        var2 = pybamm.Variable("var2", domain=domain)
+        model.rhs = {var1: -0.1 * var1}
+        model.algebraic = {var2: 2 * var1 - var2}
+        model.initial_conditions = {var1: 1, var2: 2}
+        disc = pybamm.Discretisation(
+            get_mesh_for_testing(), {"macroscale": pybamm.FiniteVolume()}
+        )
+        disc.process_model(model)
+        n = model.concatenated_rhs.size
+
+        t_eval = np.linspace(0, 1, 10)
+        for graph in ["MX", "SX", "expand"]:
+            model.casadi_graph = graph
+            for mode in ["safe", "fast"]:
+                solver = pybamm.CasadiSolver(mode=mode, rtol=1e-8, atol=1e-8)
+                solution = solver.solve(model, t_eval)
+                self.assertEqual(solver.casadi_graph, graph)
+                self.assertEqual(
+                    solver.casadi_rhs.is_a("SXFunction"), graph != "MX"
+                )
+                np.testing.assert_allclose(
+                    solution.y[0], np.exp(-0.1 * solution.t), rtol=1e-6
+                )
+                np.testing.assert_allclose(
+                    solution.y[n], 2 * np.exp(-0.1 * solution.t), rtol=1e-6
+                )
+
+    def test_model_solver_dae_jac_times_vec(self):
+        class KrylovSolver(pybamm.CasadiSolver):
+            use_jac_times_vec = True
+
+        # Create model
+        model = pybamm.BaseModel()
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var1 = pybamm.Variable("var1", domain=domain)
+        var2 = pybamm.Variable("var2", domain=domain)
+        model.rhs = {var1: -pybamm.InputParameter("rate") * var1 * var2}
+        model.algebraic = {var2: pybamm.exp(var1) - var2}
+        model.initial_conditions = {var1: 1, var2: np.exp(1)}
+        disc = pybamm.Discretisation(
+            get_mesh_for_testing(), {"macroscale": pybamm.FiniteVolume()}
+        )
+        disc.process_model(model)
+
+        inputs = {"rate": 0.1}
+        for convert_to_format in ["python", None, "casadi"]:
+            model.convert_to_format = convert_to_format
+            solver = KrylovSolver()
+            if convert_to_format == "casadi":
+                solver.set_up_casadi(model, inputs)
+            else:
+                solver.set_up(model, inputs)
+            solver.set_inputs_and_external(inputs)
+            y = np.linspace(1, 2, len(solver.y0))
+            v = np.linspace(-1, 1, len(solver.y0))
+            jac = solver.jacobian(0, y)
+            if convert_to_format == "casadi":
+                jac = jac.full()
+            else:
+                jac = jac.toarray()
+            np.testing.assert_allclose(
+                solver.jac_times_vec(0, y, v), jac @ v, rtol=1e-12, atol=1e-12
+            )
+
 
 if __name__ == "__main__":
     print("Add -v for more debug output")
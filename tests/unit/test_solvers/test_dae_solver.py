@@ -2,9 +2,12 @@
 # Tests for the DAE Solver class
 #
 import pybamm
+import tempfile
 import unittest
+from unittest import mock
 import numpy as np
-from scipy.sparse import csr_matrix
+from scipy.sparse import csr_matrix, issparse
+from tests import get_mesh_for_testing
 
 
 class TestDaeSolver(unittest.TestCase):
@@ -77,6 +80,69 @@ class TestDaeSolver(unittest.TestCase):
         ):
             solver.calculate_consistent_initial_conditions(rhs, algebraic, y0)
 
+    def test_jacobian_sparsity(self):
+        model = pybamm.BaseModel()
+        var1 = pybamm.Variable("var1", domain="negative electrode")
+        var2 = pybamm.Variable("var2", domain="negative electrode")
+        model.rhs = {var1: -var2}
+        model.algebraic = {var2: var2 - 2 * var1}
+        model.initial_conditions = {var1: 1, var2: 2}
+        mesh = get_mesh_for_testing()
+        disc = pybamm.Discretisation(mesh, {"macroscale": pybamm.FiniteVolume()})
+        disc.process_model(model)
+        N = mesh["negative electrode"][0].npts
+        expected = np.block([[np.zeros((N, N)), np.eye(N)], [np.eye(N), np.eye(N)]])
+        for convert_to_format in ["python", "casadi"]:
+            for use_jacobian in [True, False]:
+                model.convert_to_format = convert_to_format
+                model.use_jacobian = use_jacobian
+                solver = pybamm.DaeSolver()
+                if convert_to_format == "casadi":
+                    solver.set_up_casadi(model)
+                else:
+                    solver.set_up(model)
+                np.testing.assert_array_equal(
+                    solver.jac_sparsity.toarray(), expected
+                )
+
+    @unittest.skipIf(not pybamm.have_numba(), "numba is not installed")
+    def test_jacobian_numba(self):
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        model = pybamm.BaseModel()
+        var1 = pybamm.Variable("var1", domain="negative electrode")
+        var2 = pybamm.Variable("var2", domain="negative electrode")
+        model.rhs = {var1: -var2}
+        model.algebraic = {var2: var2 - 2 * var1}
+        model.initial_conditions = {var1: 1, var2: 2}
+        model.convert_to_format = "numba"
+        mesh = get_mesh_for_testing()
+        disc = pybamm.Discretisation(mesh, {"macroscale": pybamm.FiniteVolume()})
+        disc.process_model(model)
+        N = mesh["negative electrode"][0].npts
+        expected = np.block(
+            [[np.zeros((N, N)), -np.eye(N)], [-2 * np.eye(N), np.eye(N)]]
+        )
+
+        # the numba kernels calculate the jacobian, so only its sparsity pattern is
+        # found symbolically
+        solver = pybamm.DaeSolver()
+        with mock.patch.object(
+            pybamm.expression_tree.operations.evaluate_numba,
+            "NUMBA_CACHE_DIR",
+            cache_dir.name,
+        ), mock.patch.object(
+            pybamm.Jacobian, "jac", autospec=True, side_effect=pybamm.Jacobian.jac
+        ) as jac_mock:
+            solver.set_up(model)
+        for call in jac_mock.call_args_list:
+            self.assertTrue(call[0][0]._structure)
+        np.testing.assert_array_equal(solver.jac_sparsity.toarray(), expected != 0)
+        jac = solver.jacobian(0, np.ones(2 * N))
+        if issparse(jac):
+            jac = jac.toarray()
+        np.testing.assert_array_equal(jac, expected)
+
     def test_errors(self):
         solver = pybamm.DaeSolver()
         with self.assertRaises(NotImplementedError):
@@ -4,8 +4,10 @@
 import pybamm
 import numpy as np
 import scipy.sparse as sparse
+import tempfile
 import unittest
 import warnings
+from unittest import mock
 from tests import get_mesh_for_testing, get_discretisation_for_testing
 
 
@@ -503,6 +505,39 @@ class TestScikitsSolvers(unittest.TestCase):
         np.testing.assert_allclose(solution.y[0], np.exp(0.1 * solution.t))
         np.testing.assert_allclose(solution.y[-1], 2 * np.exp(0.1 * solution.t))
 
+    @unittest.skipIf(not pybamm.have_numba(), "numba is not installed")
+    def test_model_solver_dae_numba(self):
+        # Compile into a temporary cache directory
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patch = mock.patch.object(
+            pybamm.expression_tree.operations.evaluate_numba,
+            "NUMBA_CACHE_DIR",
+            cache_dir.name,
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        model = pybamm.BaseModel()
+        model.convert_to_format = "numba"
+        whole_cell = ["negative electrode", "separator", "positive electrode"]
+        var1 = pybamm.Variable("var1", domain=whole_cell)
+        var2 = pybamm.Variable("var2", domain=whole_cell)
+        model.rhs = {var1: 0.1 * var1}
+        model.algebraic = {var2: 2 * var1 - var2}
+        model.initial_conditions = {var1: 1, var2: 2}
+        model.events = {"var1 = 1.5": pybamm.min(var1 - 1.5)}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+
+        # Solve
+        solver = pybamm.ScikitsDaeSolver(rtol=1e-8, atol=1e-8)
+        t_eval = np.linspace(0, 5, 100)
+        solution = solver.solve(model, t_eval)
+        np.testing.assert_array_less(solution.y[0], 1.5)
+        np.testing.assert_allclose(solution.y[0], np.exp(0.1 * solution.t))
+        np.testing.assert_allclose(solution.y[-1], 2 * np.exp(0.1 * solution.t))
+
     def test_model_solver_dae_bad_ics_python(self):
         model = pybamm.BaseModel()
         model.convert_to_format = "python"
@@ -761,6 +796,376 @@ class TestScikitsSolvers(unittest.TestCase):
         np.testing.assert_array_equal(solution.t, t_eval)
         np.testing.assert_allclose(solution.y[0], np.exp(0.1 * solution.t))
 
+    def test_model_solver_auto_linsolver(self):
+        whole_cell = ["negative electrode", "separator", "positive electrode"]
+        var1 = pybamm.Variable("var1", domain=whole_cell)
+        var2 = pybamm.Variable("var2", domain=whole_cell)
+        boundary_conditions = {
+            var1: {
+                "left": (pybamm.Scalar(0), "Neumann"),
+                "right": (pybamm.Scalar(0), "Neumann"),
+            }
+        }
+        t_eval = np.linspace(0, 1, 100)
+
+        # Tridiagonal Jacobian, so the band solver is chosen
+        model = pybamm.BaseModel()
+        model.rhs = {var1: pybamm.div(pybamm.grad(var1))}
+        model.boundary_conditions = boundary_conditions
+        model.initial_conditions = {var1: 1}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        solver = pybamm.ScikitsOdeSolver(linsolver="auto")
+        solution = solver.solve(model, t_eval)
+        self.assertEqual(solver.chosen_linsolver, "band")
+        np.testing.assert_allclose(solution.y, 1)
+
+        # The states are ordered [var1, var2], so the band is wide, and the system
+        # is small, so the dense solver is chosen
+        model = pybamm.BaseModel()
+        model.rhs = {var1: pybamm.div(pybamm.grad(var1))}
+        model.algebraic = {var2: var2 - var1}
+        model.boundary_conditions = boundary_conditions
+        model.initial_conditions = {var1: 1, var2: 1}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        solver = pybamm.ScikitsDaeSolver(linsolver="auto")
+        solution = solver.solve(model, t_eval)
+        self.assertEqual(solver.chosen_linsolver, "dense")
+        np.testing.assert_allclose(solution.y, 1)
+
+
+class TestChooseLinsolver(unittest.TestCase):
+    def test_choose_linsolver(self):
+        n = 100
+        # no sparsity pattern
+        self.assertEqual(pybamm.choose_linsolver("auto", None), ("dense", {}))
+        self.assertEqual(pybamm.choose_linsolver("spgmr", None), ("spgmr", {}))
+        with self.assertRaisesRegex(pybamm.SolverError, "without a Jacobian"):
+            pybamm.choose_linsolver("band", None)
+
+        # banded
+        tridiag = sparse.diags([1, 1, 1], [-1, 0, 1], shape=(n, n))
+        self.assertEqual(
+            pybamm.choose_linsolver("auto", tridiag),
+            ("band", {"lband": 1, "uband": 1}),
+        )
+        # mass matrix and diagonal are added to the pattern
+        mass_matrix = sparse.eye(n, k=-2)
+        self.assertEqual(
+            pybamm.choose_linsolver("auto", sparse.eye(n, k=1), mass_matrix),
+            ("band", {"lband": 2, "uband": 1}),
+        )
+        # user-requested band solver still gets the bandwidths
+        self.assertEqual(
+            pybamm.choose_linsolver("lapackband", tridiag),
+            ("lapackband", {"lband": 1, "uband": 1}),
+        )
+
+        # banded after reordering the states: band solver, with the permutation
+        n = 1000
+        interleaved = (
+            sparse.eye(n) + sparse.eye(n, k=n // 2) + sparse.eye(n, k=-n // 2)
+        ).tocsr()
+        linsolver, options = pybamm.choose_linsolver("auto", interleaved)
+        self.assertEqual(linsolver, "band")
+        self.assertEqual((options["lband"], options["uband"]), (1, 1))
+        permutation = options["permutation"]
+        np.testing.assert_array_equal(np.sort(permutation), np.arange(n))
+        self.assertEqual(
+            pybamm.get_bandwidth(interleaved[permutation][:, permutation]), (1, 1)
+        )
+        # no permutation if the states are already ordered
+        self.assertNotIn("permutation", pybamm.choose_linsolver("band", tridiag)[1])
+
+        # sparse but not banded, even after reordering: Krylov solver for large
+        # systems
+        coupled = sparse.random(n, n, density=3 / n, random_state=0, format="csr")
+        self.assertEqual(pybamm.choose_linsolver("auto", coupled), ("spgmr", {}))
+        # dense otherwise
+        small_coupled = sparse.random(10, 10, density=0.3, random_state=0)
+        self.assertEqual(pybamm.choose_linsolver("auto", small_coupled), ("dense", {}))
+        self.assertEqual(
+            pybamm.choose_linsolver("auto", sparse.csr_matrix(np.ones((n, n)))),
+            ("dense", {}),
+        )
+
+
+class TestScikitsLinsolverOptions(unittest.TestCase):
+    """
+    Check the options passed to scikits.odes for each linear solver, with a mock of
+    scikits.odes (so that these tests run whether or not it is installed)
+    """
+
+    def integrate(self, solver_class, *args, **kwargs):
+        "Call `integrate`, returning the solver and the options given to scikits.odes"
+        module = pybamm.solvers.scikits_ode_solver
+        if solver_class is pybamm.ScikitsDaeSolver:
+            module = pybamm.solvers.scikits_dae_solver
+        scikits_odes = mock.MagicMock()
+        sol = mock.MagicMock(flag=0)
+        sol.values.t = np.array([0, 1])
+        sol.roots.t = np.array([])
+
+        def solve(t_eval, y0, *ydot0):
+            # the state stays at its initial value
+            sol.values.y = np.array([y0, y0])
+            sol.roots.y = np.zeros((0, len(y0)))
+            return sol
+
+        scikits_odes.ode.return_value.solve.side_effect = solve
+        scikits_odes.dae.return_value.solve.side_effect = solve
+        self.scikits_odes = scikits_odes
+        linsolver = kwargs.pop("linsolver", None)
+        with mock.patch.object(module, "scikits_odes_spec", True), mock.patch.object(
+            module, "scikits_odes", scikits_odes, create=True
+        ):
+            if linsolver is None:
+                solver = solver_class()
+            else:
+                solver = solver_class(linsolver=linsolver)
+            self.solution = solver.integrate(*args, **kwargs)
+        if solver_class is pybamm.ScikitsDaeSolver:
+            options = scikits_odes.dae.call_args[1]
+        else:
+            options = scikits_odes.ode.call_args[1]
+        return solver, options
+
+    def test_ode_linsolver_options(self):
+        n = 500
+        y0 = np.ones(n)
+        t_eval = np.array([0, 1])
+        tridiag = sparse.csr_matrix(sparse.diags([1, -2, 1], [-1, 0, 1], shape=(n, n)))
+        # sparse, but not banded even after reordering the states
+        coupled = sparse.random(n, n, density=3 / n, random_state=0, format="csr")
+
+        def derivs(t, y):
+            return -y
+
+        # dense by default, with the analytic Jacobian
+        solver, options = self.integrate(
+            pybamm.ScikitsOdeSolver,
+            derivs,
+            y0,
+            t_eval,
+            jacobian=lambda t, y: tridiag,
+        )
+        self.assertEqual(solver.chosen_linsolver, "dense")
+        self.assertEqual(options["linsolver"], "dense")
+        self.assertIn("jacfn", options)
+        J = np.zeros((n, n))
+        options["jacfn"](0, y0, None, J)
+        np.testing.assert_array_equal(J, tridiag.toarray())
+
+        # no Jacobian: "auto" falls back to the dense solver
+        solver, options = self.integrate(
+            pybamm.ScikitsOdeSolver, derivs, y0, t_eval, linsolver="auto"
+        )
+        self.assertEqual(options["linsolver"], "dense")
+        self.assertNotIn("jacfn", options)
+
+        # banded Jacobian: band solver, with the bandwidths
+        solver, options = self.integrate(
+            pybamm.ScikitsOdeSolver,
+            derivs,
+            y0,
+            t_eval,
+            jacobian=lambda t, y: tridiag,
+            linsolver="auto",
+        )
+        self.assertEqual(solver.chosen_linsolver, "band")
+        self.assertEqual((options["lband"], options["uband"]), (1, 1))
+        self.assertNotIn("jacfn", options)
+
+        # banded Jacobian after reordering the states: the band solver is given
+        # the reordered states, and the solution is returned in the original order
+        shuffle = np.random.RandomState(0).permutation(n)
+        y_shuffled = np.arange(1, n + 1, dtype=float)
+        solver, options = self.integrate(
+            pybamm.ScikitsOdeSolver,
+            lambda t, y: y ** 2,
+            y_shuffled,
+            t_eval,
+            events=[lambda t, y: y[0]],
+            jacobian=lambda t, y: tridiag[shuffle][:, shuffle],
+            linsolver="auto",
+        )
+        self.assertEqual(solver.chosen_linsolver, "band")
+        self.assertEqual((options["lband"], options["uband"]), (1, 1))
+        self.assertNotIn("permutation", options)
+        eqsydot = self.scikits_odes.ode.call_args[0][1]
+        y_solver = self.scikits_odes.ode.return_value.solve.call_args[0][1]
+        self.assertEqual(sorted(y_solver), sorted(y_shuffled))
+        ydot = np.zeros(n)
+        eqsydot(0, y_solver, ydot)
+        np.testing.assert_array_equal(ydot, y_solver ** 2)
+        root = np.zeros(1)
+        options["rootfn"](0, y_solver, root)
+        self.assertEqual(root[0], 1)
+        np.testing.assert_array_equal(self.solution.y[:, 0], y_shuffled)
+
+        # large sparse Jacobian: Krylov solver, with Jacobian-vector products
+        v = np.arange(n, dtype=float)
+        Jv = np.zeros(n)
+        solver, options = self.integrate(
+            pybamm.ScikitsOdeSolver,
+            derivs,
+            y0,
+            t_eval,
+            jacobian=lambda t, y: coupled,
+            jac_sparsity=coupled,
+            jac_times_vec=lambda t, y, v: coupled @ v,
+            linsolver="auto",
+        )
+        self.assertEqual(solver.chosen_linsolver, "spgmr")
+        self.assertNotIn("jac_times_setupfn", options)
+        options["jac_times_vecfn"](v, Jv, 0, y0, None)
+        np.testing.assert_array_equal(Jv, coupled @ v)
+
+        # Krylov solver without Jacobian-vector products: the Jacobian is used
+        solver, options = self.integrate(
+            pybamm.ScikitsOdeSolver,
+            derivs,
+            y0,
+            t_eval,
+            jacobian=lambda t, y: coupled,
+            linsolver="spgmr",
+        )
+        self.assertIs(options["user_data"], solver)
+        options["jac_times_setupfn"](0, y0, None, solver)
+        Jv = np.zeros(n)
+        options["jac_times_vecfn"](v, Jv, 0, y0, solver)
+        np.testing.assert_array_equal(Jv, coupled @ v)
+
+    def test_dae_linsolver_options(self):
+        n = 500
+        y0 = np.ones(n)
+        t_eval = np.array([0, 1])
+        tridiag = sparse.csr_matrix(sparse.diags([1, -2, 1], [-1, 0, 1], shape=(n, n)))
+        mass_matrix = sparse.eye(n, format="csr")
+        # sparse, but not banded even after reordering the states
+        coupled = sparse.random(n, n, density=3 / n, random_state=0, format="csr")
+
+        def residuals(t, y, ydot):
+            return ydot + y
+
+        # dense by default, with the analytic Jacobian
+        solver, options = self.integrate(
+            pybamm.ScikitsDaeSolver,
+            residuals,
+            y0,
+            t_eval,
+            mass_matrix=mass_matrix,
+            jacobian=lambda t, y: tridiag,
+        )
+        self.assertEqual(solver.chosen_linsolver, "dense")
+        self.assertEqual(options["linsolver"], "dense")
+        J = np.zeros((n, n))
+        options["jacfn"](0, y0, None, None, 2, J)
+        np.testing.assert_array_equal(J, (tridiag - 2 * mass_matrix).toarray())
+
+        # banded Jacobian: band solver, with the bandwidths
+        solver, options = self.integrate(
+            pybamm.ScikitsDaeSolver,
+            residuals,
+            y0,
+            t_eval,
+            mass_matrix=mass_matrix,
+            jacobian=lambda t, y: tridiag,
+            linsolver="auto",
+        )
+        self.assertEqual(solver.chosen_linsolver, "band")
+        self.assertEqual((options["lband"], options["uband"]), (1, 1))
+        self.assertNotIn("jacfn", options)
+
+        # banded Jacobian after reordering the states: the band solver is given
+        # the reordered states, and the solution is returned in the original order
+        shuffle = np.random.RandomState(0).permutation(n)
+        y_shuffled = np.arange(1, n + 1, dtype=float)
+        solver, options = self.integrate(
+            pybamm.ScikitsDaeSolver,
+            lambda t, y, ydot: ydot + y ** 2,
+            y_shuffled,
+            t_eval,
+            events=[lambda t, y: y[0]],
+            mass_matrix=mass_matrix,
+            jacobian=lambda t, y: tridiag[shuffle][:, shuffle],
+            linsolver="auto",
+        )
+        self.assertEqual(solver.chosen_linsolver, "band")
+        self.assertEqual((options["lband"], options["uband"]), (1, 1))
+        self.assertNotIn("permutation", options)
+        eqsres = self.scikits_odes.dae.call_args[0][1]
+        y_solver = self.scikits_odes.dae.return_value.solve.call_args[0][1]
+        self.assertEqual(sorted(y_solver), sorted(y_shuffled))
+        res = np.zeros(n)
+        eqsres(0, y_solver, y_solver, res)
+        np.testing.assert_array_equal(res, y_solver + y_solver ** 2)
+        root = np.zeros(1)
+        options["rootfn"](0, y_solver, None, root)
+        self.assertEqual(root[0], 1)
+        np.testing.assert_array_equal(self.solution.y[:, 0], y_shuffled)
+
+        # large sparse Jacobian: Krylov solver, with Jacobian-vector products
+        solver, options = self.integrate(
+            pybamm.ScikitsDaeSolver,
+            residuals,
+            y0,
+            t_eval,
+            mass_matrix=mass_matrix,
+            jacobian=lambda t, y: coupled,
+            jac_times_vec=lambda t, y, v: coupled @ v,
+            linsolver="auto",
+        )
+        self.assertEqual(solver.chosen_linsolver, "spgmr")
+        v = np.arange(n, dtype=float)
+        Jv = np.zeros(n)
+        options["jac_times_vecfn"](0, y0, None, None, v, Jv, 2)
+        np.testing.assert_array_equal(Jv, coupled @ v - 2 * v)
+
+    def test_needs_jac_times_vec(self):
+        n = 500
+        tridiag = sparse.csr_matrix(sparse.diags([1, -2, 1], [-1, 0, 1], shape=(n, n)))
+        # sparse, but not banded even after reordering the states
+        coupled = sparse.random(n, n, density=3 / n, random_state=0, format="csr")
+        mass_matrix = sparse.eye(n, format="csr")
+        self.assertFalse(pybamm.ScipySolver().needs_jac_times_vec(coupled))
+        for module, solver_class in [
+            (pybamm.solvers.scikits_ode_solver, pybamm.ScikitsOdeSolver),
+            (pybamm.solvers.scikits_dae_solver, pybamm.ScikitsDaeSolver),
+        ]:
+            with mock.patch.object(module, "scikits_odes_spec", True):
+                for linsolver, sparsity, expected in [
+                    ("dense", coupled, False),
+                    ("band", tridiag, False),
+                    ("spgmr", tridiag, True),
+                    ("auto", tridiag, False),
+                    ("auto", coupled, True),
+                ]:
+                    solver = solver_class(linsolver=linsolver)
+                    self.assertEqual(
+                        solver.needs_jac_times_vec(sparsity, mass_matrix), expected
+                    )
+
+            # the jacobian-vector product is only created if a Krylov solver is
+            # chosen for the model
+            model = pybamm.BaseModel()
+            var = pybamm.Variable("var", domain="negative electrode")
+            model.rhs = {var: -var}
+            model.initial_conditions = {var: 1}
+            disc = get_discretisation_for_testing()
+            disc.process_model(model)
+            for convert_to_format in ["python", "casadi"]:
+                model.convert_to_format = convert_to_format
+                for linsolver, created in [("auto", False), ("spgmr", True)]:
+                    with mock.patch.object(module, "scikits_odes_spec", True):
+                        solver = solver_class(linsolver=linsolver)
+                    if convert_to_format == "casadi":
+                        solver.set_up_casadi(model, {})
+                    else:
+                        solver.set_up(model, {})
+                    self.assertEqual(solver.jac_times_vec is not None, created)
+
 
 if __name__ == "__main__":
     print("Add -v for more debug output")
@@ -2,9 +2,13 @@
 # Tests for the Scipy Solver class
 #
 import pybamm
+import os
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 import numpy as np
-from tests import get_mesh_for_testing
+from tests import get_mesh_for_testing, get_discretisation_for_testing
 import warnings
 
 
@@ -183,6 +187,127 @@ class TestScipySolver(unittest.TestCase):
         np.testing.assert_array_equal(solution.t, t_eval[: len(solution.t)])
         np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t))
 
+    @unittest.skipIf(not pybamm.have_numba(), "numba is not installed")
+    def test_model_solver_with_event_numba(self):
+        # Compile into a temporary cache directory
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patch = mock.patch.object(
+            pybamm.expression_tree.operations.evaluate_numba,
+            "NUMBA_CACHE_DIR",
+            cache_dir.name,
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        # Create model
+        model = pybamm.BaseModel()
+        model.convert_to_format = "numba"
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var = pybamm.Variable("var", domain=domain)
+        model.rhs = {var: -0.1 * var}
+        model.initial_conditions = {var: 1}
+        model.events = {"var=0.5": pybamm.min(var - 0.5)}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        # Solve
+        solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-8)
+        t_eval = np.linspace(0, 10, 100)
+        # the numba kernels calculate the jacobian, so only its sparsity pattern is
+        # found symbolically
+        with mock.patch.object(
+            pybamm.Jacobian, "jac", autospec=True, side_effect=pybamm.Jacobian.jac
+        ) as jac_mock:
+            solution = solver.solve(model, t_eval)
+        self.assertGreater(jac_mock.call_count, 0)
+        for call in jac_mock.call_args_list:
+            self.assertTrue(call[0][0]._structure)
+        self.assertIsInstance(solver.jacobian.jac_fn.__self__, pybamm.EvaluatorNumba)
+        self.assertGreater(len(os.listdir(cache_dir.name)), 0)
+        self.assertLess(len(solution.t), len(t_eval))
+        np.testing.assert_array_equal(solution.t, t_eval[: len(solution.t)])
+        np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t))
+        self.assertEqual(solution.termination, "event: var=0.5")
+
+    def test_model_solver_with_event_flat(self):
+        # Create model
+        model = pybamm.BaseModel()
+        model.convert_to_format = None
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var = pybamm.Variable("var", domain=domain)
+        model.rhs = {var: -0.1 * var}
+        model.initial_conditions = {var: 1}
+        model.events = {
+            "var=0.5": pybamm.min(var - 0.5),
+            "var=-1": pybamm.min(var + 1),
+        }
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        # Solve
+        solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-8)
+        t_eval = np.linspace(0, 10, 100)
+        solution = solver.solve(model, t_eval)
+        # the rhs and events are evaluated together
+        evaluator = solver.dydt.concatenated_rhs_fn.__self__.evaluator
+        self.assertIs(solver.events["var=0.5"].evaluator, evaluator)
+        self.assertLess(len(solution.t), len(t_eval))
+        np.testing.assert_array_equal(solution.t, t_eval[: len(solution.t)])
+        np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t))
+        self.assertEqual(solution.termination, "event: var=0.5")
+
+    @unittest.skipIf(shutil.which("cc") is None, "no C compiler")
+    def test_model_solver_with_event_compiled_casadi(self):
+        # Compile into a temporary cache directory
+        cache_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(cache_dir.cleanup)
+        patch = mock.patch.object(
+            pybamm.solvers.casadi_compile, "CASADI_CACHE_DIR", cache_dir.name
+        )
+        patch.start()
+        self.addCleanup(patch.stop)
+
+        # Create model
+        model = pybamm.BaseModel()
+        model.convert_to_format = "casadi"
+        model.compile_casadi = True
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var = pybamm.Variable("var", domain=domain)
+        model.rhs = {var: -0.1 * var}
+        model.initial_conditions = {var: 1}
+        model.events = {"var=0.5": pybamm.min(var - 0.5)}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        # Solve
+        solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-8)
+        t_eval = np.linspace(0, 10, 100)
+        solution = solver.solve(model, t_eval)
+        self.assertLess(len(solution.t), len(t_eval))
+        np.testing.assert_array_equal(solution.t, t_eval[: len(solution.t)])
+        np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t))
+        self.assertEqual(solution.termination, "event: var=0.5")
+        libraries = [
+            name for name in os.listdir(cache_dir.name) if name.endswith(".so")
+        ]
+        self.assertGreater(len(libraries), 0)
+
+        # A second set-up loads the compiled libraries instead of compiling again
+        solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-8)
+        with mock.patch.object(
+            pybamm.solvers.casadi_compile.subprocess, "run"
+        ) as compile_mock:
+            second_solution = solver.solve(model, t_eval)
+        compile_mock.assert_not_called()
+        np.testing.assert_array_equal(second_solution.y, solution.y)
+        self.assertEqual(
+            libraries,
+            [name for name in os.listdir(cache_dir.name) if name.endswith(".so")],
+        )
+
+        # The CasADi solver does not compile its functions
+        with self.assertLogs("pybamm.logger", level="WARNING") as logs:
+            pybamm.CasadiSolver(mode="fast").solve(model, t_eval)
+        self.assertIn("'compile_casadi' has no effect", logs.output[0])
+
     def test_model_solver_ode_with_jacobian_python(self):
         # Create model
         model = pybamm.BaseModel()
@@ -235,6 +360,46 @@ class TestScipySolver(unittest.TestCase):
             np.ones((N, T.size)) * (T[np.newaxis, :] - np.exp(T[np.newaxis, :])),
         )
 
+    def test_model_solver_ode_jacobian_sparsity(self):
+        for convert_to_format in ["python", "casadi"]:
+            # Create model
+            model = pybamm.BaseModel()
+            model.convert_to_format = convert_to_format
+            model.use_jacobian = False
+            whole_cell = ["negative electrode", "separator", "positive electrode"]
+            var1 = pybamm.Variable("var1", domain=whole_cell)
+            var2 = pybamm.Variable("var2", domain=whole_cell)
+            model.rhs = {var1: var1, var2: 1 - var1}
+            model.initial_conditions = {var1: 1.0, var2: -1.0}
+            model.variables = {"var1": var1, "var2": var2}
+
+            # create discretisation
+            mesh = get_mesh_for_testing()
+            spatial_methods = {"macroscale": pybamm.FiniteVolume()}
+            disc = pybamm.Discretisation(mesh, spatial_methods)
+            disc.process_model(model)
+            N = mesh.combine_submeshes(*whole_cell)[0].npts
+
+            # Solve
+            solver = pybamm.ScipySolver(rtol=1e-9, atol=1e-9)
+            t_eval = np.linspace(0, 1, 100)
+            solution = solver.solve(model, t_eval)
+            np.testing.assert_array_equal(solution.t, t_eval)
+
+            # Sparsity pattern should match the structure of the Jacobian
+            J = np.block([[np.eye(N), np.zeros((N, N))], [np.eye(N), np.zeros((N, N))]])
+            np.testing.assert_array_equal(solver.jac_sparsity.toarray(), J)
+
+            T, Y = solution.t, solution.y
+            np.testing.assert_array_almost_equal(
+                model.variables["var1"].evaluate(T, Y),
+                np.ones((N, T.size)) * np.exp(T[np.newaxis, :]),
+            )
+            np.testing.assert_array_almost_equal(
+                model.variables["var2"].evaluate(T, Y),
+                np.ones((N, T.size)) * (T[np.newaxis, :] - np.exp(T[np.newaxis, :])),
+            )
+
     def test_model_step_python(self):
         # Create model
         model = pybamm.BaseModel()
@@ -272,6 +437,69 @@ class TestScipySolver(unittest.TestCase):
         solution = solver.solve(model, t_eval)
         np.testing.assert_allclose(solution.y[0], step_sol.y[0])
 
+    def test_model_step_checkpoint_python(self):
+        # Create model
+        model = pybamm.BaseModel()
+        model.convert_to_format = "python"
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var = pybamm.Variable("var", domain=domain)
+        model.rhs = {var: -pybamm.InputParameter("rate") * var}
+        model.initial_conditions = {var: 1}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+
+        solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-8)
+        dt = 0.1
+        solver.step(model, dt, inputs={"rate": 1})
+        checkpoint = solver.checkpoint()
+        np.testing.assert_allclose(checkpoint.y, np.exp(-dt), rtol=1e-6)
+
+        # Branch from the checkpoint with two different rates
+        for rate in [1, 2]:
+            solver.restore(checkpoint)
+            step_sol = solver.step(model, dt, inputs={"rate": rate})
+            np.testing.assert_allclose(
+                step_sol.y[0],
+                np.exp(-dt) * np.exp(-rate * (step_sol.t - dt)),
+                rtol=1e-6,
+            )
+
+        # The inputs are not reused between steps if none are given
+        with self.assertRaisesRegex(KeyError, "rate"):
+            solver.step(model, dt)
+        self.assertEqual(solver.inputs, {})
+
+        # ... but the inputs and external variables from a restored checkpoint are
+        solver.restore(checkpoint)
+        solver.y_ext[:] = 1
+        y_ext = solver.y_ext.copy()
+        solver.step(model, dt)
+        self.assertEqual(solver.inputs, {"rate": 1})
+        np.testing.assert_array_equal(solver.y_ext, y_ext)
+        with self.assertRaisesRegex(KeyError, "rate"):
+            solver.step(model, dt)
+        np.testing.assert_array_equal(solver.y_ext, 0)
+
+    def test_model_solver_atol_by_variable(self):
+        model = pybamm.BaseModel()
+        var1 = pybamm.Variable("var1")
+        var2 = pybamm.Variable("var2")
+        model.rhs = {var1: -var1, var2: -1e3 * var2}
+        model.initial_conditions = {var1: 1, var2: 1e-6}
+        model.variables = {"var1": var1, "var2": var2}
+        disc = get_discretisation_for_testing()
+        disc.process_model(model)
+        t_eval = np.linspace(0, 0.005, 10)
+
+        # var2 is much smaller than atol, so needs its own tolerance to be accurate
+        solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-3)
+        solver.set_atol_by_variable({"var2": 1e-14}, model)
+        solution = solver.solve(model, t_eval)
+        np.testing.assert_allclose(solution.y[0], np.exp(-t_eval), rtol=1e-6)
+        np.testing.assert_allclose(
+            solution.y[1], 1e-6 * np.exp(-1e3 * t_eval), rtol=1e-4
+        )
+
     def test_model_solver_with_inputs(self):
         # Create model
         model = pybamm.BaseModel()
@@ -297,6 +525,151 @@ class TestScipySolver(unittest.TestCase):
         np.testing.assert_array_equal(solution.t, t_eval[: len(solution.t)])
         np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t))
 
+    def test_model_solver_reuse_set_up(self):
+        for convert_to_format in ["python", None, "casadi"]:
+            # Create model
+            model = pybamm.BaseModel()
+            model.convert_to_format = convert_to_format
+            domain = ["negative electrode", "separator", "positive electrode"]
+            var = pybamm.Variable("var", domain=domain)
+            model.rhs = {var: -pybamm.InputParameter("rate") * var}
+            model.initial_conditions = {var: 1}
+            model.events = {"var=0.5": pybamm.min(var - 0.5)}
+            disc = pybamm.Discretisation(
+                get_mesh_for_testing(), {"macroscale": pybamm.FiniteVolume()}
+            )
+            disc.process_model(model)
+
+            solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-8, method="RK45")
+            t_eval = np.linspace(0, 10, 100)
+            solution = solver.solve(model, t_eval, inputs={"rate": 0.1})
+            np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t))
+            dydt = solver.dydt
+
+            # only the inputs change: the set-up is reused
+            solution = solver.solve(model, t_eval, inputs={"rate": 0.2})
+            self.assertIs(solver.dydt, dydt)
+            np.testing.assert_allclose(solution.y[0], np.exp(-0.2 * solution.t))
+            self.assertEqual(solution.termination, "event: var=0.5")
+
+            # the set-up is done again if the model changes
+            model.use_jacobian = False
+            solution = solver.solve(model, t_eval, inputs={"rate": 0.2})
+            self.assertIsNot(solver.dydt, dydt)
+            dydt = solver.dydt
+            model.concatenated_rhs = -2 * pybamm.InputParameter("rate") * (
+                model.concatenated_rhs / -pybamm.InputParameter("rate")
+            )
+            solution = solver.solve(model, t_eval, inputs={"rate": 0.1})
+            self.assertIsNot(solver.dydt, dydt)
+            np.testing.assert_allclose(
+                solution.y[0], np.exp(-0.2 * solution.t), rtol=1e-6
+            )
+
+            # or if the solver is set up for something else in the meantime
+            dydt = solver.dydt
+            solver.set_up(model, {"rate": 0.1})
+            solver.solve(model, t_eval, inputs={"rate": 0.1})
+            self.assertIsNot(solver.dydt, dydt)
+
+    def test_model_solver_jac_times_vec(self):
+        class KrylovSolver(pybamm.ScipySolver):
+            use_jac_times_vec = True
+
+        for convert_to_format in ["python", None, "casadi"]:
+            # Create model
+            model = pybamm.BaseModel()
+            model.convert_to_format = convert_to_format
+            whole_cell = ["negative electrode", "separator", "positive electrode"]
+            var = pybamm.Variable("var", domain=whole_cell)
+            model.rhs = {
+                var: pybamm.div(pybamm.grad(var))
+                - pybamm.InputParameter("rate") * var ** 2
+            }
+            model.initial_conditions = {var: 1}
+            model.boundary_conditions = {
+                var: {
+                    "left": (pybamm.Scalar(0), "Neumann"),
+                    "right": (pybamm.Scalar(1), "Dirichlet"),
+                }
+            }
+            disc = get_discretisation_for_testing()
+            disc.process_model(model)
+
+            inputs = {"rate": 0.3}
+            solvers = [pybamm.ScipySolver(), KrylovSolver()]
+            for solver in solvers:
+                if convert_to_format == "casadi":
+                    solver.set_up_casadi(model, inputs)
+                else:
+                    solver.set_up(model, inputs)
+                solver.set_inputs_and_external(inputs)
+
+            # the Jacobian-vector product is only created for solvers that use it
+            self.assertIsNone(solvers[0].jac_times_vec)
+            solver = solvers[1]
+            y = np.linspace(1, 2, len(solver.y0))
+            v = np.linspace(-1, 1, len(solver.y0))
+            jac = solver.jacobian(0, y)
+            if convert_to_format == "casadi":
+                jac = jac.full()
+            else:
+                jac = jac.toarray()
+            np.testing.assert_allclose(
+                solver.jac_times_vec(0, y, v), jac @ v, rtol=1e-12, atol=1e-12
+            )
+
+    def test_model_solver_casadi_graph(self):
+        # Create model
+        model = pybamm.BaseModel()
+        domain = ["negative electrode", "separator", "positive electrode"]
+        var = pybamm.Variable("var", domain=domain)
+        model.rhs = {var: -pybamm.InputParameter("rate") * var}
+        model.initial_conditions = {var: 1}
+        model.events = {"var=0.5": pybamm.min(var - 0.5)}
+        model.convert_to_format = "casadi"
+        disc = pybamm.Discretisation(
+            get_mesh_for_testing(), {"macroscale": pybamm.FiniteVolume()}
+        )
+        disc.process_model(model)
+        self.assertEqual(model.casadi_graph, "auto")
+
+        t_eval = np.linspace(0, 10, 100)
+        for graph, expected in [
+            ("auto", "MX"),
+            ("MX", "MX"),
+            ("SX", "SX"),
+            ("expand", "expand"),
+        ]:
+            model.casadi_graph = graph
+            solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-8)
+            solution = solver.solve(model, t_eval, inputs={"rate": 0.1})
+            self.assertEqual(solver.casadi_graph, expected)
+            self.assertEqual(
+                solver.dydt.concatenated_rhs_fn.is_a("SXFunction"), expected != "MX"
+            )
+            np.testing.assert_allclose(
+                solution.y[0], np.exp(-0.1 * solution.t), rtol=1e-6
+            )
+            self.assertEqual(solution.termination, "event: var=0.5")
+
+        model.casadi_graph = "bad graph"
+        with self.assertRaisesRegex(ValueError, "CasADi graph 'bad graph' not"):
+            pybamm.ScipySolver().solve(model, t_eval, inputs={"rate": 0.1})
+
+        # small models use SX graphs
+        model = pybamm.BaseModel()
+        var = pybamm.Variable("var")
+        model.rhs = {var: -0.1 * var}
+        model.initial_conditions = {var: 1}
+        model.convert_to_format = "casadi"
+        disc = pybamm.Discretisation()
+        disc.process_model(model)
+        solver = pybamm.ScipySolver(rtol=1e-8, atol=1e-8)
+        solution = solver.solve(model, t_eval)
+        self.assertEqual(solver.casadi_graph, "SX")
+        np.testing.assert_allclose(solution.y[0], np.exp(-0.1 * solution.t), rtol=1e-6)
+
     def test_model_solver_with_event_with_casadi(self):
         # Create model
         model = pybamm.BaseModel()